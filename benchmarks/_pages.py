@@ -0,0 +1,33 @@
+"""
+t.me 页面样例（测试与基准共用）
+Sample t.me pages shared by tests and benchmarks
+"""
+
+HEAD = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+    "<title>Telegram: Contact @someone</title>"
+    "<meta property=\"og:description\" content=\"not the bio\">"
+    "<link href=\"//telegram.org/css/font-roboto.css\" rel=\"stylesheet\">"
+    "</head><body class=\"no_transition\"><div class=\"tgme_page_wrap\">"
+    + "<div class=\"tgme_head\">" + "x" * 3000 + "</div>"
+)
+PHOTO = (
+    "<div class=\"tgme_page_photo\"><a href=\"tg://resolve?domain=someone\">"
+    "<img class=\"tgme_page_photo_image\" src=\"https://cdn4.telesco.pe/file/a.jpg?x=1&amp;y=2\"></a></div>"
+)
+TITLE = "<div class=\"tgme_page_title\"><span dir=\"auto\">Some One</span></div>"
+DESCRIPTION = (
+    "<div class=\"tgme_page_description\" dir=\"auto\">\n  加V: abc&amp;123<br/>"
+    "<a href=\"https://t.me/spam\">t.me/spam</a> 🚀\n</div>"
+)
+TAIL = (
+    "<div class=\"tgme_page_action\"><a class=\"tgme_action_button_new\">Send Message</a></div>"
+    "</div><script>" + "var a=1;" * 2000 + "</script></body></html>"
+)
+
+PAGES = {
+    "full": HEAD + PHOTO + TITLE + DESCRIPTION + TAIL,
+    "no_bio": HEAD + PHOTO + TITLE + TAIL,
+    "no_photo": HEAD + TITLE + DESCRIPTION + TAIL,
+    "empty": HEAD + TITLE + TAIL,
+}
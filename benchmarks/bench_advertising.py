@@ -0,0 +1,88 @@
+"""
+广告词检测基准：每次调用重新加载 + 逐词查找 vs 预构建的 AdvertisingMatcher
+Benchmark: check_advertising with a 10k-word list
+
+旧实现每次调用都重新读取配置、切分词表、编译正则，再对每个词做一次子串查找；
+新实现只在配置变化时构建自动机，单次扫描文本。
+
+用法: python -m benchmarks.bench_advertising [--words N] [--rounds N]
+"""
+
+import argparse
+import random
+import time
+from configparser import ConfigParser
+
+from manager import manager
+from utils import advertising
+
+PATTERNS = r"电报群:t\.me\/\+[a-zA-Z0-9_-]+;微信号:微信[:\s]+[a-zA-Z0-9_-]{5,20};QQ号:加[QqＱｑ]{2}[:\s]+[0-9]{5,11}"
+
+TEXTS = [
+    "大家好，我是新来的，请多关照",
+    "hello everyone, nice to meet you all in this group",
+    "请问这个项目怎么部署到服务器上？日志里一直报错 connection refused",
+    "这是一段比较长的普通聊天内容，" * 8,
+]
+
+
+def _words(count: int) -> list:
+    rng = random.Random(1)
+    alphabet = "abcdefghijklmnopqrstuvwxyz赌博彩票代购兼职返利推广优惠"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(3, 8))) for _ in range(count)]
+
+
+def _baseline(text: str):
+    """基线：改动前的 check_advertising。"""
+    words = advertising.load_advertising_words()
+    text_lower = text.lower()
+    for word in words:
+        if len(word) < 2:
+            continue
+        if word.lower() in text_lower:
+            return True, word
+    for info in advertising.load_advertising_patterns():
+        if info["compiled"].search(text):
+            return True, f"pattern:{info['name']}"
+    return False, None
+
+
+def _bench(func, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in TEXTS:
+            func(text)
+    return (time.perf_counter() - start) / (rounds * len(TEXTS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    config = ConfigParser()
+    config["advertising"] = {"enabled": "true", "words": ",".join(_words(args.words)), "regex_patterns": PATTERNS}
+    manager.config = config
+    manager.logger.remove()
+
+    for text in TEXTS:
+        assert _baseline(text) == advertising.check_advertising(text)
+
+    start = time.perf_counter()
+    advertising._matcher_key = None
+    advertising.get_advertising_matcher()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    before = _bench(_baseline, args.rounds)
+    after = _bench(advertising.check_advertising, args.rounds)
+
+    print(f"words={args.words} texts={len(TEXTS)} rounds={args.rounds} (matcher build {build_ms:.1f}ms, once)")
+    print(f"{'':<10} {'us/call':>10}")
+    print(f"{'before':<10} {before:>10.1f}")
+    print(f"{'after':<10} {after:>10.1f}")
+    print(f"speedup {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+default_handler 吞吐基准：未处于观察期的普通群消息
+Benchmark: default_handler messages/sec, Redis DELETE per message vs in-process watch set
+
+旧实现对每条消息都 get_chat / get_sender 并 DELETE first_msg_watch key；
+新实现查进程内名单后直接返回。Redis 往返用 asyncio.sleep 模拟（--rtt-ms）。
+
+用法: python -m benchmarks.bench_default_handler [--messages N] [--rtt-ms MS]
+"""
+
+import argparse
+import asyncio
+import time
+
+from telethon import types
+
+from handlers.default import default_handler
+from manager import manager
+
+
+class _Redis:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.calls = 0
+
+    async def delete(self, *keys):
+        self.calls += 1
+        await asyncio.sleep(self.rtt)
+        return 0
+
+    async def scan(self, cursor=0, match=None, count=10):
+        self.calls += 1
+        await asyncio.sleep(self.rtt)
+        return 0, []
+
+
+class _Chat:
+    id = 123456
+    title = "Bench Group"
+    megagroup = True
+
+
+class _Sender:
+    id = 888999
+    username = "bench"
+    first_name = "Bench"
+    last_name = None
+
+
+class _Event:
+    chat_id = -100123456
+    sender_id = 888999
+    text = "hello world"
+
+    def __init__(self):
+        self.message = type("M", (), {"peer_id": types.PeerChannel(123456)})()
+
+    async def get_chat(self):
+        return _Chat()
+
+    async def get_sender(self):
+        return _Sender()
+
+
+async def _baseline_handler(event, rdb):
+    """基线：改动前的 default_handler 未命中路径。"""
+    chat = await event.get_chat()
+    sender = await event.get_sender()
+    if not sender or not chat:
+        return
+    manager.username(sender)
+    if not await rdb.delete(f"first_msg_watch:{chat.id}:{sender.id}"):
+        return
+
+
+async def _run(handler, messages: int) -> float:
+    event = _Event()
+    start = time.perf_counter()
+    for _ in range(messages):
+        await handler(event)
+    return messages / (time.perf_counter() - start)
+
+
+async def main_async(messages: int, rtt_ms: float):
+    rdb = _Redis(rtt_ms / 1000)
+
+    async def get_redis():
+        return rdb
+
+    manager.get_redis = get_redis
+    manager.first_msg_watch = None
+    await manager.get_first_msg_watch().pop(0, 0)  # 启动时载入一次
+
+    rdb.calls = 0
+    before = await _run(lambda e: _baseline_handler(e, rdb), messages)
+    before_calls, rdb.calls = rdb.calls, 0
+    after = await _run(default_handler, messages)
+
+    print(f"messages={messages} simulated redis rtt={rtt_ms}ms")
+    print(f"{'':<10} {'msg/s':>12} {'redis calls':>12}")
+    print(f"{'before':<10} {before:>12.0f} {before_calls:>12}")
+    print(f"{'after':<10} {after:>12.0f} {rdb.calls:>12}")
+    print(f"speedup {after / before:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.messages, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
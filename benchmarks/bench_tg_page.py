@@ -0,0 +1,52 @@
+"""
+t.me 页面提取基准：BeautifulSoup 全量解析 vs 流式扫描器
+Benchmark: BS4 full parse vs TgPageScanner
+
+用法: python -m benchmarks.bench_tg_page [--rounds N]
+"""
+
+import argparse
+import time
+
+from manager.tg_page import PAGE_CHUNK_SIZE, TgPageScanner, parse_page_bs4
+
+from ._pages import PAGES
+
+
+def _bs4(page: str):
+    return parse_page_bs4(page)
+
+
+def _scanner(page: str):
+    raw = page.encode("utf-8")
+    scanner = TgPageScanner()
+    for i in range(0, len(raw), PAGE_CHUNK_SIZE):
+        if scanner.feed(raw[i : i + PAGE_CHUNK_SIZE]):
+            break
+    else:
+        scanner.close()
+    return scanner.result()
+
+
+def _bench(func, page: str, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(page)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'page':<10} {'bytes':>8} {'bs4 us':>10} {'scanner us':>12} {'speedup':>8}")
+    for name, page in sorted(PAGES.items()):
+        assert _bs4(page) == _scanner(page), name
+        bs4_us = _bench(_bs4, page, args.rounds)
+        scan_us = _bench(_scanner, page, args.rounds)
+        print(f"{name:<10} {len(page.encode()):>8} {bs4_us:>10.1f} {scan_us:>12.1f} {bs4_us / scan_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from telethon import events
 
 from manager import manager
-from utils.asr import openai_whisper
+from utils.asr import CHUNK_SIZE, MediaTooLarge, get_asr_queue, get_max_size, limit_size, openai_whisper
 from handlers.member_captcha.config import get_chat_type
 
 logger = manager.logger
@@ -11,7 +11,7 @@ logger = manager.logger
 SUPPORT_GROUP_TYPES = ["supergroup", "group", "private"]
 
 
-@manager.register("message", pattern=r"(?i)^/asr(\s|$)|^/asr@\w+")
+@manager.register_command("asr")
 async def asr(event: events.NewMessage.Event):
     chat = await event.get_chat()
     if get_chat_type(chat) not in SUPPORT_GROUP_TYPES:
@@ -28,18 +28,45 @@ async def asr(event: events.NewMessage.Event):
     if not reply_msg.voice and not reply_msg.media:
         return
 
-    raw = await manager.download_media_bytes(reply_msg)
-    if not raw:
+    media = reply_msg.file
+    if not media:
         return
 
+    # 已知大小时直接拒绝，未知大小时在流式上传中截断
+    max_bytes = get_max_size()
+    if media.size and media.size > max_bytes:
+        await manager.reply(reply_msg, "media too large for asr", datetime.now() + timedelta(seconds=5))
+        return
+
+    queue = get_asr_queue()
+    notice_id = None
+    ahead = queue.ahead()
+    if ahead:
+        notice_id = await manager.send_text(chat.id, f"asr queued, {ahead} job(s) ahead", reply_to=reply_msg.id)
+
     try:
-        text = await openai_whisper(raw)
+        async with queue.slot():
+            if notice_id:
+                await manager.delete_message(chat.id, notice_id)
+                notice_id = None
+            chunks = limit_size(manager.iter_media(reply_msg, CHUNK_SIZE), max_bytes)
+            text = await openai_whisper(
+                chunks,
+                filename=media.name or f"audio{media.ext or '.ogg'}",
+                content_type=media.mime_type or "application/octet-stream",
+            )
         if not text:
             return
+    except MediaTooLarge:
+        await manager.reply(reply_msg, "media too large for asr", datetime.now() + timedelta(seconds=5))
+        return
     except Exception as e:
         logger.exception("asr failed")
         await manager.reply(reply_msg, "asr failed", datetime.now() + timedelta(seconds=5))
         return
+    finally:
+        if notice_id:
+            await manager.delete_message(chat.id, notice_id)
 
     await manager.reply(reply_msg, text)
     name = getattr(user, "first_name", "") or ""
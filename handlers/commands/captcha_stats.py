@@ -7,13 +7,13 @@ from ..member_captcha.stats import STATS_KEY, FIELD_GROUP_JOINS, FIELD_VERIFICAT
 logger = manager.logger
 
 
-@manager.register("message", pattern=r"(?i)^/captcha_stats(\s+\d+)?$")
+@manager.register_command("captcha_stats")
 async def captcha_stats(event: events.NewMessage.Event):
     """查看验证统计。用法: /captcha_stats [群ID]"""
     import re
 
     text = event.raw_text.strip()
-    m = re.match(r"(?i)^/captcha_stats(?:\s+(\d+))?\s*$", text)
+    m = re.match(r"(?i)^/captcha_stats(?:@\w+)?(?:\s+(\d+))?\s*$", text)
     group_id = int(m.group(1)) if m and m.group(1) else None
 
     rdb = await manager.get_redis()
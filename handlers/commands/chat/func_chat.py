@@ -1,24 +1,135 @@
 import re
+import time
 from datetime import timedelta
+from typing import List, Optional
 
 import telegramify_markdown
 from telethon import events
 
 from manager import manager
 
-from ...utils import count_tokens, tg_generate_text
+from ...utils import tg_generate_text
+from ...utils.history import history_key
 
 DELETED_AFTER = 5
 RE_CLEAR = re.compile(r"(?i)^/chat(?:@[a-zA-Z0-9_]+)?(?:\s|$)")
 
+# 流式回复：占位消息随输出渐进编辑。Telegram 对同一聊天的编辑有频率限制（群组更严），
+# 编辑间隔按聊天类型区分，并遵守 429 返回的 retry_after
+STREAM_PLACEHOLDER = "…"
+STREAM_CURSOR = " ▌"
+STREAM_EDIT_INTERVAL = 1.0
+STREAM_EDIT_INTERVAL_GROUP = 3.0
+STREAM_PREVIEW_LIMIT = 4000  # 单条消息上限 4096，预览超出部分截断，完整内容在结束时分段发送
+
 logger = manager.logger
 
 
+async def _bot_api(method: str, payload: dict) -> dict:
+    """调用 Bot API，失败时抛出 RuntimeError（附带 retry_after 供限流退避）。"""
+    session = await manager.create_session("telegram")
+    token = manager.config["telegram"]["token"]
+    async with session.post(f"https://api.telegram.org/bot{token}/{method}", json=payload) as response:
+        result = await response.json()
+    if response.status != 200 or not result.get("ok"):
+        error = RuntimeError(result.get("description", f"HTTP {response.status}"))
+        error.retry_after = (result.get("parameters") or {}).get("retry_after")
+        raise error
+    return result.get("result") or {}
+
+
+def _stream_enabled() -> bool:
+    try:
+        return manager.config["ai"].getboolean("chat_stream", True)
+    except Exception:
+        return True
+
+
+class StreamingReply:
+    """
+    流式回复写入器：先回复一条占位消息，随后按节流间隔用累计文本编辑它；
+    结束时按 Rich Message 正式发送完整回复并删除占位消息（失败时把完整文本编辑进占位消息）。
+    """
+
+    def __init__(self, event, prefix: str, interval: float = STREAM_EDIT_INTERVAL):
+        self.event = event
+        self.prefix = prefix
+        self.interval = interval
+        self.message_id: Optional[int] = None
+        self.parts: List[str] = []
+        self.shown = ""
+        self.next_edit_at = 0.0
+        self.edits = 0
+
+    async def start(self) -> bool:
+        payload = {"chat_id": self.event.chat_id, "text": STREAM_PLACEHOLDER}
+        if self.event.id is not None:
+            payload["reply_parameters"] = {"message_id": self.event.id}
+        try:
+            result = await _bot_api("sendMessage", payload)
+            self.message_id = result.get("message_id")
+        except Exception:
+            logger.exception(f"{self.prefix} stream placeholder failed")
+        self.next_edit_at = time.monotonic()
+        return self.message_id is not None
+
+    async def feed(self, delta: str) -> None:
+        self.parts.append(delta)
+        if self.message_id is not None and time.monotonic() >= self.next_edit_at:
+            await self._edit(self._preview())
+
+    def _preview(self) -> str:
+        text = "".join(self.parts)
+        if len(text) > STREAM_PREVIEW_LIMIT:
+            return text[:STREAM_PREVIEW_LIMIT] + " …"
+        return text + STREAM_CURSOR
+
+    async def _edit(self, text: str) -> bool:
+        self.next_edit_at = time.monotonic() + self.interval
+        if not text.strip() or text == self.shown:
+            return True
+        try:
+            await _bot_api(
+                "editMessageText",
+                {"chat_id": self.event.chat_id, "message_id": self.message_id, "text": text},
+            )
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after:
+                self.next_edit_at = time.monotonic() + float(retry_after)
+                logger.warning(f"{self.prefix} stream edit rate limited, pausing {retry_after}s")
+            else:
+                logger.warning(f"{self.prefix} stream edit failed: {e}")
+            return False
+        self.shown = text
+        self.edits += 1
+        return True
+
+    async def discard(self) -> None:
+        if self.message_id is None:
+            return
+        try:
+            await _bot_api("deleteMessage", {"chat_id": self.event.chat_id, "message_id": self.message_id})
+        except Exception:
+            logger.warning(f"{self.prefix} stream placeholder delete failed")
+        self.message_id = None
+
+    async def finish(self, text_resp: str) -> bool:
+        if self.message_id is None:
+            return await _reply_response(self.event, text_resp, self.prefix)
+        if await _reply_response(self.event, text_resp, self.prefix):
+            await self.discard()
+            return True
+        # 正式发送失败：保留占位消息，写入（截断的）完整纯文本
+        self.next_edit_at = 0.0
+        return await self._edit(text_resp[:STREAM_PREVIEW_LIMIT])
+
+
 async def _reply_response(event, text_resp: str, prefix: str) -> bool:
     """Send raw Markdown as Rich Messages through the Bot API."""
     sent_chunks = 0
     try:
-        session = await manager.create_session()
+        session = await manager.create_session("telegram")
         token = manager.config["telegram"]["token"]
         url = f"https://api.telegram.org/bot{token}/sendRichMessage"
         chunks = telegramify_markdown.telegramify_rich(text_resp, mode="html")
@@ -44,7 +155,7 @@ async def _reply_response(event, text_resp: str, prefix: str) -> bool:
 
         logger.warning(f"{prefix} no Rich Message chunk was sent, falling back to plain Bot API")
         try:
-            session = await manager.create_session()
+            session = await manager.create_session("telegram")
             token = manager.config["telegram"]["token"]
             url = f"https://api.telegram.org/bot{token}/sendMessage"
             payload = {
@@ -63,7 +174,7 @@ async def _reply_response(event, text_resp: str, prefix: str) -> bool:
     return True
 
 
-@manager.register("message", pattern=r"(?i)^/chat(?:\s|$)|^/chat@[a-zA-Z0-9_]+(?:\s|$)")
+@manager.register_command("chat")
 async def chat(event: events.NewMessage.Event):
     """Basic /chat with 30-minute conversation TTL (reset/simplified version).
 
@@ -106,7 +217,7 @@ async def chat(event: events.NewMessage.Event):
     subcommand = parts[0].strip().lower() if parts else ""
 
     if subcommand == "reset":
-        await rdb.delete(f"chat:history:{user.id}")
+        await rdb.delete(history_key(user.id))
         await manager.reply(
             event,
             "会话已经重置\nYour chat history has been reset.",
@@ -119,12 +230,24 @@ async def chat(event: events.NewMessage.Event):
         logger.warning(f"{prefix} message too short, ignored")
         return
 
+    writer = None
+    if _stream_enabled():
+        is_private = getattr(event, "is_private", False)
+        writer = StreamingReply(event, prefix, STREAM_EDIT_INTERVAL if is_private else STREAM_EDIT_INTERVAL_GROUP)
+        if not await writer.start():
+            writer = None
+
     try:
         text_resp = await tg_generate_text(
-            chat_entity.id if hasattr(chat_entity, "id") else event.chat_id, user.id, text
+            chat_entity.id if hasattr(chat_entity, "id") else event.chat_id,
+            user.id,
+            text,
+            on_delta=writer.feed if writer else None,
         )
         if not text_resp:
             logger.warning(f"{prefix} generate text returned no response")
+            if writer:
+                await writer.discard()
             await manager.reply(
                 event,
                 "生成回复失败，请稍后再试。| Failed to generate response, please try again later.",
@@ -138,7 +261,10 @@ async def chat(event: events.NewMessage.Event):
             "生成回复失败，请稍后再试。| Failed to generate response, please try again later.\n"
         )
 
-    success = await _reply_response(event, text_resp, prefix)
+    if writer:
+        success = await writer.finish(text_resp)
+    else:
+        success = await _reply_response(event, text_resp, prefix)
     if not success:
         await manager.reply(
             event,
@@ -152,4 +278,5 @@ async def chat(event: events.NewMessage.Event):
 
     # Delete the trigger command message (group hygiene, same as other admin commands).
     await manager.delete_message(event.chat_id, event, event.date + timedelta(seconds=DELETED_AFTER))
-    logger.info(f"{prefix} do chat command, send token {count_tokens(text)}, response token {count_tokens(text_resp)}")
+    # token 数已在生成时计入会话历史，这里只记录长度，避免重复分词
+    logger.info(f"{prefix} do chat command, send chars {len(text)}, response chars {len(text_resp)}")
@@ -4,6 +4,7 @@ import time
 from telethon import events
 
 from manager import manager
+from manager.filters import PEER_GROUP, entity_chat_id
 from manager.group import NEW_MEMBER_CHECK_METHODS, PENDING_KEY_PREFIX, settings_get, settings_set
 from handlers.member_captcha.config import VerificationMode, get_chat_type
 
@@ -42,6 +43,7 @@ async def _render_setting_panel(rdb, chat_id: int):
     keyboard = [
         [
             manager.inline_button("认证剔除", "su:nm:ban"),
+            manager.inline_button("图片验证", "su:nm:image"),
             manager.inline_button("手动解封", "su:nm:silence"),
             manager.inline_button("无作为", "su:nm:none"),
         ],
@@ -58,7 +60,7 @@ async def _render_setting_panel(rdb, chat_id: int):
     ]
     return text, keyboard
 
-@manager.register("message", pattern=r"(?i)^/group_setting(\s|$)|^/group_setting@\w+")
+@manager.register_command("group_setting")
 async def group_setting_command(event: events.NewMessage.Event):
     chat = await event.get_chat()
     user = await event.get_sender()
@@ -88,7 +90,7 @@ async def group_setting_command(event: events.NewMessage.Event):
     log.info(f"群组 {chat.id} 调用设置命令")
     await manager.delete_message(chat.id, reply.id, datetime.now() + timedelta(seconds=45))
 
-@manager.register("callback_query")
+@manager.register("callback_query", prefix="su:")
 async def group_setting_callback(event: events.CallbackQuery.Event):
     data = event.data
     if isinstance(data, bytes):
@@ -171,26 +173,31 @@ async def group_setting_callback(event: events.CallbackQuery.Event):
         log.error(f"处理设置回调时出错: {e}")
         await event.answer()
 
-@manager.register("message")
+@manager.register("message", peer=(PEER_GROUP,))
 async def handle_pending_input(event: events.NewMessage.Event):
     """两阶段设置：处理管理员对「自定义静默」的回复"""
-    chat = await event.get_chat()
-    user = await event.get_sender()
+    # 只用原始字段定位待输入记录，不为普通群消息解析实体
+    chat_id = entity_chat_id(event)
+    sender_id = getattr(event, "sender_id", None)
+    if chat_id is None or sender_id is None:
+        return
 
     rdb = await manager.get_redis()
     if not rdb:
         return
 
-    pending_key = f"{PENDING_KEY_PREFIX}{chat.id}"
+    pending_key = f"{PENDING_KEY_PREFIX}{chat_id}"
     raw = await rdb.hgetall(pending_key)
     if not raw:
         return
 
     saved = {k.decode(): v.decode() for k, v in raw.items()} if isinstance(list(raw.keys())[0], bytes) else raw
 
-    if str(user.id) != saved.get("user_id"):
+    if str(sender_id) != saved.get("user_id"):
         return
 
+    chat = await event.get_chat()
+
     try:
         await event.delete()
     except Exception:
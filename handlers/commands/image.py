@@ -21,7 +21,7 @@ from manager import manager
 from utils import comfy_api
 from utils.comfy_workflow import WORKFLOWS
 
-from ..utils import strip_text_prefix, chat_completions, get_image_optimize_models
+from ..utils import PRIORITY_INTERACTIVE, strip_text_prefix, chat_completions, get_image_optimize_models
 
 logger = manager.logger
 
@@ -439,8 +439,8 @@ class PromptProcessor:
             return prompt, options
 
     @staticmethod
-    async def optimize_prompt(prompt: str) -> Tuple[str, str]:
-        """优化提示词"""
+    async def optimize_prompt(prompt: str, user_id: Optional[int] = None) -> Tuple[str, str]:
+        """优化提示词（交互优先级，按 user_id 公平排队）"""
         reply_content = prompt
 
         if "," in prompt:
@@ -454,6 +454,9 @@ class PromptProcessor:
                         {"role": "user", "content": prompt},
                     ],
                     model_name=model,
+                    priority=PRIORITY_INTERACTIVE,
+                    user_id=user_id,
+                    cacheable=True,
                 )
                 if optimized_prompt:
                     logger.info(f"Prompt optimized by {model}: {prompt} => {optimized_prompt}")
@@ -468,7 +471,7 @@ class PromptProcessor:
         return prompt, reply_content
 
 
-@manager.register("message", pattern=r"(?i)^/image(?: .*)?$")
+@manager.register_command("image")
 async def image(event: events.NewMessage.Event):
     """处理图像生成命令"""
     chat = await event.get_chat()
@@ -523,7 +526,7 @@ async def image(event: events.NewMessage.Event):
         if options.get("model", DEFAULT_MODEL) == "zimage":
             reply_content = prompt
         else:
-            prompt, reply_content = await PromptProcessor.optimize_prompt(prompt)
+            prompt, reply_content = await PromptProcessor.optimize_prompt(prompt, sender.id)
 
         # 创建任务
         reply_msg = await event.get_reply_message()
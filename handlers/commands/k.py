@@ -3,6 +3,7 @@ from typing import Union
 
 from telethon import events, types
 from manager import manager
+from manager.filters import PEER_GROUP
 
 DELETED_AFTER = 5
 BAN_MEMBER = 300  # 300s
@@ -10,9 +11,7 @@ BAN_MEMBER = 300  # 300s
 logger = manager.logger
 
 
-@manager.register("message", pattern=r"(?i)^/k(\s|$)|^/k@\w+")
-# Support /k, /k<space>, /k@botname in groups (Telegram appends @bot to commands).
-# The (\s|$) prevents matching /kill etc; ^/k@ handles bot-mention form.
+@manager.register_command("k", peer=(PEER_GROUP,), middleware=(manager.require_admin,))
 async def k(event: events.NewMessage.Event):
     """踢人功能"""
     chat = await event.get_chat()
@@ -23,11 +22,6 @@ async def k(event: events.NewMessage.Event):
         logger.warning(f"{prefix} message without user, ignored")
         return
 
-    # check permission
-    if not await manager.is_admin(event.chat_id, sender.id):
-        logger.warning(f"{prefix} user {sender.id} is not admin")
-        return
-
     reply = await event.get_reply_message()
     if not reply:
         logger.info(f"{prefix} no reply message")
@@ -2,13 +2,14 @@ from datetime import timedelta
 
 from telethon import events, types
 from manager import manager
+from manager.filters import PEER_GROUP
 
 DELETED_AFTER = 3
 
 logger = manager.logger
 
 
-@manager.register("message", pattern=r"(?i)^/sb(\s|$)|^/sb@\w+")
+@manager.register_command("sb", peer=(PEER_GROUP,), middleware=(manager.require_admin,))
 async def sb(event: events.NewMessage.Event):
     """将用户放入黑名单"""
     chat = await event.get_chat()
@@ -19,11 +20,6 @@ async def sb(event: events.NewMessage.Event):
         logger.warning(f"{prefix} message has no sender, ignoring")
         return
 
-    # check permission
-    if not await manager.is_admin(event.chat_id, sender.id):
-        logger.warning(f"{prefix} user {sender.id} is not an admin")
-        return
-
     reply = await event.get_reply_message()
     if not reply:
         logger.info(f"{prefix} no reply message found")
@@ -77,7 +73,7 @@ async def ban_member(chat, event, administrator, member):
         logger.warning(f"{prefix} failed to edit permissions for user {id} before ban")
 
     try:
-        session = await manager.create_session()
+        session = await manager.create_session("telegram")
         url = f"https://api.telegram.org/bot{manager.config['telegram']['token']}/banChatMember"
         payload = {
             "chat_id": event.chat_id,
@@ -10,7 +10,7 @@ logger = manager.logger
 DELETED_AFTER = 5
 
 
-@manager.register("message", pattern=r"(?i)^/sdxl(\s|$)|^/sdxl@\w+")
+@manager.register_command("sdxl")
 async def sdxl(event: events.NewMessage.Event):
     """sdxl base 1.0 power on cloudflare worker/ai"""
     chat = await event.get_chat()
@@ -44,7 +44,7 @@ async def sdxl(event: events.NewMessage.Event):
     prefix += f" user {name}"
     logger.info(f"{prefix} is using sdxl base 1.0 func")
 
-    session = await manager.create_session()
+    session = await manager.create_session("media")
     async with session.post(
         "https://iscys.com/api/cf/ai/txt2img",
         json={
@@ -16,7 +16,7 @@ URL_API = "https://api.iscys.com/api/shorturl"
 logger = manager.logger
 
 
-@manager.register("message", pattern=r"(?i)^/shorturl(?:\s+.*)?$")
+@manager.register_command("shorturl")
 async def shorturl_command(event: events.NewMessage.Event):
     sender = await event.get_sender()
     content = None
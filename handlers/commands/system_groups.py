@@ -94,7 +94,7 @@ async def _build_page(page: int) -> tuple:
     return "\n".join(lines), buttons, total_pages
 
 
-@manager.register("message", pattern=r"(?i)^/system_groups$")
+@manager.register_command("system_groups")
 async def system_groups(event: events.NewMessage.Event):
     """查看所有使用中的群组统计（仅全局管理员）。"""
     sender = await event.get_sender()
@@ -1,13 +1,52 @@
 import asyncio
+from typing import Any, Dict, List
 
 from telethon import events
 from manager import manager
+from utils import asr, audio, blocking
+from utils import first_msg_classifier as classifier
+from ..member_captcha import image_captcha
 from ..member_captcha.stats import STATS_KEY, FIELD_GROUP_JOINS, FIELD_VERIFICATIONS, FIELD_SUCCESS, FIELD_FAILED
+from ..utils import gateway, llm
+from ..utils.health import model_health
 
 logger = manager.logger
 
 
-@manager.register("message", pattern=r"(?i)^/system_usage$")
+def runtime_stats() -> Dict[str, Any]:
+    """进程内各组件的运行统计；尚未创建的组件不列出（也不会因此被创建）。"""
+    result = manager.runtime_stats()
+    optional = {
+        "llm_gateway": gateway._gateway,
+        "asr_queue": asr._queue,
+        "image_captcha_pool": image_captcha._pool,
+        "first_msg_classifier": classifier._classifier,
+    }
+    result.update({name: c.stats() for name, c in optional.items() if c is not None})
+    result["llm_hedge"] = dict(llm.hedge_stats)
+    result["model_health"] = model_health.stats()
+    result["blocking_pools"] = {name: pool.stats() for name, pool in blocking.pools.items()}
+    result["transcode"] = dict(audio.transcode_stats)
+    return result
+
+
+def format_stats(stats: Dict[str, Any], prefix: str = "") -> List[str]:
+    """嵌套统计展开为 "a.b: k=v k=v" 形式的行。"""
+    lines: List[str] = []
+    nested: List[str] = []
+    scalars = []
+    for key, value in stats.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            nested.extend(format_stats(value, name))
+        else:
+            scalars.append(f"{key}={round(value, 3) if isinstance(value, float) else value}")
+    if scalars:
+        lines.append(f"{prefix}: {' '.join(scalars)}" if prefix else " ".join(scalars))
+    return lines + nested
+
+
+@manager.register_command("system_usage")
 async def system_usage(event: events.NewMessage.Event):
     """查看系统使用统计（仅限管理员）。"""
     chat_id = event.chat_id
@@ -51,11 +90,18 @@ async def system_usage(event: events.NewMessage.Event):
 
     logger.debug(f"{prefix} permission ok (global_admin={is_global_admin})")
 
+    # 进程级运行统计只对全局 admin 展示，同时写入日志
+    runtime: List[str] = []
+    if is_global_admin:
+        runtime = format_stats(runtime_stats())
+        logger.info(f"{prefix} runtime stats | " + " | ".join(runtime))
+        runtime = ["", "运行状态:"] + runtime
+
     rdb = await manager.get_redis()
     if not rdb:
         logger.warning(f"{prefix} redis is not ready, cannot fetch stats")
         try:
-            await event.reply("Redis 未就绪，无法获取统计。")
+            await event.reply("\n".join(["Redis 未就绪，无法获取统计。"] + runtime))
         except Exception as e:
             logger.error(f"{prefix} reply redis-not-ready failed: {e}")
         return
@@ -94,7 +140,7 @@ async def system_usage(event: events.NewMessage.Event):
             f"唯一用户: {persons_count}",
             f"成功率: {rate}",
         ]
-        await event.reply("\n".join(lines))
+        await event.reply("\n".join(lines + runtime))
         logger.info(
             f"{prefix} ok scope={scope} joins={joins} verifications={verifications} "
             f"success={success} failed={failed} persons={persons_count} rate={rate}"
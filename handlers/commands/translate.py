@@ -1,19 +1,69 @@
+import asyncio
 from datetime import timedelta
+from typing import AsyncIterator, List
+
 from telethon import events
 
 import translators as ts
 
 from manager import manager
-from utils.tts import reply_tts
+from utils.blocking import BlockingPool
+from utils.tts import reply_tts_segments
 from ..utils import strip_text_prefix
 from handlers.member_captcha.config import get_chat_type
 
 logger = manager.logger
 
 DELETED_AFTER = 5
+TRANSLATOR = "google"
+TRANSLATE_WORKERS = 4
+TRANSLATE_TIMEOUT = 15
+SEGMENT_CHARS = 600  # 长文本按段落切分，逐段翻译并交给 TTS，两个阶段重叠执行
+
+# translators 是同步网络请求，放在专用线程池里执行，避免阻塞事件循环
+_pool = BlockingPool("translate", workers=TRANSLATE_WORKERS, timeout=TRANSLATE_TIMEOUT)
+
+
+async def _translate(content: str, to_language: str):
+    return await _pool.run(ts.translate_text, content, to_language=to_language, translator=TRANSLATOR)
+
+
+async def _translate_cached(content: str, to_language: str):
+    # 同一条消息常被转发到多个群翻译，按 (翻译器, 目标语言, 原文) 缓存结果
+    cache = manager.get_response_cache()
+    key = cache.make_key("translate", {"translator": TRANSLATOR, "to": to_language, "text": content})
+    return await cache.get_or_compute(key, lambda: _translate(content, to_language))
+
+
+def _split_segments(content: str, limit: int = SEGMENT_CHARS) -> List[str]:
+    """按行合并为不超过 limit 字符的段落（单行超长时整行作为一段）。"""
+    segments, current = [], ""
+    for line in content.splitlines():
+        if current and len(current) + len(line) + 1 > limit:
+            segments.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current.strip():
+        segments.append(current)
+    return segments or [content]
+
+
+async def _translate_segments(segments: List[str], to_language: str) -> AsyncIterator[str]:
+    """所有段落并发提交到线程池，按原顺序逐个产出译文；任一段失败时取消其余段落。"""
+    tasks = [asyncio.create_task(_translate_cached(segment, to_language)) for segment in segments]
+    try:
+        for task in tasks:
+            result = await task
+            if not isinstance(result, str):
+                raise ValueError(f"unexpected translate result: {type(result)}")
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
-@manager.register("message", pattern=r"(?i)^/tr(\s|$)|^/tr@\w+")
+@manager.register_command("tr")
 async def translate(event: events.NewMessage.Event):
     user = await event.get_sender()
     if not user:
@@ -45,9 +95,8 @@ async def translate(event: events.NewMessage.Event):
         content = parts[1]
 
     try:
-        result = ts.translate_text(content, to_language=to_language, translator="google")
-        if isinstance(result, str):
-            await reply_tts(target, result, show_original=True, lang=to_language)
+        segments = _translate_segments(_split_segments(content), to_language)
+        await reply_tts_segments(target, segments, show_original=True, lang=to_language)
     except Exception as e:
         logger.exception("translate failed")
         await manager.reply(
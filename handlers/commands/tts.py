@@ -12,7 +12,7 @@ SUPPORT_GROUP_TYPES = ["supergroup", "group", "private"]
 RE_CLEAR = re.compile(r"(?i)/tts(@[a-zA-Z0-9]+\s?)?")
 
 
-@manager.register("message", pattern=r"(?i)^/tts(\s|$)|^/tts@\w+")
+@manager.register_command("tts")
 async def tts(event: events.NewMessage.Event):
     chat = await event.get_chat()
     if get_chat_type(chat) not in SUPPORT_GROUP_TYPES:
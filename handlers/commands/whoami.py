@@ -6,7 +6,7 @@ from manager import manager
 logger = manager.logger
 
 
-@manager.register("message", pattern="/id")
+@manager.register_command("id")
 async def whoami(event: events.NewMessage.Event):
     """我的信息"""
     if event.is_reply:
@@ -1,7 +1,11 @@
 from datetime import datetime, timezone, timedelta
 from manager import manager
+from manager.filters import PEER_GROUP, entity_chat_id
 from handlers.member_captcha.config import get_chat_type
 from utils.advertising import check_advertising
+from utils.normalize import normalize_words
+from utils import first_msg_classifier
+from handlers.utils import PRIORITY_MODERATION
 from handlers.utils.llm import check_spams_with_llm
 
 logger = manager.logger
@@ -15,10 +19,8 @@ SAFE_GREETINGS = {
 }
 
 def _is_fast_safe_greeting(text: str) -> bool:
-    """检查是否为简短常见的友善问候语。"""
-    cleaned = "".join(ch for ch in text.lower() if ch.isalnum() or ch.isspace() or '\u4e00' <= ch <= '\u9fff')
-    cleaned = " ".join(cleaned.split()).strip()
-    return cleaned in SAFE_GREETINGS
+    """检查是否为简短常见的友善问候语（归一化并去掉标点后整句比较）。"""
+    return normalize_words(text) in SAFE_GREETINGS
 
 async def _handle_first_msg_violation(chat, event, user, reason: str):
     """处理首句违规：撤回违规消息 + 踢出成员 + 发送自毁通知。"""
@@ -48,8 +50,16 @@ async def _handle_first_msg_violation(chat, event, user, reason: str):
         auto_deleted_at=now_dt + timedelta(seconds=30),
     )
 
-@manager.register("message")
+# commands=True：新成员的第一条消息是命令时同样要出观察名单并做首句审查
+@manager.register("message", peer=(PEER_GROUP,), commands=True)
 async def default_handler(event):
+    # 快速路径：绝大多数发送者不在首句观察期，只查进程内名单，不取实体、不访问 Redis
+    watch = manager.get_first_msg_watch()
+    watch_chat_id = entity_chat_id(event)
+    sender_id = getattr(event, "sender_id", None)
+    if watch_chat_id is None or sender_id is None or not watch.might_watch(watch_chat_id, sender_id):
+        return
+
     chat = await event.get_chat()
     sender = await event.get_sender()
 
@@ -66,19 +76,12 @@ async def default_handler(event):
     if chat_type not in ("supergroup", "group"):
         return
 
-    # 检查是否处于入群 5 分钟首句观察期
+    # 检查是否处于入群 5 分钟首句观察期（以 Redis DELETE 结果为准）
     rdb = await manager.get_redis()
     if not rdb:
         return
 
-    watch_key = f"first_msg_watch:{chat.id}:{user_id}"
-    try:
-        was_watched = await rdb.delete(watch_key)
-    except Exception as e:
-        logger.warning(f"check first_msg_watch redis error: {e}")
-        was_watched = False
-
-    if not was_watched:
+    if not await watch.pop(chat.id, user_id):
         return
 
     # 用户已在 5 分钟内发言，取消潜水超时定时任务
@@ -104,16 +107,35 @@ async def default_handler(event):
     contains_adv, matched_word = check_advertising(text)
     if contains_adv:
         logger.warning(f"[首句审查] 群组:{chat.id} 成员:{user_id}({full_name}) | 命中广告词: {matched_word} | 内容:{text}")
+        await first_msg_classifier.record_verdict(chat.id, user_id, text, True, first_msg_classifier.SOURCE_ADVERTISING)
         await _handle_first_msg_violation(chat, event, sender, f"首句包含广告黑名单词「{matched_word}」")
         return
 
-    # 3. 提交 LLM 进行意图审查
+    # 3. 本地分类器：高置信度的直接放行 / 判定违规，只有不确定的交给 LLM
+    classifier = first_msg_classifier.get_first_msg_classifier()
+    if classifier is not None:
+        decision, prob = classifier.decide(text)
+        if decision is not None:
+            score = round(prob * 100)
+            logger.info(f"[首句审查] 群组:{chat.id} 成员:{user_id}({full_name}) | 本地分类:{decision} 评分:{score}/100 | 内容:{text}")
+            await first_msg_classifier.record_verdict(
+                chat.id, user_id, text, decision == first_msg_classifier.DECISION_REJECT,
+                first_msg_classifier.SOURCE_CLASSIFIER, score,
+            )
+            if decision == first_msg_classifier.DECISION_REJECT:
+                await _handle_first_msg_violation(chat, event, sender, f"本地模型识别为违规引流（评分 {score}）")
+            return
+
+    # 4. 提交 LLM 进行意图审查
     try:
-        eval_results = await check_spams_with_llm([sender], message=text)
+        eval_results = await check_spams_with_llm([sender], message=text, priority=PRIORITY_MODERATION)
         if eval_results:
             user_eval = next((item for item in eval_results if item.id == user_id), None)
             if user_eval:
                 logger.info(f"[首句审查] 群组:{chat.id} 成员:{user_id}({full_name}) | LLM评分:{user_eval.score}/100 | 违规:{user_eval.is_spam} | 原因:{user_eval.reason}")
+                await first_msg_classifier.record_verdict(
+                    chat.id, user_id, text, user_eval.is_spam, first_msg_classifier.SOURCE_LLM, user_eval.score
+                )
                 if user_eval.is_spam:
                     await _handle_first_msg_violation(chat, event, sender, f"AI识别为违规引流「{user_eval.reason}」")
                     return
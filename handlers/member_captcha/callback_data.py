@@ -0,0 +1,86 @@
+"""
+验证码按钮 callback data 签名
+Stateless signed captcha callback data
+
+按钮数据自带成员 id、签发时间、选项与随机数，并用 HMAC 签名，回调时本地校验即可，
+不再需要 Redis 中的 hash→payload 映射。
+
+格式（ASCII，37 字节，低于 Telegram 64 字节上限）:
+    "c" + base64url( member_id:int64 | issued_at:uint32 | option:1B | nonce:uint32 | mac:10B )
+
+mac = HMAC-SHA256(key, chat_id:int64 | payload)[:10]，key 由 bot token 派生；
+绑定 chat_id，同一按钮无法在其他群重放。
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+import time
+from typing import Optional
+
+from manager import manager
+from .config import DELETED_AFTER
+
+CALLBACK_PREFIX = b"c"
+CALLBACK_MAC_SIZE = 10
+# 与原 callback_map 的 Redis TTL 一致：消息删除后再留 15 秒
+CALLBACK_TTL = DELETED_AFTER + 15
+
+_PAYLOAD = struct.Struct(">qIcI")
+_CHAT = struct.Struct(">q")
+_ENCODED_SIZE = len(CALLBACK_PREFIX) + len(base64.urlsafe_b64encode(b"\0" * (_PAYLOAD.size + CALLBACK_MAC_SIZE)))
+
+
+def _key() -> bytes:
+    token = manager.config["telegram"].get("token", "") if manager.config.has_section("telegram") else ""
+    return hashlib.sha256(b"captcha-callback:" + token.encode("utf-8")).digest()
+
+
+def _mac(chat_id: int, payload: bytes) -> bytes:
+    return hmac.new(_key(), _CHAT.pack(chat_id) + payload, hashlib.sha256).digest()[:CALLBACK_MAC_SIZE]
+
+
+def new_nonce() -> int:
+    """每条验证消息一个随机数，同一消息的按钮共享。"""
+    return secrets.randbits(32)
+
+
+def make_token(issued_at: int, nonce: int) -> str:
+    """验证码实例标识（签发时间 + 随机数），会话中保存以拒绝旧消息上的点击。"""
+    return f"{issued_at}-{nonce:08x}"
+
+
+def sign_callback_data(chat_id: int, member_id: int, option: str, nonce: int, issued_at: Optional[int] = None) -> bytes:
+    """option 为单字符：选项下标 0-9 或管理员操作 O / X。"""
+    if issued_at is None:
+        issued_at = int(time.time())
+    payload = _PAYLOAD.pack(member_id, issued_at, option.encode("ascii"), nonce)
+    return CALLBACK_PREFIX + base64.urlsafe_b64encode(payload + _mac(chat_id, payload))
+
+
+def verify_callback_data(chat_id: int, data: bytes, now: Optional[float] = None) -> Optional[str]:
+    """
+    校验按钮数据，成功返回 "{member_id}__{token}__{option}"（与旧格式同为三段），
+    token 见 make_token。
+
+    格式错误、签名不符或已过期返回 None。
+    """
+    if isinstance(data, str):
+        data = data.encode("ascii", errors="replace")
+    if len(data) != _ENCODED_SIZE or not data.startswith(CALLBACK_PREFIX):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(data[len(CALLBACK_PREFIX):])
+    except ValueError:
+        return None
+
+    payload, mac = raw[: _PAYLOAD.size], raw[_PAYLOAD.size :]
+    if not hmac.compare_digest(mac, _mac(chat_id, payload)):
+        return None
+
+    member_id, issued_at, option, nonce = _PAYLOAD.unpack(payload)
+    if (now if now is not None else time.time()) - issued_at > CALLBACK_TTL:
+        return None
+    return f"{member_id}__{make_token(issued_at, nonce)}__{option.decode('ascii', errors='replace')}"
@@ -15,11 +15,11 @@ from .exceptions import LogContext
 from .helpers import (
     accepted_member,
     build_captcha_message,
+    build_image_captcha_message,
     cancel_pending_member_jobs,
-    get_callback_map,
-    store_callback_map,
-    delete_callback_map,
 )
+from .image_captcha import get_image_pool
+from .callback_data import verify_callback_data
 from .stats import stats_incr, FIELD_SUCCESS, FIELD_FAILED, FIELD_VERIFICATIONS
 
 
@@ -96,7 +96,6 @@ async def handle_admin_operation(chat: Any, msg: Any, data: str, log_prefix: str
 
         if op == CallbackOperation.ACCEPT:
             await manager.delete_message(chat, msg)
-            await delete_callback_map(chat.id, msg.id)
             # 先取消超时任务（保留 session 以便 accepted_member 记 cost）
             await cancel_pending_member_jobs(
                 chat.id, member_id, delete_captcha_session=False
@@ -110,7 +109,6 @@ async def handle_admin_operation(chat: Any, msg: Any, data: str, log_prefix: str
 
         elif op == CallbackOperation.REJECT:
             await manager.delete_message(chat, msg)
-            await delete_callback_map(chat.id, msg.id)
             # 必须取消 new_member_check / unban：否则超时会把 30 天封禁改成 60s 并自动解封
             await cancel_pending_member_jobs(chat.id, member_id)
             await manager.hide_member(chat, member_id, timedelta(days=DEFAULT_BAN_DAYS))
@@ -130,7 +128,13 @@ async def handle_admin_operation(chat: Any, msg: Any, data: str, log_prefix: str
 async def handle_self_verification(
     chat: Any, msg: Any, data: str, operator: Any, log_prefix: str, event: Optional[events.CallbackQuery.Event] = None
 ) -> bool:
-    """处理用户自验证。从 Redis 读取正确答案进行比较。"""
+    """
+    处理用户自验证。
+
+    答案比较、重试计数、标记读取以及答错后的新答案写入与超时顺延，
+    由 CaptchaSession.verify_answer 在一次 Redis 调用中原子完成；
+    因此答错时的新验证码需要先生成好再一并提交。
+    """
     try:
         rdb = await manager.get_redis()
         parts = data.split("__")
@@ -138,22 +142,44 @@ async def handle_self_verification(
             logger.warning(f"{log_prefix} | invalid self-verify data | data={data}")
             return False
 
-        chosen_key = parts[2]
+        _, token, chosen_key = parts
 
-        from .session import CaptchaSession
-        session_data = await CaptchaSession.get(chat.id, operator.id)
-        if not session_data:
+        from .session import CaptchaSession, VERIFY_MISSING, VERIFY_STALE, VERIFY_PASS, VERIFY_RETRY, VERIFY_KICK
+        now = datetime.now(timezone.utc)
+        # 图片验证码消息答错后仍换一道图片题；池为空时不等待渲染，降级为图标题。
+        # 先只查看队首的题，确认答错需要换题后再取走，答对或重复点击不消耗题目
+        challenge = get_image_pool().peek() if getattr(msg, "photo", None) else None
+        if challenge is not None:
+            content, buttons, answer_meta = await build_image_captcha_message(operator, now, chat.id, challenge)
+        else:
+            content, buttons, answer_meta = await build_captcha_message(operator, now, chat.id)
+        result = await CaptchaSession.verify_answer(
+            chat.id,
+            operator.id,
+            msg.id,
+            chosen_key,
+            token,
+            CAPTCHA_MAX_RETRY,
+            answer_meta,
+            now + timedelta(seconds=DELETED_AFTER),
+        )
+
+        if challenge is not None and result.status == VERIFY_RETRY:
+            get_image_pool().claim(challenge)
+
+        if result.status == VERIFY_MISSING:
             logger.warning(f"{log_prefix} | session not found during self-verification")
             return False
 
-        correct_answer = session_data.get("last_answer", "")
+        if result.status == VERIFY_STALE:
+            logger.debug(f"{log_prefix} | duplicate or stale click ignored | chosen={chosen_key}")
+            return True
 
-        if chosen_key == correct_answer:
+        if result.status == VERIFY_PASS:
             await manager.delete_message(chat, msg)
-            await delete_callback_map(chat.id, msg.id)
 
             # 检查是否有安全检查标记
-            flagged_reason = await CaptchaSession.is_flagged(chat.id, operator.id)
+            flagged_reason = result.flagged_reason
 
             if flagged_reason == "advertising":
                 # 30 天封禁：取消超时踢人 + 任何已有 unban，不可自动解封
@@ -206,12 +232,11 @@ async def handle_self_verification(
 
         else:
 
-            # 递增重试次数，超过上限直接 Kick
-            retry_count = await CaptchaSession.record_retry(chat.id, operator.id)
-            if retry_count >= CAPTCHA_MAX_RETRY:
+            # 重试次数超过上限直接 Kick
+            retry_count = result.retry_count
+            if result.status == VERIFY_KICK:
                 now_utc = datetime.now(timezone.utc)
                 await manager.delete_message(chat, msg)
-                await delete_callback_map(chat.id, msg.id)
                 await cancel_pending_member_jobs(chat.id, operator.id)
                 if not await manager.kick_member(chat, operator.id):
                     await manager.hide_member(chat, operator.id, timedelta(seconds=60))
@@ -238,34 +263,21 @@ async def handle_self_verification(
                 )
                 return True
 
-            now = datetime.now(timezone.utc)
-            content, buttons, answer_meta = await build_captcha_message(operator, now)
-            await manager.edit_text(chat.id, msg.id, content, parse_mode="md", buttons=buttons)
-
-            await CaptchaSession.record_answer(
-                chat.id, operator.id,
-                icon=answer_meta["icon"],
-                answer=answer_meta["answer"],
-                options=answer_meta["options"],
-            )
-
-            # 更新 callback_map（消息内容变了，hash 也变了）
-            await store_callback_map(chat.id, msg.id, answer_meta["callback_map"],
-                                     ttl=DELETED_AFTER + 15)
-
-            # 取消旧的超时踢人并重新计时
-            await manager.lazy_session_delete(chat.id, operator.id, "new_member_check")
-            await manager.lazy_session(
-                chat.id, msg.id, operator.id, "new_member_check",
-                now + timedelta(seconds=DELETED_AFTER),
-            )
-            # 推迟消息自动删除时间
-            await manager.delete_message(
-                chat, msg,
-                now + timedelta(seconds=DELETED_AFTER),
+            # 新答案、超时踢人与消息删除时间已由 verify_answer 顺延，这里只更新消息
+            if challenge is not None:
+                await manager.edit_text(
+                    chat.id, msg.id, content, parse_mode="md", buttons=buttons, file=challenge.as_file()
+                )
+            elif getattr(msg, "photo", None):
+                # 图片题降级为图标题：编辑无法去掉旧图片，改为重新发送文字消息
+                await _resend_as_text(chat, msg, operator.id, content, buttons, now, log_prefix)
+            else:
+                await manager.edit_text(chat.id, msg.id, content, parse_mode="md", buttons=buttons)
+
+            logger.info(
+                f"{log_prefix} | verification failed | regenerated captcha | "
+                f"chosen={chosen_key} retry={retry_count}"
             )
-
-            logger.info(f"{log_prefix} | verification failed | regenerated captcha | chosen={chosen_key} correct={correct_answer}")
             await stats_incr(rdb, FIELD_VERIFICATIONS, chat.id, operator.id)
             return True
 
@@ -274,6 +286,22 @@ async def handle_self_verification(
         return False
 
 
+async def _resend_as_text(
+    chat: Any, msg: Any, member_id: int, content: str, buttons: Any, now: datetime, log_prefix: str
+) -> None:
+    """删除旧的图片验证消息并发送文字验证码，超时踢人与自动删除任务改挂到新消息上。"""
+    await manager.delete_message(chat, msg)
+    new_msg_id = await manager.send_text(chat.id, content, buttons=buttons, parse_mode="md")
+    if new_msg_id is None:
+        logger.error(f"{log_prefix} | failed to resend captcha as text")
+        return
+
+    deadline = now + timedelta(seconds=DELETED_AFTER)
+    await manager.lazy_session_delete(chat.id, member_id, "new_member_check")
+    await manager.lazy_session(chat.id, new_msg_id, member_id, "new_member_check", deadline)
+    await manager.delete_message(chat.id, new_msg_id, deadline)
+
+
 async def process_callback_query(event: events.CallbackQuery.Event) -> None:
     """处理回调查询的主要逻辑。"""
     validation_error = await validate_callback_conditions(event)
@@ -292,14 +320,13 @@ async def process_callback_query(event: events.CallbackQuery.Event) -> None:
     log_context = LogContext(chat, operator.id, getattr(operator, "username", None), _user_full_name(operator), "[回调]")
     log_prefix = f"{log_context.log_prefix} 消息:{msg.id}"
 
-    # 将 MD5 哈希解码为原始 callback data
+    # 校验签名并解码为原始 callback data（无需读取 Redis）
     raw_data = data
-    cb_map = await get_callback_map(chat.id, msg.id)
-    if cb_map and data in cb_map:
-        data = cb_map[data]
-        logger.debug(f"{log_prefix} | callback data decoded | hash={raw_data} -> data={data}")
+    data = verify_callback_data(chat.id, raw_data)
+    if data:
+        logger.debug(f"{log_prefix} | callback data verified | raw={raw_data} -> data={data}")
     else:
-        logger.warning(f"{log_prefix} | callback_map miss | hash={raw_data}")
+        logger.warning(f"{log_prefix} | callback data invalid or expired | raw={raw_data}")
         # 验证已过期，提示用户
         try:
             await event.answer("验证已过期，请重新入群获取新的验证。")
@@ -25,6 +25,9 @@ MEMBER_CHECK_WAIT_TIME = 3  # 等待其他机器人检查的时间
 LLM_CHECK_TIMEOUT = 20  # LLM检查总超时时间
 LLM_MODEL_TIMEOUT = 9  # 单个模型超时时间；为 fallback 留出总预算
 LLM_MAX_TOKENS = 1000  # 垃圾检测输出上限，保留足够空间输出错误原因
+LLM_HEDGE_DELAY = 3.0  # 对冲请求：样本不足时，主模型未返回多久后启动备用模型
+LLM_HEDGE_MIN_DELAY = 0.5  # 对冲延迟下限（按主模型近期 p90 延迟自适应）
+LLM_HEDGE_MAX_INFLIGHT = 2  # 同时进行的模型请求上限
 EVENT_EXPIRY_SECONDS = 60  # 事件过期时间
 
 # 封禁配置
@@ -51,6 +54,7 @@ class VerificationMode:
     SLEEP_1WEEK = "sleep_1week"  # 静默1周
     SLEEP_2WEEKS = "sleep_2weeks"  # 静默2周
     BAN = "ban"  # 验证码验证（默认）
+    IMAGE = "image"  # 图片验证码
 
 # 回调操作类型
 class CallbackOperation:
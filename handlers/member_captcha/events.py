@@ -8,6 +8,14 @@ from .stats import stats_incr, FIELD_FAILED
 logger = manager.logger
 
 
+async def _get_permissions(client, chat, chat_id: int, member_id: int):
+    """优先读取本地成员状态（bot 自身操作与参与者更新），未命中再请求 API。"""
+    perms = manager.get_participant_states().permissions(chat_id, member_id)
+    if perms is None:
+        perms = await client.get_permissions(chat, member_id)
+    return perms
+
+
 async def _kick_member(client, chat_id: int, member_id: int, reason: str) -> bool:
     """
     获取群组和成员实体，检查权限，然后踢出成员。
@@ -25,13 +33,13 @@ async def _kick_member(client, chat_id: int, member_id: int, reason: str) -> boo
     不得再次 edit_permissions，否则会把永久/30 天 ban 覆盖成 60s。
     """
     try:
-        chat = await resolve_chat_entity(client, chat_id)
+        chat = await resolve_chat_entity(client, chat_id, manager.get_chat_peers())
     except Exception as e:
         logger.warning(f"chat {chat_id} get failed: {e}")
         return False
 
     try:
-        perms = await client.get_permissions(chat, member_id)
+        perms = await _get_permissions(client, chat, chat_id, member_id)
     except ValueError as e:
         logger.info(f"chat {chat_id} member {member_id} entity not cached in session, skip kick")
         return False
@@ -146,7 +154,7 @@ async def new_member_check(client, chat_id: int, message_id: int, member_id: int
 @manager.register_event("unban_member")
 async def unban_member(client, chat_id: int, message_id: int, member_id: int):
     try:
-        chat = await resolve_chat_entity(client, chat_id)
+        chat = await resolve_chat_entity(client, chat_id, manager.get_chat_peers())
     except Exception as e:
         logger.warning(f"bot get chat {chat_id} failed: {e}")
         return
@@ -157,7 +165,7 @@ async def unban_member(client, chat_id: int, message_id: int, member_id: int):
     try:
         from telethon.errors import UserNotParticipantError
         try:
-            perms = await client.get_permissions(chat, member_id)
+            perms = await _get_permissions(client, chat, chat_id, member_id)
             if perms and (perms.is_admin or perms.is_creator or getattr(perms, "has_left", False)):
                 return
             if perms and (getattr(perms, "is_banned", False) or getattr(perms, "view_messages", True) is False):
@@ -213,12 +221,9 @@ async def first_msg_timeout(client, chat_id: int, message_id: int, member_id: in
     """5分钟内未发言，触发防僵尸潜水踢出。"""
     rdb = await manager.get_redis()
     if rdb:
-        watch_key = f"first_msg_watch:{chat_id}:{member_id}"
-        is_watching = await rdb.get(watch_key)
-        if not is_watching:
+        if not await manager.get_first_msg_watch().pop(chat_id, member_id):
             logger.debug(f"chat {chat_id} member {member_id} already spoke or watch ended, skip first_msg_timeout")
             return
-        await rdb.delete(watch_key)
 
         from manager.group import settings_get
         lurk_check = await settings_get(rdb, chat_id, "lurk_check_5min", "off")
@@ -227,8 +232,8 @@ async def first_msg_timeout(client, chat_id: int, message_id: int, member_id: in
             return
 
     try:
-        chat = await resolve_chat_entity(client, chat_id)
-        perms = await client.get_permissions(chat, member_id)
+        chat = await resolve_chat_entity(client, chat_id, manager.get_chat_peers())
+        perms = await _get_permissions(client, chat, chat_id, member_id)
         if perms and (perms.is_admin or perms.is_creator or getattr(perms, "has_left", False)):
             return
     except Exception as e:
@@ -1,12 +1,12 @@
 import random
-import json
-import hashlib
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Tuple, List, Any, Dict
+from typing import Tuple, List, Any, Dict
 
 from manager import manager
-from .config import DELETED_AFTER
+from .config import DELETED_AFTER, CallbackOperation
+from .callback_data import make_token, new_nonce, sign_callback_data
 from .security import restore_member_permissions
+from .session import pack_options
 
 
 def _user_full_name(user: Any) -> str:
@@ -87,53 +87,62 @@ ICONS = {
 }
 
 
+IMAGE_WELCOME_TEXT = (
+    "**🛡️ 新成员入群验证 | Member Verification**\n\n"
+    "欢迎 [%(title)s](tg://user?id=%(user_id)d) ，请点击下方与【**图片中字符**】一致的按钮完成验证。\n\n"
+    "> ⏱️ **30秒** 内未完成验证或多次选错将被移出群组。\n\n"
+    "Welcome [%(title)s](tg://user?id=%(user_id)d).\n"
+    "> Please click the button matching **the characters in the image** to verify and start chatting."
+)
+
+
 logger = manager.logger
 
 
+def _member_identity(member: Any) -> Tuple[int, str]:
+    """member 需有 .user (id, first_name, last_name) 或自身为 User。"""
+    if getattr(member, "user", None):
+        return member.user.id, _user_full_name(member.user)
+    if hasattr(member, "id"):
+        return member.id, _user_full_name(member)
+    raise ValueError(f"Unknown member type {type(member)}")
+
+
 async def build_captcha_message(
     member: Any,
     msg_timestamp: datetime,
+    chat_id: int,
 ) -> Tuple[str, List[List[Any]], Dict[str, str]]:
     """
     构建新用户验证信息的文字与内联按钮（二维列表，按钮由 manager.inline_button 构建）。
     member 需有 .user (id, first_name, last_name) 或自身为 User。
+    按钮数据为带签名的无状态数据（见 callback_data），msg_timestamp 作为签发时间。
 
     返回:
       (message_content, buttons, answer_meta)
-        answer_meta = {"icon": emoji, "answer": key, "options": json_string}
+        answer_meta = {"icon": emoji, "answer": key, "options": 按钮上的 emoji 以逗号连接, "token": 验证码实例标识}
     """
-    if getattr(member, "user", None):
-        member_id = member.user.id
-        member_name = _user_full_name(member.user)
-    elif hasattr(member, "id"):
-        member_id = member.id
-        member_name = _user_full_name(member)
-    else:
-        raise ValueError(f"Unknown member type {type(member)}")
-
-    ts_str = str(msg_timestamp)
+    member_id, member_name = _member_identity(member)
+
+    issued_at = int(msg_timestamp.timestamp())
+    nonce = new_nonce()
     items = random.sample(list(ICONS.items()), k=5)
     random.shuffle(items)
     correct_idx = random.randint(0, len(items) - 1)
     button_user_ok_key, button_user_ok_emoji = items[correct_idx]
 
-    # Use a hash map to avoid exceeding Telethon's 64-byte callback data limit
-    callback_map: Dict[str, str] = {}
-
-    def _short_callback(data_str: str) -> bytes:
-        h = hashlib.md5(data_str.encode("utf-8")).hexdigest()
-        callback_map[h] = data_str
-        return h.encode("utf-8")
+    def _callback(option: str) -> bytes:
+        return sign_callback_data(chat_id, member_id, option, nonce, issued_at)
 
     # 按钮 value 使用纯索引（0, 1, 2, 3, 4），彻底脱敏真实内容
     row_user = [
-        manager.inline_button(emoji, _short_callback("__".join([str(member_id), ts_str, str(idx)])))
+        manager.inline_button(emoji, _callback(str(idx)))
         for idx, (key, emoji) in enumerate(items)
     ]
 
     row_admin = [
-        manager.inline_button("✔", _short_callback("__".join([str(member_id), ts_str, "O"]))),
-        manager.inline_button("❌", _short_callback("__".join([str(member_id), ts_str, "X"]))),
+        manager.inline_button("✔", _callback(CallbackOperation.ACCEPT)),
+        manager.inline_button("❌", _callback(CallbackOperation.REJECT)),
     ]
 
     zh_desc, en_desc = _get_icon_descriptions(button_user_ok_key)
@@ -146,50 +155,56 @@ async def build_captcha_message(
     buttons = [row_user, row_admin]
 
     # 构建答案元数据
-    all_options = [{"index": idx, "key": k, "emoji": v} for idx, (k, v) in enumerate(items)]
     answer_meta = {
         "icon": button_user_ok_emoji,
         "answer": str(correct_idx),
         "answer_key": button_user_ok_key,
-        "options": json.dumps(all_options, ensure_ascii=False),
-        "callback_map": callback_map,
+        "options": pack_options(v for _, v in items),
+        "token": make_token(issued_at, nonce),
     }
 
     return content, buttons, answer_meta
 
 
-async def store_callback_map(chat_id: int, msg_id: int, callback_map: Dict[str, str], ttl: int = 60) -> None:
-    """将 callback_map (hash→原始数据) 存入 Redis，供回调时解码 MD5 哈希。"""
-    rdb = await manager.get_redis()
-    if not rdb:
-        return
-    key = f"captcha_cb_map:{chat_id}:{msg_id}"
-    await rdb.set(key, json.dumps(callback_map, ensure_ascii=False), ex=ttl)
+async def build_image_captcha_message(
+    member: Any,
+    msg_timestamp: datetime,
+    chat_id: int,
+    challenge: Any,
+) -> Tuple[str, List[List[Any]], Dict[str, str]]:
+    """
+    构建图片验证码的说明文字与按钮，challenge 为 image_captcha.ImageChallenge。
+
+    按钮为正确字符串与干扰项的乱序排列，签名与答案格式同 build_captcha_message，
+    校验流程（CaptchaSession.verify_answer）无需区分两种验证码。
+    """
+    member_id, member_name = _member_identity(member)
 
+    issued_at = int(msg_timestamp.timestamp())
+    nonce = new_nonce()
+    options = [challenge.code, *challenge.decoys]
+    random.shuffle(options)
+    correct_idx = options.index(challenge.code)
 
-async def get_callback_map(chat_id: int, msg_id: int) -> Optional[Dict[str, str]]:
-    """从 Redis 读取 callback_map。"""
-    rdb = await manager.get_redis()
-    if not rdb:
-        return None
-    key = f"captcha_cb_map:{chat_id}:{msg_id}"
-    raw = await rdb.get(key)
-    if raw:
-        try:
-            return json.loads(raw if isinstance(raw, str) else raw.decode("utf-8"))
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse callback_map: {e}")
-            return None
-    return None
-
-
-async def delete_callback_map(chat_id: int, msg_id: int) -> None:
-    """删除 callback_map。"""
-    rdb = await manager.get_redis()
-    if not rdb:
-        return
-    key = f"captcha_cb_map:{chat_id}:{msg_id}"
-    await rdb.delete(key)
+    def _callback(option: str) -> bytes:
+        return sign_callback_data(chat_id, member_id, option, nonce, issued_at)
+
+    row_user = [manager.inline_button(code, _callback(str(idx))) for idx, code in enumerate(options)]
+    row_admin = [
+        manager.inline_button("✔", _callback(CallbackOperation.ACCEPT)),
+        manager.inline_button("❌", _callback(CallbackOperation.REJECT)),
+    ]
+
+    content = IMAGE_WELCOME_TEXT % {"title": member_name, "user_id": member_id}
+    answer_meta = {
+        "icon": challenge.code,
+        "answer": str(correct_idx),
+        "answer_key": challenge.code,
+        "options": pack_options(options),
+        "token": make_token(issued_at, nonce),
+    }
+
+    return content, [row_user, row_admin], answer_meta
 
 
 # 与成员验证相关的 lazy session 类型
@@ -238,13 +253,12 @@ async def accepted_member(chat: Any, msg: Any, user: Any):
     msg_date = getattr(msg, "date", None) or datetime.now(timezone.utc)
     captcha_data = await CaptchaSession.get(chat_id, user.id)
     if captcha_data:
-        first_join = captcha_data.get("first_join_ts", "")
-        if first_join:
+        first_join_dt = CaptchaSession.parse_ts(captcha_data.get("first_join_ts"))
+        if first_join_dt:
             try:
-                first_join_dt = datetime.fromisoformat(first_join)
                 cost = (msg_date - first_join_dt).total_seconds()
                 await CaptchaSession.record_cost(chat_id, user.id, cost)
-            except (ValueError, TypeError):
+            except TypeError:
                 pass
 
     title = manager.username(user)
@@ -270,14 +284,12 @@ async def accepted_member(chat: Any, msg: Any, user: Any):
             "\n\n> 📌 **新手发言指引**：请在 **5 分钟内** 在群里发送任意一条消息打招呼完成破冰（防僵尸号挂机机制）。\n"
             "> Please send a message in this group within **5 minutes** to complete verification."
         )
-        if rdb:
-            await rdb.set(f"first_msg_watch:{chat_id}:{user_id}", "1", ex=1800)
+        await manager.get_first_msg_watch().add(chat_id, user_id)
         await manager.lazy_session(
             chat_id, 0, user_id, "first_msg_timeout", now + timedelta(minutes=5)
         )
     elif first_msg_check == "on":
-        if rdb:
-            await rdb.set(f"first_msg_watch:{chat_id}:{user_id}", "1", ex=1800)
+        await manager.get_first_msg_watch().add(chat_id, user_id)
 
     has_photo = await manager.has_profile_photo(user)
     try:
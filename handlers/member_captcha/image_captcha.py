@@ -0,0 +1,216 @@
+"""
+图片验证码
+Pre-rendered image captcha
+
+图片中是一串扭曲的字符，按钮给出 5 个候选串，选中与图片一致者即通过；
+答案只存在于像素中，读取消息文本或按钮的机器人无法作答。
+
+渲染在 ProcessPoolExecutor 中进行（utils.captcha_render，纯 Python 生成灰度 PNG，无需 Pillow），
+ImageCaptchaPool 在后台保持一批预渲染的题目，发题时只是一次 O(1) 出队，
+事件循环上没有 CPU 开销；总字节数受 max_bytes 限制。
+"""
+
+import asyncio
+import io
+import secrets
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+from manager import manager
+from utils.captcha_render import render_challenge
+
+IMAGE_POOL_SIZE = 32  # 预渲染题目数量
+IMAGE_POOL_MAX_BYTES = 1024 * 1024  # 预渲染题目总字节上限
+IMAGE_POOL_WORKERS = 2
+IMAGE_RENDER_TIMEOUT = 5  # 池为空时现场渲染的超时(秒)
+
+
+@dataclass(slots=True)
+class ImageChallenge:
+    """一道预渲染的图片题：PNG 数据、正确字符串与干扰项。"""
+
+    png: bytes
+    code: str
+    decoys: Tuple[str, ...]
+
+    def as_file(self) -> io.BytesIO:
+        """带文件名的 BytesIO，Telethon 据此按图片而非文件发送。"""
+        f = io.BytesIO(self.png)
+        f.name = "captcha.png"
+        return f
+
+
+# ------------------------------------------------------------------
+# 预渲染池
+# ------------------------------------------------------------------
+
+
+class ImageCaptchaPool:
+    """
+    预渲染题目池。
+
+    take() 出队一道题并触发后台补充；池为空时 get() 在执行器中现场渲染。
+    executor 默认为按需创建的 ProcessPoolExecutor，测试可注入线程池。
+    """
+
+    def __init__(
+        self,
+        *,
+        size: int = IMAGE_POOL_SIZE,
+        max_bytes: int = IMAGE_POOL_MAX_BYTES,
+        workers: int = IMAGE_POOL_WORKERS,
+        executor: Optional[Executor] = None,
+        render: Callable[[int], Tuple[bytes, str, Tuple[str, ...]]] = render_challenge,
+    ):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self._executor = executor
+        self._render = render
+        self._ready: Deque[ImageChallenge] = deque()
+        self._bytes = 0
+        self._refill_task: Optional[asyncio.Task] = None
+        self.served = 0
+        self.misses = 0
+        self.rendered = 0
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _render_one(self) -> ImageChallenge:
+        loop = asyncio.get_running_loop()
+        png, code, decoys = await loop.run_in_executor(self._get_executor(), self._render, secrets.randbits(64))
+        self.rendered += 1
+        return ImageChallenge(png, code, tuple(decoys))
+
+    def _full(self) -> bool:
+        return len(self._ready) >= self.size or self._bytes >= self.max_bytes
+
+    def _push(self, challenge: ImageChallenge) -> None:
+        self._ready.append(challenge)
+        self._bytes += len(challenge.png)
+
+    async def _refill(self) -> None:
+        while not self._full():
+            batch = min(self.workers, self.size - len(self._ready))
+            try:
+                results = await asyncio.gather(*(self._render_one() for _ in range(batch)))
+            except Exception as e:
+                logger.warning(f"image captcha refill failed: {e}")
+                return
+            for challenge in results:
+                if self._full():
+                    break
+                self._push(challenge)
+        logger.debug(f"image captcha pool refilled: {len(self._ready)} ready, {self._bytes} bytes")
+
+    def warm(self) -> None:
+        """后台补满题目池（已在补充时不重复启动）。"""
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+
+    def take(self) -> Optional[ImageChallenge]:
+        """O(1) 取一道预渲染的题；池为空返回 None。"""
+        if not self._ready:
+            self.warm()
+            return None
+        challenge = self._ready.popleft()
+        self._bytes -= len(challenge.png)
+        self.served += 1
+        self.warm()
+        return challenge
+
+    def peek(self) -> Optional[ImageChallenge]:
+        """查看队首的题但不取出；池为空返回 None。确定要换题时再用 claim 取走。"""
+        if not self._ready:
+            self.warm()
+            return None
+        return self._ready[0]
+
+    def claim(self, challenge: ImageChallenge) -> None:
+        """取走 peek 得到的题（并发时可能已被取走，只计数）。"""
+        try:
+            self._ready.remove(challenge)
+        except ValueError:
+            pass
+        else:
+            self._bytes -= len(challenge.png)
+        self.served += 1
+        self.warm()
+
+    async def get(self, timeout: float = IMAGE_RENDER_TIMEOUT) -> Optional[ImageChallenge]:
+        """取一道题；池为空时现场渲染，超时或失败返回 None。"""
+        challenge = self.take()
+        if challenge is not None:
+            return challenge
+        self.misses += 1
+        try:
+            challenge = await asyncio.wait_for(self._render_one(), timeout)
+        except Exception as e:
+            logger.warning(f"image captcha render on demand failed: {e}")
+            return None
+        self.served += 1
+        return challenge
+
+    def close(self) -> None:
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+        self._refill_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._ready.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": len(self._ready),
+            "bytes": self._bytes,
+            "served": self.served,
+            "misses": self.misses,
+            "rendered": self.rendered,
+        }
+
+
+_pool: Optional[ImageCaptchaPool] = None
+
+
+def get_image_pool() -> ImageCaptchaPool:
+    """
+    全局题目池，首次使用时按配置创建：
+
+    [captcha]
+    image_pool_size = 32
+    image_pool_max_kb = 1024
+    image_workers = 2
+    """
+    global _pool
+    if _pool is None:
+        cfg = manager.config["captcha"] if manager.config.has_section("captcha") else None
+
+        def _opt(name: str, default: int) -> int:
+            return cfg.getint(name, default) if cfg is not None else default
+
+        _pool = ImageCaptchaPool(
+            size=_opt("image_pool_size", IMAGE_POOL_SIZE),
+            max_bytes=_opt("image_pool_max_kb", IMAGE_POOL_MAX_BYTES // 1024) * 1024,
+            workers=_opt("image_workers", IMAGE_POOL_WORKERS),
+        )
+    return _pool
+
+
+def close_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
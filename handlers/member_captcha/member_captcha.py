@@ -10,6 +10,7 @@ from telethon import events, types
 from loguru import logger
 
 from manager import manager
+from manager.filters import PEER_GROUP
 from .config import DEFAULT_BAN_DAYS, VerificationMode, DELETED_AFTER, MEMBER_CHECK_WAIT_TIME
 from .exceptions import LogContext
 from .session import CaptchaSession
@@ -20,8 +21,10 @@ from .validators import (
     create_verification_session,
 )
 from .security import restrict_member_permissions, get_member_info_for_check, perform_security_checks
-from .helpers import build_captcha_message, cancel_pending_member_jobs, store_callback_map
+from .helpers import build_captcha_message, build_image_captcha_message, cancel_pending_member_jobs
+from .image_captcha import get_image_pool
 from .callbacks import process_callback_query
+from .callback_data import CALLBACK_PREFIX
 from .stats import stats_incr, record_group, FIELD_FAILED, FIELD_GROUP_JOINS, FIELD_VERIFICATIONS
 
 
@@ -148,8 +151,11 @@ async def member_captcha(event: events.ChatAction.Event):
         # handle_silence_mode 失败，降级到验证码流程
         logger.warning(f"{log_context.log_prefix} | 静默模式处理失败，降级到验证码")
 
-    # BAN 模式（默认）— 验证码验证流程
-    if new_member_check_method != VerificationMode.BAN:
+    # BAN 模式（默认）/ IMAGE 模式 — 验证码验证流程
+    if new_member_check_method == VerificationMode.IMAGE:
+        # 等待与安全检查期间后台补充题目池
+        get_image_pool().warm()
+    elif new_member_check_method != VerificationMode.BAN:
         logger.warning(f"{log_context.log_prefix} | 未知处理方式: {new_member_check_method}，使用默认验证码流程")
 
     # 收紧新成员权限，禁止发送消息
@@ -166,11 +172,14 @@ async def member_captcha(event: events.ChatAction.Event):
         now + timedelta(seconds=180),
     )
 
-    # 创建验证会话（传入 event 以兼容 Session.get 的 event.date）
+    # 本次入群的内存记录（安全检查中填充 username / bio）
     session = await create_verification_session(chat, user, now, log_context)
     if not session:
         return
 
+    # 等待期间预热 bio / 头像缓存，安全检查与欢迎消息直接命中
+    prefetch = asyncio.create_task(manager.prefetch_user_profiles([user]))
+
     await asyncio.sleep(MEMBER_CHECK_WAIT_TIME)
 
     user_permissions = await manager.chat_member_permissions(chat, user.id)
@@ -182,6 +191,7 @@ async def member_captcha(event: events.ChatAction.Event):
         return
 
     # 收集需要检查的文本
+    await prefetch
     check_list = await get_member_info_for_check(user, session)
 
     # 执行安全检查；广告命中直接长期封禁，其他结果保留验证码流程。
@@ -246,8 +256,16 @@ async def member_captcha(event: events.ChatAction.Event):
             )
             return
 
-    # 生成验证码消息（返回文字 + 按钮 + 答案元数据）
-    message_content, buttons, answer_meta = await build_captcha_message(user, now)
+    # 生成验证码消息（返回文字 + 按钮 + 答案元数据）；图片题取不到时降级为图标验证码
+    challenge = None
+    if new_member_check_method == VerificationMode.IMAGE:
+        challenge = await get_image_pool().get()
+        if challenge is None:
+            logger.warning(f"{log_context.log_prefix} | 图片验证码不可用，降级到图标验证码")
+    if challenge is not None:
+        message_content, buttons, answer_meta = await build_image_captcha_message(user, now, chat.id, challenge)
+    else:
+        message_content, buttons, answer_meta = await build_captcha_message(user, now, chat.id)
 
     # ★ 记录验证码答案到 CaptchaSession
     await CaptchaSession.record_answer(
@@ -256,15 +274,24 @@ async def member_captcha(event: events.ChatAction.Event):
         icon=answer_meta["icon"],
         answer=answer_meta["answer"],
         options=answer_meta["options"],
+        token=answer_meta["token"],
     )
 
     # 发送验证消息
-    captcha_msg_id = await manager.send_text(
-        chat.id,
-        message_content,
-        buttons=buttons,
-        parse_mode="md",
-    )
+    if challenge is not None:
+        captcha_msg_id = await manager.send_photo(
+            chat.id,
+            challenge.as_file(),
+            caption=message_content,
+            buttons=buttons,
+        )
+    else:
+        captcha_msg_id = await manager.send_text(
+            chat.id,
+            message_content,
+            buttons=buttons,
+            parse_mode="md",
+        )
     if captcha_msg_id is None:
         logger.error(f"{log_context.log_prefix} | 验证消息发送失败")
         return
@@ -276,9 +303,6 @@ async def member_captcha(event: events.ChatAction.Event):
     # 兜底已生效，取消兜底检查（下面开始调度正常 30s 超时踢人）
     await manager.lazy_session_delete(chat.id, user.id, "safety_timeout_check")
 
-    # 存储 callback_map 供回调时解码 MD5 哈希
-    await store_callback_map(chat.id, captcha_msg_id, answer_meta["callback_map"], ttl=DELETED_AFTER + 15)
-
     # 调度超时检查：DELETED_AFTER 秒后若用户未通过验证则 Kick
     await manager.lazy_session(
         chat.id,
@@ -320,7 +344,7 @@ def _event_dedup_uid(event: events.ChatAction.Event, now: datetime) -> str:
     return f"date:{event_date}"
 
 
-@manager.register("callback_query")
+@manager.register("callback_query", peer=(PEER_GROUP,), prefix=CALLBACK_PREFIX)
 async def new_member_callback(event: events.CallbackQuery.Event):
     """处理用户点击验证按钮后的逻辑"""
     await process_callback_query(event)
@@ -16,7 +16,7 @@ from ..utils.llm import check_spams_with_llm
 
 from .config import LLM_CHECK_TIMEOUT, DELETED_AFTER
 from .exceptions import LogContext, SecurityCheckError
-from .session import Session
+from .session import CaptchaRecord
 
 
 async def restrict_member_permissions(chat: Any, user: Union[int, types.User], until_date: Optional[timedelta] = None) -> bool:
@@ -31,7 +31,7 @@ async def restore_member_permissions(chat: Any, user: types.User) -> bool:
     return await manager.unmute_member(chat, user_id)
 
 
-async def get_member_info_for_check(user: types.User, session: Session) -> List[str]:
+async def get_member_info_for_check(user: types.User, session: CaptchaRecord) -> List[str]:
     """
     获取需要检查的成员信息（支持无 username 用户）。
     """
@@ -63,7 +63,7 @@ async def get_member_info_for_check(user: types.User, session: Session) -> List[
 
 
 async def perform_security_checks(
-    user: types.User, session: Session, check_list: List[str], log_context: LogContext, now: datetime
+    user: types.User, session: CaptchaRecord, check_list: List[str], log_context: LogContext, now: datetime
 ) -> Optional[str]:
     """
     执行安全检查（LLM检查和广告检查）
@@ -101,7 +101,7 @@ async def perform_security_checks(
 
 
 async def _perform_llm_check(
-    user: types.User, session: Session, check_list: List[str], log_context: LogContext, now: datetime
+    user: types.User, session: CaptchaRecord, check_list: List[str], log_context: LogContext, now: datetime
 ) -> bool:
     """执行LLM检查，返回 True 表示检测到 spam（应封禁）。"""
     try:
@@ -138,7 +138,7 @@ async def _perform_llm_check(
 
 
 async def _perform_advertising_check(
-    strings_to_check: List[str], session: Session, log_context: LogContext
+    strings_to_check: List[str], session: CaptchaRecord, log_context: LogContext
 ) -> bool:
     """执行广告检查，返回 True 表示检测到广告内容。"""
     for txt in strings_to_check:
@@ -152,7 +152,7 @@ async def _perform_advertising_check(
 
 
 async def _handle_advertising_violation(
-    matched_word: str, session: Session, log_context: LogContext
+    matched_word: str, session: CaptchaRecord, log_context: LogContext
 ) -> None:
     """处理广告违规：发送通知并记录日志（不执行封禁，由上层验证通过后统一处理）。"""
     try:
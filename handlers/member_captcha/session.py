@@ -2,14 +2,22 @@
 成员验证会话管理模块
 Member captcha session management module
 
+每个成员只保留一条 Redis Hash，TTL 即入群频率窗口；入群流程中的临时信息
+（用户名、bio、检测结果）只在内存中的 CaptchaRecord 上，不再单独落盘。
+
+各字段值都保持在 64 字节以内（选项只存按钮文字，见 pack_options），
+Redis 以 listpack 紧凑编码保存整个 Hash；不打包成单个字符串，是因为
+入群与答题脚本需要按字段原子更新（HINCRBY / HSET）。
+旧版 member_captcha:* JSON 记录带 7 天 TTL，不做迁移，自然过期。
+
 Redis Key: chat_captcha-{chat_id}-{user_id}  (Hash)
 Dedup Key: chat_captcha-dedup-{chat_id}-{user_id}-{event_uid}  (String, SETNX)
 """
 
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, Union
 
-from orjson import dumps, loads
 from loguru import logger
 
 from manager import manager
@@ -23,25 +31,148 @@ from .config import (
     CAPTCHA_JOIN_COALESCE_TTL,
 )
 
+# 入群记录脚本：合并锁 + 去重锁 + 频率计数 + 清理上一轮临时字段，一次往返完成。
+# KEYS: session hash, coalesce lock, dedup lock
+# ARGV: event_uid, now_ts, kick_threshold, reset_threshold, ttl_default, ttl_extended,
+#       coalesce_ttl, dedup_ttl
+# 旧记录中的 chat_id / user_id 字段（与 key 重复）在此一并删除。
+JOIN_RECORD_SCRIPT = """
+if not redis.call('SET', KEYS[2], ARGV[1], 'NX', 'EX', ARGV[7]) then
+  return {'duplicate', 0, 0, ''}
+end
+if not redis.call('SET', KEYS[3], '1', 'NX', 'EX', ARGV[8]) then
+  return {'duplicate', 0, 0, ''}
+end
+local f = redis.call('HMGET', KEYS[1], 'join_count', 'total_joins', 'state', 'first_join_ts')
+local joins = (tonumber(f[1]) or 0) + 1
+local total = (tonumber(f[2]) or 0) + 1
+local state = f[3] or 'normal'
+local first = f[4] or ARGV[2]
+local ttl = ARGV[5]
+if joins >= tonumber(ARGV[3]) then
+  state = 'throttled'
+  ttl = ARGV[6]
+elseif state == 'throttled' and joins <= tonumber(ARGV[4]) then
+  state = 'normal'
+end
+redis.call('HDEL', KEYS[1], 'flagged_reason', 'captcha_restricted', 'retry_count', 'last_icon',
+  'last_answer', 'last_options', 'last_token', 'chat_id', 'user_id')
+redis.call('HSET', KEYS[1], 'join_count', joins, 'total_joins', total, 'first_join_ts', first,
+  'last_join_ts', ARGV[2], 'state', state)
+redis.call('EXPIRE', KEYS[1], ttl)
+return {state, joins, total, first}
+"""
+
+# 答案校验结果
+VERIFY_MISSING = "missing"  # session 或答案不存在
+VERIFY_STALE = "stale"  # 重复点击 / 旧验证码消息上的点击
+VERIFY_PASS = "pass"  # 答对（答案已作废，防止重复处理）
+VERIFY_RETRY = "retry"  # 答错，已写入新验证码答案并顺延超时
+VERIFY_KICK = "kick"  # 答错且达到重试上限（答案已作废）
+
+# 原子“校验并转移”脚本，一次往返完成比较答案、计数重试、读取标记与写入新答案。
+# 顺延超时任务时 ZADD 带 XX：任务已执行或已取消时不会被重新加回。
+# KEYS: session hash, lazy_sessions, lazy_delete_messages
+# ARGV: chosen, token, max_retry, icon, answer, options, new_token, deadline,
+#       timeout session member, delete message member
+VERIFY_ANSWER_SCRIPT = """
+local f = redis.call('HMGET', KEYS[1], 'last_answer', 'last_token', 'flagged_reason', 'state')
+local answer, token, flag, state = f[1], f[2], f[3] or '', f[4] or ''
+if not answer then
+  return {'missing', 0, flag, state}
+end
+if answer == '' or (token and token ~= '' and token ~= ARGV[2]) then
+  return {'stale', 0, flag, state}
+end
+if answer == ARGV[1] then
+  redis.call('HSET', KEYS[1], 'last_answer', '')
+  return {'pass', 0, flag, state}
+end
+local retry = redis.call('HINCRBY', KEYS[1], 'retry_count', 1)
+if retry >= tonumber(ARGV[3]) then
+  redis.call('HSET', KEYS[1], 'last_answer', '')
+  return {'kick', retry, flag, state}
+end
+redis.call('HSET', KEYS[1], 'last_icon', ARGV[4], 'last_answer', ARGV[5], 'last_options', ARGV[6], 'last_token', ARGV[7])
+redis.call('ZADD', KEYS[2], 'XX', ARGV[8], ARGV[9])
+redis.call('ZADD', KEYS[3], 'XX', ARGV[8], ARGV[10])
+return {'retry', retry, flag, state}
+"""
+
+
+def pack_options(labels) -> str:
+    """选项按钮文字（emoji 或图片验证码字符串）以逗号连接，保持 Hash 字段短小。"""
+    return ",".join(labels)
+
+
+@dataclass
+class VerifyResult:
+    """CaptchaSession.verify_answer 的返回值"""
+
+    status: str
+    retry_count: int = 0
+    flagged_reason: Optional[str] = None
+    state: str = ""
+
+
+@dataclass(slots=True)
+class CaptchaRecord:
+    """
+    单次入群验证流程的内存记录（取代旧版 Session，不再写 Redis）。
+
+    安全检查过程中填充 member_username / member_bio / banned。
+    """
+
+    chat_id: int
+    member_id: int
+    join_ts: int
+    member_username: Optional[str] = None
+    member_bio: Optional[str] = None
+    banned: bool = False
+
+    @classmethod
+    def for_join(cls, chat: Any, user: Any, now: datetime) -> "CaptchaRecord":
+        return cls(
+            chat_id=chat.id,
+            member_id=user.id,
+            join_ts=int(now.timestamp()),
+            member_username=getattr(user, "username", None),
+        )
+
 
 class CaptchaSession:
     """
     入群验证频率控制会话
 
-    Redis Hash 字段:
+    Redis Hash 字段（空值不写入，时间为 Unix 秒）:
       join_count: str      — 当前 TTL 窗口内入群次数
-      first_join_ts: str   — 窗口内首次入群时间 (ISO)
-      last_join_ts: str    — 最近入群时间 (ISO)
+      first_join_ts: str   — 窗口内首次入群时间（旧记录可能为 ISO 格式）
+      last_join_ts: str    — 最近入群时间
       last_cost: str       — 上次验证耗时(秒)
       last_icon: str       — 上次正确图标(emoji)
       last_answer: str     — 上次正确答案(图标名称 key)
-      last_options: str    — 上次选项列表 (JSON)
+      last_options: str    — 上次选项的按钮文字，逗号分隔
+      last_token: str      — 当前验证码消息标识（签发时间 + 随机数）
       total_joins: str     — 总入群次数(跨窗口累计)
       state: str           — normal / throttled / blocked
-      chat_id: str
-      user_id: str
     """
 
+    @staticmethod
+    def parse_ts(raw: Union[str, bytes, None]) -> Optional[datetime]:
+        """解析 first_join_ts / last_join_ts，兼容旧记录的 ISO 格式。"""
+        if not raw:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        try:
+            return datetime.fromtimestamp(int(raw), timezone.utc)
+        except ValueError:
+            pass
+        try:
+            return datetime.fromisoformat(raw)
+        except ValueError:
+            return None
+
     # ------------------------------------------------------------------
     # Key 构建
     # ------------------------------------------------------------------
@@ -95,119 +226,54 @@ class CaptchaSession:
             logger.warning("Redis 不可用，CaptchaSession 降级放行")
             return True, {}
 
-        session_key = CaptchaSession.make_key(chat_id, user_id)
         if event_uid is None:
             # 理论上入口会传入稳定事件 ID；缺失时用事件时间兜底，避免退回“按用户去重”的粗粒度。
             event_uid = f"ts:{now.isoformat()}"
-        dedup_key = CaptchaSession.make_dedup_key(chat_id, user_id, event_uid)
-        coalesce_key = CaptchaSession.make_coalesce_key(chat_id, user_id)
-
-        # 0) 入群合并锁：压制同一次入群的多条 Telegram 更新（不同 event_uid）
-        coalesced = await rdb.set(
-            coalesce_key, event_uid, nx=True, ex=CAPTCHA_JOIN_COALESCE_TTL
+        now_ts = str(int(now.timestamp()))
+
+        # 合并锁（压制同一次入群的多条 Telegram 更新）、去重锁与计数更新在同一脚本内完成
+        script = rdb.register_script(JOIN_RECORD_SCRIPT)
+        raw = await script(
+            keys=[
+                CaptchaSession.make_key(chat_id, user_id),
+                CaptchaSession.make_coalesce_key(chat_id, user_id),
+                CaptchaSession.make_dedup_key(chat_id, user_id, event_uid),
+            ],
+            args=[
+                event_uid,
+                now_ts,
+                CAPTCHA_JOIN_THRESHOLD_KICK,
+                CAPTCHA_JOIN_THRESHOLD_RESET,
+                CAPTCHA_TTL_DEFAULT,
+                CAPTCHA_TTL_EXTENDED,
+                CAPTCHA_JOIN_COALESCE_TTL,
+                CAPTCHA_DEDUP_TTL,
+            ],
         )
-        if not coalesced:
-            logger.debug(
-                f"入群合并锁命中，跳过并发/双推送 chat={chat_id} user={user_id} event={event_uid}"
-            )
-            return False, {"state": "duplicate"}
+        state, join_count, total_joins, first_join_ts = (v.decode() if isinstance(v, bytes) else v for v in raw)
 
-        # 1) 去重锁：SETNX 原子操作
-        acquired = await rdb.set(dedup_key, "1", nx=True, ex=CAPTCHA_DEDUP_TTL)
-        if not acquired:
-            logger.debug(f"去重锁命中，跳过重复事件 chat={chat_id} user={user_id} event={event_uid}")
+        if state == "duplicate":
+            logger.debug(f"入群合并/去重锁命中，跳过重复事件 chat={chat_id} user={user_id} event={event_uid}")
             return False, {"state": "duplicate"}
 
-        # 2) 读取已有 session
-        existing = await rdb.hgetall(session_key)
-        # redis-py 返回 dict[bytes, bytes]，转成 dict[str, str]
-        data: Dict[str, str] = {}
-        if existing:
-            data = {k.decode() if isinstance(k, bytes) else k: v.decode() if isinstance(v, bytes) else v
-                    for k, v in existing.items()}
-
-        now_iso = now.isoformat()
-        is_new = len(data) == 0
-
-        if is_new:
-            # 首次入群
-            data = {
-                "join_count": "1",
-                "first_join_ts": now_iso,
-                "last_join_ts": now_iso,
-                "last_cost": "0",
-                "last_icon": "",
-                "last_answer": "",
-                "last_options": "",
-                "total_joins": "1",
-                "state": "normal",
-                "chat_id": str(chat_id),
-                "user_id": str(user_id),
-            }
-            await rdb.hset(session_key, mapping=data)
-            await rdb.expire(session_key, CAPTCHA_TTL_DEFAULT)
-            logger.info(f"CaptchaSession 新建 chat={chat_id} user={user_id} TTL={CAPTCHA_TTL_DEFAULT}s")
-            return True, data
-
-        # 3) 已有记录：更新计数
-        join_count = int(data.get("join_count", "0")) + 1
-        total_joins = int(data.get("total_joins", "0")) + 1
-        current_state = data.get("state", "normal")
-        new_state = current_state
-        new_ttl = CAPTCHA_TTL_DEFAULT
-
-        if join_count >= CAPTCHA_JOIN_THRESHOLD_KICK:
-            # 频率过高 → throttled
-            new_state = "throttled"
-            new_ttl = CAPTCHA_TTL_EXTENDED
-            logger.warning(
-                f"CaptchaSession 频率触发 chat={chat_id} user={user_id} "
-                f"join_count={join_count} threshold={CAPTCHA_JOIN_THRESHOLD_KICK} → throttled"
-            )
-        elif current_state == "throttled" and join_count <= CAPTCHA_JOIN_THRESHOLD_RESET:
-            # 频率降回正常
-            new_state = "normal"
-            new_ttl = CAPTCHA_TTL_DEFAULT
-            logger.info(
-                f"CaptchaSession 频率恢复 chat={chat_id} user={user_id} "
-                f"join_count={join_count} → normal"
-            )
-
-        # 4) 写回
-        data["join_count"] = str(join_count)
-        data["total_joins"] = str(total_joins)
-        data["last_join_ts"] = now_iso
-        data["state"] = new_state
-
-        await rdb.hset(session_key, mapping={
+        data = {
             "join_count": str(join_count),
             "total_joins": str(total_joins),
-            "last_join_ts": now_iso,
-            "state": new_state,
-        })
-        # 新入群，清除上一轮入群的临时数据（标记、重试次数、验证码答案等），
-        # 让本次入群获得全新评估。频率计数器保留不变。
-        await rdb.hdel(
-            session_key,
-            "flagged_reason",
-            "captcha_restricted",
-            "retry_count",
-            "last_icon",
-            "last_answer",
-            "last_options",
-        )
-        await rdb.expire(session_key, new_ttl)
+            "first_join_ts": first_join_ts,
+            "last_join_ts": now_ts,
+            "state": state,
+        }
 
-        if new_state == "throttled":
-            logger.info(
+        if state == "throttled":
+            logger.warning(
                 f"CaptchaSession throttled chat={chat_id} user={user_id} "
-                f"join_count={join_count} TTL={new_ttl}s → 应 Kick"
+                f"join_count={join_count} threshold={CAPTCHA_JOIN_THRESHOLD_KICK} → 应 Kick"
             )
             return False, data
 
         logger.debug(
             f"CaptchaSession 放行 chat={chat_id} user={user_id} "
-            f"join_count={join_count} state={new_state}"
+            f"join_count={join_count} total={total_joins} state={state}"
         )
         return True, data
 
@@ -222,8 +288,9 @@ class CaptchaSession:
         icon: str,
         answer: str,
         options: str,
+        token: str = "",
     ) -> None:
-        """在发送验证消息后，记录图标、正确答案、选项列表"""
+        """在发送验证消息后，记录图标、正确答案、选项列表与验证码标识"""
         rdb = await manager.get_redis()
         if not rdb:
             return
@@ -238,9 +305,57 @@ class CaptchaSession:
             "last_icon": icon,
             "last_answer": answer,
             "last_options": options,
+            "last_token": token,
         })
         logger.debug(f"CaptchaSession 记录答案 chat={chat_id} user={user_id} icon={icon} answer={answer}")
 
+    # ------------------------------------------------------------------
+    # 原子校验答案（按钮回调热路径）
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def verify_answer(
+        chat_id: int,
+        user_id: int,
+        msg_id: int,
+        chosen: str,
+        token: str,
+        max_retry: int,
+        next_answer: Dict[str, str],
+        timeout_at: datetime,
+    ) -> VerifyResult:
+        """
+        比较用户选择与当前答案，并在同一次 Redis 调用中完成状态转移。
+
+        答错且未达上限时，写入 next_answer（build_captcha_message 生成的新验证码），
+        并把超时踢人任务与验证消息删除时间顺延到 timeout_at。
+        答对或达到上限时答案立即作废，重复点击得到 VERIFY_STALE。
+        """
+        rdb = await manager.get_redis()
+        if not rdb:
+            return VerifyResult(VERIFY_MISSING)
+
+        script = rdb.register_script(VERIFY_ANSWER_SCRIPT)
+        raw = await script(
+            keys=[CaptchaSession.make_key(chat_id, user_id), "lazy_sessions", "lazy_delete_messages"],
+            args=[
+                chosen,
+                token,
+                max_retry,
+                next_answer["icon"],
+                next_answer["answer"],
+                next_answer["options"],
+                next_answer.get("token", ""),
+                timeout_at.timestamp(),
+                manager.lazy_session_value(chat_id, user_id, "new_member_check", msg_id),
+                manager.lazy_delete_value(chat_id, msg_id),
+            ],
+        )
+        status, retry_count, flag, state = (v.decode() if isinstance(v, bytes) else v for v in raw)
+        result = VerifyResult(status, int(retry_count), flag or None, state)
+        logger.debug(f"CaptchaSession 校验 chat={chat_id} user={user_id} chosen={chosen} -> {result}")
+        return result
+
     # ------------------------------------------------------------------
     # 记录验证耗时（用户通过验证后）
     # ------------------------------------------------------------------
@@ -368,69 +483,3 @@ class CaptchaSession:
         session_key = CaptchaSession.make_key(chat_id, user_id)
         await rdb.delete(session_key)
         logger.debug(f"CaptchaSession 删除 chat={chat_id} user={user_id}")
-
-
-# ------------------------------------------------------------------
-# 保留旧 Session 类以兼容 security.py / validators.py 中仍引用的地方
-# 逐步迁移到 CaptchaSession
-# ------------------------------------------------------------------
-
-class Session:
-    """
-    旧版 Session — 保留兼容，内部字段不变。
-    新代码应优先使用 CaptchaSession。
-    """
-    id: str
-    chat: str
-    chat_id: int
-    member: str
-    member_id: int
-    member_username: Optional[str]
-    member_bio: Optional[str]
-    ts_create: datetime
-    ts_update: datetime
-    cost_captcha: float
-    accepted: bool
-    timeout: bool
-    banned: bool
-
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
-
-    async def save(self):
-        rdb = await manager.get_redis()
-        if not rdb:
-            return
-        self.cost_captcha = (self.ts_update - self.ts_create).total_seconds()
-        TTL_SESSION = 60 * 60 * 24 * 7
-        await rdb.set(self.id, dumps(self.__dict__), TTL_SESSION)
-
-    @staticmethod
-    async def create(chat, user, now: datetime) -> "Session":
-        session = Session(**{
-            "id": f"member_captcha:{chat.id}:{user.id}",
-            "chat": getattr(chat, "title", str(chat.id)),
-            "chat_id": chat.id,
-            "member": f"{user.first_name} {user.last_name}".strip(),
-            "member_id": user.id,
-            "member_username": user.username,
-            "member_bio": None,
-            "ts_create": now,
-            "ts_update": now,
-            "cost_captcha": 0,
-            "accepted": False,
-            "timeout": False,
-            "banned": False,
-        })
-
-        rdb = await manager.get_redis()
-        if rdb:
-            if await rdb.exists(session.id):
-                old_data = loads(await rdb.get(session.id))
-                old_data["ts_update"] = now
-                ts_create_raw = old_data["ts_create"]
-                ts_create = datetime.fromisoformat(ts_create_raw) if isinstance(ts_create_raw, str) else ts_create_raw
-                old_data["cost_captcha"] = (now - ts_create).total_seconds()
-            TTL_SESSION = 60 * 60 * 24 * 7
-            await rdb.set(session.id, dumps(session.__dict__), TTL_SESSION)
-        return session
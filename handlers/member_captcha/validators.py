@@ -15,7 +15,7 @@ from manager.group import settings_get
 from .config import SUPPORT_GROUP_TYPES, EVENT_EXPIRY_SECONDS, VerificationMode, DELETED_AFTER, get_chat_type
 from .exceptions import LogContext, ValidationError
 from .security import restrict_member_permissions
-from .session import Session
+from .session import CaptchaRecord
 
 
 async def validate_basic_conditions(
@@ -158,7 +158,7 @@ async def handle_silence_mode(chat: Any, member_id: int, member_fullname: str, c
 
 async def create_verification_session(
     chat: types.Chat, user: types.User, now: datetime, log_context: LogContext
-) -> Optional[Session]:
+) -> Optional[CaptchaRecord]:
     """
     创建验证会话
 
@@ -169,9 +169,9 @@ async def create_verification_session(
         log_context: 日志上下文
 
     Returns:
-        Optional[Session]: 创建的会话对象，失败返回None
+        Optional[CaptchaRecord]: 本次入群的内存记录，失败返回None
     """
     try:
-        return await Session.create(chat, user, now)
+        return CaptchaRecord.for_join(chat, user, now)
     except Exception as e:
         logger.exception(f"{log_context.log_prefix} | 创建会话失败 | 错误:{e}")
@@ -1,2 +1,3 @@
 from .base import count_tokens, contains_chinese, strip_text_prefix
-from .txt import tg_generate_text, chat_completions, get_ai_chat_model, get_spam_models, get_image_optimize_models
\ No newline at end of file
+from .txt import BadRequestError, tg_generate_text, chat_completions, get_ai_chat_model, get_spam_models, get_image_optimize_models
+from .gateway import PRIORITY_SECURITY, PRIORITY_MODERATION, PRIORITY_INTERACTIVE, get_llm_gateway
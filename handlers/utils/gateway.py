@@ -0,0 +1,190 @@
+"""
+LLM 出站请求网关
+Priority-aware concurrency limiter for outbound LLM calls
+
+所有经 _api_request 发往 AI 代理的请求共享一个并发池：
+
+  - 优先级：安全检查（入群 LLM 审查）> 内容审核（首句检查）> 交互（/chat、/image 提示词优化）
+  - 交互请求按用户轮转排队，单个用户的连续请求不会挤占其他用户
+  - 交互请求最多占用 limit - reserved 个并发，留出的名额只给安全 / 审核请求，
+    避免长时间的 /chat 请求占满并发导致验证检查超时
+  - 统计每个优先级的排队等待时间（总计 / 最大）与当前排队数
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Deque, Dict, Hashable, Optional
+
+from loguru import logger
+
+from manager import manager
+
+PRIORITY_SECURITY = 0
+PRIORITY_MODERATION = 1
+PRIORITY_INTERACTIVE = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_SECURITY: "security",
+    PRIORITY_MODERATION: "moderation",
+    PRIORITY_INTERACTIVE: "interactive",
+}
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RESERVED = 1
+SLOW_WAIT_LOG = 5.0  # 排队超过此秒数时记录日志
+
+
+class LLMGateway:
+    def __init__(self, limit: int = DEFAULT_CONCURRENCY, reserved: int = DEFAULT_RESERVED):
+        self.limit = max(1, limit)
+        self.interactive_limit = max(1, self.limit - max(0, reserved))
+        self.active = 0
+        self.active_interactive = 0
+        # 安全 / 审核：FIFO；交互：用户 -> FIFO，按用户轮转
+        self._queues: Dict[int, Deque[asyncio.Future]] = {
+            PRIORITY_SECURITY: deque(),
+            PRIORITY_MODERATION: deque(),
+        }
+        self._users: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._metrics = {p: {"admitted": 0, "wait_total": 0.0, "wait_max": 0.0} for p in PRIORITY_NAMES}
+
+    def _queued(self, priority: int) -> int:
+        if priority == PRIORITY_INTERACTIVE:
+            return sum(len(q) for q in self._users.values())
+        return len(self._queues[priority])
+
+    def _can_admit(self, priority: int) -> bool:
+        if self.active >= self.limit:
+            return False
+        return priority != PRIORITY_INTERACTIVE or self.active_interactive < self.interactive_limit
+
+    def _take(self, priority: int) -> None:
+        self.active += 1
+        if priority == PRIORITY_INTERACTIVE:
+            self.active_interactive += 1
+
+    def _next_waiter(self) -> Optional[tuple[int, asyncio.Future]]:
+        for priority in (PRIORITY_SECURITY, PRIORITY_MODERATION):
+            queue = self._queues[priority]
+            if queue and self._can_admit(priority):
+                return priority, queue.popleft()
+        if self._users and self._can_admit(PRIORITY_INTERACTIVE):
+            user, queue = next(iter(self._users.items()))
+            waiter = queue.popleft()
+            # 轮转：该用户还有请求则排到队尾
+            self._users.pop(user)
+            if queue:
+                self._users[user] = queue
+            return PRIORITY_INTERACTIVE, waiter
+        return None
+
+    def _wake(self) -> None:
+        while True:
+            item = self._next_waiter()
+            if item is None:
+                return
+            priority, waiter = item
+            if waiter.done():
+                continue
+            self._take(priority)
+            waiter.set_result(None)
+
+    def _remove(self, priority: int, user: Hashable, waiter: asyncio.Future) -> None:
+        if priority != PRIORITY_INTERACTIVE:
+            try:
+                self._queues[priority].remove(waiter)
+            except ValueError:
+                pass
+            return
+        queue = self._users.get(user)
+        if queue is not None:
+            try:
+                queue.remove(waiter)
+            except ValueError:
+                pass
+            if not queue:
+                self._users.pop(user, None)
+
+    async def acquire(self, priority: int, user: Hashable = None) -> None:
+        if priority not in PRIORITY_NAMES:
+            priority = PRIORITY_INTERACTIVE
+        # 同级或更高优先级有人排队时不插队
+        if self._can_admit(priority) and not any(self._queued(p) for p in PRIORITY_NAMES if p <= priority):
+            self._take(priority)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        if priority == PRIORITY_INTERACTIVE:
+            self._users.setdefault(user, deque()).append(waiter)
+        else:
+            self._queues[priority].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已分配但调用方被取消，归还名额
+                self.release(priority)
+            else:
+                self._remove(priority, user, waiter)
+            raise
+
+    def release(self, priority: int) -> None:
+        if priority not in PRIORITY_NAMES:
+            priority = PRIORITY_INTERACTIVE
+        self.active -= 1
+        if priority == PRIORITY_INTERACTIVE:
+            self.active_interactive -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE, user: Hashable = None) -> AsyncIterator[float]:
+        """占用一个并发名额，返回排队等待的秒数。"""
+        started = monotonic()
+        await self.acquire(priority, user)
+        waited = monotonic() - started
+
+        metrics = self._metrics.get(priority, self._metrics[PRIORITY_INTERACTIVE])
+        metrics["admitted"] += 1
+        metrics["wait_total"] += waited
+        metrics["wait_max"] = max(metrics["wait_max"], waited)
+        if waited >= SLOW_WAIT_LOG:
+            logger.warning(f"llm gateway queued {waited:.1f}s | priority={PRIORITY_NAMES.get(priority, priority)}")
+        try:
+            yield waited
+        finally:
+            self.release(priority)
+
+    def stats(self) -> dict:
+        result = {"limit": self.limit, "interactive_limit": self.interactive_limit, "active": self.active}
+        for priority, name in PRIORITY_NAMES.items():
+            metrics = self._metrics[priority]
+            admitted = metrics["admitted"]
+            result[name] = {
+                "admitted": admitted,
+                "queued": self._queued(priority),
+                "wait_avg": round(metrics["wait_total"] / admitted, 3) if admitted else 0.0,
+                "wait_max": round(metrics["wait_max"], 3),
+            }
+        return result
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """首次使用时按 [ai] llm_concurrency / llm_reserved_slots 创建网关。"""
+    global _gateway
+    if _gateway is None:
+        limit, reserved = DEFAULT_CONCURRENCY, DEFAULT_RESERVED
+        try:
+            config = manager.config
+            if config and config.has_section("ai"):
+                limit = config["ai"].getint("llm_concurrency", DEFAULT_CONCURRENCY)
+                reserved = config["ai"].getint("llm_reserved_slots", DEFAULT_RESERVED)
+        except Exception as e:
+            logger.warning(f"invalid llm gateway config, using defaults: {e}")
+        _gateway = LLMGateway(limit, reserved)
+        logger.info(f"llm gateway created | limit={_gateway.limit} interactive_limit={_gateway.interactive_limit}")
+    return _gateway
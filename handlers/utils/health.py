@@ -0,0 +1,202 @@
+"""
+AI 代理模型健康度与熔断
+Per-(proxy host, model) health tracking and circuit breaking
+
+每个 (代理主机, 模型) 记录延迟 EWMA、错误率 EWMA 与 429 限流信号：
+
+  - 连续失败达到阈值，或样本足够且错误率过高时熔断，冷却期内跳过该模型
+  - 冷却期结束后进入半开状态，只放行一个探测请求；成功则恢复，失败则冷却期翻倍（有上限）
+  - 429 按 Retry-After（缺省为固定值）暂停该模型，不计入错误率
+
+get_spam_models() / get_ai_chat_model() 通过 order() 按健康度重新排序候选模型；
+_api_request 在熔断期间直接失败，不再重复走完整的重试与超时流程。
+"""
+
+from dataclasses import dataclass
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+EWMA_ALPHA = 0.2
+FAILURE_THRESHOLD = 3  # 连续失败次数
+ERROR_RATE_THRESHOLD = 0.6
+ERROR_RATE_MIN_SAMPLES = 10
+COOLDOWN_BASE = 30.0
+COOLDOWN_MAX = 600.0
+RATE_LIMIT_COOLDOWN = 15.0
+RATE_LIMIT_MAX = 300.0
+DEGRADED_ERROR_RATE = 0.3  # 超过此错误率或延迟的模型排到健康模型之后
+DEGRADED_LATENCY = 20.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+@dataclass(slots=True)
+class ModelHealth:
+    latency: Optional[float] = None  # 成功请求耗时 EWMA（秒）
+    error_rate: float = 0.0  # 失败率 EWMA
+    samples: int = 0
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    cooldown: float = COOLDOWN_BASE
+    rate_limited_until: float = 0.0
+    probing: bool = False
+    successes: int = 0
+    failures: int = 0
+    rate_limits: int = 0
+    skipped: int = 0
+    last_error: str = ""
+
+    def state(self, now: float) -> str:
+        if self.open_until > now:
+            return STATE_OPEN
+        if self.open_until:
+            return STATE_HALF_OPEN
+        return STATE_CLOSED
+
+    @property
+    def degraded(self) -> bool:
+        return self.error_rate >= DEGRADED_ERROR_RATE or (self.latency or 0.0) >= DEGRADED_LATENCY
+
+    def stats(self, now: float) -> dict:
+        return {
+            "state": self.state(now),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limits": self.rate_limits,
+            "skipped": self.skipped,
+            "open_for": round(max(self.open_until, self.rate_limited_until) - now, 1)
+            if max(self.open_until, self.rate_limited_until) > now
+            else 0,
+            "last_error": self.last_error,
+        }
+
+
+def host_of(url: str) -> str:
+    """代理 URL 的主机部分（含端口），作为健康度的分组键。"""
+    return urlsplit(url).netloc or url
+
+
+class HealthTracker:
+    def __init__(self):
+        self._models: Dict[Tuple[str, str], ModelHealth] = {}
+
+    def reset(self) -> None:
+        self._models.clear()
+
+    def get(self, host: str, model: str) -> ModelHealth:
+        key = (host_of(host), model)
+        health = self._models.get(key)
+        if health is None:
+            health = self._models[key] = ModelHealth()
+        return health
+
+    def available(self, host: str, model: str, now: Optional[float] = None) -> bool:
+        """是否允许向该模型发请求；半开状态只放行一个探测请求。"""
+        now = monotonic() if now is None else now
+        health = self._models.get((host_of(host), model))
+        if health is None:
+            return True
+        if health.rate_limited_until > now:
+            return False
+        state = health.state(now)
+        if state == STATE_OPEN:
+            return False
+        if state == STATE_HALF_OPEN:
+            return not health.probing
+        return True
+
+    def acquire(self, host: str, model: str) -> bool:
+        """请求前调用：不可用时计入 skipped 并返回 False；半开状态下占用探测名额。"""
+        now = monotonic()
+        health = self.get(host, model)
+        if not self.available(host, model, now):
+            health.skipped += 1
+            return False
+        if health.state(now) == STATE_HALF_OPEN:
+            health.probing = True
+        return True
+
+    def record_success(self, host: str, model: str, elapsed: float) -> None:
+        health = self.get(host, model)
+        health.latency = elapsed if health.latency is None else (
+            EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * health.latency
+        )
+        health.error_rate *= 1 - EWMA_ALPHA
+        health.samples += 1
+        health.successes += 1
+        health.consecutive_failures = 0
+        if health.open_until:
+            logger.info(f"model circuit closed | host={host_of(host)} model={model}")
+        health.open_until = 0.0
+        health.cooldown = COOLDOWN_BASE
+        health.probing = False
+
+    def record_failure(self, host: str, model: str, error: str = "") -> None:
+        now = monotonic()
+        health = self.get(host, model)
+        health.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * health.error_rate
+        health.samples += 1
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = error
+
+        if health.state(now) == STATE_HALF_OPEN:
+            # 探测失败：冷却期翻倍后重新熔断
+            health.cooldown = min(health.cooldown * 2, COOLDOWN_MAX)
+            self._open(host, model, health, now)
+        elif health.state(now) == STATE_CLOSED and (
+            health.consecutive_failures >= FAILURE_THRESHOLD
+            or (health.samples >= ERROR_RATE_MIN_SAMPLES and health.error_rate >= ERROR_RATE_THRESHOLD)
+        ):
+            self._open(host, model, health, now)
+
+    def record_rate_limit(self, host: str, model: str, retry_after: Optional[float] = None) -> None:
+        health = self.get(host, model)
+        wait = RATE_LIMIT_COOLDOWN if retry_after is None else min(max(retry_after, 1.0), RATE_LIMIT_MAX)
+        health.rate_limited_until = monotonic() + wait
+        health.rate_limits += 1
+        health.probing = False
+        logger.warning(f"model rate limited | host={host_of(host)} model={model} pause={wait:.0f}s")
+
+    def release(self, host: str, model: str) -> None:
+        """请求没有产生健康信号（如 400 / 401）时释放探测名额。"""
+        health = self._models.get((host_of(host), model))
+        if health is not None:
+            health.probing = False
+
+    def _open(self, host: str, model: str, health: ModelHealth, now: float) -> None:
+        health.open_until = now + health.cooldown
+        health.probing = False
+        logger.warning(
+            f"model circuit open | host={host_of(host)} model={model} "
+            f"cooldown={health.cooldown:.0f}s error_rate={health.error_rate:.2f} last_error={health.last_error}"
+        )
+
+    def order(self, host: str, models: List[str]) -> List[str]:
+        """
+        按健康度重新排序候选模型：健康的在前，其次是错误率或延迟偏高的，熔断或限流中的放到最后；
+        同一档内保持配置顺序。全部不可用时调用方仍然有模型可试。
+        """
+        now = monotonic()
+        ranked = []
+        for index, model in enumerate(models):
+            health = self._models.get((host_of(host), model))
+            available = self.available(host, model, now)
+            degraded = health is not None and health.degraded
+            ranked.append((not available, degraded, index, model))
+        ranked.sort()
+        return [model for *_, model in ranked]
+
+    def stats(self) -> dict:
+        now = monotonic()
+        return {f"{host}/{model}": health.stats(now) for (host, model), health in self._models.items()}
+
+
+model_health = HealthTracker()
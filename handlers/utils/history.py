@@ -0,0 +1,136 @@
+"""
+/chat 会话历史
+Append-only chat history with cached per-message token counts
+
+chat:history:{user} 是一个 Redis hash：
+
+  head / next   最早保留的消息序号 / 下一条消息的序号
+  <seq>         单条消息 [role, content, tokens]，orjson 编码，较长的内容再用 zlib 压缩
+
+每轮只对新消息计算 token；超出上下文预算时从最早的消息开始丢弃（O(丢弃条数)），
+写回时只 HSET 新消息与元数据、HDEL 被丢弃的序号，不再整段重写。
+token 总数在加载时由各条消息累加（本来就要逐条解码），不单独存储。
+"""
+
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Tuple
+
+from loguru import logger
+from orjson import dumps, loads
+from redis.exceptions import ResponseError
+
+HISTORY_KEY = "chat:history:{}"
+COMPRESS_MIN_BYTES = 256
+_RAW = b"j"
+_ZLIB = b"z"
+
+# (序号, role, content, tokens)
+Entry = Tuple[int, str, str, int]
+
+
+def history_key(user_id: int) -> str:
+    return HISTORY_KEY.format(user_id)
+
+
+def encode_message(role: str, content: str, tokens: int) -> bytes:
+    payload = dumps([role, content, tokens])
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(payload)
+    return _RAW + payload
+
+
+def decode_message(raw: bytes) -> Tuple[str, str, int]:
+    if isinstance(raw, str):
+        raw = raw.encode()
+    body = raw[1:]
+    if raw[:1] == _ZLIB:
+        body = zlib.decompress(body)
+    role, content, tokens = loads(body)
+    return role, content, int(tokens)
+
+
+def _int(meta: Dict[str, bytes], name: str, default: int = 0) -> int:
+    try:
+        return int(meta[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+@dataclass(slots=True)
+class ChatHistory:
+    user_id: int
+    head: int = 0
+    next: int = 0
+    tokens: int = 0
+    entries: Deque[Entry] = field(default_factory=deque)
+    dropped: List[int] = field(default_factory=list)
+
+    @classmethod
+    async def load(cls, rdb, user_id: int) -> "ChatHistory":
+        key = history_key(user_id)
+        try:
+            raw = await rdb.hgetall(key)
+        except ResponseError as e:
+            # 旧版本把整段历史存成 JSON 字符串（WRONGTYPE），直接丢弃重新开始；
+            # 其他错误（超时、连接断开等）原样抛出，不能误删历史
+            if "WRONGTYPE" not in str(e):
+                raise
+            logger.info(f"chat history {user_id} unreadable ({e}), starting a new one")
+            await rdb.delete(key)
+            return cls(user_id)
+
+        history = cls(user_id)
+        meta, messages = {}, []
+        for k, v in (raw or {}).items():
+            name = k.decode() if isinstance(k, bytes) else str(k)
+            if name.isdigit():
+                messages.append((int(name), v))
+            else:
+                meta[name] = v
+        history.head = _int(meta, "head")
+        history.next = _int(meta, "next")
+
+        total = 0
+        for seq, value in sorted(messages):
+            if seq < history.head:
+                continue
+            try:
+                role, content, tokens = decode_message(value)
+            except Exception as e:
+                logger.warning(f"chat history {user_id} message {seq} corrupted: {e}")
+                continue
+            history.entries.append((seq, role, content, tokens))
+            total += tokens
+            history.next = max(history.next, seq + 1)
+        history.tokens = total
+        return history
+
+    def fit(self, budget: float, incoming: int) -> None:
+        """从最早的消息开始丢弃，直到保留的 token 加上即将追加的 incoming 不超过 budget。"""
+        while self.entries and self.tokens + incoming > budget:
+            seq, _, _, tokens = self.entries.popleft()
+            self.tokens -= tokens
+            self.dropped.append(seq)
+            self.head = seq + 1
+
+    def as_messages(self) -> List[dict]:
+        return [{"role": role, "content": content} for _, role, content, _ in self.entries]
+
+    async def append(self, rdb, turns: Iterable[Tuple[str, str, int]], ttl: int) -> None:
+        """追加新消息并写回：只写新增序号与元数据，删除 fit 丢弃的序号。"""
+        mapping = {}
+        for role, content, tokens in turns:
+            mapping[str(self.next)] = encode_message(role, content, tokens)
+            self.entries.append((self.next, role, content, tokens))
+            self.tokens += tokens
+            self.next += 1
+        mapping.update(head=str(self.head), next=str(self.next))
+
+        key = history_key(self.user_id)
+        await rdb.hset(key, mapping=mapping)
+        if self.dropped:
+            await rdb.hdel(key, *(str(seq) for seq in self.dropped))
+            self.dropped.clear()
+        await rdb.expire(key, ttl)
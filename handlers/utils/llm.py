@@ -1,14 +1,24 @@
 import asyncio
+from collections import deque
 from dataclasses import dataclass
 from time import monotonic
-from typing import Any, List, Optional
+from typing import Any, Deque, Dict, List, Optional, Tuple
 import re
 
 import orjson as json
 from loguru import logger
 
-from ..utils import chat_completions, get_spam_models
-from ..member_captcha.config import LLM_MAX_TOKENS, LLM_MODEL_TIMEOUT
+from utils.normalize import normalize_text
+
+from ..utils import PRIORITY_SECURITY, BadRequestError, chat_completions, get_spam_models
+from ..member_captcha.config import (
+    LLM_CHECK_TIMEOUT,
+    LLM_HEDGE_DELAY,
+    LLM_HEDGE_MAX_INFLIGHT,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_MAX_TOKENS,
+    LLM_MODEL_TIMEOUT,
+)
 
 @dataclass
 class LLMUserEvaluation:
@@ -22,6 +32,19 @@ def _user_fullname(user: Any) -> str:
     last = getattr(user, "last_name", None) or ""
     return f"{first} {last}".strip() or ""
 
+def _add_normalized_fields(member_data: dict) -> None:
+    """
+    LLM 审查前的预处理：文本归一化后与原文（仅大小写、空白差异除外）不同时，附上归一化版本，
+    让模型看到全角、零宽、形近字母混淆之后的真实内容。
+    """
+    for key in ("fullname", "username", "bio", "message"):
+        value = member_data.get(key)
+        if not value:
+            continue
+        normalized = normalize_text(value)
+        if normalized != " ".join(value.casefold().split()):
+            member_data[f"{key}_normalized"] = normalized
+
 # 严格结构化输出规范（JSON Schema），锁定模型只按此结构返回
 SPAM_EVAL_JSON_SCHEMA = {
     "type": "json_schema",
@@ -101,13 +124,174 @@ def _extract_and_parse_json(raw: Any) -> Optional[dict]:
 
     return None
 
+# 每个模型保留的近期成功延迟样本数；样本不少于 LATENCY_MIN_SAMPLES 时按 p90 计算对冲延迟
+LATENCY_WINDOW = 50
+LATENCY_MIN_SAMPLES = 5
+# 记住模型不支持 json_schema 的时长，过期后重新探测
+FORMAT_MEMORY_TTL = 6 * 3600
+
+FORMAT_JSON_SCHEMA = "json_schema"
+FORMAT_JSON_OBJECT = "json_object"
+_RESPONSE_FORMATS = {FORMAT_JSON_SCHEMA: SPAM_EVAL_JSON_SCHEMA, FORMAT_JSON_OBJECT: {"type": "json_object"}}
+
+_latencies: Dict[str, Deque[float]] = {}
+# model -> (不支持 json_schema 的判定时间)
+_schema_unsupported: Dict[str, float] = {}
+hedge_stats = {"requests": 0, "hedged": 0, "backup_wins": 0}
+
+
+def _record_latency(model: str, elapsed: float) -> None:
+    samples = _latencies.get(model)
+    if samples is None:
+        samples = _latencies[model] = deque(maxlen=LATENCY_WINDOW)
+    samples.append(elapsed)
+
+
+def hedge_delay(model: str) -> float:
+    """主模型未返回多久后启动备用模型：近期 p90 延迟，样本不足时用默认值。"""
+    samples = _latencies.get(model)
+    if not samples or len(samples) < LATENCY_MIN_SAMPLES:
+        return LLM_HEDGE_DELAY
+    ordered = sorted(samples)
+    p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+    return min(max(p90, LLM_HEDGE_MIN_DELAY), LLM_MODEL_TIMEOUT)
+
+
+def _formats_for(model: str) -> Tuple[str, ...]:
+    marked = _schema_unsupported.get(model)
+    if marked is not None and monotonic() - marked < FORMAT_MEMORY_TTL:
+        return (FORMAT_JSON_OBJECT,)
+    return (FORMAT_JSON_SCHEMA, FORMAT_JSON_OBJECT)
+
+
+async def _query_model(model: str, messages: List[dict], priority: int = PRIORITY_SECURITY) -> Optional[dict]:
+    """
+    单个模型在 LLM_MODEL_TIMEOUT 内返回可解析的结果，否则返回 None。
+
+    优先 strict json_schema；代理 / 模型不支持时回退 json_object，并记住该模型的格式能力。
+    只有 json_schema 请求被 400 拒绝或返回不可解析的内容才视为不支持；
+    超时、连接错误、5xx、熔断等可用性问题只回退本次请求，不记录。
+    """
+    started = monotonic()
+    deadline = started + LLM_MODEL_TIMEOUT
+    formats = _formats_for(model)
+    schema_rejected = False
+    for fmt in formats:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = await asyncio.wait_for(
+                chat_completions(
+                    messages,
+                    model,
+                    max_tokens=LLM_MAX_TOKENS,
+                    temperature=0.0,
+                    response_format=_RESPONSE_FORMATS[fmt],
+                    priority=priority,
+                ),
+                timeout=remaining,
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"check_spams_with_llm timeout for model {model} after {monotonic() - started:.2f}s")
+            return None
+        except BadRequestError as e:
+            logger.debug(f"check_spams_with_llm format {fmt} rejected by {model}: {e}")
+            schema_rejected = fmt == FORMAT_JSON_SCHEMA
+            continue
+        except Exception as e:
+            logger.debug(f"check_spams_with_llm format {fmt} error on {model}: {e}")
+            continue
+
+        data = _extract_and_parse_json(result) if result else None
+        if not data:
+            logger.warning(f"check_spams_with_llm unparsable {fmt} response from {model}: {str(result)[:200]}")
+            schema_rejected = fmt == FORMAT_JSON_SCHEMA
+            continue
+
+        if fmt == FORMAT_JSON_OBJECT and schema_rejected:
+            _schema_unsupported[model] = monotonic()
+            logger.info(f"model {model} does not support json_schema, using json_object for {FORMAT_MEMORY_TTL}s")
+        elif fmt == FORMAT_JSON_SCHEMA:
+            _schema_unsupported.pop(model, None)
+        elapsed = monotonic() - started
+        _record_latency(model, elapsed)
+        logger.info(f"check_spams_with_llm model {model} returned in {elapsed:.2f}s")
+        return data
+    return None
+
+
+async def _hedged_query(
+    models: List[str],
+    messages: List[dict],
+    budget: float = LLM_CHECK_TIMEOUT,
+    priority: int = PRIORITY_SECURITY,
+) -> Optional[dict]:
+    """
+    对冲请求：先请求主模型；它在自适应延迟（近期 p90）内未返回时并行启动下一个模型，
+    某个模型失败时立即补上下一个（即使其他模型仍在进行，不超过并发上限）。第一个可解析的结果胜出，其余请求取消。
+    """
+    queue = list(models)
+    inflight: Dict[asyncio.Task, str] = {}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    hedge_at = 0.0
+    hedge_stats["requests"] += 1
+
+    def launch() -> None:
+        nonlocal hedge_at
+        model = queue.pop(0)
+        if inflight:
+            hedge_stats["hedged"] += 1
+            logger.debug(f"check_spams_with_llm hedging with {model}")
+        inflight[asyncio.create_task(_query_model(model, messages, priority))] = model
+        hedge_at = loop.time() + hedge_delay(model)
+
+    try:
+        while queue or inflight:
+            if queue and not inflight:
+                launch()
+            now = loop.time()
+            if now >= deadline:
+                break
+            can_hedge = bool(queue) and len(inflight) < LLM_HEDGE_MAX_INFLIGHT
+            timeout = min(deadline, hedge_at) - now if can_hedge else deadline - now
+            done, _ = await asyncio.wait(inflight, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if can_hedge and loop.time() >= hedge_at:
+                    launch()
+                continue
+            for task in done:
+                model = inflight.pop(task)
+                data = task.result()
+                if data:
+                    if model != models[0]:
+                        hedge_stats["backup_wins"] += 1
+                    return data
+                # 失败的模型不必等到下一个对冲时间点，立即由下一个模型补上
+                if queue and len(inflight) < LLM_HEDGE_MAX_INFLIGHT:
+                    launch()
+        logger.error(f"check_spams_with_llm: no model returned a valid result within {budget}s")
+        return None
+    finally:
+        for task in inflight:
+            task.cancel()
+
+
 async def check_spams_with_llm(
     members: List[Any],
     session=None,
     additional_strings=None,
     now=None,
+    message: Optional[str] = None,
+    priority: int = PRIORITY_SECURITY,
 ) -> List[LLMUserEvaluation]:
-    """members 为具 .user 的对象或 User，兼容 Telethon。返回每个用户的评估结果列表。"""
+    """
+    members 为具 .user 的对象或 User，兼容 Telethon。返回每个用户的评估结果列表。
+
+    message: 成员发送的消息（首句审查），附在每个成员的资料中一并评估。
+    priority: LLM 网关优先级；入群审查为安全级，首句审查由调用方传入审核级。
+    """
     try:
         members_data = []
         for member in members:
@@ -127,6 +311,10 @@ async def check_spams_with_llm(
             if session and hasattr(session, "member_bio") and session.member_bio:
                 member_data["bio"] = session.member_bio
 
+            if message:
+                member_data["message"] = message
+
+            _add_normalized_fields(member_data)
             members_data.append(member_data)
 
         members_str = "\n".join([f"{i + 1}. {json.dumps(member)}" for i, member in enumerate(members_data)])
@@ -140,7 +328,9 @@ async def check_spams_with_llm(
             "3. 80 ~ 100 分（高危 SPAM，is_spam=true）：只有存在确凿恶意证据时才打高分，如：\n"
             "   - Bio 或昵称包含明确的引流广告（如微信号/QQ号/联系方式/Telegram群链接/外链等）；\n"
             "   - 包含博彩/赌博/色情/代开发票/办证/信用卡套现/兼职刷单/暴富等黑产特征词或话术；\n"
-            "   - 明显的批量营销黑产机器人账号。\n\n"
+            "   - 明显的批量营销黑产机器人账号。\n"
+            "4. 带 _normalized 后缀的字段是去除全角、零宽字符、形近字母混淆后的同一内容，以它为准判断；"
+            "刻意使用这类混淆本身也是可疑信号。\n\n"
             "【输出格式要求】：\n"
             "必须输出标准的 JSON 对象，包含 evaluations 数组，严禁输出任何额外说明文本。"
         )
@@ -150,47 +340,8 @@ async def check_spams_with_llm(
 
         messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": members_str}]
 
-        result = None
-        for model in get_spam_models():
-            model_started = monotonic()
-            # 优先尝试 strict json_schema，若代理不支持则回退 json_object
-            for fmt in (SPAM_EVAL_JSON_SCHEMA, {"type": "json_object"}):
-                try:
-                    result = await asyncio.wait_for(
-                        chat_completions(
-                            messages,
-                            model,
-                            max_tokens=LLM_MAX_TOKENS,
-                            temperature=0.0,
-                            response_format=fmt,
-                        ),
-                        timeout=LLM_MODEL_TIMEOUT,
-                    )
-                    if result:
-                        break
-                except asyncio.TimeoutError as e:
-                    logger.error(
-                        f"check_spams_with_llm timeout for model {model} "
-                        f"after {monotonic() - model_started:.2f}s: {e}"
-                    )
-                    break
-                except Exception as e:
-                    logger.debug(f"check_spams_with_llm format {fmt.get('type')} error on {model}: {e}")
-                    continue
-
-            if result:
-                logger.info(
-                    f"check_spams_with_llm model {model} returned "
-                    f"in {monotonic() - model_started:.2f}s"
-                )
-                break
-
-        if not result:
-            return []
-
-        data = _extract_and_parse_json(result)
+        data = await _hedged_query(get_spam_models(), messages, priority=priority)
         if not data:
-            logger.error(f"Failed to parse LLM response as JSON: {str(result)[:300]}")
             return []
 
         eval_list: List[LLMUserEvaluation] = []
@@ -1,19 +1,28 @@
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Any, Union
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any, Union
 import asyncio
 import time
 
 from aiohttp import ClientTimeout, ClientResponse, ClientError, ServerTimeoutError, ClientConnectorError
 from aiohttp.client_exceptions import ClientResponseError, ClientPayloadError, ServerDisconnectedError
-from orjson import dumps, loads
+from orjson import loads
 
 from manager import manager
 
 from .base import count_tokens
+from .gateway import PRIORITY_INTERACTIVE, get_llm_gateway
+from .health import model_health
+from .history import ChatHistory
 
 logger = manager.logger
 
 
+class BadRequestError(ValueError):
+    """上游以 400 拒绝请求（参数或 response_format 不被接受），换模型或重试同样的请求无意义。"""
+
+    pass
+
+
 @dataclass
 class ModelDescription:
     name: str
@@ -55,35 +64,45 @@ SUPPORTED_MODELS = {
 DEFAULT_INPUT_LENGTH = 128000
 
 
+def _proxy_host() -> str:
+    try:
+        return str(manager.config["ai"].get("proxy_host", "")).strip()
+    except Exception:
+        return ""
+
+
+def _split_models(raw: str) -> list[str]:
+    return [p.strip() for p in raw.replace(",", ";").split(";") if p.strip()]
+
+
 def get_ai_chat_model() -> str:
     """从 [ai] chat_model 读取 /chat 使用的模型名；未配置时回退 DEFAULT_MODEL。
-    支持任意后端支持的模型标识符（不限于 SUPPORTED_MODELS 的 keys）。"""
+    支持任意后端支持的模型标识符（不限于 SUPPORTED_MODELS 的 keys）。
+    配置多个模型（; 或 , 分隔）时按健康度选择，首选模型熔断期间自动换用后备模型。"""
     try:
         config = manager.config
         if config and config.has_section("ai"):
-            m = str(config["ai"].get("chat_model", "")).strip()
-            if m:
-                return m
+            parts = _split_models(str(config["ai"].get("chat_model", "")))
+            if parts:
+                return model_health.order(_proxy_host(), parts)[0]
     except Exception:
         pass
     return DEFAULT_MODEL
 
 
 def get_spam_models() -> list[str]:
-    """从 [ai] spam_models 读取入群 LLM 检测模型列表；支持 ; 或 , 分隔。"""
+    """从 [ai] spam_models 读取入群 LLM 检测模型列表；支持 ; 或 , 分隔。按健康度重新排序，熔断中的模型排在最后。"""
     try:
         config = manager.config
         if config and config.has_section("ai"):
-            raw = str(config["ai"].get("spam_models", "")).strip()
-            if raw:
-                parts = [p.strip() for p in raw.replace(",", ";").split(";") if p.strip()]
-                if parts:
-                    return parts
+            parts = _split_models(str(config["ai"].get("spam_models", "")))
+            if parts:
+                return model_health.order(_proxy_host(), parts)
     except Exception:
         pass
     # 默认使用的模型列表，按优先级顺序排列
     logger.info("Using default spam models")
-    return ["gemini-3.1-flash-lite", "gemma-4-31b-it"]
+    return model_health.order(_proxy_host(), ["gemini-3.1-flash-lite", "gemma-4-31b-it"])
 
 
 def get_image_optimize_models() -> list[str]:
@@ -101,12 +120,27 @@ def get_image_optimize_models() -> list[str]:
     return ["deepseek-r1", "gemini-flash"]
 
 
-async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict[str, Any]:
+def _retry_after(response: ClientResponse) -> Optional[float]:
+    """解析 429 响应的 Retry-After（秒数形式），无法解析时返回 None。"""
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _api_request(
+    url: str,
+    data: Dict[str, Any],
+    proxy_token: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    user_id: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     发送API请求到LLM提供商并处理常见错误情况
     包含重试机制和详细的错误处理
+    每次尝试都经 LLM 网关按 priority / user_id 排队占用并发名额（重试等待期间不占用）
     """
-    session = await manager.create_session()
+    session = await manager.create_session("llm")
 
     # 根据模型类型设置不同的超时时间
     model_name = data.get("model", DEFAULT_MODEL)
@@ -129,104 +163,130 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
     
     # 可重试的HTTP状态码
     retryable_status_codes = {502, 503, 504, 429}
-    
+
+    def can_retry(attempt: int) -> bool:
+        # 模型已熔断或被限流时不再重试，交给调用方换模型
+        return attempt < max_retries - 1 and model_health.available(url, model_name)
+
+    if not model_health.acquire(url, model_name):
+        logger.warning(f"model circuit open, skipped | model={model_name}")
+        raise ValueError("AI服务暂时不可用，请稍后重试")
+
     for attempt in range(max_retries):
         try:
             start_time = time.time()
-            
-            async with session.post(
+            backoff = None  # 本次尝试需要重试时的退避时间，在离开网关名额与连接后再等待
+
+            async with get_llm_gateway().slot(priority, user_id) as queued, session.post(
                 url,
                 json=data,
                 headers={"Authorization": f"Bearer {proxy_token}"},
                 timeout=timeout_config,
             ) as response:
-                
-                request_time = time.time() - start_time
+
+                request_time = time.time() - start_time - queued
                 
                 # 记录请求信息
                 logger.info(f"API request | model={model_name} status={response.status} "
-                           f"elapsed={request_time:.2f}s attempt={attempt + 1}/{max_retries}")
+                           f"elapsed={request_time:.2f}s queued={queued:.2f}s attempt={attempt + 1}/{max_retries}")
                 
                 # 处理不同的HTTP状态码
                 if response.status == 200:
                     try:
                         response_data = await response.json()
-                        
-                        # 检查响应中的错误
-                        if "error" in response_data:
-                            error_info = response_data["error"]
-                            error_code = error_info.get("code", "unknown")
-                            error_message = error_info.get("message", "Unknown error")
-                            
-                            logger.error(f"API response error | model={model_name} "
-                                       f"code={error_code} message={error_message}")
-                            
-                            # 根据错误代码决定是否重试
-                            if error_code in ["rate_limit_exceeded", "server_error"] and attempt < max_retries - 1:
-                                await asyncio.sleep(retry_delay * (2 ** attempt))
-                                continue
-                                
-                            raise ValueError(f"AI服务返回错误: {error_message}")
-                        
-                        return response_data
-                        
                     except Exception as json_error:
                         logger.error(f"failed to parse response JSON | model={model_name} error={str(json_error)}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(retry_delay * (2 ** attempt))
-                            continue
-                        raise ValueError("响应格式错误，请稍后重试")
-                
+                        model_health.record_failure(url, model_name, "invalid json")
+                        if not can_retry(attempt):
+                            raise ValueError("响应格式错误，请稍后重试")
+                        response_data = {}
+                        backoff = retry_delay * (2 ** attempt)
+
+                    # 检查响应中的错误
+                    if backoff is not None:
+                        pass  # JSON 解析失败，退避后重试
+                    elif "error" in response_data:
+                        error_info = response_data["error"]
+                        error_code = error_info.get("code", "unknown")
+                        error_message = error_info.get("message", "Unknown error")
+
+                        logger.error(f"API response error | model={model_name} "
+                                   f"code={error_code} message={error_message}")
+
+                        # 根据错误代码决定是否重试
+                        if error_code == "rate_limit_exceeded":
+                            model_health.record_rate_limit(url, model_name)
+                        elif error_code == "server_error":
+                            model_health.record_failure(url, model_name, f"server_error: {error_message}")
+                        else:
+                            model_health.release(url, model_name)
+                        if error_code not in ["rate_limit_exceeded", "server_error"] or not can_retry(attempt):
+                            raise ValueError(f"AI服务返回错误: {error_message}")
+                        backoff = retry_delay * (2 ** attempt)
+
+                    else:
+                        model_health.record_success(url, model_name, request_time)
+                        return response_data
+
                 # 处理特定的HTTP错误状态码
                 elif response.status == 400:
                     error_text = await response.text()
                     logger.error(f"bad request | model={model_name} status=400 detail={error_text}")
-                    raise ValueError("请求参数错误，请检查输入内容")
+                    model_health.release(url, model_name)
+                    raise BadRequestError("请求参数错误，请检查输入内容")
                 
                 elif response.status == 401:
                     logger.error(f"auth failed | model={model_name} status=401")
+                    model_health.release(url, model_name)
                     raise ValueError("AI服务认证失败，请检查配置")
                 
                 elif response.status == 403:
                     logger.error(f"forbidden | model={model_name} status=403")
+                    model_health.release(url, model_name)
                     raise ValueError("无权访问AI服务，请检查权限配置")
                 
                 elif response.status == 429:
                     error_text = await response.text()
                     logger.warning(f"rate limited | model={model_name} status=429 attempt={attempt + 1}")
+                    model_health.record_rate_limit(url, model_name, _retry_after(response))
                     
-                    if attempt < max_retries - 1:
-                        # 对于429错误，使用更长的重试延迟
-                        retry_wait = retry_delay * (3 ** attempt)
-                        logger.info(f"retrying after {retry_wait}s...")
-                        await asyncio.sleep(retry_wait)
-                        continue
-                    
-                    raise ValueError("请求过于频繁，请稍后重试")
+                    if not can_retry(attempt):
+                        raise ValueError("请求过于频繁，请稍后重试")
+                    # 对于429错误，使用更长的重试延迟
+                    backoff = retry_delay * (3 ** attempt)
+                    logger.info(f"retrying after {backoff}s...")
                 
                 elif response.status in retryable_status_codes:
                     error_text = await response.text()
                     logger.warning(f"server error | model={model_name} status={response.status} "
                                  f"attempt={attempt + 1} detail={error_text}")
-                    
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    
-                    raise ValueError(f"AI服务暂时不可用 ({response.status})，请稍后重试")
+                    model_health.record_failure(url, model_name, f"status {response.status}")
+
+                    if not can_retry(attempt):
+                        raise ValueError(f"AI服务暂时不可用 ({response.status})，请稍后重试")
+                    backoff = retry_delay * (2 ** attempt)
                 
                 else:
                     # 其他HTTP错误
                     error_text = await response.text()
                     logger.error(f"HTTP error | model={model_name} status={response.status} "
                                f"detail={error_text}")
+                    if response.status >= 500:
+                        model_health.record_failure(url, model_name, f"status {response.status}")
+                    else:
+                        model_health.release(url, model_name)
                     raise ValueError(f"服务器错误 ({response.status})，请稍后重试")
-        
+
+            # 已离开 with：网关名额与连接均已释放，退避期间不占用
+            await asyncio.sleep(backoff)
+            continue
+
         # 处理网络异常
         except ClientConnectorError as e:
             logger.error(f"connection error | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "connection error")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -234,8 +294,9 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
         
         except ServerTimeoutError as e:
             logger.error(f"server timeout | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "server timeout")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -243,8 +304,9 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
         
         except asyncio.TimeoutError as e:
             logger.error(f"request timeout | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "request timeout")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -252,8 +314,9 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
         
         except ClientPayloadError as e:
             logger.error(f"payload error | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "payload error")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -261,8 +324,9 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
         
         except ServerDisconnectedError as e:
             logger.error(f"server disconnected | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "server disconnected")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -270,8 +334,9 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
         
         except ClientError as e:
             logger.error(f"client error | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "client error")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -279,8 +344,9 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
     
         except RuntimeError as e:
             logger.error(f"runtime error | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, "runtime error")
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -289,11 +355,17 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
         except ValueError:
             # ValueError是我们自定义的错误，不需要重试
             raise
-        
+
+        except asyncio.CancelledError:
+            # 被调用方取消（如对冲请求中落败）不算模型失败，但要释放半开探测名额
+            model_health.release(url, model_name)
+            raise
+
         except Exception as e:
             logger.exception(f"unexpected error | model={model_name} attempt={attempt + 1} error={str(e)}")
+            model_health.record_failure(url, model_name, type(e).__name__)
             
-            if attempt < max_retries - 1:
+            if can_retry(attempt):
                 await asyncio.sleep(retry_delay * (2 ** attempt))
                 continue
             
@@ -303,7 +375,120 @@ async def _api_request(url: str, data: Dict[str, Any], proxy_token: str) -> Dict
     raise ValueError("所有重试都失败了，请稍后重试")
 
 
-async def tg_generate_text(chat_id: int, member_id: int, prompt: str) -> Optional[str]:
+async def _iter_sse(response: ClientResponse) -> AsyncIterator[str]:
+    """按 SSE 规范逐个产出事件的 data 字段（多行 data 以换行拼接，忽略注释与其他字段）。"""
+    data_lines: List[str] = []
+    async for raw in response.content:
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        if not line:
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            data_lines.append(value[1:] if value.startswith(" ") else value)
+    if data_lines:
+        yield "\n".join(data_lines)
+
+
+def _delta_text(chunk: Dict[str, Any]) -> str:
+    """流式分片中 choices[0].delta.content 的文本（content 可能是分段列表）。"""
+    try:
+        content = chunk["choices"][0].get("delta", {}).get("content")
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
+    if isinstance(content, list):
+        return "".join(str(part.get("text", "")) if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+async def _api_stream(
+    url: str,
+    data: Dict[str, Any],
+    proxy_token: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    user_id: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """
+    流式请求（stream=True），逐段产出模型输出的文本。
+    不做重试：已经输出的内容无法撤回，失败时抛出 ValueError 由调用方处理。
+    整个流期间占用一个网关名额；首个分片的到达时间记入模型健康度。
+    """
+    session = await manager.create_session("llm")
+    model_name = data.get("model", DEFAULT_MODEL)
+    data = {**data, "stream": True}
+    timeout_config = ClientTimeout(total=180, connect=15, sock_read=60, sock_connect=20)
+
+    if not model_health.acquire(url, model_name):
+        logger.warning(f"model circuit open, skipped | model={model_name}")
+        raise ValueError("AI服务暂时不可用，请稍后重试")
+
+    first_chunk = True
+    try:
+        async with get_llm_gateway().slot(priority, user_id) as queued, session.post(
+            url,
+            json=data,
+            headers={"Authorization": f"Bearer {proxy_token}", "Accept": "text/event-stream"},
+            timeout=timeout_config,
+        ) as response:
+            start_time = time.time()
+            logger.info(f"API stream | model={model_name} status={response.status} queued={queued:.2f}s")
+            if response.status == 429:
+                model_health.record_rate_limit(url, model_name, _retry_after(response))
+                raise ValueError("请求过于频繁，请稍后重试")
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"stream HTTP error | model={model_name} status={response.status} detail={error_text}")
+                if response.status >= 500:
+                    model_health.record_failure(url, model_name, f"status {response.status}")
+                else:
+                    model_health.release(url, model_name)
+                raise ValueError(f"服务器错误 ({response.status})，请稍后重试")
+
+            async for event in _iter_sse(response):
+                if event.strip() == "[DONE]":
+                    break
+                try:
+                    chunk = loads(event)
+                except Exception:
+                    logger.warning(f"unparsable stream chunk | model={model_name} data={event[:200]}")
+                    continue
+                if isinstance(chunk, dict) and "error" in chunk:
+                    message = (chunk["error"] or {}).get("message", "Unknown error")
+                    model_health.record_failure(url, model_name, f"stream error: {message}")
+                    raise ValueError(f"AI服务返回错误: {message}")
+                text = _delta_text(chunk)
+                if not text:
+                    continue
+                if first_chunk:
+                    first_chunk = False
+                    model_health.record_success(url, model_name, time.time() - start_time)
+                yield text
+    except ValueError:
+        raise
+    except (ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"stream error | model={model_name} error={e!r}")
+        model_health.record_failure(url, model_name, type(e).__name__)
+        raise ValueError("网络请求失败，请稍后重试")
+    finally:
+        # 没有产生健康信号时（如被取消、空响应）释放半开探测名额
+        if first_chunk:
+            model_health.release(url, model_name)
+
+
+async def tg_generate_text(
+    chat_id: int,
+    member_id: int,
+    prompt: str,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Optional[str]:
+    """
+    /chat 生成回复。on_delta 不为空时使用流式请求，每收到一段文本就回调一次（用于渐进编辑消息）；
+    最终都返回完整回复（附 Powered by）。
+    """
     config = manager.config
 
     host = config["ai"]["proxy_host"]
@@ -332,28 +517,19 @@ async def tg_generate_text(chat_id: int, member_id: int, prompt: str) -> Optiona
         display_name = model_name
         logger.info(f"chat_model '{model_name}' not listed in SUPPORTED_MODELS, using default input length {DEFAULT_INPUT_LENGTH} and raw name for display")
 
+    history = None
+    prompt_tokens = 0
     rdb = await manager.get_redis()
     if rdb:
         # No global "disabled", no per-user settings/model/prompt (simplified).
         truncate_input = min(model_input_length * 0.99, model_input_length - 1024)
 
         # Load previous conversation history (per-user, 30min TTL).
-        prev_chat_history = await rdb.get(f"chat:history:{member_id}")
-        if prev_chat_history:
-            prev_chat_history = loads(prev_chat_history)
-            # Drop any leading system message from previous saves to avoid duplicate systems
-            # (we will re-insert the current BASIC_SYSTEM_PROMPT).
-            if prev_chat_history and prev_chat_history[0].get("role") == "system":
-                prev_chat_history = prev_chat_history[1:]
-            chat_history = [*prev_chat_history, *chat_history]
-
-            # Limit by tokens and drop oldest excess (reuse original truncation logic).
-            tokens = 0
-            for i, msg in enumerate(chat_history):
-                tokens += count_tokens(msg["content"])
-                if tokens > truncate_input:
-                    chat_history = chat_history[0 : i - 1]
-                    break
+        # 历史消息带缓存的 token 数，只对本轮输入计数；超出预算时丢弃最早的消息。
+        prompt_tokens = count_tokens(prompt)
+        history = await ChatHistory.load(rdb, member_id)
+        history.fit(truncate_input, prompt_tokens)
+        chat_history = [*history.as_messages(), *chat_history]
 
     # Insert the basic system prompt (always present for the basic feature).
     if prompt_system:
@@ -371,20 +547,47 @@ async def tg_generate_text(chat_id: int, member_id: int, prompt: str) -> Optiona
     logger.info(f"chat {chat_id} user {member_id} generating text with model {model_name} ({display_name})")
 
     try:
-        response_data = await _api_request(url, data, proxy_token)
-        text = response_data["choices"][0]["message"]["content"]
-
-        if rdb:
-            # Save full history (incl. system) back with the 30min TTL.
-            chat_history.append({"role": "assistant", "content": text})
-            await rdb.set(f"chat:history:{member_id}", dumps(chat_history), ex=CONVERSATION_TTL)
+        if on_delta is None:
+            response_data = await _api_request(url, data, proxy_token, PRIORITY_INTERACTIVE, member_id)
+            text = response_data["choices"][0]["message"]["content"]
+        else:
+            parts = []
+            async for delta in _api_stream(url, data, proxy_token, PRIORITY_INTERACTIVE, member_id):
+                parts.append(delta)
+                await on_delta(delta)
+            text = "".join(parts)
+            if not text:
+                raise ValueError("AI服务没有返回内容，请稍后重试")
+
+        if history is not None:
+            # Append this turn (system prompt is not stored) and refresh the 30min TTL.
+            await history.append(
+                rdb,
+                [("user", prompt, prompt_tokens), ("assistant", text, count_tokens(text))],
+                CONVERSATION_TTL,
+            )
 
         return text + f"\n\nPowered by **{display_name}**"
     except ValueError as e:
         return str(e)
 
 
-async def chat_completions(messages: List[Dict[str, Any]], model_name: Optional[str] = None, **kwargs) -> Optional[str]:
+async def chat_completions(
+    messages: List[Dict[str, Any]],
+    model_name: Optional[str] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    user_id: Optional[int] = None,
+    cacheable: bool = False,
+    cache_accept: Optional[Callable[[str], bool]] = None,
+    **kwargs,
+) -> Optional[str]:
+    """
+    单次补全，返回文本。
+
+    cacheable=True 时按 (模型, 消息, 参数) 缓存结果，只应用于输入相同即可复用结果的调用
+    （如提示词优化）；安全审查等判定类调用不缓存，temperature=0 也不会自动缓存。
+    cache_accept 返回 False 的结果（如无法解析的输出）不写入缓存。
+    """
     config = manager.config
 
     host = config["ai"]["proxy_host"]
@@ -405,7 +608,21 @@ async def chat_completions(messages: List[Dict[str, Any]], model_name: Optional[
         **kwargs,
     }
 
-    response_data = await _api_request(url, data, proxy_token)
+    if not cacheable:
+        return await _complete(url, data, proxy_token, priority, user_id)
+
+    cache = manager.get_response_cache()
+    key = cache.make_key("chat", {"model": model_name, "messages": messages, "params": kwargs})
+    return await cache.get_or_compute(
+        key, lambda: _complete(url, data, proxy_token, priority, user_id), accept=cache_accept
+    )
+
+
+async def _complete(
+    url: str, data: Dict[str, Any], proxy_token: str, priority: int, user_id: Optional[int]
+) -> Optional[str]:
+    model_name = data["model"]
+    response_data = await _api_request(url, data, proxy_token, priority, user_id)
     logger.debug(f"text generated with model {model_name}")
     try:
         content = response_data["choices"][0]["message"].get("content", "")
@@ -44,6 +44,8 @@ from manager import manager
 from handlers import *  # Import handlers to register them
 from handlers.commands.image import worker as txt2img_worker
 from handlers.member_captcha.events import new_member_check, unban_member, safety_timeout_check, first_msg_timeout
+from handlers.member_captcha.image_captcha import close_image_pool
+from utils.first_msg_classifier import SQL_CREATE_FIRST_MSG_VERDICTS
 
 logger = manager.logger
 
@@ -208,30 +210,6 @@ async def worker_loop():
         processed += await lazy_sessions()
         await asyncio.sleep(0.25 if processed else 1.0)
 
-async def startup_cleanup():
-    """启动时清理可能残留的 Redis 数据。"""
-    try:
-        rdb = await manager.get_redis()
-        if not rdb:
-            return
-
-        cursor = 0
-        total = 0
-        while True:
-            cursor, keys = await rdb.scan(cursor, match="captcha_cb_map:*", count=100)
-            if keys:
-                await rdb.delete(*keys)
-                total += len(keys)
-            if cursor == 0:
-                break
-        if total:
-            logger.warning(f"启动清理：已清除 {total} 个残留 callback_map（重启导致失效）")
-        else:
-            logger.debug("启动清理：无残留 callback_map")
-    except Exception as e:
-        logger.warning(f"启动清理 Redis 残留数据失败（已忽略，继续启动）: {e}")
-
-
 async def main():
     config_path = os.environ.get("GOALKEEPR_CONFIG")
     manager.setup(config_path=config_path)
@@ -239,9 +217,7 @@ async def main():
     # Initialize database tables
     await database.execute(SQL_CREATE_MESSAGES)
     await database.execute(SQL_CREATE_NEW_MEMBER_SESSION)
-
-    # Cleanup stale Redis data from previous run
-    await startup_cleanup()
+    await database.execute(SQL_CREATE_FIRST_MSG_VERDICTS)
 
     logger.info("主进程开始运行")
     try:
@@ -257,6 +233,7 @@ async def main():
         logger.error(f"主进程断开连接时发生错误: {e}")
 
     await manager.stop()
+    close_image_pool()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+群管理员名单缓存
+Chat admin roster cache
+
+每个群只用一次 get_participants(filter=ChannelParticipantsAdmins) 拉取管理员名单，
+之后 is_admin 为内存中的集合查找。
+名单在 TTL 到期或收到管理员变更更新（UpdateChannelParticipant /
+UpdateChatParticipantAdmin / UpdateChatParticipants）时失效，下次查询重新拉取。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional
+
+import loguru
+from telethon.tl import types
+
+from .cache import LRUCache, MISSING
+
+logger = loguru.logger
+
+ADMIN_ROSTER_TTL = 60 * 10  # 名单最长缓存 10 分钟
+ADMIN_ROSTER_MAXSIZE = 5000  # 最多缓存的群数量
+ADMIN_ROSTER_FAILURE_TTL = 30  # 加载失败（如机器人不是管理员）负缓存 30 秒
+
+_ADMIN_PARTICIPANTS = (
+    types.ChannelParticipantAdmin,
+    types.ChannelParticipantCreator,
+    types.ChatParticipantAdmin,
+    types.ChatParticipantCreator,
+)
+
+
+def is_admin_participant(participant: Any) -> bool:
+    return isinstance(participant, _ADMIN_PARTICIPANTS)
+
+
+class AdminRoster:
+    """
+    按群缓存管理员 id 集合。
+
+    load 为协程函数 load(chat_id) -> 可迭代的 user id；抛出异常时按较短的 failure_ttl 负缓存，
+    期间同一群的查询直接抛出该异常，不再重复请求。同一群的并发加载合并为一次请求。
+    """
+
+    def __init__(
+        self,
+        load: Callable[[int], Awaitable[Any]],
+        *,
+        ttl: int = ADMIN_ROSTER_TTL,
+        maxsize: int = ADMIN_ROSTER_MAXSIZE,
+        failure_ttl: int = ADMIN_ROSTER_FAILURE_TTL,
+    ):
+        self._load = load
+        self._rosters = LRUCache(maxsize, ttl)
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.failure_ttl = failure_ttl
+        self.loads = 0
+        self.load_errors = 0
+        self.invalidations = 0
+
+    async def get(self, chat_id: int) -> FrozenSet[int]:
+        """返回群管理员 id 集合；加载失败时抛出异常。"""
+        roster = self._rosters.get(chat_id)
+        if isinstance(roster, Exception):
+            raise roster
+        if roster is not MISSING:
+            return roster
+
+        inflight = self._inflight.get(chat_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[chat_id] = future
+        try:
+            self.loads += 1
+            roster = frozenset(await self._load(chat_id))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.load_errors += 1
+            if self._inflight.get(chat_id) is future:
+                self._rosters.set(chat_id, e, self.failure_ttl)
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            # 加载期间收到变更更新时，本次结果可能已过时，不写入缓存
+            if self._inflight.get(chat_id) is future:
+                self._rosters.set(chat_id, roster)
+            future.set_result(roster)
+            return roster
+        finally:
+            if self._inflight.get(chat_id) is future:
+                del self._inflight[chat_id]
+
+    async def is_admin(self, chat_id: int, user_id: int) -> bool:
+        return user_id in await self.get(chat_id)
+
+    def invalidate(self, chat_id: int) -> None:
+        self.invalidations += 1
+        self._rosters.delete(chat_id)
+        self._inflight.pop(chat_id, None)
+
+    def on_update(self, update: Any) -> Optional[int]:
+        """
+        处理管理员变更相关的原始更新，返回被失效的群 id（无关更新返回 None）。
+
+        普通成员进出群的 UpdateChannelParticipant 不影响名单，直接忽略。
+        """
+        if isinstance(update, types.UpdateChannelParticipant):
+            if not (
+                is_admin_participant(update.prev_participant)
+                or is_admin_participant(update.new_participant)
+            ):
+                return None
+            chat_id = int(f"-100{update.channel_id}")
+        elif isinstance(update, (types.UpdateChatParticipantAdmin, types.UpdateChatParticipants)):
+            chat_id = -int(getattr(update, "chat_id", None) or update.participants.chat_id)
+        else:
+            return None
+
+        self.invalidate(chat_id)
+        logger.debug(f"admin roster invalidated chat={chat_id} by {type(update).__name__}")
+        return chat_id
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._rosters.stats()
+        stats.update(loads=self.loads, load_errors=self.load_errors, invalidations=self.invalidations)
+        return stats
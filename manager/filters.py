@@ -0,0 +1,141 @@
+"""
+分发前过滤
+Entity-free pre-dispatch filters
+
+在 Telethon 调用 handler 之前，只用更新中的原始字段（peer 类型、chat id、发送者 id、
+文本 / callback data 前缀）拒绝无关更新，避免 handler 开头的 get_chat / get_sender
+为私聊、频道等无关流量触发实体查询。
+
+PreFilter 作为事件构造器的 func 参数使用（Telethon 在 handler 前同步调用）。
+同一更新的同类事件对象由 Telethon 在所有 handler 之间共享，
+第一次 get_chat / get_sender 的结果缓存在事件上，后续 handler 不再重复解析。
+"""
+
+import inspect
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from telethon.tl import types
+
+PEER_PRIVATE = "private"
+PEER_GROUP = "group"  # 普通群与超级群
+PEER_CHANNEL = "channel"
+
+
+def raw_peer(event: Any) -> Any:
+    """更新中的会话 peer（不解析实体）。"""
+    message = getattr(event, "message", None)
+    peer = getattr(message, "peer_id", None)
+    if peer is None:
+        peer = getattr(getattr(event, "query", None), "peer", None)
+    return peer
+
+
+def peer_kind(event: Any) -> Optional[str]:
+    """
+    private / group / channel；无法判断返回 None。
+
+    频道消息带 post 标记；回调查询没有该标记时，用更新自带的实体（无网络请求）区分。
+    """
+    peer = raw_peer(event)
+    if isinstance(peer, types.PeerUser):
+        return PEER_PRIVATE
+    if isinstance(peer, types.PeerChat):
+        return PEER_GROUP
+    if isinstance(peer, types.PeerChannel):
+        if getattr(getattr(event, "message", None), "post", False):
+            return PEER_CHANNEL
+        chat = getattr(event, "_chat", None)
+        if chat is not None and getattr(chat, "broadcast", False):
+            return PEER_CHANNEL
+        return PEER_GROUP
+    return None
+
+
+def entity_chat_id(event: Any) -> Optional[int]:
+    """
+    群实体 id（与 chat.id 一致，超级群为裸 id），只读原始字段；私聊 / 频道返回 None。
+
+    没有原始 peer 时（测试或合成事件）回退到 event.chat_id。
+    """
+    peer = raw_peer(event)
+    if isinstance(peer, types.PeerChannel):
+        return None if peer_kind(event) == PEER_CHANNEL else peer.channel_id
+    if isinstance(peer, types.PeerChat):
+        return peer.chat_id
+    if peer is not None:
+        return None
+    return getattr(event, "chat_id", None)
+
+
+def _raw_text(event: Any) -> Union[str, bytes, None]:
+    data = getattr(event, "data", None)
+    if data is not None:
+        return data
+    message = getattr(event, "message", None)
+    return getattr(message, "message", None)
+
+
+class PreFilter:
+    """
+    由 register(peer=..., prefix=...) 生成的过滤器。
+
+    peer: 允许的会话类型（PEER_*）；prefix: 文本或 callback data 前缀（不区分大小写）。
+    另可组合调用方原有的 func（同步或异步；原始字段检查总是先执行）。
+    """
+
+    __slots__ = ("name", "peers", "prefixes", "func", "passed", "rejected")
+
+    def __init__(
+        self,
+        name: str,
+        peer: Optional[Iterable[str]] = None,
+        prefix: Union[str, bytes, Iterable[Union[str, bytes]], None] = None,
+        func: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.name = name
+        self.peers = frozenset(peer) if peer else None
+        if isinstance(prefix, (str, bytes)):
+            prefix = (prefix,)
+        self.prefixes: Optional[Tuple[Union[str, bytes], ...]] = (
+            tuple(p.lower() for p in prefix) if prefix else None
+        )
+        self.func = func
+        self.passed = 0
+        self.rejected = 0
+
+    def _match_prefix(self, text: Union[str, bytes, None]) -> bool:
+        if not text:
+            return False
+        for p in self.prefixes:
+            if isinstance(text, bytes) != isinstance(p, bytes):
+                p = p.decode() if isinstance(p, bytes) else p.encode()
+            if text[: len(p)].lower() == p:
+                return True
+        return False
+
+    def __call__(self, event: Any) -> Any:
+        if self.peers is not None and peer_kind(event) not in self.peers:
+            self.rejected += 1
+            return False
+        if self.prefixes is not None and not self._match_prefix(_raw_text(event)):
+            self.rejected += 1
+            return False
+        if self.func is not None:
+            result = self.func(event)
+            if inspect.isawaitable(result):
+                return self._finish(result)
+            if not result:
+                self.rejected += 1
+                return False
+        self.passed += 1
+        return True
+
+    async def _finish(self, pending: Any) -> bool:
+        if not await pending:
+            self.rejected += 1
+            return False
+        self.passed += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"passed": self.passed, "rejected": self.rejected}
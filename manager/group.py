@@ -14,6 +14,7 @@ SETTINGS_DEFAULT_VALUE = {
 
 NEW_MEMBER_CHECK_METHODS = {
     "ban":            "认证剔除",
+    "image":          "图片验证",
     "silence":        "手动解封",
     "none":           "无作为",
     "sleep_1week":    "静默1周",
@@ -75,11 +76,26 @@ def chat_peer_id(chat: Any) -> int:
         return int(getattr(chat, "id", chat))
 
 
-async def resolve_chat_entity(client: Any, chat_id: int):
+async def resolve_chat_entity(client: Any, chat_id: int, peers: Any = None):
     """
     解析群实体。裸 channel id 若直接 get_entity 会被当成 User peer，
     因此按候选 id 与 PeerChannel/PeerChat 依次尝试。
+
+    传入 peers（manager.peers.ChatPeerCache）时先查缓存，命中直接返回 input peer；
+    通过 API 解析成功后写回缓存。
     """
+    if peers is not None:
+        peer = await peers.get(settings_chat_id_candidates(chat_id))
+        if peer is not None:
+            return peer
+
+    entity = await _resolve_chat_entity(client, chat_id)
+    if peers is not None:
+        await peers.remember(entity)
+    return entity
+
+
+async def _resolve_chat_entity(client: Any, chat_id: int):
     from telethon.tl import types
 
     errors: list[str] = []
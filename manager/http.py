@@ -0,0 +1,212 @@
+"""
+按目标划分的 HTTP 连接池
+Named aiohttp client profiles with separate connectors
+
+所有出站 HTTP 请求原先共用一个 ClientSession，慢的 ComfyUI 轮询或 t.me 抓取会占住连接，
+入群安全检查的 LLM 请求只能排队。现在按目标划分为独立的 session / connector：
+
+  - default   其他请求（短链接等）
+  - llm       AI 代理（入群检查、/chat、提示词优化）
+  - telegram  Bot API（sendRichMessage、banChatMember 等）
+  - media     ComfyUI / SD / ASR 等长耗时请求
+  - scrape    t.me 页面抓取
+
+每个 profile 有自己的总连接数、单 host 连接数、keep-alive、DNS 缓存时间、默认超时与代理，
+可在 [http.<name>] 中覆盖。session 首次使用时创建，Manager.stop 时关闭。
+统计每个池等待响应头的请求数、占用中的响应数（读取响应体直到释放）、排队等待连接的次数与时间，
+在 /system_usage 中展示。
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Dict, Optional
+
+import aiohttp
+import loguru
+
+logger = loguru.logger
+
+DEFAULT_PROFILE = "default"
+
+
+@dataclass
+class HTTPProfile:
+    limit: int = 100
+    limit_per_host: int = 0  # 0 为不限
+    keepalive_timeout: float = 15.0
+    ttl_dns_cache: int = 300
+    total_timeout: Optional[float] = 30.0
+    connect_timeout: Optional[float] = None
+    proxy: Optional[str] = None
+
+
+PROFILES: Dict[str, HTTPProfile] = {
+    "default": HTTPProfile(),
+    "llm": HTTPProfile(limit=32, limit_per_host=16, keepalive_timeout=60.0, total_timeout=120.0, connect_timeout=15.0),
+    "telegram": HTTPProfile(limit=16, limit_per_host=16, keepalive_timeout=60.0, total_timeout=30.0, connect_timeout=10.0),
+    "media": HTTPProfile(limit=8, limit_per_host=4, total_timeout=300.0, connect_timeout=15.0),
+    "scrape": HTTPProfile(limit=8, limit_per_host=4, keepalive_timeout=30.0, total_timeout=15.0, connect_timeout=10.0),
+}
+
+
+def load_profiles(config: Any) -> Dict[str, HTTPProfile]:
+    """内置 profile 加上 [http.<name>] 中的覆盖项（也可以定义新的 profile）。"""
+    profiles = {name: dataclasses.replace(p) for name, p in PROFILES.items()}
+    if config is None:
+        return profiles
+
+    for section in config.sections():
+        if not section.startswith("http."):
+            continue
+        name = section[len("http.") :]
+        profile = profiles.setdefault(name, HTTPProfile())
+        for field in dataclasses.fields(HTTPProfile):
+            raw = config[section].get(field.name)
+            if raw is None or raw.strip() == "":
+                continue
+            try:
+                if field.name == "proxy":
+                    value = raw.strip()
+                elif field.name in ("limit", "limit_per_host", "ttl_dns_cache"):
+                    value = int(raw)
+                else:
+                    value = float(raw)
+            except ValueError:
+                logger.warning(f"invalid http profile value [{section}] {field.name}={raw}, ignored")
+                continue
+            setattr(profile, field.name, value)
+    return profiles
+
+
+class HTTPPools:
+    """按 profile 名称惰性创建 ClientSession；未知名称使用 default。"""
+
+    def __init__(self, profiles: Dict[str, HTTPProfile]):
+        self.profiles = profiles
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    def _metrics_for(self, name: str) -> Dict[str, Any]:
+        metrics = self._metrics.get(name)
+        if metrics is None:
+            metrics = {
+                "requests": 0,
+                "awaiting_headers": 0,
+                "in_use": 0,
+                "queued": 0,
+                "waits": 0,
+                "wait_total": 0.0,
+                "wait_max": 0.0,
+            }
+            self._metrics[name] = metrics
+        return metrics
+
+    def _trace_config(self, name: str) -> aiohttp.TraceConfig:
+        """awaiting_headers 在收到响应头或出错时减少；queued / wait 为等待连接池空位的情况。"""
+        metrics = self._metrics_for(name)
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            metrics["requests"] += 1
+            metrics["awaiting_headers"] += 1
+
+        async def on_request_done(session, ctx, params):
+            metrics["awaiting_headers"] -= 1
+
+        async def on_queued_start(session, ctx, params):
+            metrics["queued"] += 1
+            ctx.queued_at = monotonic()
+
+        async def on_queued_end(session, ctx, params):
+            metrics["queued"] -= 1
+            waited = monotonic() - getattr(ctx, "queued_at", monotonic())
+            metrics["waits"] += 1
+            metrics["wait_total"] += waited
+            metrics["wait_max"] = max(metrics["wait_max"], waited)
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_done)
+        trace.on_request_exception.append(on_request_done)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        return trace
+
+    def _response_class(self, name: str) -> type:
+        """响应对象从创建到读完响应体 / 释放 / 关闭之间计入 in_use（流式响应可能持续很久）。"""
+        metrics = self._metrics_for(name)
+
+        class TrackedResponse(aiohttp.ClientResponse):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self._in_use = True
+                metrics["in_use"] += 1
+
+            def _done(self) -> None:
+                if getattr(self, "_in_use", False):
+                    self._in_use = False
+                    metrics["in_use"] -= 1
+
+            def _response_eof(self) -> None:
+                super()._response_eof()
+                if self._closed:
+                    self._done()
+
+            def close(self) -> None:
+                super().close()
+                self._done()
+
+            def release(self) -> Any:
+                result = super().release()
+                self._done()
+                return result
+
+        return TrackedResponse
+
+    def session(self, name: str = DEFAULT_PROFILE) -> aiohttp.ClientSession:
+        if name not in self.profiles:
+            logger.warning(f"unknown http profile {name}, using {DEFAULT_PROFILE}")
+            name = DEFAULT_PROFILE
+
+        session = self._sessions.get(name)
+        if session is not None and not session.closed:
+            return session
+
+        profile = self.profiles[name]
+        connector = aiohttp.TCPConnector(
+            limit=profile.limit,
+            limit_per_host=profile.limit_per_host,
+            keepalive_timeout=profile.keepalive_timeout,
+            ttl_dns_cache=profile.ttl_dns_cache,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=profile.total_timeout, connect=profile.connect_timeout),
+            proxy=profile.proxy or None,
+            trace_configs=[self._trace_config(name)],
+            response_class=self._response_class(name),
+        )
+        self._sessions[name] = session
+        logger.debug(f"http pool {name} created | limit={profile.limit} per_host={profile.limit_per_host}")
+        return session
+
+    async def close(self) -> None:
+        sessions, self._sessions = self._sessions, {}
+        for name, session in sessions.items():
+            if not session.closed:
+                await session.close()
+                logger.debug(f"http pool {name} closed")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for name, session in self._sessions.items():
+            metrics = self._metrics_for(name)
+            profile = self.profiles[name]
+            result[name] = {
+                "limit": profile.limit,
+                "limit_per_host": profile.limit_per_host,
+                "closed": session.closed,
+                **metrics,
+                "wait_avg": metrics["wait_total"] / metrics["waits"] if metrics["waits"] else 0.0,
+            }
+        return result
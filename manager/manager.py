@@ -1,3 +1,4 @@
+import asyncio
 import os
 import os.path
 import sys
@@ -6,7 +7,7 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 from functools import wraps
 from pathlib import Path
-from typing import Optional, Union, Tuple, Any
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Union, Tuple, Any
 from urllib.parse import urlparse
 
 import aiohttp
@@ -14,9 +15,20 @@ import database
 import redis.asyncio as aioredis
 import loguru
 from telethon import Button, TelegramClient, events, types, hints
-from bs4 import BeautifulSoup, Tag
 
 from .settings import SETTINGS_TEMPLATE
+from .cache import MISSING
+from .profile import UserProfileCache, KIND_BIO, KIND_PHOTO, KIND_PAGE
+from .responses import ResponseCache
+from .http import DEFAULT_PROFILE, HTTPPools, load_profiles
+from .admins import AdminRoster, is_admin_participant
+from .group import chat_peer_id
+from .participants import ParticipantStateTracker, banned_participant, member_participant
+from .peers import ChatPeerCache
+from .watch import FirstMessageWatch
+from .filters import PreFilter
+from .router import Command, CommandRouter
+from .tg_page import extract_from_response
 
 logger = loguru.logger
 
@@ -73,8 +85,29 @@ class Manager:
     # redis connection
     rdb: Optional[aioredis.Redis] = None
     
-    # http session
-    http_session: Optional[aiohttp.ClientSession] = None
+    # per-destination http sessions (see manager.http)
+    http_pools: Optional[HTTPPools] = None
+
+    # user profile cache (bio / photo / t.me page)
+    profile_cache: Optional[UserProfileCache] = None
+
+    # chat admin roster cache
+    admin_roster: Optional[AdminRoster] = None
+
+    # member restriction state tracker
+    participant_states: Optional[ParticipantStateTracker] = None
+
+    # chat id -> input peer (resolve_chat_entity)
+    chat_peers: Optional[ChatPeerCache] = None
+
+    # first message watch set (default_handler fast path)
+    first_msg_watch: Optional[FirstMessageWatch] = None
+
+    # deterministic LLM / translation response cache
+    response_cache: Optional[ResponseCache] = None
+
+    # handler name -> pre-dispatch filter
+    prefilters: dict = {}
 
     # global config
     config = ConfigParser()
@@ -82,6 +115,7 @@ class Manager:
     # routes
     handlers = []
     events = {}
+    router = CommandRouter()
     
     # running status
     is_running = False
@@ -178,14 +212,23 @@ class Manager:
         """
         pass
 
-    def register(self, type_name, *args, **kwargs):
+    def register(self, type_name, *args, peer=None, prefix=None, commands=False, **kwargs):
         """
         Decorator to register handlers.
         type_name: "message", "callback_query", "chat_member"
+        peer / prefix: 分发前过滤（见 manager.filters.PreFilter），只读原始字段，不解析实体
+        commands: 非命令处理链中的 handler 是否也处理已注册命令的消息
         kwargs: passed to event filter (e.g. pattern, outgoing)
+
+        不带其他过滤参数的 "message" handler 进入路由器的非命令处理链；命令请用 register_command。
         """
 
         def wrapper(func):
+            if peer or prefix:
+                prefilter = PreFilter(func.__name__, peer, prefix, kwargs.get("func"))
+                kwargs["func"] = prefilter
+                self.prefilters[func.__name__] = prefilter
+
             event_cls = None
             if type_name == "raw":
                 event_cls = events.Raw
@@ -196,7 +239,10 @@ class Manager:
             elif type_name == "chat_member":
                 event_cls = events.ChatAction
 
-            if event_cls:
+            if event_cls is events.NewMessage and not args and set(kwargs) <= {"func"}:
+                self.router.add_message_handler(func, kwargs.get("func"), commands)
+                logger.info(f"registered {func.__name__} for non-command messages")
+            elif event_cls:
                 self.handlers.append((func, event_cls, args, kwargs))
                 logger.info(f"registered {func.__name__} for {type_name}")
             else:
@@ -210,12 +256,52 @@ class Manager:
 
         return wrapper
     
+    def register_command(self, name: str, *aliases: str, peer=None, middleware=()):
+        """
+        Decorator to register a bot command (without the leading slash).
+        peer: 允许的会话类型（PEER_*）；middleware: 中间件链（见 manager.router），按顺序执行
+        """
+
+        def wrapper(func):
+            self.router.add_command(
+                (name, *aliases), func, frozenset(peer) if peer else None, tuple(middleware)
+            )
+            logger.info(f"registered {func.__name__} for /{name}")
+            return func
+
+        return wrapper
+
+    async def require_admin(self, event, command: Command, call_next):
+        """命令中间件：仅群管理员可执行。"""
+        sender_id = getattr(event, "sender_id", None)
+        if sender_id is None or not await self.is_admin(event.chat_id, sender_id):
+            command.rejected += 1
+            logger.warning(f"chat {event.chat_id} user {sender_id} is not admin, /{command.name} ignored")
+            return None
+        return await call_next()
+
     def _apply_handlers(self):
         """Actually register handlers to client"""
         for func, event_cls, args, kwargs in self.handlers:
             self.client.add_event_handler(func, event_cls(*args, **kwargs))
             logger.info(f"handler {func.__name__} added to client")
 
+        if self.router:
+            self.client.add_event_handler(self.router.dispatch, events.NewMessage())
+            logger.info(f"router added to client: {len(self.router.commands)} commands")
+
+        self.client.add_event_handler(
+            self._on_participant_update,
+            events.Raw(
+                types=[
+                    types.UpdateChannelParticipant,
+                    types.UpdateChatParticipantAdmin,
+                    types.UpdateChatParticipants,
+                ]
+            ),
+        )
+        self.client.add_event_handler(self._on_raw_update, events.Raw())
+
     def register_event(self, type_name: str):
         """
         将函数添加到事件处理内 (Internal events like lazy_session)
@@ -245,6 +331,7 @@ class Manager:
         
         me = await self.client.get_me(input_peer=False)
         logger.info(f"bot started as {self.username(me)}")
+        self.router.bot_username = me.username
 
         admin_raw = self.config["telegram"].get("admin", "").strip()
         if admin_raw.isdigit():
@@ -267,8 +354,7 @@ class Manager:
         if self.web_server is not None:
             await self.web_server.stop()
             self.web_server = None
-        if self.http_session and not self.http_session.closed:
-            await self.http_session.close()
+        await self.close_http_session()
         await database.close()
         await self.client.disconnect()
 
@@ -279,23 +365,95 @@ class Manager:
         return user.username if isinstance(user, types.User) else user.title if isinstance(user, types.Chat) else getattr(user, "username", None) or str(user)
 
     async def is_admin(self, chat: Union[types.Chat, types.Channel, int], member: Union[types.User, int]):
-        try:
-            if isinstance(chat, int):
-                chat_id = chat
-            else:
-                chat_id = chat.id
-            
-            if isinstance(member, int):
-                user_id = member
-            else:
-                user_id = member.id
+        chat_id = chat_peer_id(chat)
+        user_id = member if isinstance(member, int) else member.id
+
+        # 群组走管理员名单缓存；私聊等其他会话保持原有权限查询
+        if chat_id < 0:
+            try:
+                return await self.get_admin_roster().is_admin(chat_id, user_id)
+            except Exception as e:
+                logger.debug(f"admin roster load failed chat={chat_id}, fallback to get_permissions: {e}")
 
+        try:
             perms = await self.client.get_permissions(chat_id, user_id)
             return not perms or perms.is_admin or perms.is_creator
         except Exception as e:
             logger.error(f"check admin failed: {e}")
         return False
 
+    def get_admin_roster(self) -> AdminRoster:
+        """群管理员名单缓存（惰性创建）。"""
+        if self.admin_roster is None:
+            self.admin_roster = AdminRoster(self._load_admin_ids)
+        return self.admin_roster
+
+    async def _load_admin_ids(self, chat_id: int) -> set:
+        """一次请求拉取群管理员（含群主）。"""
+        admins = await self.client.get_participants(chat_id, filter=types.ChannelParticipantsAdmins())
+        ids = set()
+        for user in admins:
+            participant = getattr(user, "participant", None)
+            # 普通群不支持过滤参数时会返回全部成员，按参与者类型再筛一次
+            if participant is not None and not is_admin_participant(participant):
+                continue
+            ids.add(user.id)
+        logger.debug(f"admin roster loaded chat={chat_id} admins={len(ids)}")
+        return ids
+
+    def get_participant_states(self) -> ParticipantStateTracker:
+        """成员限制状态跟踪（惰性创建）。"""
+        if self.participant_states is None:
+            self.participant_states = ParticipantStateTracker()
+        return self.participant_states
+
+    def get_chat_peers(self) -> ChatPeerCache:
+        """群 input peer 缓存（惰性创建）。"""
+        if self.chat_peers is None:
+            self.chat_peers = ChatPeerCache(lambda: self.get_redis())
+        return self.chat_peers
+
+    def get_first_msg_watch(self) -> FirstMessageWatch:
+        """首句观察名单（惰性创建）。"""
+        if self.first_msg_watch is None:
+            self.first_msg_watch = FirstMessageWatch(lambda: self.get_redis())
+        return self.first_msg_watch
+
+    def get_response_cache(self) -> ResponseCache:
+        """确定性响应缓存（惰性创建）。"""
+        if self.response_cache is None:
+            self.response_cache = ResponseCache(lambda: self.get_redis())
+        return self.response_cache
+
+    def runtime_stats(self) -> Dict[str, Any]:
+        """已创建组件的运行统计（不触发惰性创建），供 /system_usage 展示。"""
+        components = {
+            "router": self.router,
+            "admin_roster": self.admin_roster,
+            "participant_states": self.participant_states,
+            "chat_peers": self.chat_peers,
+            "first_msg_watch": self.first_msg_watch,
+            "profile_cache": self.profile_cache,
+            "response_cache": self.response_cache,
+        }
+        result = {name: c.stats() for name, c in components.items() if c is not None}
+        if "router" in result:
+            # 只列出被调用过的命令
+            commands = result["router"]["commands"]
+            result["router"]["commands"] = {name: s for name, s in commands.items() if s["calls"]}
+        if self.http_pools is not None:
+            result["http_pools"] = self.http_pools.stats()
+        if self.prefilters:
+            result["prefilters"] = {name: f.stats() for name, f in self.prefilters.items()}
+        return result
+
+    async def _on_raw_update(self, update):
+        await self.get_chat_peers().remember_from_update(update)
+
+    async def _on_participant_update(self, update):
+        self.get_admin_roster().on_update(update)
+        self.get_participant_states().on_update(update)
+
     async def chat_member_permissions(self, chat, member_id: int):
         try:
             return await self.client.get_permissions(chat, member_id)
@@ -307,40 +465,79 @@ class Manager:
             logger.exception(f"chat member permissions check exception: {e}")
             return None
 
+    def get_profile_cache(self) -> UserProfileCache:
+        """用户资料缓存（惰性创建）。"""
+        if self.profile_cache is None:
+            self.profile_cache = UserProfileCache(lambda: self.get_redis())
+        return self.profile_cache
+
     async def get_user_bio(self, user: Union[types.User, int]) -> Optional[str]:
-        """通过 Telegram API 直接获取用户的 Bio（简介），支持无 username 用户。"""
-        try:
+        """通过 Telegram API 直接获取用户的 Bio（简介），支持无 username 用户。结果经 profile cache 缓存。"""
+        user_id = getattr(user, "id", user)
+
+        async def _load():
             from telethon.tl.functions.users import GetFullUserRequest
-            user_id = getattr(user, "id", user)
             full = await self.client(GetFullUserRequest(user_id))
             about = getattr(getattr(full, "full_user", None), "about", None)
             return about.strip() if about else None
+
+        try:
+            return await self.get_profile_cache().get_or_load(KIND_BIO, user_id, _load)
         except Exception as e:
             logger.debug(f"get_user_bio failed for {user}: {e}")
             return None
 
     async def get_user_extra_info(self, username: str):
+        """抓取 t.me/{username} 页面的头像与简介。页面不可用时返回 None（负缓存）。"""
         url = f"https://t.me/{username}"
         headers = {
             "User-Agent": "Mozilla/5.0"
         }
-        try:
+
+        async def _load():
             proxy = self.config["telegram"].get("proxy", "")
-            session = await self.create_session()
+            session = await self.create_session("scrape")
             async with session.get(url, headers=headers, timeout=15, proxy=proxy or None) as response:
                 if response.status != 200:
-                    return {"error": f"status {response.status}"}
-                page_content = await response.text()
-                soup = BeautifulSoup(page_content, "html.parser")
-                image_tag = soup.find("img", {"class": "tgme_page_photo_image"})
-                image_url = image_tag.get("src") if isinstance(image_tag, Tag) else None
-                bio_tag = soup.find("div", {"class": "tgme_page_description"})
-                bio = bio_tag.text.strip() if bio_tag else None
-                return {"bio": bio, "image_url": image_url}
+                    logger.debug(f"fetch {url} status {response.status}")
+                    return None
+                return await extract_from_response(response)
+
+        try:
+            return await self.get_profile_cache().get_or_load(KIND_PAGE, username.lower(), _load)
         except Exception as e:
             logger.error(f"Failed to fetch page: {e}")
             return
 
+    async def prefetch_user_profiles(self, users: Any) -> None:
+        """
+        批量预热用户资料缓存（bio + 头像）。
+
+        先用一次 MGET 从 Redis 取回已有结果，仅对未命中的用户并发回源。
+        users 可以是 UserInfo / 底层 User / user_id 的列表。
+        """
+        by_id = {}
+        for user in users:
+            user_id = getattr(user, "id", user)
+            if isinstance(user_id, int):
+                by_id.setdefault(user_id, user)
+        if not by_id:
+            return
+
+        cache = self.get_profile_cache()
+        bios = await cache.get_many(KIND_BIO, by_id)
+        photos = await cache.get_many(KIND_PHOTO, by_id)
+
+        jobs = []
+        for user_id, user in by_id.items():
+            if user_id not in bios:
+                jobs.append(self.get_user_bio(user_id))
+            if user_id not in photos:
+                jobs.append(self.has_profile_photo(user))
+        if jobs:
+            await asyncio.gather(*jobs, return_exceptions=True)
+            logger.debug(f"prefetched {len(jobs)} user profile items for {len(by_id)} users")
+
     async def delete_message(
         self,
         chat: Union[int, types.Chat],
@@ -370,7 +567,7 @@ class Manager:
             if rdb:
                 try:
                     await rdb.zadd(
-                        "lazy_delete_messages", {f"{id_chat}:{id_message}": deleted_at.timestamp()}
+                        "lazy_delete_messages", {self.lazy_delete_value(id_chat, id_message): deleted_at.timestamp()}
                     )
                     logger.debug(f"chat {id_chat} message {id_message} delete at {deleted_at} (redis)")
                     return True
@@ -397,13 +594,23 @@ class Manager:
                 logger.error(f"chat {id_chat} message {id_message} delete failed: {e}")
                 return False
 
+    @staticmethod
+    def lazy_delete_value(chat: int, msg: int) -> str:
+        """lazy_delete_messages 有序集合中的成员值。"""
+        return f"{chat}:{msg}"
+
+    @staticmethod
+    def lazy_session_value(chat: int, member: int, type: str, msg: int) -> str:
+        """lazy_sessions 有序集合中的成员值；同一值重复 ZADD 只会更新执行时间。"""
+        return f"{chat}:{member}:{type}:{msg}"
+
     async def lazy_session(
         self, chat: int, msg: int, member: int, type: str, deleted_at: datetime
     ):
         rdb = await self.get_redis()
         if rdb:
             try:
-                val = f"{chat}:{member}:{type}:{msg}"
+                val = self.lazy_session_value(chat, member, type, msg)
                 await rdb.zadd("lazy_sessions", {val: deleted_at.timestamp()})
                 logger.debug(f"chat {chat} message {msg} member {member} after {deleted_at} (redis)")
                 return
@@ -527,20 +734,24 @@ class Manager:
             dt = dt.astimezone()
         return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-    async def create_session(self) -> aiohttp.ClientSession:
+    def get_http_pools(self) -> HTTPPools:
+        """按目标划分的 HTTP 连接池（惰性创建，profile 可在 [http.<name>] 覆盖）。"""
+        if self.http_pools is None:
+            self.http_pools = HTTPPools(load_profiles(self.config))
+        return self.http_pools
+
+    async def create_session(self, profile: str = DEFAULT_PROFILE) -> aiohttp.ClientSession:
         """
         创建或复用 HTTP 会话
+        profile: llm / telegram / media / scrape / default，各自使用独立的连接池
         """
-        if self.http_session is None or self.http_session.closed:
-            self.http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
-        return self.http_session
+        return self.get_http_pools().session(profile)
 
     async def close_http_session(self) -> None:
-        """关闭 HTTP 会话"""
-        if self.http_session and not self.http_session.closed:
-            await self.http_session.close()
-            self.http_session = None
-            logger.debug("http session closed")
+        """关闭所有 HTTP 会话"""
+        if self.http_pools is not None:
+            await self.http_pools.close()
+            logger.debug("http sessions closed")
 
     # ------------------------------------------------------------------
     # 统一 Telegram 操作接口（业务层只应调用以下方法，不直接使用 self.client）
@@ -588,13 +799,13 @@ class Manager:
     async def send_photo(
         self,
         chat_id: int,
-        photo: bytes,
+        photo: Union[bytes, BinaryIO],
         *,
         caption: Optional[str] = None,
         buttons: Optional[list] = None,
         reply_to: Optional[int] = None,
     ) -> Optional[int]:
-        """发送图片（bytes），成功返回 msg_id。"""
+        """发送图片（bytes，或带 name 属性的文件对象以按图片类型上传），成功返回 msg_id。"""
         try:
             resp = await self.client.send_file(
                 chat_id, photo, caption=caption, buttons=buttons, reply_to=reply_to
@@ -633,6 +844,11 @@ class Manager:
             logger.exception(f"download media error: {e}")
             return None
 
+    async def iter_media(self, msg: Any, chunk_size: int = 128 * 1024) -> AsyncIterator[bytes]:
+        """分块下载消息中的媒体文件，不整体读入内存；下载错误原样抛出。"""
+        async for chunk in self.client.iter_download(msg.media, request_size=chunk_size):
+            yield chunk
+
     async def get_user_info(self, user_id: int) -> Optional[UserInfo]:
         """按 id 获取用户信息（原生 UserInfo），失败返回 None。"""
         try:
@@ -650,10 +866,15 @@ class Manager:
         )
 
     async def has_profile_photo(self, user: Any) -> Optional[bool]:
-        """用户是否有公开头像。user 可以是 UserInfo / 底层 User / user_id。"""
+        """用户是否有公开头像。user 可以是 UserInfo / 底层 User / user_id。结果经 profile cache 缓存。"""
+        user_id = getattr(user, "id", user)
+        cache = self.get_profile_cache()
+        cached = await cache.get(KIND_PHOTO, user_id)
+        if cached is not MISSING:
+            return cached
+
         entity = user
         if isinstance(user, UserInfo) or isinstance(user, int):
-            user_id = user.id if isinstance(user, UserInfo) else user
             try:
                 entity = await self.client.get_entity(user_id)
             except Exception as e:
@@ -661,11 +882,14 @@ class Manager:
                 return None
         try:
             photos = await self.client.get_profile_photos(entity, limit=1)
-            return bool(photos)
         except Exception as e:
             logger.exception(f"get profile photos error: {e}")
             return None
 
+        has_photo = bool(photos)
+        await cache.set(KIND_PHOTO, user_id, has_photo)
+        return has_photo
+
     # ---- 成员权限管理（业务语义，屏蔽底层黑名单/白名单差异）----
 
     async def mute_member(self, chat: Any, user: Any, until: Optional[timedelta] = None) -> bool:
@@ -684,6 +908,21 @@ class Manager:
                 embed_link_previews=False,
                 until_date=until,
             )
+            self.get_participant_states().record(
+                chat_peer_id(chat),
+                user_id,
+                banned_participant(
+                    user_id,
+                    until,
+                    send_messages=True,
+                    send_media=True,
+                    send_stickers=True,
+                    send_gifs=True,
+                    send_games=True,
+                    send_inline=True,
+                    embed_links=True,
+                ),
+            )
             return True
         except Exception as e:
             logger.error(f"failed to restrict permissions for member {user_id}: {e}")
@@ -705,6 +944,7 @@ class Manager:
                 embed_link_previews=True,
                 until_date=None,
             )
+            self.get_participant_states().record(chat_peer_id(chat), user_id, member_participant(user_id))
             return True
         except Exception as e:
             logger.error(f"failed to restore permissions for member {user_id}: {e}")
@@ -726,6 +966,8 @@ class Manager:
                 send_inline=True,
                 embed_link_previews=True,
             )
+            # 解封后是否仍在群内取决于之前是否被踢出，交给下一次更新 / API 判断
+            self.get_participant_states().invalidate(chat_peer_id(chat), user_id)
             return True
         except Exception as e:
             logger.error(f"failed to unban member {user_id}: {e}")
@@ -738,6 +980,9 @@ class Manager:
             await self.client.edit_permissions(
                 chat, user_id, view_messages=False, until_date=until
             )
+            self.get_participant_states().record(
+                chat_peer_id(chat), user_id, banned_participant(user_id, until, view_messages=True)
+            )
             return True
         except Exception as e:
             logger.error(f"failed to ban member {user_id}: {e}")
@@ -748,6 +993,7 @@ class Manager:
         user_id = getattr(user, "id", user)
         try:
             await self.client.kick_participant(chat, user_id)
+            self.get_participant_states().record(chat_peer_id(chat), user_id, None)
             return True
         except Exception as e:
             logger.warning(f"kick_participant {user_id} failed: {e}")
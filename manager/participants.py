@@ -0,0 +1,108 @@
+"""
+成员限制状态跟踪
+Member restriction state tracker
+
+记录 bot 自己执行的禁言 / 封禁 / 踢出 / 解封结果，以及收到的 UpdateChannelParticipant，
+超时任务据此判断成员是否为管理员、已离开、已被封禁，命中时无需再调 get_permissions。
+
+状态以 Telegram 的 participant 对象保存，读取时包装成与 client.get_permissions
+相同的 ParticipantPermissions，调用方的判断逻辑不变。条目 TTL 很短，过期后回退到 API。
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import loguru
+from telethon.errors import UserNotParticipantError
+from telethon.tl import types
+from telethon.tl.custom import ParticipantPermissions
+
+from .cache import LRUCache, MISSING
+from .group import chat_peer_id, settings_chat_id_candidates
+
+logger = loguru.logger
+
+PARTICIPANT_STATE_TTL = 60 * 10  # 覆盖验证超时 → 解封 → 5 分钟潜水检查的整个流程
+PARTICIPANT_STATE_MAXSIZE = 50000
+
+# 已确认不在群内（被踢出 / 主动离开）
+NOT_PARTICIPANT: Any = object()
+
+
+def banned_participant(user_id: int, until: Optional[timedelta] = None, **rights: bool) -> types.ChannelParticipantBanned:
+    """构造受限成员状态；rights 为 ChatBannedRights 中被禁止的项（True 表示禁止）。"""
+    now = datetime.now(timezone.utc)
+    return types.ChannelParticipantBanned(
+        peer=types.PeerUser(user_id),
+        kicked_by=0,
+        date=now,
+        banned_rights=types.ChatBannedRights(until_date=now + until if until else None, **rights),
+    )
+
+
+def member_participant(user_id: int) -> types.ChannelParticipant:
+    """构造无限制的普通成员状态。"""
+    return types.ChannelParticipant(user_id=user_id, date=datetime.now(timezone.utc))
+
+
+class ParticipantStateTracker:
+    """
+    (chat_id, user_id) → participant 的短期缓存。
+
+    内部以带标记的 peer id（超级群 -100...）为 key；写入时可传群实体或任一形式的 id，
+    读取时按候选 id 查找，延迟任务中保存的裸 chat.id 也能命中。
+    """
+
+    def __init__(self, *, ttl: int = PARTICIPANT_STATE_TTL, maxsize: int = PARTICIPANT_STATE_MAXSIZE):
+        self._states = LRUCache(maxsize, ttl)
+
+    @staticmethod
+    def _chat_key(chat: Any) -> int:
+        """群实体 / marked id 原样规范化；裸正数 id 视为超级群。"""
+        chat_id = chat_peer_id(chat)
+        return settings_chat_id_candidates(chat_id)[1] if chat_id > 0 else chat_id
+
+    def _lookup(self, chat_id: int, user_id: int) -> Any:
+        for cid in settings_chat_id_candidates(chat_id):
+            if cid > 0:
+                continue
+            state = self._states.get((cid, user_id))
+            if state is not MISSING:
+                return state
+        return MISSING
+
+    def record(self, chat: Any, user_id: int, participant: Any) -> None:
+        """participant 为 None 或 NOT_PARTICIPANT 表示成员已不在群内。"""
+        self._states.set((self._chat_key(chat), user_id), NOT_PARTICIPANT if participant is None else participant)
+
+    def invalidate(self, chat: Any, user_id: int) -> None:
+        for cid in settings_chat_id_candidates(chat_peer_id(chat)):
+            self._states.delete((cid, user_id))
+
+    def permissions(self, chat_id: int, user_id: int) -> Optional[ParticipantPermissions]:
+        """
+        返回缓存的成员权限，未命中返回 None。
+
+        已知成员不在群内时抛出 UserNotParticipantError，与 client.get_permissions 一致。
+        """
+        state = self._lookup(chat_id, user_id)
+        if state is MISSING:
+            return None
+        if state is NOT_PARTICIPANT:
+            raise UserNotParticipantError(request=None)
+        return ParticipantPermissions(state, chat=False)
+
+    def on_update(self, update: Any) -> bool:
+        """用 UpdateChannelParticipant 更新成员状态，返回是否处理。"""
+        if not isinstance(update, types.UpdateChannelParticipant):
+            return False
+        chat_id = int(f"-100{update.channel_id}")
+        self.record(chat_id, update.user_id, update.new_participant)
+        logger.debug(
+            f"participant state chat={chat_id} user={update.user_id} -> "
+            f"{type(update.new_participant).__name__ if update.new_participant else 'left'}"
+        )
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return self._states.stats()
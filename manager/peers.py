@@ -0,0 +1,132 @@
+"""
+群 input peer 缓存
+Persistent chat peer cache for resolve_chat_entity
+
+把带标记的 chat id（超级群 -100...，普通群 -id）映射到可直接用于 API 调用的 input peer。
+首次解析成功、以及收到来自该群的任何更新时写入；延迟任务解析群时不再调用 get_entity。
+
+进程内 dict → Redis Hash（重启后仍可用，无 TTL；bot 的 access_hash 长期有效）。
+
+Redis Key: chat_peers  (Hash, field=marked chat id, value="channel:{id}:{access_hash}" | "chat:{id}")
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Union
+
+import loguru
+from telethon import utils
+from telethon.tl import types
+
+logger = loguru.logger
+
+CHAT_PEERS_KEY = "chat_peers"
+
+InputChatPeer = Union[types.InputPeerChannel, types.InputPeerChat]
+
+
+def _to_input_peer(entity: Any) -> Optional[InputChatPeer]:
+    """群实体 / input peer → input peer；用户、min 频道、已无权访问的群返回 None。"""
+    if isinstance(entity, (types.InputPeerChannel, types.InputPeerChat)):
+        return entity
+    if isinstance(entity, types.Channel):
+        if entity.min or entity.access_hash is None:
+            return None
+        return types.InputPeerChannel(entity.id, entity.access_hash)
+    if isinstance(entity, types.Chat):
+        return types.InputPeerChat(entity.id)
+    return None
+
+
+def _pack(peer: InputChatPeer) -> str:
+    if isinstance(peer, types.InputPeerChannel):
+        return f"channel:{peer.channel_id}:{peer.access_hash}"
+    return f"chat:{peer.chat_id}"
+
+
+def _unpack(raw: Union[bytes, str]) -> Optional[InputChatPeer]:
+    text = raw.decode() if isinstance(raw, bytes) else raw
+    kind, _, rest = text.partition(":")
+    try:
+        if kind == "channel":
+            channel_id, _, access_hash = rest.partition(":")
+            return types.InputPeerChannel(int(channel_id), int(access_hash))
+        if kind == "chat":
+            return types.InputPeerChat(int(rest))
+    except ValueError:
+        pass
+    return None
+
+
+class ChatPeerCache:
+    """
+    chat id → input peer 映射。
+
+    get_redis 为返回 Redis 连接（或 None）的协程函数；Redis 不可用时只用进程内缓存。
+    """
+
+    def __init__(self, get_redis: Callable[[], Awaitable[Any]]):
+        self._get_redis = get_redis
+        self._peers: Dict[int, InputChatPeer] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, chat_ids: Iterable[int]) -> Optional[InputChatPeer]:
+        """按候选 chat id 依次查找，全部未命中返回 None。"""
+        chat_ids = list(chat_ids)
+        for cid in chat_ids:
+            peer = self._peers.get(cid)
+            if peer is not None:
+                self.hits += 1
+                return peer
+
+        rdb = await self._get_redis()
+        if rdb:
+            for cid in chat_ids:
+                try:
+                    raw = await rdb.hget(CHAT_PEERS_KEY, str(cid))
+                except Exception as e:
+                    logger.debug(f"chat peer redis hget {cid} failed: {e}")
+                    break
+                peer = _unpack(raw) if raw else None
+                if peer is not None:
+                    self._peers[cid] = peer
+                    self.hits += 1
+                    return peer
+
+        self.misses += 1
+        return None
+
+    async def remember(self, entity: Any) -> None:
+        """记录群实体；与已缓存内容相同时不写 Redis。"""
+        peer = _to_input_peer(entity)
+        if peer is None:
+            return
+        cid = utils.get_peer_id(peer)
+        if self._peers.get(cid) == peer:
+            return
+        self._peers[cid] = peer
+
+        rdb = await self._get_redis()
+        if not rdb:
+            return
+        try:
+            await rdb.hset(CHAT_PEERS_KEY, str(cid), _pack(peer))
+        except Exception as e:
+            logger.debug(f"chat peer redis hset {cid} failed: {e}")
+
+    async def remember_from_update(self, update: Any) -> None:
+        """Telethon 为每个更新附带的 _entities 中包含来源群实体。"""
+        entities = getattr(update, "_entities", None)
+        if not entities:
+            return
+        for entity in entities.values():
+            if isinstance(entity, (types.Channel, types.Chat)):
+                await self.remember(entity)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._peers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
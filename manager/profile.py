@@ -0,0 +1,185 @@
+"""
+用户资料缓存（bio / 头像 / t.me 页面）
+User profile cache
+
+两层结构：进程内 LRU → 可选 Redis（多进程/重启后共享）。
+None 表示“查过但没有”（负缓存），使用更短的 TTL。
+回源异常不缓存，下次调用重新请求。
+
+Redis Key: user_profile:{kind}:{ident}  (String, orjson {"v": value})
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+import loguru
+from orjson import dumps, loads
+
+from .cache import LRUCache, MISSING
+
+logger = loguru.logger
+
+PROFILE_KEY_PREFIX = "user_profile:"
+PROFILE_TTL = 60 * 60 * 6  # 正常结果 6 小时
+PROFILE_NEGATIVE_TTL = 60 * 30  # 负缓存 30 分钟（无 bio / 页面不存在）
+PROFILE_MAXSIZE = 20000  # 进程内最多缓存条目数
+
+# 资料类别
+KIND_BIO = "bio"
+KIND_PHOTO = "photo"
+KIND_PAGE = "page"
+
+
+class UserProfileCache:
+    """
+    用户资料两层缓存。
+
+    get_redis 为返回 Redis 连接（或 None）的协程函数；Redis 不可用时只用进程内缓存。
+    同一 key 的并发回源会合并为一次请求。
+    """
+
+    def __init__(
+        self,
+        get_redis: Callable[[], Awaitable[Any]],
+        *,
+        maxsize: int = PROFILE_MAXSIZE,
+        ttl: int = PROFILE_TTL,
+        negative_ttl: int = PROFILE_NEGATIVE_TTL,
+    ):
+        self._get_redis = get_redis
+        self._local = LRUCache(maxsize, ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def make_key(kind: str, ident: Hashable) -> str:
+        """构建缓存 key（同时用于进程内与 Redis）。"""
+        return f"{PROFILE_KEY_PREFIX}{kind}:{ident}"
+
+    def _ttl_for(self, value: Any) -> int:
+        return self.negative_ttl if value is None else self.ttl
+
+    async def get(self, kind: str, ident: Hashable) -> Any:
+        """读取缓存，未命中返回 MISSING；负缓存返回 None。"""
+        key = self.make_key(kind, ident)
+        value = self._local.get(key)
+        if value is not MISSING:
+            return value
+
+        rdb = await self._get_redis()
+        if not rdb:
+            return MISSING
+        try:
+            raw = await rdb.get(key)
+        except Exception as e:
+            logger.debug(f"profile cache redis get {key} failed: {e}")
+            return MISSING
+        if raw is None:
+            return MISSING
+
+        try:
+            value = loads(raw)["v"]
+        except Exception:
+            return MISSING
+        self._local.set(key, value, self._ttl_for(value))
+        return value
+
+    async def get_many(self, kind: str, idents: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """批量读取：进程内未命中的部分用一次 MGET 从 Redis 取回。返回命中项。"""
+        found: Dict[Hashable, Any] = {}
+        pending = []
+        for ident in idents:
+            value = self._local.get(self.make_key(kind, ident))
+            if value is MISSING:
+                pending.append(ident)
+            else:
+                found[ident] = value
+
+        if not pending:
+            return found
+
+        rdb = await self._get_redis()
+        if not rdb:
+            return found
+        keys = [self.make_key(kind, ident) for ident in pending]
+        try:
+            raws = await rdb.mget(keys)
+        except Exception as e:
+            logger.debug(f"profile cache redis mget failed: {e}")
+            return found
+
+        for ident, key, raw in zip(pending, keys, raws):
+            if raw is None:
+                continue
+            try:
+                value = loads(raw)["v"]
+            except Exception:
+                continue
+            self._local.set(key, value, self._ttl_for(value))
+            found[ident] = value
+        return found
+
+    async def set(self, kind: str, ident: Hashable, value: Any) -> None:
+        """写入两层缓存；value 为 None 时按负缓存 TTL 保存。"""
+        key = self.make_key(kind, ident)
+        ttl = self._ttl_for(value)
+        self._local.set(key, value, ttl)
+
+        rdb = await self._get_redis()
+        if not rdb:
+            return
+        try:
+            await rdb.set(key, dumps({"v": value}), ex=ttl)
+        except Exception as e:
+            logger.debug(f"profile cache redis set {key} failed: {e}")
+
+    async def invalidate(self, kind: str, ident: Hashable) -> None:
+        key = self.make_key(kind, ident)
+        self._local.delete(key)
+        rdb = await self._get_redis()
+        if not rdb:
+            return
+        try:
+            await rdb.delete(key)
+        except Exception as e:
+            logger.debug(f"profile cache redis delete {key} failed: {e}")
+
+    async def get_or_load(
+        self, kind: str, ident: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        命中直接返回；否则调用 loader 回源并写入缓存。
+
+        loader 抛出的异常原样向上抛出且不缓存；同一 key 的并发调用共享一次回源。
+        """
+        value = await self.get(kind, ident)
+        if value is not MISSING:
+            return value
+
+        key = self.make_key(kind, ident)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            await self.set(kind, ident, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._local.stats()
@@ -0,0 +1,150 @@
+"""
+确定性响应缓存（LLM / 翻译）
+Content-addressed cache for deterministic responses
+
+key 为 (命名空间, 模型, 消息, 参数) 的 SHA-256，只有调用方显式声明可缓存的调用才走缓存。
+
+两层结构：进程内 LRU → 可选 Redis（TTL 更长，多进程/重启后共享）。
+空结果与异常不缓存；同一 key 的并发请求合并为一次回源。
+
+Redis Key: llm_cache:{namespace}:{sha256}  (String, orjson {"v": value})
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import loguru
+from orjson import OPT_SORT_KEYS, dumps, loads
+
+from .cache import LRUCache, MISSING
+
+logger = loguru.logger
+
+RESPONSE_KEY_PREFIX = "llm_cache:"
+RESPONSE_MAXSIZE = 512
+RESPONSE_LOCAL_TTL = 60 * 60  # 进程内 1 小时
+RESPONSE_REDIS_TTL = 60 * 60 * 24  # Redis 1 天
+
+
+class ResponseCache:
+    """
+    响应两层缓存，命中率按层统计。
+
+    get_redis 为返回 Redis 连接（或 None）的协程函数；Redis 不可用时只用进程内缓存。
+    """
+
+    def __init__(
+        self,
+        get_redis: Callable[[], Awaitable[Any]],
+        *,
+        maxsize: int = RESPONSE_MAXSIZE,
+        ttl: int = RESPONSE_LOCAL_TTL,
+        redis_ttl: int = RESPONSE_REDIS_TTL,
+    ):
+        self._get_redis = get_redis
+        self._local = LRUCache(maxsize, ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.redis_ttl = redis_ttl
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.stores = 0
+
+    @staticmethod
+    def make_key(namespace: str, payload: Any) -> str:
+        """内容寻址 key：payload（模型、消息、参数等）规范化序列化后取 SHA-256。"""
+        digest = hashlib.sha256(dumps(payload, option=OPT_SORT_KEYS)).hexdigest()
+        return f"{RESPONSE_KEY_PREFIX}{namespace}:{digest}"
+
+    async def get(self, key: str) -> Any:
+        """读取缓存，未命中返回 MISSING。"""
+        value = self._local.get(key)
+        if value is not MISSING:
+            return value
+
+        rdb = await self._get_redis()
+        if not rdb:
+            return MISSING
+        try:
+            raw = await rdb.get(key)
+        except Exception as e:
+            logger.debug(f"response cache redis get {key} failed: {e}")
+            return MISSING
+        if raw is None:
+            return MISSING
+
+        try:
+            value = loads(raw)["v"]
+        except Exception:
+            return MISSING
+        self.redis_hits += 1
+        self._local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._local.set(key, value)
+        self.stores += 1
+
+        rdb = await self._get_redis()
+        if not rdb:
+            return
+        try:
+            await rdb.set(key, dumps({"v": value}), ex=self.redis_ttl)
+        except Exception as e:
+            logger.debug(f"response cache redis set {key} failed: {e}")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        accept: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        命中直接返回；否则调用 compute 并缓存非空结果（accept 给出时还需 accept(结果) 为真）。
+
+        compute 抛出的异常原样向上抛出且不缓存；同一 key 的并发调用共享一次回源。
+        回源的调用方被取消时，等待者不会随之收到 CancelledError，而是自己重新回源。
+        """
+        value = await self.get(key)
+        if value is not MISSING:
+            return value
+
+        while (inflight := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # 等待者自身被取消
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            if value and (accept is None or accept(value)):
+                await self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        local = self._local.stats()
+        lookups = local["hits"] + local["misses"]
+        hits = local["hits"] + self.redis_hits
+        return {
+            **local,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "stores": self.stores,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,203 @@
+"""
+消息路由
+Central command router
+
+所有新消息只经过一个 Telethon handler：取首个词一次，去掉 @botname，
+在命令表（dict）中查找；命中则经过该命令的中间件链执行，否则交给非命令处理链
+（default_handler 等）。每条消息的分发成本与启用的命令数量无关。
+以 commands=True 注册的非命令 handler 对命令消息同样执行（如首句审查，
+新成员的第一条消息可能就是 /chat 之类的命令）。
+
+中间件签名：async def mw(event, command, call_next)；不调用 call_next 即拦截。
+"""
+
+import inspect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import loguru
+from telethon import events
+
+from .filters import peer_kind
+
+logger = loguru.logger
+
+Handler = Callable[[Any], Awaitable[Any]]
+Middleware = Callable[[Any, "Command", Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+# 限流记录超过此数量时顺带清理过期条目
+RATE_LIMIT_PRUNE_AT = 4096
+
+
+def parse_command(text: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    "/Cmd@bot args" → ("cmd", "bot")；非命令返回 None。
+
+    命令名统一小写；没有 @ 时 mention 为空字符串。
+    """
+    if not text or text[0] != "/":
+        return None
+    head = text.split(None, 1)[0]
+    name, _, mention = head[1:].partition("@")
+    if not name:
+        return None
+    return name.lower(), mention
+
+
+@dataclass(slots=True)
+class Command:
+    """命令表条目与调用计数。"""
+
+    name: str
+    func: Handler
+    peers: Optional[FrozenSet[str]] = None
+    middleware: Tuple[Middleware, ...] = ()
+    calls: int = 0
+    rejected: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        avg = self.total_ms / self.calls if self.calls else 0.0
+        return {
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "avg_ms": round(avg, 2),
+        }
+
+
+@dataclass(slots=True)
+class _PipelineEntry:
+    func: Handler
+    gate: Optional[Callable[[Any], Any]] = None
+    commands: bool = False
+
+
+@dataclass
+class CommandRouter:
+    """命令表 + 非命令处理链。bot_username 在启动后设置，用于忽略发给其他 bot 的命令。"""
+
+    bot_username: Optional[str] = None
+    commands: Dict[str, Command] = field(default_factory=dict)
+    pipeline: List[_PipelineEntry] = field(default_factory=list)
+    messages: int = 0
+    unknown: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.commands or self.pipeline)
+
+    def add_command(
+        self,
+        names: Tuple[str, ...],
+        func: Handler,
+        peers: Optional[FrozenSet[str]] = None,
+        middleware: Tuple[Middleware, ...] = (),
+    ) -> Command:
+        command = Command(names[0].lower(), func, peers, tuple(middleware))
+        for name in names:
+            key = name.lower()
+            if key in self.commands:
+                logger.warning(f"command /{key} is registered twice, {func.__name__} replaces it")
+            self.commands[key] = command
+        return command
+
+    def add_message_handler(
+        self, func: Handler, gate: Optional[Callable[[Any], Any]] = None, commands: bool = False
+    ) -> None:
+        self.pipeline.append(_PipelineEntry(func, gate, commands))
+
+    def match(self, event: Any) -> Optional[Command]:
+        message = getattr(event, "message", None)
+        text = getattr(message, "message", None)
+        if text is None:
+            text = getattr(event, "raw_text", None)
+        parsed = parse_command(text)
+        if parsed is None:
+            return None
+        name, mention = parsed
+        if mention and self.bot_username and mention.lower() != self.bot_username.lower():
+            return None
+        command = self.commands.get(name)
+        if command is None:
+            self.unknown += 1
+        return command
+
+    async def dispatch(self, event: Any) -> None:
+        """Telethon NewMessage 的唯一入口。"""
+        self.messages += 1
+        command = self.match(event)
+        if command is not None:
+            await self.run_pipeline(event, commands_only=True)
+            await self.run_command(command, event)
+            return
+        await self.run_pipeline(event)
+
+    async def run_command(self, command: Command, event: Any) -> None:
+        if command.peers is not None and peer_kind(event) not in command.peers:
+            command.rejected += 1
+            return
+
+        chain = command.middleware
+
+        async def call(index: int) -> Any:
+            if index < len(chain):
+                return await chain[index](event, command, lambda: call(index + 1))
+            command.calls += 1
+            return await command.func(event)
+
+        start = time.perf_counter()
+        try:
+            await call(0)
+        except events.StopPropagation:
+            raise
+        except Exception:
+            command.errors += 1
+            logger.exception(f"command /{command.name} failed")
+        finally:
+            command.total_ms += (time.perf_counter() - start) * 1000
+
+    async def run_pipeline(self, event: Any, commands_only: bool = False) -> None:
+        for entry in self.pipeline:
+            if commands_only and not entry.commands:
+                continue
+            if entry.gate is not None:
+                passed = entry.gate(event)
+                if inspect.isawaitable(passed):
+                    passed = await passed
+                if not passed:
+                    continue
+            try:
+                await entry.func(event)
+            except events.StopPropagation:
+                break
+            except Exception:
+                logger.exception(f"message handler {entry.func.__name__} failed")
+
+    def stats(self) -> Dict[str, Any]:
+        seen = {}
+        for command in self.commands.values():
+            seen.setdefault(command.name, command.stats())
+        return {"messages": self.messages, "unknown": self.unknown, "commands": seen}
+
+
+def rate_limit(seconds: float) -> Middleware:
+    """同一会话内同一用户每 seconds 秒最多执行一次该命令；超出的调用直接忽略。"""
+    last_seen: Dict[Tuple[str, Any, Any], float] = {}
+
+    async def _rate_limit(event: Any, command: Command, call_next: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        key = (command.name, getattr(event, "chat_id", None), getattr(event, "sender_id", None))
+        last = last_seen.get(key)
+        if last is not None and now - last < seconds:
+            command.rejected += 1
+            logger.debug(f"command /{command.name} rate limited for {key[1]}:{key[2]}")
+            return None
+        if len(last_seen) >= RATE_LIMIT_PRUNE_AT:
+            for k in [k for k, t in last_seen.items() if now - t >= seconds]:
+                del last_seen[k]
+        last_seen[key] = now
+        return await call_next()
+
+    return _rate_limit
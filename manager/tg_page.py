@@ -0,0 +1,155 @@
+"""
+t.me 用户页面轻量提取
+Lightweight extractor for t.me/{username} pages
+
+只需要两个字段：头像 img.tgme_page_photo_image 的 src 与 div.tgme_page_description 的文本。
+TgPageScanner 增量读取响应，两个字段就位（或越过简介所在区域 / 达到字节上限）即停止，
+不构建完整 DOM。页面结构异常无法判定时，才把已读内容交给 BeautifulSoup，
+且在线程池中解析，避免阻塞事件循环。
+"""
+
+import asyncio
+import codecs
+import html
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+PAGE_MAX_BYTES = 64 * 1024  # 最多读取的字节数；简介区通常在前 10KB 内
+PAGE_CHUNK_SIZE = 4096
+
+PHOTO_MARKER = "tgme_page_photo_image"
+DESCRIPTION_MARKER = "tgme_page_description"
+# 简介之后的区块；出现即说明页面没有简介
+END_MARKERS = ("tgme_page_action", "</body")
+
+_RE_SRC = re.compile(r"""\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+_RE_TAG = re.compile(r"<[^>]*>")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class TgPageScanner:
+    """
+    增量扫描 t.me 页面。
+
+    feed() 返回 True 表示已得到结论，调用方可以停止读取。
+    conclusive 为 False 时（页面结构不认识或被截断）应回退到 BS4 解析 text。
+    """
+
+    def __init__(self, max_bytes: int = PAGE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.image_url: Optional[str] = None
+        self.bio: Optional[str] = None
+        self.conclusive = False
+        self.truncated = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buf = ""
+        self._photo_done = False
+        self._desc_done = False
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    @property
+    def done(self) -> bool:
+        return self.conclusive or self.truncated
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.done:
+            return True
+
+        self.received += len(chunk)
+        self._buf += self._decoder.decode(chunk)
+        self._scan()
+
+        if not self.conclusive and self.received >= self.max_bytes:
+            self.truncated = True
+        return self.done
+
+    def close(self) -> None:
+        """响应读完后调用，刷新解码器并做最后一次扫描。"""
+        self._buf += self._decoder.decode(b"", final=True)
+        self._scan()
+
+    def result(self) -> Dict[str, Any]:
+        return {"bio": self.bio, "image_url": self.image_url}
+
+    def _scan(self) -> None:
+        buf = self._buf
+
+        if not self._photo_done:
+            idx = buf.find(PHOTO_MARKER)
+            if idx != -1:
+                start = buf.rfind("<", 0, idx)
+                end = buf.find(">", idx)
+                if start != -1 and end != -1:
+                    m = _RE_SRC.search(buf, start, end)
+                    if m:
+                        self.image_url = html.unescape(m.group(1) if m.group(1) is not None else m.group(2))
+                    self._photo_done = True
+
+        if not self._desc_done:
+            idx = buf.find(DESCRIPTION_MARKER)
+            if idx != -1:
+                open_end = buf.find(">", idx)
+                close = buf.find("</div>", open_end) if open_end != -1 else -1
+                if close != -1:
+                    inner = buf[open_end + 1 : close]
+                    self.bio = html.unescape(_RE_TAG.sub("", inner)).strip()
+                    self._desc_done = True
+                    # 头像位于简介之前；到这里仍未出现说明没有头像
+                    self._photo_done = True
+                    self.conclusive = True
+                    return
+
+        for marker in END_MARKERS:
+            if buf.find(marker) != -1:
+                self._photo_done = True
+                self.conclusive = True
+                return
+
+
+def parse_page_bs4(page_content: str) -> Dict[str, Any]:
+    """完整 BeautifulSoup 解析（原实现，作为回退路径与基准对照）。"""
+    from bs4 import BeautifulSoup, Tag
+
+    soup = BeautifulSoup(page_content, "html.parser")
+    image_tag = soup.find("img", {"class": PHOTO_MARKER})
+    image_url = image_tag.get("src") if isinstance(image_tag, Tag) else None
+    bio_tag = soup.find("div", {"class": DESCRIPTION_MARKER})
+    bio = bio_tag.text.strip() if bio_tag else None
+    return {"bio": bio, "image_url": image_url}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tg-page")
+    return _executor
+
+
+async def parse_page_in_thread(page_content: str) -> Dict[str, Any]:
+    """在专用线程池中执行 BS4 解析。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), parse_page_bs4, page_content)
+
+
+async def extract_from_response(response: Any, max_bytes: int = PAGE_MAX_BYTES) -> Dict[str, Any]:
+    """
+    从 aiohttp 响应中增量提取头像与简介。
+
+    命中结论即停止读取；否则把已读内容交给线程池里的 BS4 解析。
+    """
+    scanner = TgPageScanner(max_bytes)
+    async for chunk in response.content.iter_chunked(PAGE_CHUNK_SIZE):
+        if scanner.feed(chunk):
+            break
+    else:
+        scanner.close()
+
+    if scanner.conclusive:
+        return scanner.result()
+    return await parse_page_in_thread(scanner.text)
@@ -0,0 +1,142 @@
+"""
+首句观察名单
+First-message watch set
+
+入群通过验证的成员在 30 分钟内处于首句观察期（Redis: first_msg_watch:{chat}:{user}）。
+default_handler 对每条群消息都要判断发送者是否在观察期，绝大多数并不在；
+进程内保存一份精确名单（含过期时间），未命中的消息直接返回，不产生任何网络 I/O。
+
+名单与 Redis 的同步：
+  - add / pop 同时写内存与 Redis
+  - 首次查询时 SCAN 一次 Redis 载入已有 key（重启后恢复）
+  - 内存条目按 TTL 过期；载入失败时视为“可能在观察期”，回退到 Redis 判断
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import loguru
+
+logger = loguru.logger
+
+FIRST_MSG_WATCH_PREFIX = "first_msg_watch:"
+FIRST_MSG_WATCH_TTL = 30 * 60
+# 超过此数量时在写入时顺带清理过期条目
+FIRST_MSG_WATCH_PRUNE_AT = 4096
+
+
+def watch_key(chat_id: int, user_id: int) -> str:
+    return f"{FIRST_MSG_WATCH_PREFIX}{chat_id}:{user_id}"
+
+
+def _parse_key(raw: Any) -> Optional[Tuple[int, int]]:
+    text = raw.decode() if isinstance(raw, bytes) else str(raw)
+    chat, _, user = text[len(FIRST_MSG_WATCH_PREFIX) :].rpartition(":")
+    try:
+        return int(chat), int(user)
+    except ValueError:
+        return None
+
+
+class FirstMessageWatch:
+    """
+    (chat_id, user_id) → 过期时间。
+
+    chat_id 与 Redis key 中的一致（群实体 id）。get_redis 为返回 Redis 连接（或 None）的协程函数。
+    """
+
+    def __init__(self, get_redis: Callable[[], Awaitable[Any]], *, ttl: int = FIRST_MSG_WATCH_TTL):
+        self._get_redis = get_redis
+        self.ttl = ttl
+        self._entries: Dict[Tuple[int, int], float] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.skips = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _prune(self, now: float) -> None:
+        for k in [k for k, exp in self._entries.items() if exp <= now]:
+            del self._entries[k]
+
+    def _remember(self, chat_id: int, user_id: int, ttl: int) -> None:
+        now = time.monotonic()
+        if len(self._entries) >= FIRST_MSG_WATCH_PRUNE_AT:
+            self._prune(now)
+        self._entries[(chat_id, user_id)] = now + ttl
+
+    async def _load(self) -> bool:
+        """从 Redis 载入已有观察 key；Redis 不可用视为空名单。"""
+        async with self._load_lock:
+            if self._loaded:
+                return True
+            rdb = await self._get_redis()
+            if rdb:
+                try:
+                    cursor = 0
+                    while True:
+                        cursor, keys = await rdb.scan(cursor, match=f"{FIRST_MSG_WATCH_PREFIX}*", count=500)
+                        for raw in keys:
+                            parsed = _parse_key(raw)
+                            if parsed:
+                                # 不逐个查询剩余 TTL；按完整 TTL 计，多出的条目只会多一次 Redis DELETE
+                                self._remember(*parsed, self.ttl)
+                        if cursor == 0:
+                            break
+                except Exception as e:
+                    logger.warning(f"first message watch load failed: {e}")
+                    return False
+            self._loaded = True
+            logger.debug(f"first message watch loaded: {len(self._entries)} entries")
+            return True
+
+    def might_watch(self, chat_id: int, user_id: int) -> bool:
+        """纯内存判断；尚未载入时返回 True（需要走 Redis）。"""
+        if not self._loaded:
+            return True
+        exp = self._entries.get((chat_id, user_id))
+        if exp is None:
+            return False
+        if exp <= time.monotonic():
+            del self._entries[(chat_id, user_id)]
+            return False
+        return True
+
+    async def add(self, chat_id: int, user_id: int) -> None:
+        """开始观察：写 Redis（带 TTL）并记入内存。"""
+        rdb = await self._get_redis()
+        if not rdb:
+            return
+        await rdb.set(watch_key(chat_id, user_id), "1", ex=self.ttl)
+        self._remember(chat_id, user_id, self.ttl)
+
+    async def pop(self, chat_id: int, user_id: int) -> bool:
+        """
+        结束观察并返回此前是否在观察期。
+
+        内存未命中直接返回 False；命中时以 Redis DELETE 的结果为准（并发时只有一方得到 True）。
+        """
+        if not self._loaded and not await self._load():
+            return await self._delete(chat_id, user_id)
+        if not self.might_watch(chat_id, user_id):
+            self.skips += 1
+            return False
+        self._entries.pop((chat_id, user_id), None)
+        self.hits += 1
+        return await self._delete(chat_id, user_id)
+
+    async def _delete(self, chat_id: int, user_id: int) -> bool:
+        rdb = await self._get_redis()
+        if not rdb:
+            return False
+        try:
+            return bool(await rdb.delete(watch_key(chat_id, user_id)))
+        except Exception as e:
+            logger.warning(f"first message watch redis delete failed: {e}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "loaded": self._loaded, "skips": self.skips, "hits": self.hits}
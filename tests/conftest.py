@@ -3,6 +3,7 @@ Shared test fixtures: FakeRedis, mock manager, and helper factories.
 """
 from __future__ import annotations
 
+import asyncio
 import time
 from typing import Any
 from unittest.mock import AsyncMock
@@ -59,6 +60,12 @@ class FakeRedis:
             self._expiry[k] = time.time() + ex
         return "OK"
 
+    async def mget(self, keys, *args):
+        self._evict()
+        if isinstance(keys, (str, bytes)):
+            keys = [keys, *args]
+        return [self._data.get(self._norm_key(k)) for k in keys]
+
     async def exists(self, key):
         self._evict()
         k = self._norm_key(key)
@@ -228,6 +235,86 @@ class FakeRedis:
         all_items = list(await self.zscan_iter(key, match=match))
         return (0, all_items)
 
+    # ------------------------------------------------------------------
+    # Lua scripts — emulated in Python, looked up by script source
+    # ------------------------------------------------------------------
+
+    def register_script(self, script):
+        async def _call(keys=(), args=(), client=None):
+            handler = self._script_handlers().get(script)
+            if handler is None:
+                raise NotImplementedError("Lua script is not emulated by FakeRedis")
+            self._evict()
+            return handler(list(keys), [str(a) for a in args])
+
+        return _call
+
+    def _script_handlers(self):
+        from handlers.member_captcha.session import JOIN_RECORD_SCRIPT, VERIFY_ANSWER_SCRIPT
+
+        return {
+            JOIN_RECORD_SCRIPT: self._join_record_script,
+            VERIFY_ANSWER_SCRIPT: self._verify_answer_script,
+        }
+
+    def _join_record_script(self, keys, args):
+        """Python port of session.JOIN_RECORD_SCRIPT."""
+        key, coalesce_key, dedup_key = (self._norm_key(k) for k in keys)
+        event_uid, now_ts, kick, reset, ttl_default, ttl_extended, coalesce_ttl, dedup_ttl = args
+        for lock_key, value, ttl in ((coalesce_key, event_uid, coalesce_ttl), (dedup_key, "1", dedup_ttl)):
+            if lock_key in self._data:
+                return [b"duplicate", 0, 0, b""]
+            self._data[lock_key] = value
+            self._expiry[lock_key] = time.time() + int(ttl)
+
+        fields = {self._norm_key(k): self._norm_key(v) for k, v in self._hashes.get(key, {}).items()}
+        joins = int(fields.get("join_count", 0)) + 1
+        total = int(fields.get("total_joins", 0)) + 1
+        state = fields.get("state", "normal")
+        first = fields.get("first_join_ts", now_ts)
+        ttl = ttl_default
+        if joins >= int(kick):
+            state, ttl = "throttled", ttl_extended
+        elif state == "throttled" and joins <= int(reset):
+            state = "normal"
+        for f in ("flagged_reason", "captcha_restricted", "retry_count", "last_icon",
+                  "last_answer", "last_options", "last_token", "chat_id", "user_id"):
+            fields.pop(f, None)
+        fields.update(join_count=str(joins), total_joins=str(total), first_join_ts=first,
+                      last_join_ts=now_ts, state=state)
+        self._hashes[key] = fields
+        self._expiry[key] = time.time() + int(ttl)
+        return [state.encode(), joins, total, first.encode()]
+
+    def _verify_answer_script(self, keys, args):
+        """Python port of session.VERIFY_ANSWER_SCRIPT."""
+        key, sessions_key, delete_key = (self._norm_key(k) for k in keys)
+        chosen, token, max_retry, icon, answer, options, new_token, deadline, session_member, delete_member = args
+
+        def _s(v):
+            return v.decode() if isinstance(v, bytes) else v
+
+        fields = {_s(k): _s(v) for k, v in self._hashes.get(key, {}).items()}
+        current, current_token = fields.get("last_answer"), fields.get("last_token")
+        flag, state = fields.get("flagged_reason") or "", fields.get("state") or ""
+        if current is None:
+            return [b"missing", 0, flag.encode(), state.encode()]
+        if current == "" or (current_token and current_token != token):
+            return [b"stale", 0, flag.encode(), state.encode()]
+        if current == chosen:
+            self._hashes[key]["last_answer"] = ""
+            return [b"pass", 0, flag.encode(), state.encode()]
+        retry = int(fields.get("retry_count", 0)) + 1
+        self._hashes[key]["retry_count"] = str(retry)
+        if retry >= int(max_retry):
+            self._hashes[key]["last_answer"] = ""
+            return [b"kick", retry, flag.encode(), state.encode()]
+        self._hashes[key].update(last_icon=icon, last_answer=answer, last_options=options, last_token=new_token)
+        for zkey, member in ((sessions_key, session_member), (delete_key, delete_member)):
+            if member in self._sorted_sets.get(zkey, {}):  # ZADD XX
+                self._sorted_sets[zkey][member] = float(deadline)
+        return [b"retry", retry, flag.encode(), state.encode()]
+
 
 # ------------------------------------------------------------------
 # Fixtures
@@ -249,6 +336,32 @@ def mock_manager(monkeypatch, fake_redis):
     mgr.config = _dummy_config()
     mgr.client = AsyncMock()
     mgr.logger = mgr.logger  # keep real logger
+    mgr.admin_roster = None
+    mgr.participant_states = None
+    mgr.chat_peers = None
+    mgr.first_msg_watch = None
+    mgr.response_cache = None
+    mgr.http_pools = None
+
+    # 首句分类器：默认不加载模型，判定记录不写数据库
+    import utils.first_msg_classifier as classifier_mod
+
+    monkeypatch.setattr(classifier_mod, "_classifier", None)
+    monkeypatch.setattr(classifier_mod, "_classifier_loaded", True)
+    monkeypatch.setattr(classifier_mod, "record_verdict", AsyncMock())
+
+    # 模型健康度：每个用例从全部健康开始
+    from handlers.utils.health import model_health
+
+    model_health.reset()
+
+    import handlers.utils.gateway as gateway_mod
+
+    monkeypatch.setattr(gateway_mod, "_gateway", None)
+
+    import utils.asr as asr_mod
+
+    monkeypatch.setattr(asr_mod, "_queue", None)
 
     monkeypatch.setattr(mgr, "get_redis", AsyncMock(return_value=fake_redis))
     mgr.lazy_session = AsyncMock()
@@ -264,6 +377,7 @@ def mock_manager(monkeypatch, fake_redis):
     mgr.get_user_info = AsyncMock(return_value=None)
     mgr.has_profile_photo = AsyncMock(return_value=True)
     mgr.get_user_bio = AsyncMock(return_value=None)
+    mgr.prefetch_user_profiles = AsyncMock()
     mgr.send_text = AsyncMock(return_value=1)
     mgr.send = AsyncMock(return_value=True)
     mgr.send_photo = AsyncMock(return_value=1)
@@ -288,7 +402,8 @@ def mock_advertising_config(monkeypatch):
     """Patch advertising module to return known words."""
     import utils.advertising as adv_mod
 
-    monkeypatch.setattr(adv_mod, "load_advertising_words", lambda: ["广告", "spam", "推广", "test"])
+    matcher = adv_mod.AdvertisingMatcher(["广告", "spam", "推广", "test"], [])
+    monkeypatch.setattr(adv_mod, "get_advertising_matcher", lambda: matcher)
 
 
 @pytest.fixture
@@ -309,3 +424,40 @@ def mock_llm_spam(monkeypatch):
         "chat_completions",
         AsyncMock(return_value='{"spams": [{"id": 12345, "reason": "suspicious profile"}]}'),
     )
+
+
+class LoopBlockingGuard:
+    """Background heartbeat measuring the worst event-loop scheduling lag.
+
+    A blocking call made on the loop thread shows up as a lag roughly equal
+    to its duration; work pushed to executors keeps the lag near zero.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _beat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - started - self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._beat())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+@pytest.fixture
+async def loop_guard():
+    """Fail-fast helper: assert ``loop_guard.max_lag`` stays small around blocking work."""
+    guard = LoopBlockingGuard()
+    guard.start()
+    await asyncio.sleep(0)
+    yield guard
+    guard.stop()
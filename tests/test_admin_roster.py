@@ -0,0 +1,146 @@
+"""Tests for the per-chat admin roster cache behind Manager.is_admin."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from telethon.tl import types
+
+from manager.admins import AdminRoster
+
+
+CHAT_ID = -1001234567890
+ADMIN_ID = 11
+MEMBER_ID = 22
+
+
+def _admins(*ids):
+    return [
+        SimpleNamespace(id=i, participant=types.ChannelParticipantAdmin(
+            user_id=i, promoted_by=1, date=None,
+            admin_rights=types.ChatAdminRights(), rank=None,
+        ))
+        for i in ids
+    ]
+
+
+def _fresh_manager():
+    from manager.manager import Manager
+
+    mgr = Manager()
+    mgr.admin_roster = None
+    mgr.client = AsyncMock()
+    mgr.client.get_participants = AsyncMock(return_value=_admins(ADMIN_ID))
+    return mgr
+
+
+async def test_is_admin_uses_one_roster_request():
+    mgr = _fresh_manager()
+
+    assert await mgr.is_admin(CHAT_ID, ADMIN_ID) is True
+    assert await mgr.is_admin(CHAT_ID, SimpleNamespace(id=MEMBER_ID)) is False
+    assert await mgr.is_admin(CHAT_ID, ADMIN_ID) is True
+
+    mgr.client.get_participants.assert_awaited_once()
+    _, kwargs = mgr.client.get_participants.call_args
+    assert isinstance(kwargs["filter"], types.ChannelParticipantsAdmins)
+    mgr.client.get_permissions.assert_not_awaited()
+
+    stats = mgr.get_admin_roster().stats()
+    assert stats["hits"] == 2 and stats["loads"] == 1
+
+
+async def test_roster_skips_non_admin_participants():
+    mgr = _fresh_manager()
+    plain = SimpleNamespace(id=MEMBER_ID, participant=types.ChatParticipant(user_id=MEMBER_ID, inviter_id=1, date=None))
+    mgr.client.get_participants = AsyncMock(return_value=_admins(ADMIN_ID) + [plain])
+
+    assert await mgr.is_admin(-42, MEMBER_ID) is False
+    assert await mgr.is_admin(-42, ADMIN_ID) is True
+
+
+async def test_roster_load_failure_falls_back_to_permissions():
+    mgr = _fresh_manager()
+    mgr.client.get_participants = AsyncMock(side_effect=RuntimeError("CHAT_ADMIN_REQUIRED"))
+    mgr.client.get_permissions = AsyncMock(return_value=SimpleNamespace(is_admin=True, is_creator=False))
+
+    assert await mgr.is_admin(CHAT_ID, ADMIN_ID) is True
+    mgr.client.get_permissions.assert_awaited_once_with(CHAT_ID, ADMIN_ID)
+    assert mgr.get_admin_roster().stats()["load_errors"] == 1
+
+
+async def test_load_failure_is_cached_briefly():
+    load = AsyncMock(side_effect=RuntimeError("CHAT_ADMIN_REQUIRED"))
+    roster = AdminRoster(load, failure_ttl=0.05)
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await roster.get(CHAT_ID)
+    assert load.await_count == 1
+
+    # 负缓存到期或名单失效后重新加载
+    await asyncio.sleep(0.06)
+    load.side_effect = None
+    load.return_value = [ADMIN_ID]
+    assert await roster.is_admin(CHAT_ID, ADMIN_ID) is True
+
+    load.side_effect = RuntimeError("flood wait")
+    roster.invalidate(CHAT_ID)
+    with pytest.raises(RuntimeError):
+        await roster.get(CHAT_ID)
+    roster.invalidate(CHAT_ID)
+    load.side_effect = None
+    assert await roster.get(CHAT_ID) == frozenset({ADMIN_ID})
+    assert load.await_count == 4
+
+
+async def test_private_chat_keeps_permission_lookup():
+    mgr = _fresh_manager()
+    mgr.client.get_permissions = AsyncMock(return_value=None)
+
+    assert await mgr.is_admin(ADMIN_ID, ADMIN_ID) is True
+    mgr.client.get_participants.assert_not_awaited()
+
+
+async def test_admin_change_update_invalidates_roster():
+    mgr = _fresh_manager()
+    assert await mgr.is_admin(CHAT_ID, MEMBER_ID) is False
+
+    promoted = types.UpdateChannelParticipant(
+        channel_id=1234567890, date=None, actor_id=ADMIN_ID, user_id=MEMBER_ID, qts=1,
+        prev_participant=types.ChannelParticipant(user_id=MEMBER_ID, date=None),
+        new_participant=_admins(MEMBER_ID)[0].participant,
+    )
+    mgr.client.get_participants = AsyncMock(return_value=_admins(ADMIN_ID, MEMBER_ID))
+    await mgr._on_participant_update(promoted)
+
+    assert await mgr.is_admin(CHAT_ID, MEMBER_ID) is True
+    mgr.client.get_participants.assert_awaited_once()
+
+
+def test_plain_join_does_not_invalidate():
+    roster = AdminRoster(AsyncMock())
+    joined = types.UpdateChannelParticipant(
+        channel_id=1234567890, date=None, actor_id=MEMBER_ID, user_id=MEMBER_ID, qts=1,
+        new_participant=types.ChannelParticipant(user_id=MEMBER_ID, date=None),
+    )
+    assert roster.on_update(joined) is None
+    assert roster.on_update(types.UpdateChatParticipantAdmin(chat_id=42, user_id=1, is_admin=True, version=2)) == -42
+
+
+async def test_concurrent_checks_share_one_load():
+    calls = 0
+
+    async def load(chat_id):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return {ADMIN_ID}
+
+    roster = AdminRoster(load)
+    results = await asyncio.gather(*(roster.is_admin(CHAT_ID, ADMIN_ID) for _ in range(5)))
+    assert results == [True] * 5
+    assert calls == 1
@@ -98,3 +98,64 @@ def test_load_advertising_words():
     assert "广告" in words
     assert "spam" in words
     assert "test_word" in words
+
+
+def test_automaton_matches_naive_scan():
+    import random
+
+    from utils.advertising import AhoCorasick
+
+    rng = random.Random(7)
+    alphabet = "abc广告"
+    words = list(dict.fromkeys("".join(rng.choice(alphabet) for _ in range(rng.randint(2, 5))) for _ in range(60)))
+    automaton = AhoCorasick(words)
+    for _ in range(300):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        expected = next((i for i, w in enumerate(words) if w in text), None)
+        assert automaton.search(text) == expected
+
+
+def test_matcher_is_reused_and_rebuilt_on_change():
+    from manager import manager
+    from utils import advertising
+
+    first = advertising.get_advertising_matcher()
+    assert advertising.get_advertising_matcher() is first
+
+    config = _mock_config()
+    config["advertising"]["words"] = "新词, spam"
+    with patch.object(manager, "config", config):
+        assert advertising.check_advertising("这是新词") == (True, "新词")
+        assert advertising.get_advertising_matcher() is not first
+
+    assert advertising.check_advertising("这是新词") == (False, None)
+
+
+def test_combined_and_separate_patterns():
+    from manager import manager
+    from utils.advertising import check_advertising
+
+    config = _mock_config()
+    config["advertising"]["words"] = ""
+    config["advertising"]["regex_patterns"] = r"tg:t\.me/\+\w+;qq:加[Qq]{2}\s*\d{5,};repeat:(\w)\1{5}"
+    with patch.object(manager, "config", config):
+        assert check_advertising("join T.ME/+abc now") == (True, "pattern:tg")
+        assert check_advertising("加qq 123456") == (True, "pattern:qq")
+        assert check_advertising("zzzzzz") == (True, "pattern:repeat")
+        assert check_advertising("hello") == (False, None)
+
+
+def test_patterns_run_on_original_and_normalized_text():
+    from manager import manager
+    from utils.advertising import check_advertising
+
+    config = _mock_config()
+    config["advertising"]["words"] = "Telegram频道"
+    # 按原文编写的正则：全角字符与连续空白在归一化后不再存在
+    config["advertising"]["regex_patterns"] = r"fw:加ＶＸ\d+;gap:\d{3} {2,}\d{4};tg:t\.me/\+\w+"
+    with patch.object(manager, "config", config):
+        assert check_advertising("加ＶＸ12345") == (True, "pattern:fw")
+        assert check_advertising("call 138   1234") == (True, "pattern:gap")
+        assert check_advertising("ｔ.ｍｅ/+abc") == (True, "pattern:tg")
+        # 上报配置中的原词，而不是归一化后的形式
+        assert check_advertising("加入 telegram频道") == (True, "Telegram频道")
@@ -0,0 +1,85 @@
+"""Tests for streaming /asr uploads and the ASR job queue."""
+from __future__ import annotations
+
+import asyncio
+from configparser import ConfigParser
+from unittest.mock import AsyncMock
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import utils.asr as asr_mod
+
+
+@pytest.fixture
+async def asr_server(mock_manager, monkeypatch):
+    """本地 ASR 端点：返回收到的文件名、大小与是否 chunked 传输。"""
+    received = {}
+
+    async def handle(request: web.Request):
+        reader = await request.multipart()
+        field = await reader.next()
+        data = await field.read()
+        received.update(name=field.name, filename=field.filename, size=len(data))
+        received["chunked"] = request.headers.get("Transfer-Encoding") == "chunked"
+        return web.json_response({"text": f"{field.filename}:{len(data)}"})
+
+    app = web.Application()
+    app.router.add_post("/v1/audio/transcriptions", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    config = ConfigParser()
+    config["asr"] = {"endpoint": f"http://127.0.0.1:{port}/v1/audio/transcriptions"}
+    monkeypatch.setattr(mock_manager, "config", config)
+    session = aiohttp.ClientSession()
+    mock_manager.create_session = AsyncMock(return_value=session)
+    yield received
+    await session.close()
+    await runner.cleanup()
+
+
+async def _chunks(count: int, size: int):
+    for _ in range(count):
+        await asyncio.sleep(0)
+        yield b"\0" * size
+
+
+async def test_chunks_are_uploaded_as_streaming_multipart(asr_server):
+    text = await asr_mod.openai_whisper(_chunks(8, 4096), filename="voice.oga", content_type="audio/ogg")
+    assert text == "voice.oga:32768"
+    assert asr_server == {"name": "audio", "filename": "voice.oga", "size": 32768, "chunked": True}
+
+
+async def test_size_cap_aborts_the_upload(asr_server):
+    with pytest.raises(asr_mod.MediaTooLarge):
+        await asr_mod.openai_whisper(asr_mod.limit_size(_chunks(8, 4096), 10000))
+
+
+async def test_queue_bounds_jobs_and_reports_position():
+    queue = asr_mod.ASRQueue(limit=1)
+    release = asyncio.Event()
+    peak = 0
+
+    async def job():
+        nonlocal peak
+        async with queue.slot():
+            peak = max(peak, queue.running)
+            await release.wait()
+
+    assert queue.ahead() == 0
+    tasks = [asyncio.create_task(job())]
+    await asyncio.sleep(0)
+    assert queue.ahead() == 1
+    tasks.append(asyncio.create_task(job()))
+    await asyncio.sleep(0)
+    assert queue.ahead() == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert peak == 1
+    assert queue.stats() == {"limit": 1, "running": 0, "waiting": 0, "completed": 2, "failed": 0}
@@ -0,0 +1,95 @@
+"""Tests for streaming ffmpeg transcoding."""
+from __future__ import annotations
+
+import asyncio
+import sys
+
+import pytest
+
+import utils.audio as audio_mod
+
+# 用一个把 stdin 反转写回 stdout 的 Python 进程代替 ffmpeg
+REVERSE = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read()[::-1])"]
+FAIL = [sys.executable, "-c", "import sys; sys.stdin.buffer.read(); sys.stderr.write('bad input'); sys.exit(3)"]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_slots(monkeypatch):
+    monkeypatch.setattr(audio_mod, "_slots", None)
+
+
+async def _chunks(*parts, delay=0.0, error=None):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+    if error is not None:
+        raise error
+
+
+async def test_chunks_are_streamed_through_the_subprocess(monkeypatch, loop_guard):
+    monkeypatch.setattr(audio_mod, "ffmpeg_command", lambda fmt, args: REVERSE)
+    data = await audio_mod.transcode(_chunks(b"ab", b"cd", b"ef", delay=0.01))
+    assert data == b"fedcba"
+    assert loop_guard.max_lag < 0.1
+
+
+async def test_failures_raise_and_kill_the_process(monkeypatch):
+    monkeypatch.setattr(audio_mod, "ffmpeg_command", lambda fmt, args: FAIL)
+    with pytest.raises(RuntimeError, match="exited with 3"):
+        await audio_mod.transcode(_chunks(b"x"))
+
+    monkeypatch.setattr(audio_mod, "ffmpeg_command", lambda fmt, args: REVERSE)
+    with pytest.raises(ValueError, match="upstream"):
+        await audio_mod.transcode(_chunks(b"x", error=ValueError("upstream")))
+
+
+async def test_concurrent_transcodes_are_bounded(monkeypatch):
+    monkeypatch.setattr(audio_mod, "ffmpeg_command", lambda fmt, args: REVERSE)
+    monkeypatch.setattr(audio_mod, "TRANSCODE_WORKERS", 1)
+    peak = running = 0
+    real_exec = asyncio.create_subprocess_exec
+
+    async def counting_exec(*args, **kwargs):
+        nonlocal peak, running
+        running += 1
+        peak = max(peak, running)
+        proc = await real_exec(*args, **kwargs)
+        real_wait = proc.wait
+
+        async def wait():
+            nonlocal running
+            code = await real_wait()
+            running -= 1
+            return code
+
+        proc.wait = wait
+        return proc
+
+    monkeypatch.setattr(audio_mod.asyncio, "create_subprocess_exec", counting_exec)
+    results = await asyncio.gather(*(audio_mod.transcode(_chunks(bytes([i]) * 2)) for i in range(3)))
+    assert sorted(results) == [b"\x00\x00", b"\x01\x01", b"\x02\x02"]
+    assert peak == 1
+
+
+async def test_slot_and_timeout_start_with_the_first_chunk(monkeypatch):
+    monkeypatch.setattr(audio_mod, "ffmpeg_command", lambda fmt, args: REVERSE)
+    monkeypatch.setattr(audio_mod, "TRANSCODE_WORKERS", 1)
+    spawned = []
+    real_exec = asyncio.create_subprocess_exec
+
+    async def recording_exec(*args, **kwargs):
+        spawned.append(args)
+        return await real_exec(*args, **kwargs)
+
+    monkeypatch.setattr(audio_mod.asyncio, "create_subprocess_exec", recording_exec)
+
+    # 上游迟迟不产出时不占用槽位、不启动 ffmpeg，也不计入超时
+    slow = asyncio.create_task(audio_mod.transcode(_chunks(b"ab", delay=0.2), timeout=0.15))
+    await asyncio.sleep(0.05)
+    assert spawned == []
+    assert await audio_mod.transcode(_chunks(b"cd")) == b"dc"
+    assert await slow == b"ba"
+
+    with pytest.raises(RuntimeError, match="no audio input"):
+        await audio_mod.transcode(_chunks())
+    assert len(spawned) == 2
@@ -0,0 +1,54 @@
+"""Tests for running blocking library calls off the event loop."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.blocking import BlockingPool
+
+
+async def test_blocking_call_does_not_stall_the_loop(loop_guard):
+    pool = BlockingPool("test-pool", workers=2, timeout=5)
+    try:
+        assert await pool.run(lambda s: time.sleep(s) or "done", 0.2) == "done"
+    finally:
+        pool.shutdown()
+    assert loop_guard.max_lag < 0.1
+
+
+async def test_guard_detects_a_blocking_call(loop_guard):
+    await asyncio.sleep(0.01)
+    time.sleep(0.2)
+    await asyncio.sleep(0.01)
+    assert loop_guard.max_lag >= 0.15
+
+
+async def test_pool_bounds_concurrency_and_times_out():
+    pool = BlockingPool("test-pool", workers=2, timeout=5)
+    lock = threading.Lock()
+    running = peak = 0
+
+    def work():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return True
+
+    try:
+        assert await asyncio.gather(*(pool.run(work) for _ in range(6))) == [True] * 6
+        assert peak == 2
+
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(time.sleep, 0.3, timeout=0.05)
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(lambda: 1 / 0)
+    finally:
+        pool.shutdown()
+    assert pool.stats() == {"workers": 2, "submitted": 8, "completed": 6, "timeouts": 1, "errors": 1}
@@ -0,0 +1,79 @@
+"""Tests for stateless signed captcha callback data."""
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+
+CHAT_ID = -100123456
+USER_ID = 999888
+
+
+@pytest.fixture
+def callback_data(mock_manager):
+    from handlers.member_captcha import callback_data as mod
+
+    return mod
+
+
+def test_roundtrip_fits_telegram_limit(callback_data):
+    data = callback_data.sign_callback_data(CHAT_ID, USER_ID, "3", 0xBEEF, 1_700_000_000)
+
+    assert len(data) <= 64
+    data.decode("ascii")
+    assert callback_data.verify_callback_data(CHAT_ID, data, now=1_700_000_010) == f"{USER_ID}__1700000000-0000beef__3"
+    assert callback_data.verify_callback_data(CHAT_ID, data.decode(), now=1_700_000_010) is not None
+
+
+def test_rejects_tampered_foreign_and_expired(callback_data):
+    issued = int(time.time())
+    data = callback_data.sign_callback_data(CHAT_ID, USER_ID, "O", 7, issued)
+
+    tampered = data[:-2] + (b"AA" if data[-2:] != b"AA" else b"BB")
+    assert callback_data.verify_callback_data(CHAT_ID, tampered) is None
+    assert callback_data.verify_callback_data(-100654321, data) is None
+    assert callback_data.verify_callback_data(CHAT_ID, b"5d41402abc4b2a76b9719d911017c592") is None
+    assert callback_data.verify_callback_data(CHAT_ID, data, now=issued + callback_data.CALLBACK_TTL + 1) is None
+
+
+async def test_build_captcha_message_buttons_verify(callback_data):
+    from handlers.member_captcha.helpers import build_captcha_message
+
+    now = datetime.now(timezone.utc)
+    user = SimpleNamespace(id=USER_ID, first_name="A", last_name=None)
+    _, buttons, meta = await build_captcha_message(user, now, CHAT_ID)
+
+    decoded = [callback_data.verify_callback_data(CHAT_ID, b.type.data) for row in buttons for b in row]
+    assert [d.rsplit("__", 1)[1] for d in decoded] == ["0", "1", "2", "3", "4", "O", "X"]
+    assert all(d.startswith(f"{USER_ID}__") for d in decoded)
+    assert "callback_map" not in meta
+
+
+async def test_process_callback_without_redis_lookup(callback_data, mock_manager, fake_redis):
+    from handlers.member_captcha import callbacks
+
+    data = callback_data.sign_callback_data(CHAT_ID, USER_ID, "2", 1)
+    msg = SimpleNamespace(
+        id=1001,
+        out=True,
+        reply_markup=SimpleNamespace(rows=[
+            SimpleNamespace(buttons=[None] * 5),
+            SimpleNamespace(buttons=[None] * 2),
+        ]),
+    )
+    event = SimpleNamespace(data=data, answer=AsyncMock())
+    event.get_message = AsyncMock(return_value=msg)
+    event.get_chat = AsyncMock(return_value=SimpleNamespace(id=CHAT_ID, title="g"))
+    event.get_sender = AsyncMock(return_value=SimpleNamespace(id=USER_ID, username="u"))
+    mock_manager.is_admin = AsyncMock(return_value=False)
+    fake_redis.get = AsyncMock(side_effect=AssertionError("no GET expected"))
+
+    with patch.object(callbacks, "handle_self_verification", new=AsyncMock()) as verify:
+        await callbacks.process_callback_query(event)
+
+    verify.assert_awaited_once()
+    assert verify.await_args.args[2].endswith("__2")
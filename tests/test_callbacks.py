@@ -1,6 +1,7 @@
 """Tests for callback handling (handle_self_verification, handle_admin_operation)."""
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
@@ -292,3 +293,63 @@ class TestSelfVerification:
             operator, "test"
         )
         assert result is False
+
+
+# ------------------------------------------------------------------
+# Atomic verify-and-transition (CaptchaSession.verify_answer)
+# ------------------------------------------------------------------
+
+
+@pytest.mark.usefixtures("mock_manager")
+class TestAtomicVerification:
+    TOKEN = "1748779200-0000beef"
+
+    @pytest.fixture(autouse=True)
+    async def _session(self, mock_manager, fake_redis):
+        from handlers.member_captcha.session import CaptchaSession
+
+        await CaptchaSession.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=f"msg:{MSG_ID}")
+        await CaptchaSession.record_answer(CHAT_ID, USER_ID, icon="❤️", answer="2", options="[]", token=self.TOKEN)
+        # 入群时调度的超时踢人与消息删除任务
+        await fake_redis.zadd("lazy_sessions", {f"{CHAT_ID}:{USER_ID}:new_member_check:{MSG_ID}": NOW.timestamp()})
+        await fake_redis.zadd("lazy_delete_messages", {f"{CHAT_ID}:{MSG_ID}": NOW.timestamp()})
+
+    async def test_double_click_accepts_once(self, mock_manager, fake_redis):
+        from handlers.member_captcha.callbacks import handle_self_verification
+
+        data = f"{USER_ID}__{self.TOKEN}__2"
+        with patch("handlers.member_captcha.callbacks.accepted_member", new=AsyncMock()) as mock_accept:
+            await asyncio.gather(*(
+                handle_self_verification(_make_chat(), _make_msg(), data, _make_operator(), "test")
+                for _ in range(2)
+            ))
+        mock_accept.assert_awaited_once()
+
+    async def test_click_on_previous_captcha_is_ignored(self, mock_manager, fake_redis):
+        from handlers.member_captcha.callbacks import handle_self_verification
+        from handlers.member_captcha.session import CaptchaSession
+
+        result = await handle_self_verification(
+            _make_chat(), _make_msg(), f"{USER_ID}__1748779100-00000001__2", _make_operator(), "test"
+        )
+        assert result is True
+        mock_manager.edit_text.assert_not_awaited()
+        assert (await CaptchaSession.get(CHAT_ID, USER_ID))["last_answer"] == "2"
+
+    async def test_wrong_answer_transitions_in_one_call(self, mock_manager, fake_redis):
+        from handlers.member_captcha.callbacks import handle_self_verification
+        from handlers.member_captcha.session import CaptchaSession
+
+        result = await handle_self_verification(
+            _make_chat(), _make_msg(), f"{USER_ID}__{self.TOKEN}__0", _make_operator(), "test"
+        )
+        assert result is True
+
+        session = await CaptchaSession.get(CHAT_ID, USER_ID)
+        assert session["retry_count"] == "1"
+        assert session["last_token"] != self.TOKEN
+        # 超时踢人与消息删除由脚本顺延，不再走 ZSCAN 删除 + 重新调度
+        assert fake_redis._sorted_sets["lazy_sessions"][f"{CHAT_ID}:{USER_ID}:new_member_check:{MSG_ID}"] > NOW.timestamp()
+        assert fake_redis._sorted_sets["lazy_delete_messages"][f"{CHAT_ID}:{MSG_ID}"] > NOW.timestamp()
+        mock_manager.lazy_session_delete.assert_not_awaited()
+        mock_manager.edit_text.assert_awaited_once()
@@ -0,0 +1,74 @@
+"""Tests for the append-only /chat history store."""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from unittest.mock import AsyncMock
+
+import pytest
+from redis.exceptions import ConnectionError, ResponseError, TimeoutError as RedisTimeoutError
+
+from handlers.utils import txt as txt_mod
+from handlers.utils.history import ChatHistory, decode_message, encode_message, history_key
+
+
+def test_message_encoding_compresses_long_content():
+    short = encode_message("user", "hi", 1)
+    long = encode_message("assistant", "长文本" * 200, 400)
+    assert short.startswith(b"j") and long.startswith(b"z")
+    assert len(long) < len("长文本".encode() * 200)
+    assert decode_message(long) == ("assistant", "长文本" * 200, 400)
+
+
+async def test_fit_drops_oldest_and_writes_only_new_turns(fake_redis):
+    history = await ChatHistory.load(fake_redis, 1)
+    await history.append(fake_redis, [("user", "a", 10), ("assistant", "b", 20)], 60)
+    await history.append(fake_redis, [("user", "c", 30), ("assistant", "d", 40)], 60)
+
+    history = await ChatHistory.load(fake_redis, 1)
+    assert history.tokens == 100 and [m["content"] for m in history.as_messages()] == ["a", "b", "c", "d"]
+
+    history.fit(budget=100, incoming=25)
+    assert history.dropped == [0, 1] and history.tokens == 70
+    await history.append(fake_redis, [("user", "e", 25)], 60)
+
+    stored = await fake_redis.hgetall(history_key(1))
+    assert sorted(k for k in stored if k.isdigit()) == [b"2", b"3", b"4"]
+    assert b"tokens" not in stored
+    reloaded = await ChatHistory.load(fake_redis, 1)
+    assert reloaded.head == 2 and reloaded.next == 5 and reloaded.tokens == 95
+    assert [m["content"] for m in reloaded.as_messages()] == ["c", "d", "e"]
+
+
+async def test_legacy_string_history_is_discarded():
+    rdb = AsyncMock()
+    rdb.hgetall.side_effect = ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+    history = await ChatHistory.load(rdb, 7)
+    assert history.as_messages() == []
+    rdb.delete.assert_awaited_once_with(history_key(7))
+
+
+@pytest.mark.parametrize("error", [RedisTimeoutError("timed out"), ConnectionError("reset"), ResponseError("LOADING")])
+async def test_transient_errors_keep_the_history(error):
+    rdb = AsyncMock()
+    rdb.hgetall.side_effect = error
+    with pytest.raises(type(error)):
+        await ChatHistory.load(rdb, 7)
+    rdb.delete.assert_not_awaited()
+
+
+async def test_generate_text_tokenizes_only_the_new_turn(mock_manager, fake_redis, monkeypatch):
+    config = ConfigParser()
+    config["ai"] = {"proxy_host": "http://proxy", "proxy_token": "t", "chat_model": "m"}
+    monkeypatch.setattr(mock_manager, "config", config)
+    monkeypatch.setattr(
+        txt_mod, "_api_request", AsyncMock(return_value={"choices": [{"message": {"content": "answer"}}]})
+    )
+    counted = []
+    monkeypatch.setattr(txt_mod, "count_tokens", lambda text: counted.append(text) or 5)
+
+    await txt_mod.tg_generate_text(1, 9, "first question")
+    await txt_mod.tg_generate_text(1, 9, "second question")
+    assert counted == ["first question", "answer", "second question", "answer"]
+
+    sent = txt_mod._api_request.await_args.args[1]["messages"]
+    assert [m["content"] for m in sent[1:]] == ["first question", "answer", "second question"]
@@ -0,0 +1,66 @@
+"""Tests for the persistent chat peer cache behind resolve_chat_entity."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from telethon.tl import types
+
+from manager.group import resolve_chat_entity
+from manager.peers import ChatPeerCache
+
+
+CHANNEL_ID = 1445219041
+CHAT_ID = -1001445219041
+
+
+def _channel(min=False):
+    return types.Channel(
+        id=CHANNEL_ID, title="g", photo=types.ChatPhotoEmpty(), date=None,
+        access_hash=None if min else 987654321, min=min, megagroup=True,
+    )
+
+
+async def test_resolve_hits_api_once(fake_redis):
+    peers = ChatPeerCache(AsyncMock(return_value=fake_redis))
+    client = AsyncMock()
+    client.get_entity = AsyncMock(return_value=_channel())
+
+    assert isinstance(await resolve_chat_entity(client, CHAT_ID, peers), types.Channel)
+    peer = await resolve_chat_entity(client, CHAT_ID, peers)
+
+    assert peer == types.InputPeerChannel(CHANNEL_ID, 987654321)
+    client.get_entity.assert_awaited_once()
+
+
+async def test_update_entities_populate_cache_for_bare_id(fake_redis):
+    peers = ChatPeerCache(AsyncMock(return_value=fake_redis))
+    update = types.UpdateNewChannelMessage(message=None, pts=1, pts_count=1)
+    update._entities = {CHAT_ID: _channel(), 42: types.User(id=42)}
+    await peers.remember_from_update(update)
+
+    client = AsyncMock()
+    client.get_entity = AsyncMock(side_effect=ValueError("not cached"))
+    # 裸 id 与 -100 形式都能命中
+    assert await resolve_chat_entity(client, CHANNEL_ID, peers) == types.InputPeerChannel(CHANNEL_ID, 987654321)
+    assert await resolve_chat_entity(client, CHAT_ID, peers) == types.InputPeerChannel(CHANNEL_ID, 987654321)
+    client.get_entity.assert_not_awaited()
+
+
+async def test_peers_survive_restart_via_redis(fake_redis):
+    await ChatPeerCache(AsyncMock(return_value=fake_redis)).remember(types.Chat(
+        id=555, title="basic", photo=types.ChatPhotoEmpty(), participants_count=3, date=None, version=1,
+    ))
+
+    restarted = ChatPeerCache(AsyncMock(return_value=fake_redis))
+    assert await restarted.get([-555]) == types.InputPeerChat(555)
+    assert restarted.stats()["hits"] == 1
+
+
+async def test_min_channel_is_not_cached(fake_redis):
+    peers = ChatPeerCache(AsyncMock(return_value=fake_redis))
+    await peers.remember(_channel(min=True))
+    await peers.remember(SimpleNamespace(id=CHANNEL_ID))
+
+    assert await peers.get([CHAT_ID]) is None
+    assert fake_redis._hashes == {}
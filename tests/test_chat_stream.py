@@ -0,0 +1,145 @@
+"""Tests for streaming /chat completions and progressive reply edits."""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+
+from handlers.commands.chat import func_chat
+from handlers.utils import txt as txt_mod
+from handlers.utils.history import ChatHistory
+
+URL = "http://proxy/v1/chat/completions"
+
+
+def _sse(*chunks: str) -> list[bytes]:
+    lines = [b": keep-alive\n", b"\n"]
+    for text in chunks:
+        payload = orjson.dumps({"choices": [{"delta": {"content": text}}]})
+        lines += [b"data: " + payload + b"\n", b"\n"]
+    return lines + [b"data: [DONE]\n", b"\n"]
+
+
+class _StreamResponse:
+    def __init__(self, lines, status=200):
+        self.status = status
+        self.headers = {}
+        self.content = _Lines(lines)
+
+    async def text(self):
+        return ""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Lines:
+    def __init__(self, lines):
+        self._lines = list(lines)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._lines:
+            raise StopAsyncIteration
+        return self._lines.pop(0)
+
+
+class _Session:
+    def __init__(self, response):
+        self.response = response
+        self.payloads = []
+
+    def post(self, url, json=None, **kwargs):
+        self.payloads.append(json)
+        return self.response
+
+
+def _ai_config():
+    config = ConfigParser()
+    config["telegram"] = {"token": "123:test"}
+    config["ai"] = {"proxy_host": "http://proxy", "proxy_token": "t", "chat_model": "m"}
+    return config
+
+
+async def test_sse_stream_yields_deltas(mock_manager):
+    lines = _sse("你", "好") + [b"data: {\"choices\": [{\"delta\": {}}]}\n", b"\n"]
+    session = _Session(_StreamResponse(lines))
+    mock_manager.create_session = AsyncMock(return_value=session)
+
+    deltas = [d async for d in txt_mod._api_stream(URL, {"model": "m", "messages": []}, "t")]
+    assert deltas == ["你", "好"]
+    assert session.payloads[0]["stream"] is True
+    assert txt_mod.model_health.get(URL, "m").successes == 1
+
+
+async def test_sse_stream_error_event_raises(mock_manager):
+    lines = [b"data: " + orjson.dumps({"error": {"message": "boom"}}) + b"\n", b"\n"]
+    mock_manager.create_session = AsyncMock(return_value=_Session(_StreamResponse(lines)))
+
+    with pytest.raises(ValueError, match="boom"):
+        async for _ in txt_mod._api_stream(URL, {"model": "m", "messages": []}, "t"):
+            pass
+
+
+async def test_generate_text_streams_and_saves_history(mock_manager, fake_redis, monkeypatch):
+    monkeypatch.setattr(mock_manager, "config", _ai_config())
+    monkeypatch.setattr(txt_mod, "count_tokens", len)
+    mock_manager.create_session = AsyncMock(return_value=_Session(_StreamResponse(_sse("Hel", "lo"))))
+    seen = []
+
+    async def on_delta(delta):
+        seen.append(delta)
+
+    text = await txt_mod.tg_generate_text(1, 42, "hi there", on_delta=on_delta)
+    assert seen == ["Hel", "lo"]
+    assert text.startswith("Hello\n\nPowered by")
+    history = await ChatHistory.load(fake_redis, 42)
+    assert history.as_messages()[-1] == {"role": "assistant", "content": "Hello"}
+
+
+async def test_streaming_reply_throttles_edits(mock_manager, monkeypatch):
+    calls = []
+
+    async def bot_api(method, payload):
+        calls.append((method, payload.get("text")))
+        return {"message_id": 77}
+
+    monkeypatch.setattr(func_chat, "_bot_api", bot_api)
+    monkeypatch.setattr(func_chat, "_reply_response", AsyncMock(return_value=True))
+    writer = func_chat.StreamingReply(SimpleNamespace(chat_id=1, id=5), "test", interval=60)
+
+    assert await writer.start()
+    for delta in ["a", "b", "c"]:
+        await writer.feed(delta)
+    assert await writer.finish("abc")
+
+    # 占位、节流间隔内只编辑一次、正式发送后删除占位
+    assert calls == [
+        ("sendMessage", func_chat.STREAM_PLACEHOLDER),
+        ("editMessageText", "a" + func_chat.STREAM_CURSOR),
+        ("deleteMessage", None),
+    ]
+
+
+async def test_streaming_reply_backs_off_on_rate_limit(mock_manager, monkeypatch):
+    async def bot_api(method, payload):
+        if method == "editMessageText":
+            error = RuntimeError("Too Many Requests")
+            error.retry_after = 30
+            raise error
+        return {"message_id": 77}
+
+    monkeypatch.setattr(func_chat, "_bot_api", bot_api)
+    writer = func_chat.StreamingReply(SimpleNamespace(chat_id=1, id=5), "test", interval=0)
+    await writer.start()
+    await writer.feed("a")
+    assert writer.edits == 0
+    assert writer.next_edit_at - func_chat.time.monotonic() > 25
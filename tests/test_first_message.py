@@ -23,6 +23,7 @@ def _make_msg(text="Hello", chat_id=CHAT_ID, sender_id=USER_ID):
         id=1001,
         text=text,
         chat_id=chat_id,
+        sender_id=sender_id,
         delete=AsyncMock(),
         get_chat=AsyncMock(return_value=chat),
         get_sender=AsyncMock(return_value=sender),
@@ -0,0 +1,146 @@
+"""Tests for the local first-message classifier."""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from manager.group import settings_set
+from utils import first_msg_classifier as fmc
+
+CHAT_ID = -100123456
+USER_ID = 888999
+
+SPAM = [
+    "兼职日结 加微信 vx123456 高薪招募",
+    "点击链接领取红包 t.me/+abcdef 免费领取",
+    "博彩平台 首充返利 私聊我",
+    "代开发票 办证 联系 qq 12345678",
+    "日入斗金 刷单兼职 私聊领取",
+    "usdt 套现 担保交易 加我私聊",
+] * 3
+HAM = [
+    "请问这个项目怎么部署到服务器",
+    "我也遇到了同样的报错，升级之后就好了",
+    "谢谢大家，学到了",
+    "有人用过这个库的最新版本吗",
+    "this build fails on python 3.13 for me",
+    "文档里的配置示例是不是过时了",
+] * 3
+
+
+@pytest.fixture
+def model():
+    return fmc.NaiveBayesModel.train(SPAM + HAM, [1] * len(SPAM) + [0] * len(HAM), bits=14)
+
+
+def test_train_separates_classes_and_roundtrips(model, tmp_path):
+    assert model.predict("加微信兼职日结 私聊领取红包") > 0.9
+    assert model.predict("请问大家这个报错怎么解决") < 0.1
+    assert model.meta == {"spam": len(SPAM), "ham": len(HAM)}
+
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+    loaded = fmc.NaiveBayesModel.load(path)
+    assert loaded.bits == 14 and loaded.meta == model.meta
+    assert loaded.predict("博彩返利") == pytest.approx(model.predict("博彩返利"))
+
+    # 归一化后的混淆写法得到相同特征
+    assert fmc.features("ＶＸ\u200b123") == fmc.features("vx123")
+
+
+def test_decide_thresholds_and_evaluate(model):
+    clf = fmc.FirstMessageClassifier(model, accept_below=0.1, reject_above=0.9)
+    assert clf.decide("兼职日结 加微信 高薪")[0] == fmc.DECISION_REJECT
+    assert clf.decide("请问这个库怎么部署")[0] == fmc.DECISION_ACCEPT
+    assert clf.stats()["accepted"] == 1 and clf.stats()["rejected"] == 1
+
+    metrics = fmc.evaluate(model, SPAM + HAM, [1] * len(SPAM) + [0] * len(HAM))
+    assert metrics["accuracy"] == 1.0 and metrics["auto_error"] == 0.0
+    assert 0 < metrics["auto_coverage"] <= 1
+
+
+def test_lazy_load_from_config(model, tmp_path, monkeypatch):
+    from manager import manager
+
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+    config = ConfigParser()
+    config["first_msg_classifier"] = {"model_path": path, "accept_below": "0.2", "reject_above": "0.8"}
+    monkeypatch.setattr(manager, "config", config)
+    monkeypatch.setattr(fmc, "_classifier", None)
+    monkeypatch.setattr(fmc, "_classifier_loaded", False)
+
+    clf = fmc.get_first_msg_classifier()
+    assert clf is not None and clf.accept_below == 0.2 and clf.reject_above == 0.8
+    assert fmc.get_first_msg_classifier() is clf
+
+    config["first_msg_classifier"]["model_path"] = str(tmp_path / "missing.npz")
+    monkeypatch.setattr(fmc, "_classifier_loaded", False)
+    monkeypatch.setattr(fmc, "_classifier", None)
+    assert fmc.get_first_msg_classifier() is None
+
+
+def test_cli_train_writes_model(tmp_path, monkeypatch, capsys):
+    rows = [(i + 1, t, y) for i, (t, y) in enumerate(zip(SPAM + HAM, [1] * len(SPAM) + [0] * len(HAM)))]
+    monkeypatch.setattr(fmc, "load_verdicts", AsyncMock(return_value=rows))
+    monkeypatch.setattr(fmc.database, "close", AsyncMock())
+
+    path = str(tmp_path / "model.npz")
+    assert fmc.main(["train", "--model", path, "--bits", "12"]) == 0
+    assert "holdout" in capsys.readouterr().out
+    assert fmc.NaiveBayesModel.load(path).bits == 12
+
+
+def _make_msg(text):
+    chat = SimpleNamespace(id=CHAT_ID, title="Test Group", megagroup=True)
+    sender = SimpleNamespace(id=USER_ID, first_name="Test", last_name="User", username="testuser")
+    return SimpleNamespace(
+        id=1001,
+        text=text,
+        chat_id=CHAT_ID,
+        sender_id=USER_ID,
+        delete=AsyncMock(),
+        get_chat=AsyncMock(return_value=chat),
+        get_sender=AsyncMock(return_value=sender),
+    )
+
+
+async def _watched(fake_redis):
+    await fake_redis.set(f"first_msg_watch:{CHAT_ID}:{USER_ID}", "1")
+    await settings_set(fake_redis, CHAT_ID, {"first_msg_check": "on"})
+
+
+async def test_confident_reject_skips_llm(mock_manager, fake_redis, model, monkeypatch):
+    from handlers.default import default_handler
+
+    await _watched(fake_redis)
+    monkeypatch.setattr(fmc, "_classifier", fmc.FirstMessageClassifier(model, 0.1, 0.9))
+    llm = AsyncMock(return_value=[])
+    with patch("handlers.default.check_spams_with_llm", llm):
+        msg = _make_msg("兼职日结 加微信 高薪招募")
+        await default_handler(msg)
+
+    llm.assert_not_awaited()
+    msg.delete.assert_awaited()
+    mock_manager.kick_member.assert_awaited()
+    args = fmc.record_verdict.await_args.args
+    assert args[3] is True and args[4] == fmc.SOURCE_CLASSIFIER
+
+
+async def test_uncertain_goes_to_llm_and_is_recorded(mock_manager, fake_redis, model, monkeypatch):
+    from handlers.default import default_handler
+    from handlers.utils.llm import LLMUserEvaluation
+
+    await _watched(fake_redis)
+    monkeypatch.setattr(fmc, "_classifier", fmc.FirstMessageClassifier(model, 0.0, 1.0))
+    llm = AsyncMock(return_value=[LLMUserEvaluation(id=USER_ID, score=10, is_spam=False, reason="正常")])
+    with patch("handlers.default.check_spams_with_llm", llm):
+        msg = _make_msg("今天天气不错")
+        await default_handler(msg)
+
+    llm.assert_awaited_once()
+    msg.delete.assert_not_awaited()
+    fmc.record_verdict.assert_awaited_with(CHAT_ID, USER_ID, "今天天气不错", False, fmc.SOURCE_LLM, 10)
@@ -0,0 +1,93 @@
+"""Tests for the in-process first-message watch set."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from telethon import types
+
+from handlers.default import default_handler
+from manager.watch import FirstMessageWatch, watch_key
+
+CHAT_ID = 123456
+USER_ID = 888999
+
+
+def _event(peer, sender_id=USER_ID):
+    return SimpleNamespace(
+        message=SimpleNamespace(peer_id=peer),
+        chat_id=-1000000000000 - CHAT_ID,
+        sender_id=sender_id,
+        text="hello",
+        get_chat=AsyncMock(),
+        get_sender=AsyncMock(),
+    )
+
+
+async def test_unwatched_sender_skips_entities_and_redis(mock_manager, fake_redis):
+    watch = mock_manager.get_first_msg_watch()
+    await watch.pop(0, 0)  # 载入（空名单）
+    fake_redis.delete = AsyncMock(wraps=fake_redis.delete)
+
+    event = _event(types.PeerChannel(CHAT_ID))
+    await default_handler(event)
+
+    event.get_chat.assert_not_awaited()
+    event.get_sender.assert_not_awaited()
+    fake_redis.delete.assert_not_awaited()
+
+
+async def test_private_and_channel_posts_skip(mock_manager, fake_redis):
+    await fake_redis.set(watch_key(USER_ID, USER_ID), "1")
+
+    event = _event(types.PeerUser(USER_ID))
+    await default_handler(event)
+    event.get_chat.assert_not_awaited()
+
+    event = _event(types.PeerChannel(CHAT_ID), sender_id=None)
+    await default_handler(event)
+    event.get_chat.assert_not_awaited()
+
+
+async def test_watched_sender_takes_slow_path(mock_manager, fake_redis):
+    watch = mock_manager.get_first_msg_watch()
+    await watch.add(CHAT_ID, USER_ID)
+    assert await fake_redis.get(watch_key(CHAT_ID, USER_ID)) == "1"
+
+    event = _event(types.PeerChannel(CHAT_ID))
+    event.get_chat.return_value = SimpleNamespace(id=CHAT_ID, title="G", megagroup=True)
+    event.get_sender.return_value = SimpleNamespace(id=USER_ID, username="u")
+    await default_handler(event)
+
+    event.get_chat.assert_awaited()
+    assert await fake_redis.get(watch_key(CHAT_ID, USER_ID)) is None
+    mock_manager.lazy_session_delete.assert_awaited_with(CHAT_ID, USER_ID, "first_msg_timeout")
+    assert not watch.might_watch(CHAT_ID, USER_ID)
+
+
+async def test_loads_existing_keys_and_pops_once(fake_redis):
+    await fake_redis.set(watch_key(CHAT_ID, USER_ID), "1")
+    await fake_redis.set(watch_key(-100, 7), "1")
+    watch = FirstMessageWatch(AsyncMock(return_value=fake_redis))
+
+    assert watch.might_watch(CHAT_ID, 1)  # 未载入前保守放行
+    assert await watch.pop(CHAT_ID, USER_ID) is True
+    assert await watch.pop(CHAT_ID, USER_ID) is False
+    assert watch.might_watch(-100, 7)
+    assert watch.stats()["skips"] == 1
+
+
+async def test_expired_entries_are_not_watched(fake_redis):
+    watch = FirstMessageWatch(AsyncMock(return_value=fake_redis), ttl=0)
+    await watch.pop(0, 0)
+    await watch.add(CHAT_ID, USER_ID)
+
+    assert watch.might_watch(CHAT_ID, USER_ID) is False
+    assert len(watch) == 0
+
+
+async def test_redis_unavailable_watches_nothing():
+    watch = FirstMessageWatch(AsyncMock(return_value=None))
+    await watch.add(CHAT_ID, USER_ID)
+    assert await watch.pop(CHAT_ID, USER_ID) is False
+    assert watch.might_watch(CHAT_ID, USER_ID) is False
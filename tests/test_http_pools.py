@@ -0,0 +1,135 @@
+"""Tests for per-destination HTTP connection pools."""
+from __future__ import annotations
+
+import asyncio
+from configparser import ConfigParser
+
+import pytest
+from aiohttp import web
+
+from manager.http import PROFILES, HTTPPools, load_profiles
+
+
+@pytest.fixture
+async def slow_server():
+    release = asyncio.Event()
+
+    async def handle(request):
+        await release.wait()
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/", release
+    release.set()
+    await runner.cleanup()
+
+
+def test_profiles_are_overridable_from_config():
+    config = ConfigParser()
+    config["http.llm"] = {"limit": "4", "proxy": "http://proxy:8080", "total_timeout": ""}
+    config["http.custom"] = {"limit_per_host": "2"}
+    config["http.media"] = {"limit": "many"}
+
+    profiles = load_profiles(config)
+    assert profiles["llm"].limit == 4
+    assert profiles["llm"].proxy == "http://proxy:8080"
+    assert profiles["llm"].total_timeout == PROFILES["llm"].total_timeout
+    assert profiles["custom"].limit_per_host == 2
+    assert profiles["media"].limit == PROFILES["media"].limit
+    # 内置 profile 不被修改
+    assert PROFILES["llm"].limit != 4
+
+
+async def test_slow_pool_does_not_block_other_pools(slow_server):
+    url, release = slow_server
+    config = ConfigParser()
+    config["http.media"] = {"limit": "1"}
+    pools = HTTPPools(load_profiles(config))
+    media, llm = pools.session("media"), pools.session("llm")
+    assert media is not llm
+    assert pools.session("nope") is pools.session("default")
+
+    async def fetch(session):
+        async with session.get(url) as response:
+            return await response.text()
+
+    # media 池唯一的连接被占住，第二个 media 请求排队；llm 请求走自己的连接
+    slow = [asyncio.create_task(fetch(media)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    fast = asyncio.create_task(fetch(llm))
+    await asyncio.sleep(0.05)
+    stats = pools.stats()
+    assert stats["media"]["awaiting_headers"] == 2
+    assert stats["media"]["queued"] == 1
+    assert stats["llm"]["awaiting_headers"] == 1
+
+    release.set()
+    assert await asyncio.gather(*slow, fast) == ["ok", "ok", "ok"]
+    stats = pools.stats()
+    assert stats["media"]["waits"] == 1 and stats["media"]["wait_max"] > 0
+    assert stats["llm"]["waits"] == 0
+    assert stats["media"]["awaiting_headers"] == stats["llm"]["awaiting_headers"] == 0
+    assert stats["media"]["in_use"] == stats["llm"]["in_use"] == 0
+
+    await pools.close()
+    assert media.closed and llm.closed
+    assert pools.session("media") is not media
+    await pools.close()
+
+
+async def test_streamed_response_counts_as_in_use_until_released():
+    release = asyncio.Event()
+
+    async def handle(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b"head")
+        await release.wait()
+        await response.write(b"tail")
+        return response
+
+    app = web.Application()
+    app.router.add_get("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+    pools = HTTPPools(load_profiles(None))
+    try:
+        async with pools.session("media").get(url) as response:
+            assert await response.content.readexactly(4) == b"head"
+            # 已收到响应头，但响应体仍在读取，连接仍被占用
+            stats = pools.stats()["media"]
+            assert stats["awaiting_headers"] == 0 and stats["in_use"] == 1
+            release.set()
+            assert await response.read() == b"tail"
+        assert pools.stats()["media"]["in_use"] == 0
+
+        # 提前退出 with（未读完响应体）同样释放
+        release.clear()
+        async with pools.session("media").get(url):
+            assert pools.stats()["media"]["in_use"] == 1
+        assert pools.stats()["media"]["in_use"] == 0
+    finally:
+        release.set()
+        await pools.close()
+        await runner.cleanup()
+
+
+async def test_manager_creates_profiles_lazily_and_closes_them(mock_manager, monkeypatch):
+    # 其他用例会在实例上替换 create_session
+    if "create_session" in vars(mock_manager):
+        monkeypatch.delattr(mock_manager, "create_session")
+    session = await mock_manager.create_session("scrape")
+    assert await mock_manager.create_session("scrape") is session
+    assert list(mock_manager.get_http_pools().stats()) == ["scrape"]
+    assert list(mock_manager.runtime_stats()["http_pools"]) == ["scrape"]
+    await mock_manager.close_http_session()
+    assert session.closed
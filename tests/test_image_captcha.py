@@ -0,0 +1,247 @@
+"""Tests for the pre-rendered image captcha."""
+from __future__ import annotations
+
+import asyncio
+import random
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from handlers.member_captcha.image_captcha import ImageCaptchaPool, ImageChallenge
+from utils.captcha_render import (
+    ALPHABET,
+    CODE_LENGTH,
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    OPTION_COUNT,
+    _make_decoys,
+    render_challenge,
+)
+
+
+CHAT_ID = -100123456
+USER_ID = 999888
+
+
+def _decode_png(png: bytes):
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    pos, chunks = 8, {}
+    while pos < len(png):
+        (length,) = struct.unpack(">I", png[pos : pos + 4])
+        tag = png[pos + 4 : pos + 8]
+        data = png[pos + 8 : pos + 8 + length]
+        assert struct.unpack(">I", png[pos + 8 + length : pos + 12 + length])[0] == zlib.crc32(tag + data)
+        chunks[tag] = chunks.get(tag, b"") + data
+        pos += 12 + length
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    return width, height, zlib.decompress(chunks[b"IDAT"])
+
+
+def test_render_is_deterministic_valid_png():
+    png, code, decoys = render_challenge(42)
+    assert render_challenge(42) == (png, code, decoys)
+
+    width, height, raw = _decode_png(png)
+    assert (width, height) == (IMAGE_WIDTH, IMAGE_HEIGHT)
+    assert len(raw) == (IMAGE_WIDTH + 1) * IMAGE_HEIGHT
+    # 字符墨迹确实绘制在图上
+    assert raw.count(b"\x00") >= IMAGE_HEIGHT
+
+    assert len(code) == CODE_LENGTH and set(code) <= set(ALPHABET)
+    assert len(set(decoys)) == OPTION_COUNT - 1 and code not in decoys
+
+def test_options_do_not_reveal_the_answer():
+    """按各位置多数字符挑选最接近的按钮，命中率应接近随机的 1/5。"""
+    rng = random.Random(7)
+    hits, rounds = 0, 5000
+    for _ in range(rounds):
+        code = "".join(rng.choice(ALPHABET) for _ in range(CODE_LENGTH))
+        options = [code, *_make_decoys(rng, code)]
+        rng.shuffle(options)
+        majority = [max(ALPHABET, key=[o[i] for o in options].count) for i in range(CODE_LENGTH)]
+        guess = max(options, key=lambda o: sum(a == b for a, b in zip(o, majority)))
+        hits += guess == code
+    assert hits / rounds < 0.3
+
+
+def test_render_module_does_not_import_the_bot():
+    """工作进程只导入渲染模块，不应连带导入 manager / handlers。"""
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    code = (
+        "import sys, utils.captcha_render as r; r.render_challenge(1); "
+        "print(sorted(m for m in sys.modules if m.split('.')[0] in ('manager', 'handlers', 'telethon', 'redis')))"
+    )
+    root = Path(__file__).resolve().parent.parent
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def _fake_render(seed: int):
+    return b"x" * 100, "ABCD", ("ABCE", "ABCF", "ABCH", "ABCK")
+
+
+async def test_pool_refills_in_background_and_serves_o1():
+    pool = ImageCaptchaPool(size=4, workers=2, executor=ThreadPoolExecutor(2), render=_fake_render)
+    try:
+        assert pool.take() is None  # 冷启动：触发补充
+        await pool._refill_task
+        assert len(pool) == 4 and pool.stats()["bytes"] == 400
+
+        challenge = pool.take()
+        assert isinstance(challenge, ImageChallenge) and challenge.code == "ABCD"
+        assert len(pool) == 3
+        await pool._refill_task
+        assert len(pool) == 4
+    finally:
+        pool.close()
+
+
+async def test_pool_respects_memory_cap_and_peek_claim():
+    pool = ImageCaptchaPool(size=10, max_bytes=250, executor=ThreadPoolExecutor(1), render=_fake_render)
+    try:
+        pool.warm()
+        await pool._refill_task
+        assert len(pool) == 3  # 第 3 道题后达到 250 字节上限
+
+        challenge = pool.peek()
+        assert pool._ready[0] is challenge and len(pool) == 3
+        assert pool.stats()["served"] == 0
+
+        pool.claim(challenge)
+        assert len(pool) == 2 and pool.stats()["bytes"] == 200
+        assert pool.stats()["served"] == 1
+    finally:
+        pool.close()
+
+
+async def test_pool_renders_on_demand_when_empty():
+    pool = ImageCaptchaPool(size=0, executor=ThreadPoolExecutor(1), render=_fake_render)
+    try:
+        challenge = await pool.get(timeout=1)
+        assert challenge.code == "ABCD"
+        assert pool.stats()["misses"] == 1
+    finally:
+        pool.close()
+
+
+async def test_pool_on_demand_timeout_returns_none():
+    def slow(seed):
+        import time
+
+        time.sleep(0.2)
+        return _fake_render(seed)
+
+    pool = ImageCaptchaPool(size=0, executor=ThreadPoolExecutor(1), render=slow)
+    try:
+        assert await pool.get(timeout=0.01) is None
+    finally:
+        pool.close()
+
+
+async def test_build_image_captcha_message(mock_manager):
+    from handlers.member_captcha.callback_data import verify_callback_data
+    from handlers.member_captcha.helpers import build_image_captcha_message
+
+    challenge = ImageChallenge(b"png", "ABCD", ("ABCE", "ABCF", "ABCH", "ABCK"))
+    user = SimpleNamespace(id=USER_ID, first_name="A", last_name=None)
+    content, buttons, meta = await build_image_captcha_message(user, datetime.now(timezone.utc), CHAT_ID, challenge)
+
+    labels = [b.text for b in buttons[0]]
+    assert sorted(labels) == ["ABCD", "ABCE", "ABCF", "ABCH", "ABCK"]
+    assert labels[int(meta["answer"])] == "ABCD"
+    assert "ABCD" not in content
+    decoded = [verify_callback_data(CHAT_ID, b.type.data) for row in buttons for b in row]
+    assert [d.rsplit("__", 1)[1] for d in decoded] == ["0", "1", "2", "3", "4", "O", "X"]
+    assert challenge.as_file().name.endswith(".png")
+
+
+async def test_image_retry_swaps_picture(mock_manager, fake_redis, monkeypatch):
+    from handlers.member_captcha import callbacks, image_captcha
+    from handlers.member_captcha.session import CaptchaSession
+
+    pool = ImageCaptchaPool(size=2, executor=ThreadPoolExecutor(1), render=_fake_render)
+    monkeypatch.setattr(image_captcha, "_pool", pool)
+    try:
+        pool.warm()
+        await pool._refill_task
+
+        await CaptchaSession.check_and_record(CHAT_ID, USER_ID, event_uid="msg:1")
+        await CaptchaSession.record_answer(CHAT_ID, USER_ID, icon="ABCD", answer="2", options="[]", token="t")
+
+        edits = []
+
+        async def _edit(*args, **kwargs):
+            edits.append(kwargs)
+
+        monkeypatch.setattr(mock_manager, "edit_text", _edit)
+        msg = SimpleNamespace(id=7, photo=object())
+        operator = SimpleNamespace(id=USER_ID, first_name="A", last_name=None)
+        chat = SimpleNamespace(id=CHAT_ID)
+
+        assert await callbacks.handle_self_verification(chat, msg, f"{USER_ID}__t__0", operator, "p")
+        assert edits and edits[0]["file"].name == "captcha.png"
+        session = await CaptchaSession.get(CHAT_ID, USER_ID)
+        assert session["last_icon"] == "ABCD" and session["last_token"] != "t"
+        assert pool.stats()["served"] == 1
+    finally:
+        pool.close()
+        await asyncio.sleep(0)
+
+
+async def test_correct_answer_leaves_image_pool_untouched(mock_manager, fake_redis, monkeypatch):
+    from handlers.member_captcha import callbacks, image_captcha
+    from handlers.member_captcha.session import CaptchaSession
+
+    pool = ImageCaptchaPool(size=2, executor=ThreadPoolExecutor(1), render=_fake_render)
+    monkeypatch.setattr(image_captcha, "_pool", pool)
+    monkeypatch.setattr(callbacks, "accepted_member", AsyncMock())
+    try:
+        pool.warm()
+        await pool._refill_task
+
+        await CaptchaSession.check_and_record(CHAT_ID, USER_ID, event_uid="msg:1")
+        await CaptchaSession.record_answer(CHAT_ID, USER_ID, icon="ABCD", answer="2", options="[]", token="t")
+        msg = SimpleNamespace(id=7, photo=object())
+        operator = SimpleNamespace(id=USER_ID, first_name="A", last_name=None)
+        chat = SimpleNamespace(id=CHAT_ID)
+
+        assert await callbacks.handle_self_verification(chat, msg, f"{USER_ID}__t__2", operator, "p")
+        callbacks.accepted_member.assert_awaited_once()
+        assert len(pool) == 2 and pool.stats()["served"] == 0
+    finally:
+        pool.close()
+        await asyncio.sleep(0)
+
+
+async def test_image_retry_with_empty_pool_resends_as_text(mock_manager, fake_redis, monkeypatch):
+    from handlers.member_captcha import callbacks, image_captcha
+    from handlers.member_captcha.session import CaptchaSession
+
+    pool = ImageCaptchaPool(size=0, executor=ThreadPoolExecutor(1), render=_fake_render)
+    monkeypatch.setattr(image_captcha, "_pool", pool)
+    mock_manager.send_text = AsyncMock(return_value=8)
+    try:
+        await CaptchaSession.check_and_record(CHAT_ID, USER_ID, event_uid="msg:1")
+        await CaptchaSession.record_answer(CHAT_ID, USER_ID, icon="ABCD", answer="2", options="[]", token="t")
+        msg = SimpleNamespace(id=7, photo=object())
+        operator = SimpleNamespace(id=USER_ID, first_name="A", last_name=None)
+        chat = SimpleNamespace(id=CHAT_ID)
+
+        assert await callbacks.handle_self_verification(chat, msg, f"{USER_ID}__t__0", operator, "p")
+        # 旧图片消息删除，图标题以新消息发送，超时任务改挂到新消息
+        mock_manager.edit_text.assert_not_awaited()
+        mock_manager.delete_message.assert_any_await(chat, msg)
+        mock_manager.send_text.assert_awaited_once()
+        mock_manager.lazy_session.assert_awaited_once()
+        assert mock_manager.lazy_session.await_args.args[1:4] == (8, USER_ID, "new_member_check")
+    finally:
+        pool.close()
+        await asyncio.sleep(0)
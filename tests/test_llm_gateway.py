@@ -0,0 +1,106 @@
+"""Tests for the priority-aware LLM gateway."""
+from __future__ import annotations
+
+import asyncio
+from configparser import ConfigParser
+from unittest.mock import AsyncMock
+
+from handlers.utils import gateway as gateway_mod
+from handlers.utils.gateway import (
+    PRIORITY_INTERACTIVE,
+    PRIORITY_MODERATION,
+    PRIORITY_SECURITY,
+    LLMGateway,
+)
+
+
+async def _run(gateway, order, label, priority, user=None, hold=None):
+    async with gateway.slot(priority, user):
+        order.append(label)
+        if hold is not None:
+            await hold.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_priorities_and_fair_interactive_queue():
+    gateway = LLMGateway(limit=1, reserved=0)
+    order, hold = [], asyncio.Event()
+    blocker = asyncio.create_task(_run(gateway, order, "blocker", PRIORITY_SECURITY, hold=hold))
+    await _settle()
+
+    tasks = [
+        asyncio.create_task(_run(gateway, order, label, priority, user))
+        for label, priority, user in [
+            ("alice-1", PRIORITY_INTERACTIVE, 1),
+            ("alice-2", PRIORITY_INTERACTIVE, 1),
+            ("alice-3", PRIORITY_INTERACTIVE, 1),
+            ("bob-1", PRIORITY_INTERACTIVE, 2),
+            ("moderation", PRIORITY_MODERATION, None),
+            ("security", PRIORITY_SECURITY, None),
+        ]
+    ]
+    await _settle()
+    assert gateway.stats()["interactive"]["queued"] == 4
+
+    await asyncio.sleep(0.01)
+    hold.set()
+    await asyncio.gather(blocker, *tasks)
+    assert order == ["blocker", "security", "moderation", "alice-1", "bob-1", "alice-2", "alice-3"]
+    stats = gateway.stats()
+    assert stats["active"] == 0 and stats["security"]["admitted"] == 2
+    assert stats["interactive"]["wait_max"] >= stats["interactive"]["wait_avg"] > 0
+
+
+async def test_reserved_slot_is_kept_for_security():
+    gateway = LLMGateway(limit=2, reserved=1)
+    order, hold = [], asyncio.Event()
+    chat = [asyncio.create_task(_run(gateway, order, f"chat-{i}", PRIORITY_INTERACTIVE, i, hold)) for i in range(2)]
+    await _settle()
+    assert order == ["chat-0"]
+
+    # 交互请求占满自己的份额后，安全检查仍能立即拿到保留名额
+    await asyncio.wait_for(_run(gateway, order, "security", PRIORITY_SECURITY), timeout=1)
+    assert order == ["chat-0", "security"]
+
+    hold.set()
+    await asyncio.gather(*chat)
+    assert order[-1] == "chat-1"
+
+
+async def test_cancelled_waiter_leaves_queue():
+    gateway = LLMGateway(limit=1, reserved=0)
+    order, hold = [], asyncio.Event()
+    blocker = asyncio.create_task(_run(gateway, order, "blocker", PRIORITY_SECURITY, hold=hold))
+    waiter = asyncio.create_task(_run(gateway, order, "waiter", PRIORITY_INTERACTIVE, 1))
+    await _settle()
+
+    waiter.cancel()
+    await _settle()
+    assert gateway.stats()["interactive"]["queued"] == 0
+
+    hold.set()
+    await blocker
+    assert gateway.stats()["active"] == 0
+    await asyncio.wait_for(_run(gateway, order, "after", PRIORITY_INTERACTIVE, 1), timeout=1)
+    assert order == ["blocker", "after"]
+
+
+async def test_chat_completions_passes_priority_to_gateway(mock_manager, monkeypatch):
+    config = ConfigParser()
+    config["ai"] = {"proxy_host": "http://proxy", "proxy_token": "t", "llm_concurrency": "3", "llm_reserved_slots": "2"}
+    monkeypatch.setattr(mock_manager, "config", config)
+    gateway = gateway_mod.get_llm_gateway()
+    assert (gateway.limit, gateway.interactive_limit) == (3, 1)
+
+    from handlers.utils import txt as txt_mod
+
+    api = AsyncMock(return_value={"choices": [{"message": {"content": "ok"}}]})
+    monkeypatch.setattr(txt_mod, "_api_request", api)
+    assert await txt_mod.chat_completions([], "m", priority=PRIORITY_SECURITY, temperature=0) == "ok"
+    url, data, token, priority, user_id = api.await_args.args
+    assert priority == PRIORITY_SECURITY and user_id is None
+    assert "priority" not in data and data["temperature"] == 0
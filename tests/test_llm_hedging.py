@@ -0,0 +1,135 @@
+"""Tests for hedged multi-model spam LLM requests."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import handlers.utils.llm as llm_mod
+from handlers.utils import BadRequestError
+
+VALID = '{"evaluations": [{"id": 1, "score": 90, "is_spam": true, "reason": "广告"}]}'
+
+
+@pytest.fixture(autouse=True)
+def _reset_state(monkeypatch):
+    monkeypatch.setattr(llm_mod, "_latencies", {})
+    monkeypatch.setattr(llm_mod, "_schema_unsupported", {})
+    monkeypatch.setattr(llm_mod, "hedge_stats", {"requests": 0, "hedged": 0, "backup_wins": 0})
+    monkeypatch.setattr(llm_mod, "LLM_HEDGE_DELAY", 0.05)
+
+
+def _fake_completions(behaviour):
+    """behaviour: model -> (delay, result or Exception)；记录每次调用的 (model, format)。"""
+    calls = []
+    cancelled = []
+
+    async def _chat_completions(messages, model, **kwargs):
+        calls.append((model, kwargs["response_format"]["type"]))
+        delay, result = behaviour[model]
+        if callable(result):
+            result = result(kwargs["response_format"]["type"])
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return _chat_completions, calls, cancelled
+
+
+async def test_slow_primary_is_hedged_and_cancelled(monkeypatch):
+    fake, calls, cancelled = _fake_completions({"slow": (5, VALID), "fast": (0.01, VALID)})
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+
+    started = asyncio.get_running_loop().time()
+    data = await llm_mod._hedged_query(["slow", "fast"], [], budget=2)
+    assert data["evaluations"][0]["id"] == 1
+    assert asyncio.get_running_loop().time() - started < 1
+    await asyncio.sleep(0)
+    assert cancelled == ["slow"]
+    assert llm_mod.hedge_stats == {"requests": 1, "hedged": 1, "backup_wins": 1}
+
+
+async def test_failed_primary_falls_through_without_delay(monkeypatch):
+    monkeypatch.setattr(llm_mod, "LLM_HEDGE_DELAY", 5)
+    fake, calls, _ = _fake_completions({"bad": (0, RuntimeError("down")), "good": (0, VALID)})
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+
+    data = await asyncio.wait_for(llm_mod._hedged_query(["bad", "good"], [], budget=2), timeout=1)
+    assert data is not None
+    assert [m for m, _ in calls] == ["bad", "bad", "good"]
+
+
+async def test_failed_hedge_is_replaced_while_primary_runs(monkeypatch):
+    monkeypatch.setattr(llm_mod, "LLM_HEDGE_DELAY", 0.3)
+    fake, calls, cancelled = _fake_completions(
+        {"slow": (5, VALID), "bad": (0, RuntimeError("down")), "good": (0.01, VALID)}
+    )
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+
+    # bad 在 0.3s 时启动并立即失败，good 应马上补上，而不是再等一个对冲延迟
+    started = asyncio.get_running_loop().time()
+    data = await llm_mod._hedged_query(["slow", "bad", "good"], [], budget=2)
+    assert data is not None
+    assert asyncio.get_running_loop().time() - started < 0.5
+    await asyncio.sleep(0)
+    assert cancelled == ["slow"]
+
+
+async def test_format_capability_is_remembered(monkeypatch):
+    def schema_unsupported(fmt):
+        return BadRequestError("请求参数错误") if fmt == "json_schema" else VALID
+
+    fake, calls, _ = _fake_completions({"m": (0, schema_unsupported)})
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+
+    assert await llm_mod._query_model("m", []) is not None
+    assert await llm_mod._query_model("m", []) is not None
+    assert calls == [("m", "json_schema"), ("m", "json_object"), ("m", "json_object")]
+
+
+@pytest.mark.parametrize("error", [ValueError("AI服务暂时不可用 (503)，请稍后重试"), RuntimeError("connection reset")])
+async def test_transport_errors_do_not_downgrade_format(monkeypatch, error):
+    def flaky_schema(fmt):
+        return error if fmt == "json_schema" else VALID
+
+    fake, calls, _ = _fake_completions({"m": (0, flaky_schema)})
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+
+    assert await llm_mod._query_model("m", []) is not None
+    assert await llm_mod._query_model("m", []) is not None
+    assert calls == [("m", "json_schema"), ("m", "json_object")] * 2
+    assert "m" not in llm_mod._schema_unsupported
+
+
+async def test_unparsable_schema_output_downgrades_format(monkeypatch):
+    fake, calls, _ = _fake_completions({"m": (0, lambda fmt: "not json" if fmt == "json_schema" else VALID)})
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+
+    assert await llm_mod._query_model("m", []) is not None
+    assert "m" in llm_mod._schema_unsupported
+
+
+def test_hedge_delay_tracks_p90(monkeypatch):
+    assert llm_mod.hedge_delay("m") == llm_mod.LLM_HEDGE_DELAY
+    for elapsed in [1.0] * 9 + [4.0] * 2:
+        llm_mod._record_latency("m", elapsed)
+    assert llm_mod.hedge_delay("m") == 4.0
+    llm_mod._record_latency("tiny", 0.01)
+    for _ in range(10):
+        llm_mod._record_latency("tiny", 0.01)
+    assert llm_mod.hedge_delay("tiny") == llm_mod.LLM_HEDGE_MIN_DELAY
+
+
+async def test_check_spams_uses_first_valid_result(monkeypatch):
+    fake, _, _ = _fake_completions({"a": (0, "not json at all"), "b": (0, VALID)})
+    monkeypatch.setattr(llm_mod, "chat_completions", fake)
+    monkeypatch.setattr(llm_mod, "get_spam_models", lambda: ["a", "b"])
+
+    results = await llm_mod.check_spams_with_llm([SimpleNamespace(id=1, first_name="x")])
+    assert [(r.id, r.is_spam) for r in results] == [(1, True)]
@@ -189,10 +189,9 @@ async def test_ban_mode_marks_captcha_restriction(monkeypatch, mock_manager):
     monkeypatch.setattr(
         member_captcha_module,
         "build_captcha_message",
-        AsyncMock(return_value=("captcha", [], {"icon": "x", "answer": "x", "options": "[]", "callback_map": {}})),
+        AsyncMock(return_value=("captcha", [], {"icon": "x", "answer": "x", "options": "[]", "token": "t"})),
     )
     monkeypatch.setattr(member_captcha_module.CaptchaSession, "record_answer", AsyncMock())
-    monkeypatch.setattr(member_captcha_module, "store_callback_map", AsyncMock())
     monkeypatch.setattr(member_captcha_module.manager, "delete_message", AsyncMock())
     mock_manager.client.send_message = AsyncMock(return_value=SimpleNamespace(id=100))
 
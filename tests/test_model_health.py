@@ -0,0 +1,160 @@
+"""Tests for per-model health tracking and circuit breaking on the AI proxy."""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from unittest.mock import AsyncMock
+
+import pytest
+
+import handlers.utils.health as health_mod
+from handlers.utils import txt as txt_mod
+from handlers.utils.health import HealthTracker
+
+HOST = "http://proxy:8080"
+URL = f"{HOST}/v1/chat/completions"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(health_mod, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    tracker = HealthTracker()
+    for _ in range(health_mod.FAILURE_THRESHOLD):
+        assert tracker.acquire(URL, "m")
+        tracker.record_failure(URL, "m", "status 503")
+    assert not tracker.acquire(URL, "m")
+    assert tracker.stats()["proxy:8080/m"]["state"] == health_mod.STATE_OPEN
+
+    # 冷却期结束：只放行一个探测请求，探测失败冷却期翻倍
+    clock[0] += health_mod.COOLDOWN_BASE + 1
+    assert tracker.acquire(URL, "m")
+    assert not tracker.acquire(URL, "m")
+    tracker.record_failure(URL, "m", "status 503")
+    clock[0] += health_mod.COOLDOWN_BASE + 1
+    assert not tracker.available(URL, "m")
+
+    clock[0] += health_mod.COOLDOWN_BASE
+    assert tracker.acquire(URL, "m")
+    tracker.record_success(URL, "m", 0.5)
+    stats = tracker.stats()["proxy:8080/m"]
+    assert stats["state"] == health_mod.STATE_CLOSED and stats["skipped"] == 2
+    assert tracker.get(HOST, "m").cooldown == health_mod.COOLDOWN_BASE
+
+
+def test_rate_limit_pauses_without_counting_errors(clock):
+    tracker = HealthTracker()
+    tracker.record_rate_limit(URL, "m", retry_after=5)
+    assert not tracker.available(URL, "m")
+    assert tracker.get(URL, "m").error_rate == 0
+    clock[0] += 6
+    assert tracker.available(URL, "m")
+
+
+def test_order_demotes_open_and_degraded_models(clock):
+    tracker = HealthTracker()
+    for _ in range(health_mod.FAILURE_THRESHOLD):
+        tracker.record_failure(URL, "a")
+    tracker.record_success(URL, "b", 30.0)
+    assert tracker.order(HOST, ["a", "b", "c"]) == ["c", "b", "a"]
+    # 不同代理主机分别统计
+    assert tracker.order("http://other", ["a", "b", "c"]) == ["a", "b", "c"]
+
+
+def test_model_getters_follow_health(mock_manager, monkeypatch):
+    config = ConfigParser()
+    config["ai"] = {"proxy_host": HOST, "chat_model": "main; backup", "spam_models": "x,y"}
+    monkeypatch.setattr(mock_manager, "config", config)
+    assert txt_mod.get_ai_chat_model() == "main"
+    assert txt_mod.get_spam_models() == ["x", "y"]
+
+    for _ in range(health_mod.FAILURE_THRESHOLD):
+        txt_mod.model_health.record_failure(URL, "main")
+        txt_mod.model_health.record_failure(URL, "x")
+    assert txt_mod.get_ai_chat_model() == "backup"
+    assert txt_mod.get_spam_models() == ["y", "x"]
+
+
+class _Response:
+    def __init__(self, status, body=None, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = body or {}
+        self.released = False
+
+    async def json(self):
+        return self._body
+
+    async def text(self):
+        return str(self._body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.released = True
+        return False
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+async def test_api_request_skips_open_circuit(mock_manager, monkeypatch):
+    monkeypatch.setattr(txt_mod.asyncio, "sleep", AsyncMock())
+    session = _Session([_Response(503) for _ in range(3)])
+    mock_manager.create_session = AsyncMock(return_value=session)
+
+    with pytest.raises(ValueError):
+        await txt_mod._api_request(URL, {"model": "m", "messages": []}, "token")
+    assert session.calls == 3
+    assert not txt_mod.model_health.available(URL, "m")
+
+    # 熔断期间直接失败，不再发出请求
+    with pytest.raises(ValueError):
+        await txt_mod._api_request(URL, {"model": "m", "messages": []}, "token")
+    assert session.calls == 3
+
+
+async def test_api_request_records_rate_limit_and_success(mock_manager, monkeypatch):
+    monkeypatch.setattr(txt_mod.asyncio, "sleep", AsyncMock())
+    session = _Session([_Response(429, headers={"Retry-After": "60"})])
+    mock_manager.create_session = AsyncMock(return_value=session)
+
+    with pytest.raises(ValueError, match="频繁"):
+        await txt_mod._api_request(URL, {"model": "m", "messages": []}, "token")
+    # Retry-After 期间不再原地重试
+    assert session.calls == 1
+    assert txt_mod.model_health.get(URL, "m").rate_limits == 1
+
+    ok = {"choices": [{"message": {"content": "hi"}}]}
+    session.responses = [_Response(200, ok)]
+    assert await txt_mod._api_request(URL, {"model": "n", "messages": []}, "token") == ok
+    assert txt_mod.model_health.get(URL, "n").successes == 1
+
+
+async def test_api_request_backoff_releases_gateway_slot(mock_manager, monkeypatch):
+    from handlers.utils.gateway import get_llm_gateway
+
+    first = _Response(503)
+    session = _Session([first, _Response(200, {"choices": []})])
+    mock_manager.create_session = AsyncMock(return_value=session)
+    held = []
+
+    async def _sleep(delay):
+        # 退避期间网关名额与上一次的响应（连接）都已释放
+        held.append((get_llm_gateway().active, first.released))
+
+    monkeypatch.setattr(txt_mod.asyncio, "sleep", _sleep)
+    assert await txt_mod._api_request(URL, {"model": "m", "messages": []}, "token") == {"choices": []}
+    assert held == [(0, True)]
+    assert session.calls == 2
@@ -0,0 +1,63 @@
+"""Tests for spam-matching text normalization."""
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from utils.normalize import compact_text, normalize_text, normalize_words
+
+
+def test_normalize_folds_evasions():
+    assert normalize_text("ＨＥＬＬＯ  Ｗorld") == "hello world"
+    assert normalize_text("加\u200b微\u200d信") == "加微信"
+    assert normalize_text("sрам") == "spam"  # 西里尔 р / а / м
+    assert normalize_text("  a\tb\n\nc ") == "a b c"
+    assert normalize_text("") == ""
+    assert compact_text(normalize_text("加 微 信")) == "加微信"
+
+
+def test_normalize_words_strips_punctuation():
+    assert normalize_words("Hello, World!!") == "hello world"
+    assert normalize_words("大家好～") == "大家好"
+    assert normalize_words("hi_all") == "hi all"
+
+
+def test_normalization_is_cached():
+    normalize_text.cache_clear()
+    normalize_text("ＴＥＳＴ")
+    normalize_text("ＴＥＳＴ")
+    assert normalize_text.cache_info().hits == 1
+
+
+def test_greeting_whitelist_uses_normalization():
+    from handlers.default import _is_fast_safe_greeting
+
+    assert _is_fast_safe_greeting("Ｈｅｌｌｏ!")
+    assert _is_fast_safe_greeting("大家\u200b好")
+    assert not _is_fast_safe_greeting("hello t.me/+abc")
+
+
+def test_advertising_matcher_sees_through_evasions():
+    from configparser import ConfigParser
+
+    from manager import manager
+    from utils.advertising import check_advertising
+
+    config = ConfigParser()
+    config["advertising"] = {"enabled": "true", "words": "加微信, spam, Promo", "regex_patterns": r"tg:t\.me/\+\w+"}
+    with patch.object(manager, "config", config):
+        assert check_advertising("快来加\u200b微信") == (True, "加微信")
+        assert check_advertising("快来 加 微 信") == (True, "加微信")
+        assert check_advertising("ｓｐａｍ here") == (True, "spam")
+        assert check_advertising("PROMO code") == (True, "Promo")
+        assert check_advertising("ｔ.ｍｅ/+abc") == (True, "pattern:tg")
+        # 英文词不做去空白匹配，避免跨词误中
+        assert check_advertising("this pam") == (False, None)
+
+
+def test_llm_payload_carries_normalized_fields():
+    from handlers.utils.llm import _add_normalized_fields
+
+    data = {"fullname": "Ｖ Ｘ\u200b", "username": "plain", "message": "hello"}
+    _add_normalized_fields(data)
+    assert data["fullname_normalized"] == "v x"
+    assert "username_normalized" not in data and "message_normalized" not in data
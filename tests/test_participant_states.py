@@ -0,0 +1,148 @@
+"""Tests for the member restriction state tracker used by the captcha timeout jobs."""
+from __future__ import annotations
+
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from telethon.errors import UserNotParticipantError
+from telethon.tl import types
+
+from manager.participants import ParticipantStateTracker, banned_participant, member_participant
+
+
+CHAT_ID = -1001445219041
+MEMBER_ID = 42
+
+
+def _channel_update(new_participant):
+    return types.UpdateChannelParticipant(
+        channel_id=1445219041, date=None, actor_id=1, user_id=MEMBER_ID, qts=1,
+        new_participant=new_participant,
+    )
+
+
+def test_tracker_reports_permissions_like_telethon():
+    tracker = ParticipantStateTracker()
+    assert tracker.permissions(CHAT_ID, MEMBER_ID) is None
+
+    tracker.record(CHAT_ID, MEMBER_ID, banned_participant(MEMBER_ID, timedelta(days=30), view_messages=True))
+    perms = tracker.permissions(CHAT_ID, MEMBER_ID)
+    assert perms.is_banned and not perms.is_admin and not perms.has_left
+    assert perms.participant.banned_rights.view_messages is True
+
+    tracker.record(CHAT_ID, MEMBER_ID, member_participant(MEMBER_ID))
+    assert tracker.permissions(CHAT_ID, MEMBER_ID).has_default_permissions
+
+    tracker.record(CHAT_ID, MEMBER_ID, None)
+    with pytest.raises(UserNotParticipantError):
+        tracker.permissions(CHAT_ID, MEMBER_ID)
+
+
+def test_tracker_follows_channel_participant_updates():
+    tracker = ParticipantStateTracker()
+    admin = types.ChannelParticipantAdmin(
+        user_id=MEMBER_ID, promoted_by=1, date=None, admin_rights=types.ChatAdminRights(), rank=None
+    )
+    assert tracker.on_update(_channel_update(admin)) is True
+    assert tracker.permissions(CHAT_ID, MEMBER_ID).is_admin
+
+    tracker.on_update(_channel_update(None))  # left
+    with pytest.raises(UserNotParticipantError):
+        tracker.permissions(CHAT_ID, MEMBER_ID)
+
+
+def test_tracker_matches_bare_and_marked_chat_ids():
+    """bot 操作按群实体记录，延迟任务用裸 chat.id 查询。"""
+    tracker = ParticipantStateTracker()
+    chat = types.Channel(id=1445219041, title="g", photo=types.ChatPhotoEmpty(), date=None)
+
+    tracker.record(chat, MEMBER_ID, banned_participant(MEMBER_ID, timedelta(days=30), view_messages=True))
+    assert tracker.permissions(1445219041, MEMBER_ID).is_banned
+    assert tracker.permissions(CHAT_ID, MEMBER_ID).is_banned
+
+    tracker.record(1445219041, MEMBER_ID, None)
+    with pytest.raises(UserNotParticipantError):
+        tracker.permissions(CHAT_ID, MEMBER_ID)
+
+    tracker.invalidate(chat, MEMBER_ID)
+    assert tracker.permissions(1445219041, MEMBER_ID) is None
+
+    # 普通群：marked id 为 -id
+    tracker.record(types.Chat(id=77, title="c", photo=types.ChatPhotoEmpty(), participants_count=1, date=None, version=1), MEMBER_ID, None)
+    with pytest.raises(UserNotParticipantError):
+        tracker.permissions(77, MEMBER_ID)
+
+
+async def test_manager_actions_feed_tracker():
+    from manager.manager import Manager
+
+    mgr = Manager()
+    mgr.participant_states = None
+    mgr.client = AsyncMock()
+    chat = types.Channel(id=1445219041, title="g", photo=types.ChatPhotoEmpty(), date=None)
+
+    await mgr.mute_member(chat, MEMBER_ID)
+    perms = mgr.get_participant_states().permissions(CHAT_ID, MEMBER_ID)
+    assert perms.is_banned and perms.participant.banned_rights.send_messages is True
+    assert not perms.participant.banned_rights.view_messages
+
+    await mgr.unban_member_full(chat, MEMBER_ID)
+    assert mgr.get_participant_states().permissions(CHAT_ID, MEMBER_ID) is None
+
+    mgr.client.edit_permissions = AsyncMock(side_effect=RuntimeError("CHAT_ADMIN_REQUIRED"))
+    await mgr.hide_member(chat, MEMBER_ID)
+    assert mgr.get_participant_states().permissions(CHAT_ID, MEMBER_ID) is None
+
+
+async def test_kick_skips_api_for_externally_banned_member(monkeypatch, mock_manager):
+    import handlers.member_captcha.events  # noqa: F401
+    new_member_check = mock_manager.events["new_member_check"]
+
+    mock_manager.client.get_entity = AsyncMock(return_value=SimpleNamespace(id=CHAT_ID, title="g"))
+    mock_manager.client.get_permissions = AsyncMock()
+    mock_manager.get_participant_states().record(
+        CHAT_ID, MEMBER_ID, banned_participant(MEMBER_ID, None, view_messages=True)
+    )
+
+    from handlers.member_captcha.session import CaptchaSession
+
+    monkeypatch.setattr(CaptchaSession, "is_flagged", AsyncMock(return_value=None))
+    monkeypatch.setattr(CaptchaSession, "is_restricted", AsyncMock(return_value=False))
+
+    # member_captcha 调度任务时保存的是裸 chat.id
+    await new_member_check(mock_manager.client, 1445219041, 10, MEMBER_ID)
+
+    mock_manager.client.get_permissions.assert_not_awaited()
+    mock_manager.kick_member.assert_not_awaited()
+    mock_manager.lazy_session.assert_not_awaited()
+
+
+async def test_unban_after_kick_skips_api(mock_manager):
+    import handlers.member_captcha.events  # noqa: F401
+    unban_member = mock_manager.events["unban_member"]
+
+    mock_manager.client.get_entity = AsyncMock(return_value=SimpleNamespace(id=CHAT_ID, title="g"))
+    mock_manager.client.get_permissions = AsyncMock()
+    mock_manager.get_participant_states().record(CHAT_ID, MEMBER_ID, None)
+
+    await unban_member(mock_manager.client, CHAT_ID, 10, MEMBER_ID)
+
+    mock_manager.client.get_permissions.assert_not_awaited()
+    mock_manager.unban_member_full.assert_awaited_once()
+
+
+async def test_miss_falls_back_to_api(monkeypatch, mock_manager):
+    import handlers.member_captcha.events  # noqa: F401
+    unban_member = mock_manager.events["unban_member"]
+
+    mock_manager.client.get_entity = AsyncMock(return_value=SimpleNamespace(id=CHAT_ID, title="g"))
+    mock_manager.client.get_permissions = AsyncMock(
+        return_value=SimpleNamespace(is_admin=True, is_creator=False, has_left=False)
+    )
+
+    await unban_member(mock_manager.client, CHAT_ID, 10, MEMBER_ID)
+
+    mock_manager.client.get_permissions.assert_awaited_once()
+    mock_manager.unban_member_full.assert_not_awaited()
@@ -0,0 +1,124 @@
+"""Tests for entity-free pre-dispatch filters."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from telethon import types
+
+from manager import manager
+from manager.filters import PEER_CHANNEL, PEER_GROUP, PEER_PRIVATE, PreFilter, entity_chat_id, peer_kind
+from manager.group import PENDING_KEY_PREFIX
+
+CHAT_ID = 123456
+USER_ID = 888999
+
+
+def _msg_event(peer, text="hello", post=False, chat=None):
+    return SimpleNamespace(
+        message=SimpleNamespace(peer_id=peer, message=text, post=post),
+        _chat=chat,
+        sender_id=USER_ID,
+        text=text,
+        get_chat=AsyncMock(),
+        get_sender=AsyncMock(),
+    )
+
+
+def _query_event(peer, data, chat=None):
+    return SimpleNamespace(query=SimpleNamespace(peer=peer), data=data, _chat=chat)
+
+
+def test_peer_kind_from_raw_fields():
+    assert peer_kind(_msg_event(types.PeerUser(USER_ID))) == PEER_PRIVATE
+    assert peer_kind(_msg_event(types.PeerChat(CHAT_ID))) == PEER_GROUP
+    assert peer_kind(_msg_event(types.PeerChannel(CHAT_ID))) == PEER_GROUP
+    assert peer_kind(_msg_event(types.PeerChannel(CHAT_ID), post=True)) == PEER_CHANNEL
+
+    broadcast = SimpleNamespace(broadcast=True)
+    assert peer_kind(_query_event(types.PeerChannel(CHAT_ID), b"x", chat=broadcast)) == PEER_CHANNEL
+    assert peer_kind(SimpleNamespace()) is None
+
+    assert entity_chat_id(_msg_event(types.PeerChannel(CHAT_ID))) == CHAT_ID
+    assert entity_chat_id(_msg_event(types.PeerChannel(CHAT_ID), post=True)) is None
+    assert entity_chat_id(_msg_event(types.PeerUser(USER_ID))) is None
+
+
+def test_prefix_matches_bytes_and_str():
+    f = PreFilter("t", prefix="su:")
+    assert f(_query_event(types.PeerChannel(CHAT_ID), b"su:nm:ban"))
+    assert f(_msg_event(types.PeerChannel(CHAT_ID), text="SU:x"))
+    assert not f(_query_event(types.PeerChannel(CHAT_ID), b"cAAAA"))
+    assert not f(_msg_event(types.PeerChannel(CHAT_ID), text=""))
+
+    f = PreFilter("t", prefix=b"c", peer=(PEER_GROUP,))
+    assert f(_query_event(types.PeerChannel(CHAT_ID), b"cAAAA"))
+    assert not f(_query_event(types.PeerUser(USER_ID), b"cAAAA"))
+    assert f.stats() == {"passed": 1, "rejected": 1}
+
+
+async def test_composes_user_func_sync_and_async():
+    event = _msg_event(types.PeerChannel(CHAT_ID))
+    assert PreFilter("t", peer=(PEER_GROUP,), func=lambda e: True)(event) is True
+    assert PreFilter("t", peer=(PEER_GROUP,), func=lambda e: False)(event) is False
+
+    async def deny(e):
+        return False
+
+    f = PreFilter("t", peer=(PEER_GROUP,), func=deny)
+    assert await f(event) is False
+    assert f.stats()["rejected"] == 1
+
+    # 原始字段不通过时不调用 func
+    called = []
+    f = PreFilter("t", peer=(PEER_GROUP,), func=called.append)
+    assert f(_msg_event(types.PeerUser(USER_ID))) is False
+    assert called == []
+
+
+def test_register_installs_prefilter(monkeypatch):
+    monkeypatch.setattr(manager, "handlers", [])
+    monkeypatch.setattr(manager, "prefilters", {})
+
+    @manager.register("callback_query", peer=(PEER_GROUP,), pattern="^x")
+    async def x_handler(event):
+        pass
+
+    _, _, _, kwargs = manager.handlers[0]
+    assert kwargs["pattern"] == "^x"
+    assert kwargs["func"] is manager.prefilters["x_handler"]
+
+    @manager.register("callback_query")
+    async def plain_handler(event):
+        pass
+
+    assert "func" not in manager.handlers[1][3]
+
+
+async def test_private_and_channel_updates_rejected_before_entities(mock_manager, fake_redis):
+    from handlers.commands.group_setting import handle_pending_input
+
+    prefilter = mock_manager.prefilters["handle_pending_input"]
+    for event in (
+        _msg_event(types.PeerUser(USER_ID)),
+        _msg_event(types.PeerChannel(CHAT_ID), post=True),
+    ):
+        assert prefilter(event) is False
+        event.get_chat.assert_not_awaited()
+
+    # 群内普通消息：只查 Redis，不解析实体
+    event = _msg_event(types.PeerChannel(CHAT_ID))
+    assert prefilter(event) is True
+    await handle_pending_input(event)
+    event.get_chat.assert_not_awaited()
+    event.get_sender.assert_not_awaited()
+
+    # 管理员回复：命中待输入记录后才取实体
+    await fake_redis.hset(f"{PENDING_KEY_PREFIX}{CHAT_ID}", mapping={"user_id": str(USER_ID), "msg_id": "5"})
+    event = _msg_event(types.PeerChannel(CHAT_ID), text="abc")
+    event.get_chat.return_value = SimpleNamespace(id=CHAT_ID)
+    event.delete = AsyncMock()
+    mock_manager.edit_text = AsyncMock()
+    await handle_pending_input(event)
+    event.get_chat.assert_awaited()
+    mock_manager.edit_text.assert_awaited()
@@ -0,0 +1,156 @@
+"""Tests for the in-process LRU and the Manager-level user profile cache."""
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from manager.cache import LRUCache, MISSING
+from manager.profile import UserProfileCache, KIND_BIO
+
+
+USER_ID = 424242
+
+
+def _fresh_manager(fake_redis):
+    """A Manager instance not touched by mock_manager (which patches the singleton)."""
+    from manager.manager import Manager
+
+    mgr = Manager()
+    mgr.client = AsyncMock()
+    mgr.get_redis = AsyncMock(return_value=fake_redis)
+    return mgr
+
+
+# ------------------------------------------------------------------
+# LRUCache
+# ------------------------------------------------------------------
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a is now most recent
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_ttl_expiry_and_stats():
+    cache = LRUCache(maxsize=10, ttl=60)
+    with patch("manager.cache.time.monotonic", return_value=1000.0):
+        cache.set("k", None)
+    with patch("manager.cache.time.monotonic", return_value=1030.0):
+        assert cache.get("k") is None  # None is a valid (negative) value
+    with patch("manager.cache.time.monotonic", return_value=1061.0):
+        assert cache.get("k") is MISSING
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+# ------------------------------------------------------------------
+# UserProfileCache
+# ------------------------------------------------------------------
+
+
+async def test_profile_cache_negative_entry_uses_short_ttl(fake_redis):
+    cache = UserProfileCache(AsyncMock(return_value=fake_redis), ttl=3600, negative_ttl=60)
+    await cache.set(KIND_BIO, USER_ID, None)
+
+    key = UserProfileCache.make_key(KIND_BIO, USER_ID)
+    assert key in fake_redis._data
+    assert 0 < fake_redis._expiry[key] - time.time() <= 60
+    assert await cache.get(KIND_BIO, USER_ID) is None
+
+
+async def test_profile_cache_reads_through_redis(fake_redis):
+    writer = UserProfileCache(AsyncMock(return_value=fake_redis))
+    await writer.set(KIND_BIO, USER_ID, "hello")
+
+    # A second process: empty local tier, shared Redis
+    reader = UserProfileCache(AsyncMock(return_value=fake_redis))
+    assert await reader.get(KIND_BIO, USER_ID) == "hello"
+    assert await reader.get_many(KIND_BIO, [USER_ID, 1]) == {USER_ID: "hello"}
+
+
+async def test_profile_cache_coalesces_concurrent_loads():
+    cache = UserProfileCache(AsyncMock(return_value=None))
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return "bio"
+
+    results = await asyncio.gather(*(cache.get_or_load(KIND_BIO, USER_ID, loader) for _ in range(5)))
+    assert results == ["bio"] * 5
+    assert calls == 1
+
+
+async def test_profile_cache_does_not_cache_errors():
+    cache = UserProfileCache(AsyncMock(return_value=None))
+    loader = AsyncMock(side_effect=RuntimeError("flood wait"))
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load(KIND_BIO, USER_ID, loader)
+    assert await cache.get(KIND_BIO, USER_ID) is MISSING
+
+
+# ------------------------------------------------------------------
+# Manager integration
+# ------------------------------------------------------------------
+
+
+async def test_get_user_bio_hits_api_once(fake_redis):
+    mgr = _fresh_manager(fake_redis)
+    mgr.client.return_value = SimpleNamespace(full_user=SimpleNamespace(about=" hi there "))
+
+    assert await mgr.get_user_bio(USER_ID) == "hi there"
+    assert await mgr.get_user_bio(SimpleNamespace(id=USER_ID)) == "hi there"
+    assert mgr.client.await_count == 1
+
+
+async def test_get_user_bio_negative_cached(fake_redis):
+    mgr = _fresh_manager(fake_redis)
+    mgr.client.return_value = SimpleNamespace(full_user=SimpleNamespace(about=None))
+
+    assert await mgr.get_user_bio(USER_ID) is None
+    assert await mgr.get_user_bio(USER_ID) is None
+    assert mgr.client.await_count == 1
+
+
+async def test_has_profile_photo_cached(fake_redis):
+    mgr = _fresh_manager(fake_redis)
+    mgr.client.get_profile_photos = AsyncMock(return_value=[object()])
+    user = SimpleNamespace(id=USER_ID)
+
+    assert await mgr.has_profile_photo(user) is True
+    assert await mgr.has_profile_photo(USER_ID) is True
+    mgr.client.get_profile_photos.assert_awaited_once()
+    mgr.client.get_entity.assert_not_awaited()
+
+
+async def test_prefetch_skips_users_cached_in_redis(fake_redis):
+    warm = _fresh_manager(fake_redis)
+    await warm.get_profile_cache().set(KIND_BIO, USER_ID, "cached")
+
+    mgr = _fresh_manager(fake_redis)
+    mgr.client.return_value = SimpleNamespace(full_user=SimpleNamespace(about="fresh"))
+    mgr.client.get_profile_photos = AsyncMock(return_value=[])
+
+    await mgr.prefetch_user_profiles([SimpleNamespace(id=USER_ID), SimpleNamespace(id=7)])
+
+    # bio: only user 7 fetched; photo: both fetched
+    assert mgr.client.await_count == 1
+    assert mgr.client.get_profile_photos.await_count == 2
+    assert await mgr.get_user_bio(USER_ID) == "cached"
+    assert await mgr.has_profile_photo(7) is False
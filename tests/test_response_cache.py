@@ -0,0 +1,139 @@
+"""Tests for the deterministic LLM response cache."""
+from __future__ import annotations
+
+import asyncio
+from configparser import ConfigParser
+from unittest.mock import AsyncMock
+
+import pytest
+
+from handlers.utils import txt as txt_mod
+from manager.cache import MISSING
+from manager.responses import ResponseCache
+
+
+def _reply(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+@pytest.fixture
+def ai_config(mock_manager, monkeypatch):
+    config = ConfigParser()
+    config["ai"] = {"proxy_host": "http://proxy", "proxy_token": "t", "chat_model": "m"}
+    monkeypatch.setattr(mock_manager, "config", config)
+    return config
+
+
+async def test_only_opted_in_calls_are_cached(ai_config, monkeypatch):
+    api = AsyncMock(return_value=_reply("cached"))
+    monkeypatch.setattr(txt_mod, "_api_request", api)
+    messages = [{"role": "user", "content": "hi"}]
+
+    assert await txt_mod.chat_completions(messages, "m", cacheable=True) == "cached"
+    assert await txt_mod.chat_completions(list(messages), "m", cacheable=True) == "cached"
+    assert api.await_count == 1
+
+    # 参数或模型不同则是不同的 key
+    await txt_mod.chat_completions(messages, "m", cacheable=True, max_tokens=10)
+    await txt_mod.chat_completions(messages, "other", cacheable=True)
+    assert api.await_count == 3
+
+    # 安全审查等 temperature=0 的判定调用不缓存，重新入群的成员得到新的判定
+    await txt_mod.chat_completions(messages, "m", temperature=0)
+    await txt_mod.chat_completions(messages, "m", temperature=0)
+    assert api.await_count == 5
+
+    stats = txt_mod.manager.get_response_cache().stats()
+    assert stats["stores"] == 3 and stats["hit_rate"] == pytest.approx(1 / 4)
+
+
+async def test_rejected_results_are_not_cached(ai_config, monkeypatch):
+    api = AsyncMock(return_value=_reply("not json"))
+    monkeypatch.setattr(txt_mod, "_api_request", api)
+    messages = [{"role": "user", "content": "hi"}]
+
+    for _ in range(2):
+        await txt_mod.chat_completions(messages, "m", cacheable=True, cache_accept=lambda text: text.startswith("{"))
+    assert api.await_count == 2
+    assert txt_mod.manager.get_response_cache().stats()["stores"] == 0
+
+
+async def test_redis_tier_survives_a_new_process(ai_config, fake_redis, monkeypatch):
+    monkeypatch.setattr(txt_mod, "_api_request", AsyncMock(return_value=_reply("shared")))
+    await txt_mod.chat_completions([{"role": "user", "content": "x"}], "m", cacheable=True, temperature=0)
+
+    fresh = ResponseCache(AsyncMock(return_value=fake_redis))
+    key = fresh.make_key("chat", {"model": "m", "messages": [{"role": "user", "content": "x"}], "params": {"temperature": 0}})
+    assert await fresh.get(key) == "shared"
+    assert fresh.stats()["redis_hits"] == 1
+
+
+async def test_errors_and_empty_results_are_not_cached():
+    cache = ResponseCache(AsyncMock(return_value=None))
+    failing = AsyncMock(side_effect=ValueError("down"))
+    with pytest.raises(ValueError):
+        await cache.get_or_compute("k", failing)
+    assert await cache.get_or_compute("k", AsyncMock(return_value="")) == ""
+    assert await cache.get("k") is MISSING
+
+
+async def test_concurrent_identical_requests_are_coalesced():
+    cache = ResponseCache(AsyncMock(return_value=None))
+    release = asyncio.Event()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "once"
+
+    tasks = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == ["once"] * 3
+    assert calls == 1 and cache.stats()["coalesced"] == 2
+
+
+async def test_cancelled_computation_lets_waiters_recompute():
+    cache = ResponseCache(AsyncMock(return_value=None))
+    started, release = asyncio.Event(), asyncio.Event()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return f"value-{calls}"
+
+    owner = asyncio.create_task(cache.get_or_compute("k", compute))
+    await started.wait()
+    waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+    await asyncio.sleep(0)
+
+    owner.cancel()
+    release.set()
+    # 回源方被取消不影响等待者：等待者重新回源并拿到结果
+    assert await waiter == "value-2"
+    assert owner.cancelled() and calls == 2
+
+
+async def test_cancelled_waiter_does_not_cancel_the_computation():
+    cache = ResponseCache(AsyncMock(return_value=None))
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return "once"
+
+    owner = asyncio.create_task(cache.get_or_compute("k", compute))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    release.set()
+    assert await owner == "once"
@@ -0,0 +1,161 @@
+"""Tests for the central command router."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from telethon import types
+
+from manager import manager
+from manager.filters import PEER_GROUP
+from manager.router import CommandRouter, parse_command, rate_limit
+
+CHAT_ID = 123456
+USER_ID = 888999
+
+
+def _event(text, peer=None, sender_id=USER_ID):
+    return SimpleNamespace(
+        message=SimpleNamespace(peer_id=peer or types.PeerChannel(CHAT_ID), message=text, post=False),
+        chat_id=-1000000000000 - CHAT_ID,
+        sender_id=sender_id,
+    )
+
+
+def test_parse_command():
+    assert parse_command("/Chat hello") == ("chat", "")
+    assert parse_command("/chat@GoalBot\nhi") == ("chat", "GoalBot")
+    assert parse_command("/k") == ("k", "")
+    assert parse_command("hello /chat") is None
+    assert parse_command("/ chat") is None
+    assert parse_command("/@bot") is None
+    assert parse_command("") is None
+
+
+async def test_dispatch_commands_and_pipeline():
+    router = CommandRouter(bot_username="GoalBot")
+    seen = []
+
+    async def on_chat(event):
+        seen.append("chat")
+
+    async def on_message(event):
+        seen.append("message")
+
+    router.add_command(("chat", "c"), on_chat)
+    router.add_message_handler(on_message)
+
+    await router.dispatch(_event("/CHAT@goalbot hi"))
+    await router.dispatch(_event("/c"))
+    await router.dispatch(_event("/chat@OtherBot hi"))  # 发给其他 bot，按普通消息处理
+    await router.dispatch(_event("/unknown"))
+    await router.dispatch(_event("plain text"))
+
+    assert seen == ["chat", "chat", "message", "message", "message"]
+    stats = router.stats()
+    assert stats["messages"] == 5 and stats["unknown"] == 1
+    assert stats["commands"]["chat"]["calls"] == 2
+
+
+async def test_middleware_chain_peer_and_errors():
+    router = CommandRouter()
+    order = []
+
+    async def outer(event, command, call_next):
+        order.append("outer")
+        return await call_next()
+
+    async def deny(event, command, call_next):
+        order.append("deny")
+        command.rejected += 1
+
+    async def handler(event):
+        order.append("handler")
+        raise RuntimeError("boom")
+
+    router.add_command(("a",), handler, middleware=(outer,))
+    router.add_command(("b",), handler, middleware=(outer, deny))
+    router.add_command(("g",), handler, peers=frozenset((PEER_GROUP,)))
+
+    await router.dispatch(_event("/a"))  # 异常被记录，不向外抛出
+    await router.dispatch(_event("/b"))
+    await router.dispatch(_event("/g", peer=types.PeerUser(USER_ID)))
+
+    assert order == ["outer", "handler", "outer", "deny"]
+    stats = router.stats()["commands"]
+    assert stats["a"]["errors"] == 1
+    assert stats["b"] == {"calls": 0, "rejected": 1, "errors": 0, "avg_ms": 0.0}
+    assert stats["g"]["rejected"] == 1
+
+
+async def test_pipeline_gate_and_rate_limit():
+    router = CommandRouter()
+    handled = []
+
+    async def on_message(event):
+        handled.append(event.message.message)
+
+    router.add_message_handler(on_message, gate=lambda e: e.sender_id is not None)
+    await router.dispatch(_event("a"))
+    await router.dispatch(_event("b", sender_id=None))
+    assert handled == ["a"]
+
+    calls = []
+
+    async def cmd(event):
+        calls.append(event.sender_id)
+
+    router.add_command(("tts",), cmd, middleware=(rate_limit(60),))
+    await router.dispatch(_event("/tts x"))
+    await router.dispatch(_event("/tts y"))
+    await router.dispatch(_event("/tts z", sender_id=1))
+    assert calls == [USER_ID, 1]
+    assert router.stats()["commands"]["tts"]["rejected"] == 1
+
+
+async def test_command_messages_reach_command_aware_pipeline():
+    router = CommandRouter()
+    seen = []
+
+    async def watch(event):
+        seen.append(("watch", event.message.message))
+
+    async def other(event):
+        seen.append(("other", event.message.message))
+
+    async def on_chat(event):
+        seen.append(("chat", event.message.message))
+
+    router.add_message_handler(watch, commands=True)
+    router.add_message_handler(other)
+    router.add_command(("chat",), on_chat)
+
+    await router.dispatch(_event("/chat spam"))
+    await router.dispatch(_event("hello"))
+    assert seen == [("watch", "/chat spam"), ("chat", "/chat spam"), ("watch", "hello"), ("other", "hello")]
+
+
+async def test_require_admin_middleware(mock_manager, monkeypatch):
+    monkeypatch.setattr(mock_manager, "is_admin", AsyncMock(return_value=False))
+    router = CommandRouter()
+    handler = AsyncMock()
+    router.add_command(("k",), handler, middleware=(manager.require_admin,))
+
+    await router.dispatch(_event("/k"))
+    handler.assert_not_awaited()
+
+    mock_manager.is_admin.return_value = True
+    await router.dispatch(_event("/k"))
+    handler.assert_awaited_once()
+
+
+def test_handlers_registered_on_router():
+    import handlers  # noqa: F401
+
+    commands = manager.router.commands
+    for name in ("chat", "k", "sb", "group_setting", "id", "captcha_stats", "system_groups"):
+        assert name in commands
+    pipeline = {e.func.__name__: e for e in manager.router.pipeline}
+    assert set(pipeline) >= {"default_handler", "handle_pending_input"}
+    # 首句审查也要看到命令消息
+    assert pipeline["default_handler"].commands and not pipeline["handle_pending_input"].commands
@@ -217,3 +217,134 @@ class TestCost:
 
         session = await captcha_session.get(CHAT_ID, USER_ID)
         assert session["last_cost"] == "12.5"
+
+
+@pytest.mark.usefixtures("mock_manager")
+class TestCompactRecord:
+    async def test_new_record_is_packed(self, fake_redis, captcha_session):
+        await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=EVENT_UID)
+
+        session = await captcha_session.get(CHAT_ID, USER_ID)
+        assert set(session) == {"join_count", "total_joins", "first_join_ts", "last_join_ts", "state"}
+        assert session["first_join_ts"] == str(int(NOW.timestamp()))
+        assert captcha_session.parse_ts(session["first_join_ts"]) == NOW
+
+    async def test_legacy_hash_migrated_on_rejoin(self, fake_redis, captcha_session):
+        key = captcha_session.make_key(CHAT_ID, USER_ID)
+        await fake_redis.hset(key, mapping={
+            "join_count": "1",
+            "total_joins": "1",
+            "first_join_ts": NOW.isoformat(),
+            "last_join_ts": NOW.isoformat(),
+            "last_icon": "",
+            "state": "normal",
+            "chat_id": str(CHAT_ID),
+            "user_id": str(USER_ID),
+        })
+
+        should_proceed, data = await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=EVENT_UID)
+        assert should_proceed is True
+        assert data["join_count"] == "2"
+
+        session = await captcha_session.get(CHAT_ID, USER_ID)
+        assert "chat_id" not in session and "user_id" not in session and "last_icon" not in session
+        # 旧 ISO 时间保留原值，仍可解析
+        assert captcha_session.parse_ts(session["first_join_ts"]) == NOW
+
+    async def test_answer_fields_stay_listpack_sized(self, fake_redis, captcha_session):
+        """所有字段值不超过 64 字节，Redis 才会以 listpack 紧凑编码保存 Hash。"""
+        from types import SimpleNamespace
+
+        from handlers.member_captcha.helpers import build_captcha_message, build_image_captcha_message
+        from handlers.member_captcha.image_captcha import ImageChallenge
+        from utils.captcha_render import render_challenge
+
+        user = SimpleNamespace(id=USER_ID, first_name="A", last_name=None)
+        challenge = ImageChallenge(*render_challenge(1))
+        for build in (build_captcha_message, lambda *a: build_image_captcha_message(*a, challenge)):
+            await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=f"msg:{id(build)}")
+            _, _, meta = await build(user, NOW, CHAT_ID)
+            await captcha_session.record_answer(
+                CHAT_ID, USER_ID, icon=meta["icon"], answer=meta["answer"], options=meta["options"], token=meta["token"]
+            )
+            session = await captcha_session.get(CHAT_ID, USER_ID)
+            assert session["last_options"].count(",") == 4
+            assert all(len(str(v).encode()) <= 64 for v in session.values())
+
+    def test_parse_ts_invalid(self, captcha_session):
+        assert captcha_session.parse_ts("") is None
+        assert captcha_session.parse_ts(b"not-a-date") is None
+
+    def test_join_record_is_slotted(self):
+        from types import SimpleNamespace
+
+        from handlers.member_captcha.session import CaptchaRecord
+
+        record = CaptchaRecord.for_join(
+            SimpleNamespace(id=CHAT_ID), SimpleNamespace(id=USER_ID, username="alice"), NOW
+        )
+        assert record.member_username == "alice" and record.member_bio is None
+        with pytest.raises(AttributeError):
+            record.extra = 1
+
+
+@pytest.mark.usefixtures("mock_manager")
+class TestLuaScripts:
+    """在 fakeredis 的 Lua 运行时（lupa）中执行真实脚本，而非 conftest 中的 Python 移植版。"""
+
+    @pytest.fixture
+    async def lua_redis(self, mock_manager, monkeypatch):
+        pytest.importorskip("lupa")
+        fakeredis = pytest.importorskip("fakeredis")
+        from unittest.mock import AsyncMock
+
+        rdb = fakeredis.FakeAsyncRedis()
+        monkeypatch.setattr(mock_manager, "get_redis", AsyncMock(return_value=rdb))
+        yield rdb
+        await rdb.aclose()
+
+    @staticmethod
+    def _next_answer():
+        return {"icon": "⭐", "answer": "3", "options": "a,b,c,d,e", "token": "t2"}
+
+    async def test_join_record_script(self, lua_redis, captcha_session):
+        should_proceed, data = await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=EVENT_UID)
+        assert should_proceed is True and data["join_count"] == "1"
+
+        should_proceed, _ = await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=EVENT_UID)
+        assert should_proceed is False
+
+    async def test_verify_retry_extends_only_scheduled_jobs(self, lua_redis, captcha_session, mock_manager):
+        from datetime import timedelta
+
+        from handlers.member_captcha.session import VERIFY_RETRY
+
+        await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=EVENT_UID)
+        await captcha_session.record_answer(CHAT_ID, USER_ID, icon="❤️", answer="2", options="a,b", token="t1")
+        job = mock_manager.lazy_session_value(CHAT_ID, USER_ID, "new_member_check", 7)
+        await lua_redis.zadd("lazy_sessions", {job: NOW.timestamp()})
+
+        deadline = NOW + timedelta(minutes=5)
+        result = await captcha_session.verify_answer(CHAT_ID, USER_ID, 7, "0", "t1", 3, self._next_answer(), deadline)
+        assert result.status == VERIFY_RETRY and result.retry_count == 1
+        assert await lua_redis.zscore("lazy_sessions", job) == deadline.timestamp()
+        # 消息删除任务不存在（已执行 / 已取消），不会被重新加回
+        assert await lua_redis.zcard("lazy_delete_messages") == 0
+
+        session = await captcha_session.get(CHAT_ID, USER_ID)
+        assert session["last_answer"] == "3" and session["last_token"] == "t2"
+
+    async def test_verify_pass_stale_and_kick(self, lua_redis, captcha_session):
+        from handlers.member_captcha.session import VERIFY_KICK, VERIFY_PASS, VERIFY_STALE
+
+        await captcha_session.check_and_record(CHAT_ID, USER_ID, NOW, event_uid=EVENT_UID)
+        await captcha_session.record_answer(CHAT_ID, USER_ID, icon="❤️", answer="2", options="a,b", token="t1")
+
+        args = (3, self._next_answer(), NOW)
+        assert (await captcha_session.verify_answer(CHAT_ID, USER_ID, 7, "2", "t0", *args)).status == VERIFY_STALE
+        assert (await captcha_session.verify_answer(CHAT_ID, USER_ID, 7, "2", "t1", *args)).status == VERIFY_PASS
+        assert (await captcha_session.verify_answer(CHAT_ID, USER_ID, 7, "2", "t1", *args)).status == VERIFY_STALE
+
+        await captcha_session.record_answer(CHAT_ID, USER_ID, icon="❤️", answer="2", options="a,b", token="t1")
+        result = await captcha_session.verify_answer(CHAT_ID, USER_ID, 7, "0", "t1", 1, self._next_answer(), NOW)
+        assert result.status == VERIFY_KICK and result.retry_count == 1
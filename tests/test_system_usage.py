@@ -0,0 +1,63 @@
+"""Tests for the runtime stats section of /system_usage."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+
+def test_format_stats_flattens_nested_metrics():
+    from handlers.commands.system_usage import format_stats
+
+    stats = {"gateway": {"active": 1, "security": {"admitted": 3, "wait_avg": 0.12345}}, "empty": {}}
+    assert format_stats(stats) == ["gateway: active=1", "gateway.security: admitted=3 wait_avg=0.123"]
+
+
+def test_runtime_stats_lists_only_created_components(mock_manager):
+    from handlers.commands.system_usage import runtime_stats
+    from utils.blocking import BlockingPool
+
+    pool = BlockingPool("stats-test", workers=1)
+    stats = runtime_stats()
+    assert "admin_roster" not in stats and "llm_gateway" not in stats
+    assert mock_manager.admin_roster is None
+    assert stats["blocking_pools"]["stats-test"]["workers"] == pool.workers
+    assert {"llm_hedge", "model_health", "transcode"} <= set(stats)
+
+    mock_manager.get_admin_roster()
+    mock_manager.get_response_cache()
+    stats = runtime_stats()
+    assert "admin_roster" in stats
+    assert stats["response_cache"]["hit_rate"] == 0.0
+
+
+async def test_global_admin_sees_runtime_stats(mock_manager):
+    from handlers.commands.system_usage import system_usage
+
+    mock_manager.config["telegram"]["admin"] = "42"
+    event = SimpleNamespace(
+        chat_id=-100123,
+        id=1,
+        get_sender=AsyncMock(return_value=SimpleNamespace(id=42, username="root")),
+        get_chat=AsyncMock(return_value=SimpleNamespace(id=-100123, title="g")),
+        reply=AsyncMock(),
+    )
+    await system_usage(event)
+
+    text = event.reply.await_args.args[0]
+    assert "入群人次: 0" in text
+    assert "运行状态:" in text and "llm_hedge: requests=" in text
+
+
+async def test_chat_admin_does_not_see_runtime_stats(mock_manager, monkeypatch):
+    from handlers.commands.system_usage import system_usage
+
+    monkeypatch.setattr(mock_manager, "is_admin", AsyncMock(return_value=True))
+    event = SimpleNamespace(
+        chat_id=-100123,
+        id=1,
+        get_sender=AsyncMock(return_value=SimpleNamespace(id=7, username="mod")),
+        get_chat=AsyncMock(return_value=SimpleNamespace(id=-100123, title="g")),
+        reply=AsyncMock(),
+    )
+    await system_usage(event)
+    assert "运行状态" not in event.reply.await_args.args[0]
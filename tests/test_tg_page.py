@@ -0,0 +1,65 @@
+"""Tests for the streaming t.me page extractor (parity with the BS4 path)."""
+from __future__ import annotations
+
+import pytest
+
+from benchmarks._pages import PAGES
+from manager.tg_page import TgPageScanner, extract_from_response, parse_page_bs4
+
+
+def _scan(page: str, chunk_size: int) -> TgPageScanner:
+    raw = page.encode("utf-8")
+    scanner = TgPageScanner()
+    for i in range(0, len(raw), chunk_size):
+        if scanner.feed(raw[i : i + chunk_size]):
+            break
+    else:
+        scanner.close()
+    return scanner
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096, 1 << 20])
+def test_scanner_matches_bs4(name, chunk_size):
+    page = PAGES[name]
+    scanner = _scan(page, chunk_size)
+
+    assert scanner.conclusive
+    assert scanner.result() == parse_page_bs4(page)
+
+
+def test_scanner_stops_before_reading_whole_page():
+    raw = PAGES["full"].encode("utf-8")
+    scanner = _scan(PAGES["full"], 1024)
+    assert scanner.received < len(raw) // 2
+
+
+def test_scanner_truncates_at_byte_cap():
+    scanner = TgPageScanner(max_bytes=100)
+    assert scanner.feed(b"<html>" + b"a" * 200) is True
+    assert scanner.truncated and not scanner.conclusive
+
+
+class _FakeContent:
+    def __init__(self, raw: bytes):
+        self._raw = raw
+
+    async def iter_chunked(self, n):
+        for i in range(0, len(self._raw), n):
+            yield self._raw[i : i + n]
+
+
+class _FakeResponse:
+    def __init__(self, page: str):
+        self.content = _FakeContent(page.encode("utf-8"))
+
+
+async def test_extract_from_response_streams():
+    result = await extract_from_response(_FakeResponse(PAGES["full"]))
+    assert result == parse_page_bs4(PAGES["full"])
+
+
+async def test_extract_from_response_falls_back_to_bs4_for_unknown_layout():
+    page = "<html><body><div class=\"tgme_page_description\">bio"  # never closed
+    result = await extract_from_response(_FakeResponse(page))
+    assert result == {"bio": "bio", "image_url": None}
@@ -0,0 +1,162 @@
+"""Tests for the /tr translate command."""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+# translators 导入时会联网探测地区，测试中固定地区跳过探测
+os.environ.setdefault("translators_default_region", "EN")
+
+from handlers.commands import translate as translate_mod  # noqa: E402
+from utils import tts as tts_mod  # noqa: E402
+from utils.blocking import BlockingPool  # noqa: E402
+
+LINE = "x" * 250  # 两行合并为一段（501 字符），第三行另起一段
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pool(monkeypatch):
+    pool = BlockingPool("translate", workers=translate_mod.TRANSLATE_WORKERS, timeout=5)
+    monkeypatch.setattr(translate_mod, "_pool", pool)
+    yield pool
+    pool.shutdown()
+
+
+def _fake_translate_text(delays=None, calls=None):
+    """替代 ts.translate_text：在线程里 time.sleep 模拟同步网络请求。"""
+    lock = threading.Lock()
+
+    def translate_text(text, to_language, translator):
+        if calls is not None:
+            with lock:
+                calls.append(text)
+        time.sleep((delays or {}).get(text, 0.05))
+        return f"<{to_language}>{text}"
+
+    return translate_text
+
+
+async def _fake_transcode(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+def _event(text):
+    return SimpleNamespace(
+        text=text,
+        id=10,
+        chat_id=-100,
+        is_reply=False,
+        reply_to_msg_id=None,
+        date=datetime.now(timezone.utc),
+        get_sender=AsyncMock(return_value=SimpleNamespace(id=1, first_name="A", last_name=None)),
+        respond=AsyncMock(),
+        reply=AsyncMock(),
+    )
+
+
+def test_split_segments_merges_lines_up_to_the_limit():
+    segments = translate_mod._split_segments("\n".join([LINE, LINE, LINE]))
+    assert segments == [f"{LINE}\n{LINE}", LINE]
+
+    # 单行超长时整行作为一段
+    long_line = "y" * (translate_mod.SEGMENT_CHARS + 10)
+    assert translate_mod._split_segments(f"a\n{long_line}\nb") == ["a", long_line, "b"]
+
+    assert translate_mod._split_segments("short text") == ["short text"]
+    assert translate_mod._split_segments("   ") == ["   "]
+
+
+async def test_segments_are_yielded_in_order(mock_manager, monkeypatch):
+    # 第一段最慢：并发提交，但仍按原顺序产出
+    delays = {"s0": 0.2, "s1": 0.01, "s2": 0.01}
+    monkeypatch.setattr(translate_mod.ts, "translate_text", _fake_translate_text(delays))
+
+    started = time.monotonic()
+    results = [r async for r in translate_mod._translate_segments(["s0", "s1", "s2"], "en")]
+
+    assert results == ["<en>s0", "<en>s1", "<en>s2"]
+    assert time.monotonic() - started < 0.2 + 0.15  # 各段并发，而不是依次执行
+
+
+async def test_failed_segment_cancels_the_rest(mock_manager, monkeypatch):
+    started = asyncio.Event()
+    pending = []
+
+    async def fake_translate(content, to_language):
+        if content == "bad":
+            await started.wait()
+            raise RuntimeError("boom")
+        pending.append(asyncio.current_task())
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(translate_mod, "_translate", fake_translate)
+
+    with pytest.raises(RuntimeError):
+        async for _ in translate_mod._translate_segments(["bad", "later"], "en"):
+            pass
+
+    await asyncio.sleep(0)
+    assert len(pending) == 1 and pending[0].cancelled()
+
+
+async def test_repeated_segments_are_served_from_the_cache(mock_manager, monkeypatch, _fresh_pool):
+    calls = []
+    monkeypatch.setattr(translate_mod.ts, "translate_text", _fake_translate_text(calls=calls))
+
+    # 同一批中的重复段落合并为一次回源，之后再翻译直接命中缓存
+    first = [r async for r in translate_mod._translate_segments(["same", "same", "other"], "en")]
+    second = [r async for r in translate_mod._translate_segments(["same"], "en")]
+    other_language = [r async for r in translate_mod._translate_segments(["same"], "ja")]
+
+    assert first == ["<en>same", "<en>same", "<en>other"]
+    assert second == ["<en>same"]
+    assert other_language == ["<ja>same"]
+    assert sorted(calls) == ["other", "same", "same"]
+    assert _fresh_pool.stats()["submitted"] == 3
+
+
+async def test_translate_command_keeps_the_loop_responsive(mock_manager, monkeypatch, loop_guard):
+    first, second = "a" * 250 + "\n" + "b" * 250, "c" * 250
+    delays = {first: 0.2, second: 0.05}
+    monkeypatch.setattr(translate_mod.ts, "translate_text", _fake_translate_text(delays))
+
+    received = []
+
+    async def fake_reply_tts_segments(target, segments, show_original=False, lang="zh-CN"):
+        async for text in segments:
+            received.append(text)
+        return True
+
+    monkeypatch.setattr(translate_mod, "reply_tts_segments", fake_reply_tts_segments)
+
+    event = _event(f"/tr en {first}\n{second}")
+    await translate_mod.translate(event)
+
+    assert received == [f"<en>{first}", f"<en>{second}"]
+    assert loop_guard.max_lag < 0.1
+    event.reply.assert_not_awaited()
+
+
+async def test_translate_command_reports_failures(mock_manager, monkeypatch):
+    def broken(text, to_language, translator):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(translate_mod.ts, "translate_text", broken)
+    monkeypatch.setattr(tts_mod, "transcode", _fake_transcode)
+    send_voice = AsyncMock()
+    monkeypatch.setattr(mock_manager, "send_voice", send_voice)
+
+    event = _event("/tr hello")
+    await translate_mod.translate(event)
+
+    event.reply.assert_awaited_once()
+    assert "Translate failed" in event.reply.await_args.args[0]
+    send_voice.assert_not_awaited()
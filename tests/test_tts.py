@@ -0,0 +1,71 @@
+"""Tests for segmented TTS replies."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from utils import tts as tts_mod
+
+
+@pytest.fixture
+def voice_env(mock_manager, monkeypatch):
+    """替换 edge-tts 与 ffmpeg：每段合成为 "[文本]"，转码即拼接。"""
+    synthesized = []
+
+    async def fake_synthesize(text, voice, queue):
+        synthesized.append(text)
+        queue.put_nowait(f"[{text}]".encode())
+        queue.put_nowait(tts_mod._END)
+
+    async def fake_transcode(chunks):
+        return b"".join([chunk async for chunk in chunks])
+
+    send_voice = AsyncMock(return_value=SimpleNamespace(id=1))
+    monkeypatch.setattr(tts_mod, "_synthesize", fake_synthesize)
+    monkeypatch.setattr(tts_mod, "transcode", fake_transcode)
+    monkeypatch.setattr(mock_manager, "send_voice", send_voice)
+    monkeypatch.setattr(tts_mod, "_voice_cache", tts_mod.LRUCache(8, 60))
+    return SimpleNamespace(synthesized=synthesized, send_voice=send_voice)
+
+
+async def test_synthesis_overlaps_with_upstream_segments(voice_env):
+    async def segments():
+        yield "one"
+        # 第一段合成开始后上游才产出第二段：没有重叠时这里会一直等待
+        while "one" not in voice_env.synthesized:
+            await asyncio.sleep(0.001)
+        yield "two"
+
+    msg = SimpleNamespace(chat_id=-100, id=5)
+    assert await asyncio.wait_for(tts_mod.reply_tts_segments(msg, segments(), show_original=True), timeout=2)
+
+    voice_env.send_voice.assert_awaited_once_with(-100, b"[one][two]", caption="one\ntwo", reply_to=5)
+
+
+async def test_upstream_errors_are_raised(voice_env):
+    async def segments():
+        yield "one"
+        raise ConnectionError("offline")
+
+    with pytest.raises(ConnectionError):
+        await tts_mod.reply_tts_segments(SimpleNamespace(chat_id=-100, id=5), segments())
+    voice_env.send_voice.assert_not_awaited()
+
+
+async def test_cached_voice_does_not_wait_for_transcode(voice_env, monkeypatch):
+    async def stuck_transcode(chunks):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(tts_mod, "transcode", stuck_transcode)
+    tts_mod._voice_cache.set(("one\ntwo", tts_mod.voice_for("zh-CN")), b"cached")
+
+    async def segments():
+        yield "one"
+        yield "two"
+
+    msg = SimpleNamespace(chat_id=-100, id=5)
+    assert await asyncio.wait_for(tts_mod.reply_tts_segments(msg, segments()), timeout=2)
+    voice_env.send_voice.assert_awaited_once_with(-100, b"cached", reply_to=5, silent=True)
@@ -1,13 +1,20 @@
 """
-from typing import Optional
 广告词检测模块
 Advertising words detection module
+
+配置只在变化时解析一次，构建 AdvertisingMatcher：
+  - 字面广告词：Aho–Corasick 自动机，一次扫描文本即可，耗时与词表大小无关
+  - 正则模式：合并为一个带命名分组的交替表达式，一次 search
+配置变化（[advertising] 的 enabled / words / regex_patterns）时重新构建并整体替换引用。
+广告词与待检文本都先经过 utils.normalize 归一化（全角、零宽、形近字母、插入空白）。
 """
 
 import re
+import threading
 from typing import List, Tuple, Optional, Dict, Any, Union
 
 from manager import manager
+from utils.normalize import compact_text, normalize_text
 
 logger = manager.logger
 
@@ -93,6 +100,167 @@ def load_advertising_patterns() -> List[Dict[str, Any]]:
     return patterns
 
 
+class AhoCorasick:
+    """
+    多模式字面匹配自动机。
+
+    search 返回文本中出现的、在 words 中下标最小的词的下标（与逐词查找的优先级一致），没有则返回 None。
+    """
+
+    __slots__ = ("goto", "fail", "out", "size")
+
+    def __init__(self, words: List[str]):
+        self.size = len(words)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[int] = [self.size]
+        for idx, word in enumerate(words):
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(self.size)
+                state = nxt
+            out[state] = min(out[state], idx)
+
+        # BFS 构建失败指针，并沿失败链合并输出（取最小下标）
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())  # 第一层的失败指针为根
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = min(out[nxt], out[fail[nxt]])
+                queue.append(nxt)
+
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def search(self, text: str) -> Optional[int]:
+        goto, fail, out = self.goto, self.fail, self.out
+        best = self.size
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] < best:
+                best = out[state]
+                if best == 0:
+                    break
+        return best if best < self.size else None
+
+
+class AdvertisingMatcher:
+    """
+    由广告词与正则模式构建的不可变匹配器。
+
+    广告词与文本均归一化后匹配，长度小于 2 的词忽略，命中时返回配置中的原词；含非 ASCII 字符的词
+    另在去掉全部空白的文本上匹配（“加 微 信”）。正则合并为一个交替表达式，先在原文上查找，
+    归一化改变了文本时再在归一化文本上查找（返回最靠前的命中）；
+    含反向引用等无法合并的模式单独编译，在合并表达式之后检查。
+    """
+
+    __slots__ = ("words", "labels", "automaton", "compact_automaton", "compact_index", "combined", "group_names", "separate")
+
+    def __init__(self, words: List[str], patterns: List[Dict[str, Any]]):
+        pairs = [(normalize_text(w), w) for w in words]
+        pairs = [(n, w) for n, w in pairs if len(n) >= 2]
+        self.words = [n for n, _ in pairs]
+        self.labels = [w for _, w in pairs]  # 配置中的原词，用于上报
+        self.automaton = AhoCorasick(self.words) if self.words else None
+
+        # 英文词去掉空白后容易跨词误中，只对含非 ASCII 字符的词做无空白匹配
+        self.compact_index = [i for i, w in enumerate(self.words) if not w.isascii()]
+        compact_words = [compact_text(self.words[i]) for i in self.compact_index]
+        self.compact_automaton = AhoCorasick(compact_words) if compact_words else None
+
+        self.group_names: Dict[str, str] = {}
+        self.separate: List[Tuple[str, "re.Pattern[str]"]] = []
+        parts = []
+        for i, info in enumerate(patterns):
+            pattern = info["pattern"]
+            if re.search(r"\\\d|\(\?P[<=]|\(\?[aiLmsux-]+[:)]", pattern):
+                self.separate.append((info["name"], info["compiled"]))
+                continue
+            group = f"_p{i}"
+            self.group_names[group] = info["name"]
+            parts.append(f"(?P<{group}>{pattern})")
+        self.combined = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+
+    def match(self, text: str) -> Optional[Tuple[str, str]]:
+        """返回 ("word", 词) 或 ("pattern", 模式名)；未命中返回 None。"""
+        normalized = normalize_text(text)
+        if self.automaton is not None:
+            idx = self.automaton.search(normalized)
+            if idx is not None:
+                return "word", self.labels[idx]
+        if self.compact_automaton is not None and " " in normalized and not normalized.isascii():
+            idx = self.compact_automaton.search(compact_text(normalized))
+            if idx is not None:
+                return "word", self.labels[self.compact_index[idx]]
+        # 正则按原文编写（可能依赖大小写、全角或空白），先查原文，再查归一化文本
+        name = self._search_patterns(text)
+        if name is None and normalized != text:
+            name = self._search_patterns(normalized)
+        return ("pattern", name) if name is not None else None
+
+    def _search_patterns(self, text: str) -> Optional[str]:
+        if self.combined is not None:
+            m = self.combined.search(text)
+            if m:
+                return self.group_names[m.lastgroup]
+        for name, compiled in self.separate:
+            if compiled.search(text):
+                return name
+        return None
+
+
+_matcher: Optional[AdvertisingMatcher] = None
+_matcher_key: Optional[Tuple[Any, ...]] = None
+_matcher_lock = threading.Lock()
+
+
+def _config_key() -> Optional[Tuple[Any, ...]]:
+    """[advertising] 配置的原始值；未启用时返回 None。"""
+    config = manager.config
+    if not config.has_section("advertising"):
+        return None
+    section = config["advertising"]
+    if not section.getboolean("enabled", False):
+        return None
+    return section.get("words", ""), section.get("regex_patterns", "")
+
+
+def get_advertising_matcher() -> Optional[AdvertisingMatcher]:
+    """
+    当前配置对应的匹配器；广告检测未启用时返回 None。
+
+    只比较原始配置字符串，配置未变化时直接复用；变化时在锁内构建新匹配器后整体替换。
+    """
+    global _matcher, _matcher_key
+
+    key = _config_key()
+    if key is None:
+        return None
+    if key == _matcher_key:
+        return _matcher
+    with _matcher_lock:
+        if key != _matcher_key:
+            matcher = AdvertisingMatcher(load_advertising_words(), load_advertising_patterns())
+            _matcher, _matcher_key = matcher, key
+            logger.info(
+                f"advertising matcher built: {len(matcher.words)} words, "
+                f"{len(matcher.group_names) + len(matcher.separate)} patterns"
+            )
+        return _matcher
+
+
 def check_advertising(text: Optional[str]) -> Tuple[bool, Optional[str]]:
     """
     检查文本是否包含广告词
@@ -108,29 +276,18 @@ def check_advertising(text: Optional[str]) -> Tuple[bool, Optional[str]]:
     """
     if not text:
         return False, None
-    
-    # Check simple word matches
-    words = load_advertising_words()
-    if words:
-        # Convert text to lowercase for case-insensitive matching
-        text_lower = text.lower()
-
-        for word in words:
-            if len(word) < 2:
-                continue
-            if word.lower() in text_lower:
-                logger.info(f"Advertising word detected: {word}")
-                return True, word
-    
-    # Check regex patterns
-    patterns = load_advertising_patterns()
-    if patterns:
-        for pattern_info in patterns:
-            compiled_pattern = pattern_info["compiled"]
-            name = pattern_info["name"]
-            
-            if compiled_pattern.search(text):
-                logger.info(f"Advertising pattern detected: {name}")
-                return True, f"pattern:{name}"
-    
-    return False, None
+
+    matcher = get_advertising_matcher()
+    if matcher is None:
+        return False, None
+
+    found = matcher.match(text)
+    if found is None:
+        return False, None
+
+    kind, value = found
+    if kind == "word":
+        logger.info(f"Advertising word detected: {value}")
+        return True, value
+    logger.info(f"Advertising pattern detected: {value}")
+    return True, f"pattern:{value}"
@@ -1,16 +1,123 @@
-from typing import BinaryIO
+"""
+语音识别（/asr）
+Streaming upload to the ASR endpoint
 
-from aiohttp import ClientTimeout
+媒体文件分块下载后直接写入 chunked multipart 请求体，不在内存中拼出完整文件：
+
+  - 大小上限：已知大小时提前拒绝，流式传输中超过上限立即中止
+  - 识别任务并发受 ASRQueue 限制，排队的任务可以拿到自己前面还有几个任务
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterable, AsyncIterator, List, Union
+
+from aiohttp import ClientTimeout, MultipartWriter
 
 from manager import manager
 
 logger = manager.logger
 
+DEFAULT_CONCURRENCY = 2
+DEFAULT_MAX_SIZE_MB = 20
+CHUNK_SIZE = 128 * 1024  # Telegram 分块下载大小（需为 4KB 的倍数）
+
+
+class MediaTooLarge(ValueError):
+    """媒体文件超过 [asr] max_size_mb"""
+
+    pass
+
+
+class ASRQueue:
+    """识别任务并发限制，先到先得。"""
+
+    def __init__(self, limit: int = DEFAULT_CONCURRENCY):
+        self.limit = max(1, limit)
+        self.running = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(self.limit)
+        self._stats = {"completed": 0, "failed": 0}
+
+    def ahead(self) -> int:
+        """新任务现在入队时，前面需要等待的任务数（0 表示可以立即开始）。"""
+        if self.running + self.waiting < self.limit:
+            return 0
+        return self.running + self.waiting - self.limit + 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        except BaseException:
+            self._stats["failed"] += 1
+            raise
+        else:
+            self._stats["completed"] += 1
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "running": self.running, "waiting": self.waiting, **self._stats}
+
+
+_queue: "ASRQueue | None" = None
 
-async def openai_whisper(raw: BinaryIO):
-    # request the remove
 
-    # load users and groups from configure
+def get_asr_queue() -> ASRQueue:
+    """首次使用时按 [asr] concurrency 创建。"""
+    global _queue
+    if _queue is None:
+        limit = DEFAULT_CONCURRENCY
+        try:
+            if manager.config.has_section("asr"):
+                limit = manager.config["asr"].getint("concurrency", DEFAULT_CONCURRENCY)
+        except Exception as e:
+            logger.warning(f"invalid asr concurrency, using default: {e}")
+        _queue = ASRQueue(limit)
+    return _queue
+
+
+def get_max_size() -> int:
+    """[asr] max_size_mb 换算为字节。"""
+    size_mb = DEFAULT_MAX_SIZE_MB
+    try:
+        if manager.config.has_section("asr"):
+            size_mb = manager.config["asr"].getfloat("max_size_mb", DEFAULT_MAX_SIZE_MB)
+    except Exception as e:
+        logger.warning(f"invalid asr max_size_mb, using default: {e}")
+    return int(size_mb * 1024 * 1024)
+
+
+async def limit_size(chunks: AsyncIterable[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """透传分块，累计超过 max_bytes 时抛出 MediaTooLarge。"""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > max_bytes:
+            raise MediaTooLarge(f"media exceeds {max_bytes} bytes")
+        yield chunk
+
+
+async def openai_whisper(
+    audio: Union[bytes, AsyncIterable[bytes]],
+    *,
+    filename: str = "audio.ogg",
+    content_type: str = "audio/ogg",
+):
+    """
+    上传音频并返回识别文本。
+
+    audio 为 bytes 或异步分块迭代器；后者以 chunked multipart 流式上传，
+    迭代器抛出的异常（如 MediaTooLarge）会中止请求并原样抛出。
+    """
     config = manager.config
     try:
         endpoint = config["asr"]["endpoint"]
@@ -18,14 +125,34 @@ async def openai_whisper(raw: BinaryIO):
         logger.exception("asr endpoint not found")
         return
 
-    session = await manager.create_session()
-    async with session.post(
-        url=endpoint,
-        data={"audio": raw},
-        timeout=ClientTimeout(total=300, connect=15, sock_read=240),
-    ) as response:
-        if response.status != 200:
-            raise Exception(await response.text())
-
-        resp = await response.json()
-        return resp["text"]
+    # aiohttp 会把请求体迭代器的异常包装成连接错误，这里记下原始异常以便原样抛出
+    upstream: List[BaseException] = []
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in audio:
+                yield chunk
+        except Exception as e:
+            upstream.append(e)
+            raise
+
+    form = MultipartWriter("form-data")
+    part = form.append(audio if isinstance(audio, bytes) else body(), {"Content-Type": content_type})
+    part.set_content_disposition("form-data", name="audio", filename=filename)
+
+    session = await manager.create_session("media")
+    try:
+        async with session.post(
+            url=endpoint,
+            data=form,
+            timeout=ClientTimeout(total=300, connect=15, sock_read=240),
+        ) as response:
+            if response.status != 200:
+                raise Exception(await response.text())
+
+            resp = await response.json()
+            return resp["text"]
+    except Exception:
+        if upstream:
+            raise upstream[0]
+        raise
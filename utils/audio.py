@@ -0,0 +1,95 @@
+"""
+音频转码
+Streaming ffmpeg transcoding
+
+上游音频分片（如 edge-tts 的 MP3 流）边到达边写入 ffmpeg 子进程的 stdin，同时读取 stdout，
+不在事件循环里做任何解码 / 编码。同时运行的 ffmpeg 进程数由信号量限制（转码工作池）。
+"""
+
+import asyncio
+from typing import AsyncIterable, List, Optional
+
+from loguru import logger
+
+TRANSCODE_WORKERS = 2
+TRANSCODE_TIMEOUT = 60
+
+# OGG/Opus 输出参数（Telegram 语音消息格式）
+OPUS_OGG_ARGS = ["-c:a", "opus", "-strict", "-2", "-f", "ogg"]
+
+_slots: Optional[asyncio.Semaphore] = None
+transcode_stats = {"started": 0, "completed": 0, "failed": 0}
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(TRANSCODE_WORKERS)
+    return _slots
+
+
+def ffmpeg_command(input_format: str, output_args: List[str]) -> List[str]:
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", input_format, "-i", "pipe:0", *output_args, "pipe:1"]
+
+
+async def transcode(
+    chunks: AsyncIterable[bytes],
+    input_format: str = "mp3",
+    output_args: List[str] = OPUS_OGG_ARGS,
+    timeout: float = TRANSCODE_TIMEOUT,
+) -> bytes:
+    """
+    把异步产出的音频分片流式转码，返回完整输出。
+
+    第一个分片到达后才占用转码槽位、启动 ffmpeg 并开始计算超时，等待上游（如逐段翻译）期间不占资源。
+    上游 chunks 抛出的异常会终止 ffmpeg 并原样抛出；没有输入、ffmpeg 失败或输出为空时抛出 RuntimeError。
+    """
+    iterator = chunks.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        raise RuntimeError("no audio input") from None
+
+    async with _get_slots():
+        transcode_stats["started"] += 1
+        proc = await asyncio.create_subprocess_exec(
+            *ffmpeg_command(input_format, output_args),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        async def feed() -> None:
+            try:
+                proc.stdin.write(first)
+                await proc.stdin.drain()
+                async for chunk in iterator:
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+            finally:
+                proc.stdin.close()
+
+        # 写入与读取并发进行，避免输出管道写满后双方互相等待
+        feeder = asyncio.create_task(feed())
+        output = asyncio.create_task(proc.stdout.read())
+        errors = asyncio.create_task(proc.stderr.read())
+        try:
+            await asyncio.wait_for(asyncio.gather(feeder, output, errors), timeout=timeout)
+            returncode = await proc.wait()
+        except BaseException:
+            transcode_stats["failed"] += 1
+            for task in (feeder, output, errors):
+                task.cancel()
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+
+        data = output.result()
+        if returncode != 0 or not data:
+            transcode_stats["failed"] += 1
+            detail = errors.result().decode(errors="replace").strip()[-500:]
+            logger.error(f"ffmpeg transcode failed | code={returncode} detail={detail}")
+            raise RuntimeError(f"ffmpeg exited with {returncode}")
+        transcode_stats["completed"] += 1
+        return data
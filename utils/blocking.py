@@ -0,0 +1,64 @@
+"""
+阻塞调用隔离
+Run blocking library calls in named, bounded thread pools
+
+同步的第三方库（如 translators 的网络请求）直接在 handler 里调用会阻塞整个事件循环，
+期间所有入群验证、消息处理都会停顿。BlockingPool 把这类调用放进专用线程池：
+
+  - 线程数即并发上限，超出的调用在池内排队
+  - 每次调用带超时；超时或被取消时尚未开始的任务直接从队列移除
+  - 统计提交 / 完成 / 超时 / 失败次数
+"""
+
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+# 按名称登记已创建的线程池，供 /system_usage 汇总统计（不持有引用）
+pools: "weakref.WeakValueDictionary[str, BlockingPool]" = weakref.WeakValueDictionary()
+
+
+class BlockingPool:
+    def __init__(self, name: str, workers: int = 4, timeout: float = 30.0):
+        self.name = name
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"submitted": 0, "completed": 0, "timeouts": 0, "errors": 0}
+        pools[name] = self
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """在线程池中执行 fn(*args, **kwargs)；超时抛出 asyncio.TimeoutError。"""
+        loop = asyncio.get_running_loop()
+        self._stats["submitted"] += 1
+        future = loop.run_in_executor(self._get_executor(), functools.partial(fn, *args, **kwargs))
+        try:
+            result = await asyncio.wait_for(future, timeout=self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            logger.warning(f"{self.name} blocking call {getattr(fn, '__name__', fn)} timed out")
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        self._stats["completed"] += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, **self._stats}
@@ -0,0 +1,126 @@
+"""
+图片验证码渲染
+Image captcha rendering (worker-process side)
+
+纯 Python 生成扭曲字符的灰度 PNG（无需 Pillow）。本模块只依赖标准库：
+ProcessPoolExecutor 的工作进程按模块路径导入 render_challenge，
+放在 handlers 包之外可避免每个工作进程都导入整个机器人（manager、telethon、redis 等）。
+"""
+
+import math
+import random
+import struct
+import zlib
+from typing import Dict, Tuple
+
+IMAGE_WIDTH = 200
+IMAGE_HEIGHT = 70
+CODE_LENGTH = 4
+OPTION_COUNT = 5
+
+# 5x7 点阵；去掉 0/O、1/I、9/g 等易混字符
+GLYPHS: Dict[str, Tuple[str, ...]] = {
+    "2": ("01110", "10001", "00001", "00110", "01000", "10000", "11111"),
+    "3": ("11110", "00001", "00001", "01110", "00001", "00001", "11110"),
+    "4": ("00010", "00110", "01010", "10010", "11111", "00010", "00010"),
+    "5": ("11111", "10000", "11110", "00001", "00001", "10001", "01110"),
+    "6": ("00110", "01000", "10000", "11110", "10001", "10001", "01110"),
+    "7": ("11111", "00001", "00010", "00100", "01000", "01000", "01000"),
+    "8": ("01110", "10001", "10001", "01110", "10001", "10001", "01110"),
+    "A": ("01110", "10001", "10001", "11111", "10001", "10001", "10001"),
+    "C": ("01110", "10001", "10000", "10000", "10000", "10001", "01110"),
+    "E": ("11111", "10000", "10000", "11110", "10000", "10000", "11111"),
+    "F": ("11111", "10000", "10000", "11110", "10000", "10000", "10000"),
+    "H": ("10001", "10001", "10001", "11111", "10001", "10001", "10001"),
+    "K": ("10001", "10010", "10100", "11000", "10100", "10010", "10001"),
+    "M": ("10001", "11011", "10101", "10101", "10001", "10001", "10001"),
+    "N": ("10001", "11001", "10101", "10011", "10001", "10001", "10001"),
+    "P": ("11110", "10001", "10001", "11110", "10000", "10000", "10000"),
+    "R": ("11110", "10001", "10001", "11110", "10100", "10010", "10001"),
+    "T": ("11111", "00100", "00100", "00100", "00100", "00100", "00100"),
+    "W": ("10001", "10001", "10001", "10101", "10101", "10101", "01010"),
+    "X": ("10001", "10001", "01010", "00100", "01010", "10001", "10001"),
+    "Y": ("10001", "10001", "01010", "00100", "00100", "00100", "00100"),
+}
+ALPHABET = "".join(GLYPHS)
+
+
+def _encode_png(width: int, height: int, pixels: bytearray) -> bytes:
+    """8 位灰度 PNG 编码。"""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + pixels[y * width : (y + 1) * width] for y in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _make_decoys(rng: random.Random, code: str) -> Tuple[str, ...]:
+    """
+    干扰项为独立随机生成的字符串。
+
+    不能由正确答案改动几个字符得到：否则按钮之间共享结构，
+    取各位置出现最多的字符即可不看图片选出答案。
+    """
+    decoys = set()
+    while len(decoys) < OPTION_COUNT - 1:
+        candidate = "".join(rng.choice(ALPHABET) for _ in range(len(code)))
+        if candidate != code:
+            decoys.add(candidate)
+    return tuple(sorted(decoys))
+
+
+def render_challenge(seed: int) -> Tuple[bytes, str, Tuple[str, ...]]:
+    """按种子渲染一道题，返回 (png, code, decoys)。纯函数，可在子进程中调用。"""
+    rng = random.Random(seed)
+    width, height = IMAGE_WIDTH, IMAGE_HEIGHT
+    code = "".join(rng.choice(ALPHABET) for _ in range(CODE_LENGTH))
+
+    # 浅色噪点背景
+    pixels = bytearray(rng.randint(200, 255) for _ in range(width * height))
+
+    # 整幅图的正弦纵向扭曲
+    amp = rng.uniform(2.0, 5.0)
+    period = rng.uniform(30.0, 60.0)
+    phase = rng.uniform(0, 2 * math.pi)
+
+    slot = width // (CODE_LENGTH + 1)
+    for i, ch in enumerate(code):
+        scale = rng.randint(5, 6)
+        shear = rng.uniform(-0.35, 0.35)
+        x0 = slot // 2 + i * slot + rng.randint(-4, 4)
+        y0 = (height - 7 * scale) // 2 + rng.randint(-6, 6)
+        ink = rng.randint(0, 90)
+        for row, bits in enumerate(GLYPHS[ch]):
+            for col, bit in enumerate(bits):
+                if bit != "1":
+                    continue
+                for dy in range(scale):
+                    y = row * scale + dy
+                    for dx in range(scale):
+                        px = x0 + col * scale + dx + int(shear * (y - 3.5 * scale))
+                        py = y0 + y + int(amp * math.sin(px / period * 2 * math.pi + phase))
+                        if 0 <= px < width and 0 <= py < height:
+                            pixels[py * width + px] = ink
+
+    # 干扰线
+    for _ in range(rng.randint(3, 5)):
+        x1, y1 = rng.randrange(width), rng.randrange(height)
+        x2, y2 = rng.randrange(width), rng.randrange(height)
+        shade = rng.randint(40, 140)
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+        for s in range(steps + 1):
+            px = x1 + (x2 - x1) * s // steps
+            py = y1 + (y2 - y1) * s // steps
+            pixels[py * width + px] = shade
+
+    # 深色噪点
+    for _ in range(width * height // 40):
+        pixels[rng.randrange(width * height)] = rng.randint(0, 160)
+
+    return _encode_png(width, height, pixels), code, _make_decoys(rng, code)
@@ -159,7 +159,7 @@ async def get_job_info(endpoint: str, job_id: str) -> Dict[str, Any]:
         任务信息字典
     """
     try:
-        session = await manager.create_session()
+        session = await manager.create_session("media")
         async with session.get(f"{endpoint}/history/{job_id}", timeout=DEFAULT_TIMEOUT) as response:
             if response.status != 200:
                 raise Exception(f"API请求失败: HTTP {response.status}")
@@ -193,7 +193,7 @@ async def download_image(endpoint: str, filename: str, subfolder: str) -> bytes:
     url = f"{endpoint}/view?filename={filename}&subfolder={subfolder}&type=output"
 
     try:
-        session = await manager.create_session()
+        session = await manager.create_session("media")
         async with session.get(url, timeout=DEFAULT_TIMEOUT) as response:
             if response.status != 200:
                 raise ImageDownloadError(
@@ -246,7 +246,7 @@ async def generate_image(
         logger.info(f"开始生成图片: [{size}] {prompt}")
 
         # 创建 HTTP 会话
-        session = await manager.create_session()
+        session = await manager.create_session("media")
         # 提交工作流
         return await _submit_workflow(session, endpoint, workflow)
 
@@ -274,7 +274,7 @@ async def job_status(endpoint: str, job_id: str) -> Optional[Dict[str, Any]]:
         ComfyAPIError: API 调用相关错误
     """
     try:
-        session = await manager.create_session()
+        session = await manager.create_session("media")
         # 检查历史记录中是否已完成
         async with session.get(f"{endpoint}/history/{job_id}", timeout=DEFAULT_TIMEOUT) as response:
             if response.status == 200:
@@ -323,7 +323,7 @@ async def job_cancel(endpoint: str, job_id: str) -> bool:
         job_id: 任务 ID
     """
     try:
-        session = await manager.create_session()
+        session = await manager.create_session("media")
         async with session.post(f"{endpoint}/cancel/{job_id}", timeout=DEFAULT_TIMEOUT) as response:
             if response.status == 200:
                 logger.info(f"任务 {job_id} 已取消。")
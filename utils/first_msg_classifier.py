@@ -0,0 +1,342 @@
+"""
+首句本地分类器
+Local first-message classifier
+
+首句审查中，未命中问候语白名单与广告词的消息原本全部交给 LLM（秒级延迟、按次计费）。
+这里用历史审查结果训练一个进程内朴素贝叶斯模型：
+
+  - 特征：归一化文本的字符 1~3-gram，crc32 哈希到 2**FEATURE_BITS 维（对中文与混写都适用）
+  - 模型：多项式朴素贝叶斯，只保存两类对数概率之差（float32 向量）与先验偏置，打分为一次向量索引求和
+  - 决策：垃圾概率低于 accept_below 直接放行，高于 reject_above 直接判定违规，中间区间仍交给 LLM
+
+训练数据来自 first_msg_verdicts 表（LLM 与广告词的判定，分类器自己的判定不参与训练）。
+NumPy 与模型文件都在首次使用时才加载，缺失时分类器不可用，审查流程回退到 LLM。
+
+配置（可选）：
+[first_msg_classifier]
+enabled = true
+model_path = data/first_msg_model.npz
+accept_below = 0.05
+reject_above = 0.97
+
+命令行：
+  python -m utils.first_msg_classifier eval   # 留出集评估（含阈值外自动判定的覆盖率与错误率）
+  python -m utils.first_msg_classifier train  # 评估后用全部样本训练并保存模型
+数据目录同主程序（GOALKEEPR_DATA_DIR）。
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+
+import database
+from manager import manager
+from utils.normalize import normalize_text
+
+logger = manager.logger
+
+FEATURE_BITS = 18
+NGRAM_MAX = 3
+# 只取前若干字符计算特征，长消息的尾部对判定帮助不大
+MAX_TEXT_CHARS = 512
+SMOOTHING_ALPHA = 1.0
+
+DEFAULT_ACCEPT_BELOW = 0.05
+DEFAULT_REJECT_ABOVE = 0.97
+MODEL_FILENAME = "first_msg_model.npz"
+
+DECISION_ACCEPT = "accept"
+DECISION_REJECT = "reject"
+
+SOURCE_LLM = "llm"
+SOURCE_ADVERTISING = "advertising"
+SOURCE_CLASSIFIER = "classifier"
+TRAIN_SOURCES = (SOURCE_LLM, SOURCE_ADVERTISING)
+
+# 按 id 取模划分测试集（确定性，便于多次评估对比）
+TEST_SPLIT_MOD = 5
+
+SQL_CREATE_FIRST_MSG_VERDICTS = """
+create table if not exists first_msg_verdicts(
+    id integer primary key autoincrement,
+    chat int,
+    member int,
+    text text,
+    is_spam int,
+    source text,
+    score int,
+    created_at timestamp default current_timestamp
+)
+"""
+
+
+def default_model_path() -> str:
+    return str(Path(database.DATA_DIR) / MODEL_FILENAME)
+
+
+def features(text: str, bits: int = FEATURE_BITS) -> List[int]:
+    """归一化文本的字符 n-gram 哈希下标（可重复，重复即计数）。"""
+    norm = f" {normalize_text(text)[:MAX_TEXT_CHARS]} "
+    mask = (1 << bits) - 1
+    out = []
+    for n in range(1, NGRAM_MAX + 1):
+        for i in range(len(norm) - n + 1):
+            out.append(zlib.crc32(norm[i : i + n].encode("utf-8")) & mask)
+    return out
+
+
+class NaiveBayesModel:
+    """多项式朴素贝叶斯：logit = bias + Σ weights[feature]。"""
+
+    __slots__ = ("weights", "bias", "bits", "meta")
+
+    def __init__(self, weights: Any, bias: float, bits: int, meta: Optional[Dict[str, Any]] = None):
+        self.weights = weights
+        self.bias = bias
+        self.bits = bits
+        self.meta = meta or {}
+
+    @classmethod
+    def train(
+        cls, texts: Sequence[str], labels: Sequence[int], bits: int = FEATURE_BITS, alpha: float = SMOOTHING_ALPHA
+    ) -> "NaiveBayesModel":
+        import numpy as np
+
+        dim = 1 << bits
+        counts = np.zeros((2, dim), dtype=np.float64)
+        docs = [0, 0]
+        for label in (0, 1):
+            idx = [f for text, y in zip(texts, labels) if y == label for f in features(text, bits)]
+            docs[label] = sum(1 for y in labels if y == label)
+            if idx:
+                counts[label] = np.bincount(np.asarray(idx, dtype=np.int64), minlength=dim)
+
+        log_prob = np.log(counts + alpha) - np.log(counts.sum(axis=1, keepdims=True) + alpha * dim)
+        weights = (log_prob[1] - log_prob[0]).astype(np.float32)
+        bias = math.log((docs[1] + 1) / (docs[0] + 1))
+        return cls(weights, bias, bits, {"spam": docs[1], "ham": docs[0]})
+
+    def logit(self, text: str) -> float:
+        import numpy as np
+
+        idx = np.fromiter(features(text, self.bits), dtype=np.int64)
+        return self.bias + float(self.weights[idx].sum())
+
+    def predict(self, text: str) -> float:
+        """垃圾概率。"""
+        z = self.logit(text)
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+
+    def save(self, path: str) -> None:
+        import numpy as np
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            weights=self.weights,
+            bias=np.float64(self.bias),
+            bits=np.int64(self.bits),
+            meta=np.frombuffer(orjson.dumps(self.meta), dtype=np.uint8),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesModel":
+        import numpy as np
+
+        with np.load(path) as data:
+            meta = orjson.loads(data["meta"].tobytes()) if "meta" in data else {}
+            return cls(data["weights"], float(data["bias"]), int(data["bits"]), meta)
+
+
+class FirstMessageClassifier:
+    """模型 + 放行 / 拒绝阈值。"""
+
+    __slots__ = ("model", "accept_below", "reject_above", "accepted", "rejected", "uncertain")
+
+    def __init__(
+        self,
+        model: NaiveBayesModel,
+        accept_below: float = DEFAULT_ACCEPT_BELOW,
+        reject_above: float = DEFAULT_REJECT_ABOVE,
+    ):
+        self.model = model
+        self.accept_below = accept_below
+        self.reject_above = reject_above
+        self.accepted = 0
+        self.rejected = 0
+        self.uncertain = 0
+
+    def decide(self, text: str) -> Tuple[Optional[str], float]:
+        """返回 (DECISION_ACCEPT / DECISION_REJECT / None, 垃圾概率)；None 表示交给 LLM。"""
+        p = self.model.predict(text)
+        if p < self.accept_below:
+            self.accepted += 1
+            return DECISION_ACCEPT, p
+        if p > self.reject_above:
+            self.rejected += 1
+            return DECISION_REJECT, p
+        self.uncertain += 1
+        return None, p
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "uncertain": self.uncertain,
+            **self.model.meta,
+        }
+
+
+_classifier: Optional[FirstMessageClassifier] = None
+_classifier_loaded = False
+
+
+def get_first_msg_classifier() -> Optional[FirstMessageClassifier]:
+    """首次调用时按配置加载模型；未启用、缺少 NumPy 或模型文件时返回 None（之后不再重试）。"""
+    global _classifier, _classifier_loaded
+    if _classifier_loaded:
+        return _classifier
+    _classifier_loaded = True
+
+    cfg = manager.config["first_msg_classifier"] if manager.config.has_section("first_msg_classifier") else None
+    if cfg is not None and not cfg.getboolean("enabled", True):
+        return None
+    path = cfg.get("model_path", "") if cfg is not None else ""
+    path = path or default_model_path()
+    if not os.path.isfile(path):
+        logger.info(f"first message classifier model not found at {path}, using LLM only")
+        return None
+    try:
+        model = NaiveBayesModel.load(path)
+    except ImportError:
+        logger.warning("numpy is not installed, first message classifier disabled")
+        return None
+    except Exception as e:
+        logger.error(f"first message classifier load failed: {e}")
+        return None
+
+    _classifier = FirstMessageClassifier(
+        model,
+        accept_below=cfg.getfloat("accept_below", DEFAULT_ACCEPT_BELOW) if cfg is not None else DEFAULT_ACCEPT_BELOW,
+        reject_above=cfg.getfloat("reject_above", DEFAULT_REJECT_ABOVE) if cfg is not None else DEFAULT_REJECT_ABOVE,
+    )
+    logger.info(f"first message classifier loaded from {path}: {model.meta}")
+    return _classifier
+
+
+_table_ready = False
+
+
+async def record_verdict(
+    chat_id: int, member_id: int, text: str, is_spam: bool, source: str, score: Optional[int] = None
+) -> None:
+    """记录一次首句判定（训练数据）；失败只记日志。"""
+    global _table_ready
+    try:
+        if not _table_ready:
+            await database.execute(SQL_CREATE_FIRST_MSG_VERDICTS)
+            _table_ready = True
+        await database.execute(
+            "insert into first_msg_verdicts(chat,member,text,is_spam,source,score) values(?,?,?,?,?,?)",
+            (chat_id, member_id, text, int(is_spam), source, score),
+        )
+    except Exception as e:
+        logger.warning(f"record first message verdict failed: {e}")
+
+
+async def load_verdicts(sources: Iterable[str] = TRAIN_SOURCES) -> List[Tuple[int, str, int]]:
+    """(id, text, is_spam) 列表。"""
+    sources = tuple(sources)
+    await database.execute(SQL_CREATE_FIRST_MSG_VERDICTS)
+    rows = await database.execute_fetch(
+        f"select id,text,is_spam from first_msg_verdicts where source in ({','.join('?' * len(sources))}) order by id",
+        sources,
+    )
+    return [(row[0], row[1] or "", int(row[2])) for row in rows]
+
+
+def evaluate(
+    model: NaiveBayesModel,
+    texts: Sequence[str],
+    labels: Sequence[int],
+    accept_below: float = DEFAULT_ACCEPT_BELOW,
+    reject_above: float = DEFAULT_REJECT_ABOVE,
+) -> Dict[str, float]:
+    """整体准确率 / 精确率 / 召回率，以及阈值外（自动判定）样本的覆盖率与错误率。"""
+    import numpy as np
+
+    y = np.asarray(labels, dtype=np.int8)
+    p = np.fromiter((model.predict(t) for t in texts), dtype=np.float64, count=len(texts))
+    pred = (p >= 0.5).astype(np.int8)
+    tp = int(((pred == 1) & (y == 1)).sum())
+    decided = (p < accept_below) | (p > reject_above)
+    decided_pred = (p > reject_above).astype(np.int8)
+    n = max(len(y), 1)
+    return {
+        "samples": len(y),
+        "accuracy": float((pred == y).sum()) / n,
+        "precision": tp / max(int(pred.sum()), 1),
+        "recall": tp / max(int(y.sum()), 1),
+        "auto_coverage": float(decided.sum()) / n,
+        "auto_error": float((decided_pred[decided] != y[decided]).sum()) / max(int(decided.sum()), 1),
+    }
+
+
+def _split(rows: Sequence[Tuple[int, str, int]]):
+    train = [r for r in rows if r[0] % TEST_SPLIT_MOD]
+    test = [r for r in rows if not r[0] % TEST_SPLIT_MOD]
+    return train, test
+
+
+def _print_metrics(title: str, metrics: Dict[str, float]) -> None:
+    print(title)
+    for key, value in metrics.items():
+        print(f"  {key:<14} {value:.4f}" if isinstance(value, float) else f"  {key:<14} {value}")
+
+
+async def _cli(args) -> int:
+    rows = await load_verdicts()
+    await database.close()
+    if not rows:
+        print("no labelled first messages in first_msg_verdicts")
+        return 1
+
+    # 在训练集上训练、留出集上评估；train 命令随后用全部样本重新训练并保存
+    train, test = _split(rows)
+    if train and test:
+        model = NaiveBayesModel.train([r[1] for r in train], [r[2] for r in train], bits=args.bits)
+        metrics = evaluate(model, [r[1] for r in test], [r[2] for r in test], args.accept_below, args.reject_above)
+        _print_metrics(f"holdout ({len(train)} train / {len(test)} test)", metrics)
+    else:
+        print(f"too few samples for a holdout split: {len(rows)}")
+
+    if args.command == "train":
+        model = NaiveBayesModel.train([r[1] for r in rows], [r[2] for r in rows], bits=args.bits)
+        model.save(args.model)
+        print(f"model saved to {args.model}: {model.meta}")
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="First-message classifier (train / eval)")
+    parser.add_argument("command", choices=("train", "eval"))
+    parser.add_argument("--model", default=default_model_path())
+    parser.add_argument("--bits", type=int, default=FEATURE_BITS)
+    parser.add_argument("--accept-below", type=float, default=DEFAULT_ACCEPT_BELOW)
+    parser.add_argument("--reject-above", type=float, default=DEFAULT_REJECT_ABOVE)
+    return asyncio.run(_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+"""
+文本归一化
+Single-pass text normalization for spam matching
+
+广告词匹配、安全问候语白名单、LLM 审查前的预处理共用同一套归一化，
+防止用全角字符、零宽字符、形近字母、插入空白等方式绕过检测：
+
+  1. NFKC 折叠（全角 → 半角、兼容字符 → 标准字符）
+  2. 一张预先构建的 str.translate 表：删除零宽 / 格式字符，形近字母映射为拉丁字母
+  3. casefold，空白折叠为单个空格
+
+纯 ASCII 文本跳过 1、2 步。最近的结果缓存在 LRU 中（同一段文本常被多个检测步骤重复处理）。
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 2048
+
+# 零宽与不可见格式字符（删除）
+ZERO_WIDTH_CHARS = (
+    "\u00ad"  # soft hyphen
+    "\u034f"  # combining grapheme joiner
+    "\u061c"  # arabic letter mark
+    "\u115f\u1160"  # hangul choseong / jungseong filler
+    "\u17b4\u17b5"
+    "\u180e"  # mongolian vowel separator
+    "\u200b\u200c\u200d\u200e\u200f"
+    "\u202a\u202b\u202c\u202d\u202e"
+    "\u2060\u2061\u2062\u2063\u2064"
+    "\u2066\u2067\u2068\u2069"
+    "\u3164"  # hangul filler
+    "\ufeff"
+    "\uffa0"
+)
+
+# 常见形近字母（西里尔 / 希腊 → 拉丁），大小写都映射为小写拉丁字母
+CONFUSABLES = {
+    "а": "a", "А": "a", "в": "b", "В": "b", "е": "e", "Е": "e", "ё": "e", "к": "k", "К": "k",
+    "м": "m", "М": "m", "н": "h", "Н": "h", "о": "o", "О": "o", "р": "p", "Р": "p",
+    "с": "c", "С": "c", "т": "t", "Т": "t", "у": "y", "У": "y", "х": "x", "Х": "x",
+    "ѕ": "s", "Ѕ": "s", "і": "i", "І": "i", "ј": "j", "Ј": "j", "һ": "h", "ԁ": "d",
+    "ԛ": "q", "ԝ": "w", "ɡ": "g",
+    "α": "a", "Α": "a", "β": "b", "Β": "b", "ε": "e", "Ε": "e", "η": "n", "Η": "h",
+    "ι": "i", "Ι": "i", "κ": "k", "Κ": "k", "μ": "u", "Μ": "m", "ν": "v", "Ν": "n",
+    "ο": "o", "Ο": "o", "ρ": "p", "Ρ": "p", "τ": "t", "Τ": "t", "υ": "u", "Υ": "y",
+    "χ": "x", "Χ": "x", "ζ": "z", "Ζ": "z",
+}
+
+_TRANSLATE_TABLE = str.maketrans({**dict.fromkeys(ZERO_WIDTH_CHARS), **CONFUSABLES})
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """归一化后的文本：NFKC、去零宽、形近字母映射、casefold、空白折叠。"""
+    if not text:
+        return ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text).translate(_TRANSLATE_TABLE)
+    return " ".join(text.casefold().split())
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_words(text: str) -> str:
+    """在 normalize_text 基础上去掉标点与符号，只保留以单个空格分隔的词（用于白名单比较）。"""
+    return " ".join(_NON_WORD.sub(" ", normalize_text(text)).split())
+
+
+def compact_text(normalized: str) -> str:
+    """去掉归一化文本中的全部空白（应对在中文词中间插入空格的写法）。"""
+    return normalized.replace(" ", "")
@@ -42,7 +42,7 @@ async def txt2img(
     if width * height > 513 * 513:
         timeout = ClientTimeout(total=600, connect=15, sock_read=480)
 
-    session = await manager.create_session()
+    session = await manager.create_session("media")
     async with session.post(
         url=f"{endpoint}/sdapi/v1/txt2img",
         json={
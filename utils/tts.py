@@ -1,32 +1,137 @@
-import io
-from pydub import AudioSegment
+"""
+TTS 语音回复
+Text-to-speech replies via edge-tts
+
+edge-tts 的 MP3 分片边合成边写入 ffmpeg（utils.audio.transcode）转为 OGG/Opus，
+事件循环上不做任何音频解码 / 编码；多段文本（如逐段翻译）每到一段就开始合成，按顺序拼接为一条语音。
+转码结果按 (文本, 发音人) 缓存在进程内。
+"""
+
+import asyncio
+from typing import AsyncIterable, AsyncIterator, List
 
 import edge_tts
 
 from manager import manager
+from manager.cache import LRUCache, MISSING
+
+from .audio import transcode
 
 logger = manager.logger
 
 SUPPORT_LANGUAGES = {"zh-CN": "zh-CN-XiaoxiaoNeural", "en": "en-US-AriaNeural", "ja": "ja-JP-NanamiNeural"}
+DEFAULT_VOICE = "zh-CN-XiaoxiaoNeural"
+
+VOICE_CACHE_SIZE = 64
+VOICE_CACHE_TTL = 60 * 60 * 6
+
+_voice_cache = LRUCache(VOICE_CACHE_SIZE, VOICE_CACHE_TTL)
+_END = object()
+
+
+def voice_for(lang: str) -> str:
+    return SUPPORT_LANGUAGES.get(lang, DEFAULT_VOICE)
 
 
 async def reply_tts(msg, content: str, show_original=False, lang="zh-CN"):
     """发送 TTS 语音回复。msg 为 Telethon Message 或事件。"""
+    voice_bytes = _voice_cache.get((content, voice_for(lang)))
+    if voice_bytes is not MISSING:
+        return await _send_voice(msg, voice_bytes, content, show_original)
+    return await reply_tts_segments(msg, _single(content), show_original=show_original, lang=lang)
+
+
+async def _single(content: str) -> AsyncIterator[str]:
+    yield content
+
+
+async def _synthesize(text: str, voice: str, queue: asyncio.Queue) -> None:
+    """把一段文本的 MP3 分片依次放入 queue，结束放入 _END，失败时放入异常。"""
+    try:
+        async for chunk in edge_tts.Communicate(text, voice).stream():
+            if chunk["type"] == "audio":
+                queue.put_nowait(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                logger.debug(f"WordBoundary: {chunk}")
+    except Exception as e:
+        queue.put_nowait(e)
+    finally:
+        queue.put_nowait(_END)
+
+
+async def reply_tts_segments(msg, segments: AsyncIterable[str], show_original=False, lang="zh-CN"):
+    """
+    按段发送 TTS 语音回复：每收到一段文本立即开始合成，与上游（如逐段翻译）重叠执行；
+    各段 MP3 分片按顺序直接流入 ffmpeg 转码，拼接为一条语音；全部段落已知后先查缓存，命中则直接发送。
+
+    上游产出文本时抛出的异常原样向上抛出；合成或转码失败只记录日志并返回 False。
+    """
+    voice = voice_for(lang)
+    texts: List[str] = []
+    channel: asyncio.Queue = asyncio.Queue()
+    synth_tasks: List[asyncio.Task] = []
+
+    cached = MISSING
+
+    async def produce() -> None:
+        nonlocal cached
+        try:
+            async for text in segments:
+                texts.append(text)
+                queue: asyncio.Queue = asyncio.Queue()
+                synth_tasks.append(asyncio.create_task(_synthesize(text, voice, queue)))
+                channel.put_nowait(queue)
+            cached = _voice_cache.get(("\n".join(texts), voice))
+        finally:
+            channel.put_nowait(_END)
+
+    async def audio() -> AsyncIterator[bytes]:
+        while (queue := await channel.get()) is not _END:
+            while (chunk := await queue.get()) is not _END:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+
+    producer = asyncio.create_task(produce())
+    transcoder = asyncio.create_task(transcode(audio()))
+    voice_bytes = None
     try:
-        voice_data = await edge_ext(content, lang)
+        await asyncio.wait({producer, transcoder}, return_when=asyncio.FIRST_COMPLETED)
+        # 全部段落已知后整段文本命中缓存（或上游失败）时，不再等待合成与转码
+        if cached is not MISSING:
+            voice_bytes = cached
+        elif _upstream_error(producer) is None:
+            voice_bytes = await transcoder
     except Exception:
-        logger.exception("edge ext convert content to voice failed")
-        return False
+        if _upstream_error(producer) is None:
+            logger.exception("edge tts synthesis or transcode failed")
+    finally:
+        for task in (*synth_tasks, producer, transcoder):
+            if not task.done():
+                task.cancel()
+
+    # 上游（如翻译）失败时原样抛出，由调用方提示用户
+    error = _upstream_error(producer)
+    if error is not None:
+        raise error
 
-    if not voice_data or len(voice_data) == 0:
+    if not voice_bytes:
         logger.warning("edge ext convert content to voice is empty data")
         return False
 
-    output = io.BytesIO()
-    audio = AudioSegment.from_file(io.BytesIO(voice_data), format="mp3")
-    audio.export(output, codec="opus", format="ogg", parameters=["-strict", "-2"])
-    voice_bytes = output.getvalue()
+    content = "\n".join(texts)
+    if cached is MISSING:
+        _voice_cache.set((content, voice), voice_bytes)
+    return await _send_voice(msg, voice_bytes, content, show_original)
+
+
+def _upstream_error(producer: asyncio.Task):
+    if producer.done() and not producer.cancelled():
+        return producer.exception()
+    return None
+
 
+async def _send_voice(msg, voice_bytes: bytes, content: str, show_original: bool) -> bool:
     chat_id = getattr(msg, "chat_id", None) or msg
     reply_to = getattr(msg, "id", None)
     if show_original:
@@ -36,12 +141,13 @@ async def reply_tts(msg, content: str, show_original=False, lang="zh-CN"):
     return sent is not None
 
 
-async def edge_ext(source: str, lang="zh-CN"):
-    communicate = edge_tts.Communicate(source, SUPPORT_LANGUAGES.get(lang, "zh-CN-XiaoxiaoNeural"))
-    data = b""
-    async for chunk in communicate.stream():
-        if chunk["type"] == "audio":
-            data += chunk["data"]
-        elif chunk["type"] == "WordBoundary":
-            logger.debug(f"WordBoundary: {chunk}")
-    return data
+async def edge_ext(source: str, lang="zh-CN") -> bytes:
+    """合成完整 MP3（分片收集到列表后一次拼接）。"""
+    queue: asyncio.Queue = asyncio.Queue()
+    await _synthesize(source, voice_for(lang), queue)
+    chunks = []
+    while (chunk := queue.get_nowait()) is not _END:
+        if isinstance(chunk, Exception):
+            raise chunk
+        chunks.append(chunk)
+    return b"".join(chunks)